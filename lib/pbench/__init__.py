@@ -73,3 +73,6 @@ class PbenchConfig:
 
     def getint(self, *args, **kwargs):
         return self._conf.getint(*args, **kwargs)
+
+    def getfloat(self, *args, **kwargs):
+        return self._conf.getfloat(*args, **kwargs)
@@ -17,6 +17,7 @@ from pbench.agent import PbenchAgentConfig
 from pbench.cli import CliContext
 from pbench.common import MetadataLog
 from pbench.common.exceptions import BadMDLogFormat
+from pbench.common.upload import ChunkedUpload, MB_BYTES
 from pbench.common.utils import md5sum, validate_hostname
 
 TarballRecord = collections.namedtuple("TarballRecord", ["name", "length", "md5"])
@@ -335,6 +336,8 @@ class CopyResult:
         token: Optional[str] = None,
         access: Optional[str] = None,
         metadata: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
     ) -> "CopyResult":
         """Factory method to create a CopyResults object
 
@@ -346,6 +349,8 @@ class CopyResult:
             token: The value of the --token option if specified
             access: The value of the --access option if specified
             metadata: The value of the --metadata option if specified
+            chunk_size: The value of the --chunk-size option if specified
+            concurrency: The value of the --concurrency option if specified
 
         Returns:
             An instance of the appropriate CopyResult subclass
@@ -353,7 +358,16 @@ class CopyResult:
         if relay:
             return CopyResultToRelay(logger, relay, access, metadata)
         else:
-            return CopyResultToServer(config, logger, token, server, access, metadata)
+            return CopyResultToServer(
+                config,
+                logger,
+                token,
+                server,
+                access,
+                metadata,
+                chunk_size,
+                concurrency,
+            )
 
     @classmethod
     def cli_create(
@@ -377,6 +391,8 @@ class CopyResult:
             context.token,
             context.access,
             context.metadata,
+            getattr(context, "chunk_size", None),
+            getattr(context, "concurrency", None),
         )
 
 
@@ -389,9 +405,14 @@ class CopyResultToServer(CopyResult):
         server: Optional[str] = None,
         access: Optional[str] = None,
         metadata: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
     ):
         """Configure an object to manage results upload to a Pbench Server.
 
+        Tarballs larger than the chunk size are sent using a resumable upload
+        session, with up to "concurrency" chunks in flight at once.
+
         Args
             config: The Pbench Agent configuration object
             logger: A Python logger object
@@ -401,8 +422,19 @@ class CopyResultToServer(CopyResult):
             access: A desired dataset access scope (private|public) [private]
             metadata: An optional list of metadata "key:value" pairs to apply
                     to the dataset.
+            chunk_size: The upload chunk size in MB, or 0 to always upload in
+                    a single request [defaults to Pbench Agent config
+                    "upload_chunk_size" value]
+            concurrency: The number of chunks to upload in parallel [defaults
+                    to Pbench Agent config "upload_concurrency" value]
         """
         super().__init__(logger, access, metadata)
+        if chunk_size is None:
+            chunk_size = config.getint("results", "upload_chunk_size", fallback=64)
+        if concurrency is None:
+            concurrency = config.getint("results", "upload_concurrency", fallback=4)
+        self.chunk_size = chunk_size * MB_BYTES
+        self.concurrency = concurrency
         if server:
             path = config.get("results", "rest_endpoint")
             uri = f"{server}/{path}"
@@ -424,23 +456,44 @@ class CopyResultToServer(CopyResult):
             tarball_md5: the MD5 hash of tarball
 
         Returns:
-            A Response object representing the server PUT HTTP call
+            A Response object representing the server PUT HTTP call, or the
+            last HTTP call of a chunked upload
 
         Raises:
             FileNotFoundError: the tarball doesn't exist
         """
         if not tarball.exists():
             raise FileNotFoundError(f"Tar ball '{tarball}' does not exist")
-        self.headers["Content-MD5"] = tarball_md5
         tar_uri = self.uri.format(name=tarball.name)
         with tarball.open("rb") as f:
-            return requests.put(
+            size = f.seek(0, os.SEEK_END)
+            f.seek(0)
+            if not self.chunk_size or size <= self.chunk_size:
+                self.headers["Content-MD5"] = tarball_md5
+                return requests.put(
+                    tar_uri,
+                    data=f,
+                    headers=self.headers,
+                    params=self.params,
+                    verify=self.ca,
+                )
+
+        self.logger.debug(
+            "Uploading %s in %d byte chunks, %d at a time",
+            tarball,
+            self.chunk_size,
+            self.concurrency,
+        )
+        with requests.Session() as session:
+            return ChunkedUpload(
+                session,
                 tar_uri,
-                data=f,
                 headers=self.headers,
                 params=self.params,
+                chunk_size=self.chunk_size,
+                concurrency=self.concurrency,
                 verify=self.ca,
-            )
+            ).upload(tarball, tarball_md5)
 
 
 class CopyResultToRelay(CopyResult):
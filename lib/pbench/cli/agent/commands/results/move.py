@@ -182,6 +182,23 @@ class MoveResults(BaseCommand):
 @click.command(name="pbench-results-move")
 @common_options
 @results_common_options
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=0),
+    help=(
+        "Upload tarballs larger than this many MB as resumable chunks, or 0 to"
+        " upload in a single request (default from the 'upload_chunk_size'"
+        " configuration value)"
+    ),
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    help=(
+        "Number of chunks to upload in parallel (default from the"
+        " 'upload_concurrency' configuration value)"
+    ),
+)
 @click.option(
     "--controller",
     required=False,
@@ -205,6 +222,8 @@ class MoveResults(BaseCommand):
 def main(
     context: CliContext,
     brief: bool,
+    chunk_size: int,
+    concurrency: int,
     controller: str,
     access: str,
     token: str,
@@ -241,6 +260,8 @@ def main(
         clk_ctx.exit(1)
 
     context.brief = brief
+    context.chunk_size = chunk_size
+    context.concurrency = concurrency
     context.controller = controller
     context.access = access
     context.token = token
@@ -394,6 +394,39 @@ def report_states():
                     )
 
 
+def report_checkpoints():
+    """Report the progress of incomplete tool data indexing operations."""
+
+    watcher.update("inspecting indexing checkpoints")
+    checkpoint_key = Metadata.SERVER_INDEX_CHECKPOINT.split(".", 1)[1]
+    datasets = 0
+    sources = 0
+    operations = defaultdict(int)
+    query = select(Metadata).where(Metadata.key == Metadata.SERVER)
+    for metadata in Database.db_session.execute(query).scalars():
+        value = metadata.value
+        checkpoint = value.get(checkpoint_key) if isinstance(value, dict) else None
+        if not checkpoint:
+            continue
+        name = metadata.dataset.name
+        watcher.update(f"inspecting {name} checkpoint")
+        completed = checkpoint.get("sources", [])
+        datasets += 1
+        sources += len(completed)
+        operations[checkpoint.get("operation")] += 1
+        detailer.message(
+            f"{name} {checkpoint.get('operation')}: {len(completed):,d} "
+            "tool data sources indexed"
+        )
+    click.echo("Indexing checkpoints:")
+    click.echo(
+        f"  {datasets:,d} datasets have incomplete indexing, with "
+        f"{sources:,d} tool data sources indexed"
+    )
+    for operation, count in operations.items():
+        click.echo(f"    {operation:>8s} {count:>8,d}")
+
+
 @click.command(name="pbench-report-generator")
 @pass_cli_context
 @click.option("--all", "-a", default=False, is_flag=True, help="Display full report")
@@ -406,6 +439,13 @@ def report_states():
 @click.option(
     "--cache", "-c", default=False, is_flag=True, help="Display cache statistics"
 )
+@click.option(
+    "--checkpoints",
+    "-C",
+    default=False,
+    is_flag=True,
+    help="Display incomplete indexing checkpoints",
+)
 @click.option(
     "--detail",
     "-d",
@@ -437,6 +477,7 @@ def report(
     archive: bool,
     backup: bool,
     cache: bool,
+    checkpoints: bool,
     detail: bool,
     errors: bool,
     progress: float,
@@ -455,6 +496,7 @@ def report(
         archive: report archive statistics
         backup: report backup statistics
         cache: report cache statistics
+        checkpoints: report incomplete indexing checkpoints
         detail: provide additional per-file diagnostics
         errors: show individual file errors
         sql: report SQL statistics
@@ -488,6 +530,8 @@ def report(
             report_sql()
         if all or states:
             report_states()
+        if all or checkpoints:
+            report_checkpoints()
         watcher.update("done")
 
         rv = 0
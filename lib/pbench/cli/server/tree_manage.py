@@ -9,6 +9,7 @@ from pbench.cli.server.options import common_options
 from pbench.common.logger import get_pbench_logger
 from pbench.server import BadConfig
 from pbench.server.cache_manager import CacheManager
+from pbench.server.cache_policy import POLICIES
 
 
 def print_tree(tree: CacheManager):
@@ -39,6 +40,32 @@ def print_tree(tree: CacheManager):
             print(f"    Tarball {tarball.name}")
 
 
+def print_statistics(tree: CacheManager):
+    """Print the cache counters
+
+    Args:
+        tree: a cache instance
+    """
+    stats = tree.cache_statistics()
+    print(
+        f"Cache policy {stats['policy']}, watermarks {stats['high_watermark']}%"
+        f" / {stats['low_watermark']}%: {stats['used_pct']}% used"
+    )
+    print(
+        f"  {stats['cached']} of {stats['datasets']} datasets cached"
+        f" ({humanfriendly.format_size(stats['cached_bytes'])})"
+    )
+    print(
+        f"  {stats['hits']} hits, {stats['misses']} misses"
+        f" (hit ratio {stats['hit_ratio']:.1%})"
+    )
+    print(
+        f"  {stats['evictions']} evictions"
+        f" ({humanfriendly.format_size(stats['reclaimed_bytes'])})"
+        f" in {stats['reclaim_runs']} reclaims"
+    )
+
+
 @click.command(name="pbench-tree-manager")
 @pass_cli_context
 @click.option(
@@ -57,9 +84,32 @@ def print_tree(tree: CacheManager):
     is_flag=False,
     help="Reclaim cached data to maintain specified free space",
 )
+@click.option(
+    "--reclaim-watermark",
+    default=False,
+    is_flag=True,
+    help="Reclaim cached data to the low watermark if above the high watermark",
+)
+@click.option(
+    "--policy",
+    type=click.Choice(sorted(POLICIES), case_sensitive=False),
+    help="Override the configured cache eviction policy",
+)
+@click.option(
+    "--statistics",
+    default=False,
+    is_flag=True,
+    help="Display the cache hit, miss, and eviction counters",
+)
 @common_options
 def tree_manage(
-    context: object, display: bool, reclaim_percent: float, reclaim_size: str
+    context: object,
+    display: bool,
+    reclaim_percent: float,
+    reclaim_size: str,
+    reclaim_watermark: bool,
+    policy: str,
+    statistics: bool,
 ):
     """
     Discover, display, and manipulate the on-disk representation of controllers
@@ -76,21 +126,31 @@ def tree_manage(
         lifetime: Number of hours to retain unused cache before reclaim
         reclaim-percent: Reclaim cached data to free specified % on drive
         reclaim-size: Reclame cached data to free specified size on drive
+        reclaim-watermark: Reclaim cached data from the configured high
+            watermark to the low watermark
+        policy: Cache eviction policy for reclaim
+        statistics: Print the cache counters
     """
     logger = None
     try:
         config = config_setup(context)
         logger = get_pbench_logger("cachemanager", config)
         cache_m = CacheManager(config, logger)
+        if policy:
+            cache_m.reclaim_policy = policy
         cache_m.full_discovery()
+        rv = 0
         if display:
             print_tree(cache_m)
-            rv = 0
         if reclaim_percent or reclaim_size:
             target_size = humanfriendly.parse_size(reclaim_size) if reclaim_size else 0
             target_pct = reclaim_percent if reclaim_percent else 20.0
             outcome = cache_m.reclaim_cache(goal_pct=target_pct, goal_bytes=target_size)
             rv = 0 if outcome else 1
+        if reclaim_watermark:
+            rv = 0 if cache_m.reclaim_watermark(wait=False) else 1
+        if statistics:
+            print_statistics(cache_m)
     except Exception as exc:
         if logger:
             logger.exception("An error occurred discovering the file tree: {}", exc)
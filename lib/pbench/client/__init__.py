@@ -8,6 +8,7 @@ from requests.structures import CaseInsensitiveDict
 
 from pbench.client.oidc_admin import OIDCAdmin
 from pbench.client.types import Dataset, JSONOBJECT
+from pbench.common.upload import ChunkedUpload
 
 
 class PbenchClientError(Exception):
@@ -55,6 +56,7 @@ class API(Enum):
     SERVER_AUDIT = "server_audit"
     SERVER_SETTINGS = "server_settings"
     UPLOAD = "upload"
+    UPLOAD_SESSION = "upload_session"
 
 
 class PbenchServerClient:
@@ -375,13 +377,16 @@ class PbenchServerClient:
                 md5: override companion MD5 value
                 controller: override metadata.log controller
                 filename: override the actual filename to provoke an error
+                chunk_size: upload in resumable chunks of this many bytes
+                concurrency: the number of chunks to upload in parallel
 
         Raises:
             FileNotFound: The file or the companion MD5 file is missing
             HttpError: An HTTP or PUT API error occurs
 
         Returns:
-            The PUT response object
+            The PUT response object, or the response of the last request of a
+            chunked upload
         """
         query_parameters = {}
 
@@ -392,6 +397,17 @@ class PbenchServerClient:
         if "metadata" in kwargs:
             query_parameters["metadata"] = kwargs.get("metadata")
 
+        filename = kwargs.get("filename", tarball.name)
+        if kwargs.get("chunk_size"):
+            return ChunkedUpload(
+                self.session,
+                self._uri(API.UPLOAD, {"filename": filename}),
+                headers=self._headers({"content-type": "application/octet-stream"}),
+                params=query_parameters,
+                chunk_size=kwargs["chunk_size"],
+                concurrency=kwargs.get("concurrency", 4),
+            ).upload(tarball, md5)
+
         headers = {
             "Content-MD5": md5,
             "content-type": "application/octet-stream",
@@ -400,7 +416,7 @@ class PbenchServerClient:
         with tarball.open("rb") as f:
             return self.put(
                 api=API.UPLOAD,
-                uri_params={"filename": kwargs.get("filename", tarball.name)},
+                uri_params={"filename": filename},
                 headers=headers,
                 params=query_parameters,
                 data=f,
@@ -436,6 +452,11 @@ class PbenchServerClient:
         specified) at the specified offset in the list of matches. (As if a
         direct call to the raw GET API had been made.)
 
+        When the server supports it (by returning a "next_cursor" with a page)
+        we ask for each following page with the cursor rather than following
+        the offset-based "next_url", which allows the server to find the next
+        page without skipping all the previous matches or counting them again.
+
         Args:
             kwargs: query criteria
                 metadata: list of requested metadata paths
@@ -463,7 +484,13 @@ class PbenchServerClient:
             next_url = json.get("next_url")
             if "offset" in args or not next_url:
                 break
-            json = self.get(uri=next_url).json()
+            cursor = json.get("next_cursor")
+            if cursor:
+                json = self.get(
+                    api=API.DATASETS_LIST, params={**args, "cursor": cursor}
+                ).json()
+            else:
+                json = self.get(uri=next_url).json()
 
     def get_metadata(self, dataset_id: str, metadata: list[str]) -> JSONOBJECT:
         """Return requested metadata for a specified dataset.
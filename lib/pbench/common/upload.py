@@ -0,0 +1,213 @@
+"""Resumable, chunked upload of a tarball to a Pbench Server.
+
+The client initiates an upload session with a POST to the tarball's upload
+URI, sends the missing byte ranges of the tarball as chunks with PUTs to the
+session URI (in parallel, with `concurrency` requests in flight), and then
+finalizes the session with a POST, which creates the dataset.
+
+A chunk which fails (including a dropped connection) doesn't abort the upload:
+once all chunks have been tried, we ask the server which byte ranges are still
+missing and send those again, up to `retries` times.
+
+A server which predates resumable uploads rejects the POST (with 404 or 405),
+and we fall back to sending the whole tarball with a single PUT.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import requests
+
+MB_BYTES = 1024 * 1024
+
+
+class ChunkedUploadError(Exception):
+    """Raised when chunks of a tarball can't be sent after retrying"""
+
+    def __init__(self, tarball: Path, missing: list[list[int]]):
+        self.tarball = tarball
+        self.missing = missing
+
+    def __str__(self) -> str:
+        return f"Unable to upload byte ranges {self.missing} of {self.tarball.name}"
+
+
+class FileSlice:
+    """A read-only file-like view of a byte range of a file.
+
+    This has a length, so that `requests` can set the "Content-Length" of the
+    chunk, and streams the chunk rather than reading it all into memory.
+    """
+
+    def __init__(self, path: Path, start: int, length: int):
+        self.file = path.open("rb")
+        self.file.seek(start)
+        self.length = length
+        self.remaining = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class ChunkedUpload:
+    """Upload a tarball to a Pbench Server in resumable chunks."""
+
+    def __init__(
+        self,
+        session: requests.Session,
+        uri: str,
+        *,
+        headers: Optional[dict[str, str]] = None,
+        params: Optional[dict[str, Any]] = None,
+        chunk_size: int = 64 * MB_BYTES,
+        concurrency: int = 4,
+        retries: int = 3,
+        verify: Union[bool, str, None] = None,
+    ):
+        """Configure a chunked upload
+
+        Args:
+            session: the requests session to use
+            uri: the upload URI for the tarball, /api/v1/upload/<file>
+            headers: HTTP headers (e.g., authorization) for each request
+            params: the "access" and "metadata" query parameters
+            chunk_size: the maximum size of each chunk, in bytes
+            concurrency: the number of chunks to send in parallel
+            retries: the number of times to resend missing byte ranges
+            verify: the requests "verify" option
+        """
+        self.session = session
+        self.uri = uri
+        self.headers = headers if headers else {}
+        self.params = params if params else {}
+        self.chunk_size = chunk_size
+        self.concurrency = max(concurrency, 1)
+        self.retries = retries
+        self.verify = verify
+
+    def chunks(self, missing: list[list[int]]) -> list[tuple[int, int]]:
+        """Split missing byte ranges into chunks
+
+        Args:
+            missing: a list of [start, end) byte ranges
+
+        Returns:
+            a list of (start, length) chunks no larger than the chunk size
+        """
+        chunks = []
+        for start, end in missing:
+            for offset in range(start, end, self.chunk_size):
+                chunks.append((offset, min(self.chunk_size, end - offset)))
+        return chunks
+
+    def _send(self, tarball: Path, uri: str, total: int, chunk: tuple[int, int]):
+        """Send one chunk of the tarball
+
+        Args:
+            tarball: the tarball file
+            uri: the session URI
+            total: the length of the tarball
+            chunk: the (start, length) of the chunk
+
+        Returns:
+            True if the server accepted the chunk
+        """
+        start, length = chunk
+        data = FileSlice(tarball, start, length)
+        try:
+            response = self.session.put(
+                uri,
+                data=data,
+                headers={
+                    **self.headers,
+                    "Content-Range": f"bytes {start}-{start + length - 1}/{total}",
+                },
+                verify=self.verify,
+            )
+            return response.ok
+        except requests.exceptions.RequestException:
+            return False
+        finally:
+            data.close()
+
+    def put(self, tarball: Path, md5: str) -> requests.Response:
+        """Upload the whole tarball in a single request
+
+        Args:
+            tarball: the tarball file
+            md5: the MD5 of the tarball
+
+        Returns:
+            The response to the PUT request
+        """
+        with tarball.open("rb") as f:
+            return self.session.put(
+                self.uri,
+                data=f,
+                headers={**self.headers, "Content-MD5": md5},
+                params=self.params,
+                verify=self.verify,
+            )
+
+    def upload(self, tarball: Path, md5: str) -> requests.Response:
+        """Upload the tarball
+
+        If the server doesn't support resumable uploads, the tarball is sent
+        with a single PUT.
+
+        Args:
+            tarball: the tarball file
+            md5: the MD5 of the tarball
+
+        Raises:
+            ChunkedUploadError: chunks can't be sent after retrying
+
+        Returns:
+            The response to the finalize request (or the single PUT), or to
+            the first request which fails
+        """
+        length = tarball.stat().st_size
+        headers = {**self.headers, "Content-MD5": md5}
+        response = self.session.post(
+            self.uri,
+            params={**self.params, "length": length},
+            headers=headers,
+            verify=self.verify,
+        )
+        if response.status_code in (
+            HTTPStatus.NOT_FOUND,
+            HTTPStatus.METHOD_NOT_ALLOWED,
+        ):
+            return self.put(tarball, md5)
+        if not response.ok or "missing" not in response.json():
+            # Either an error, or the dataset already exists
+            return response
+        missing = response.json()["missing"]
+        uri = f"{self.uri}/{md5}"
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for _ in range(self.retries + 1):
+                chunks = self.chunks(missing)
+                list(pool.map(lambda c: self._send(tarball, uri, length, c), chunks))
+                response = self.session.get(uri, headers=headers, verify=self.verify)
+                if not response.ok:
+                    return response
+                missing = response.json()["missing"]
+                if not missing:
+                    break
+            else:
+                raise ChunkedUploadError(tarball, missing)
+
+        return self.session.post(uri, headers=headers, verify=self.verify)
@@ -7,7 +7,7 @@ or any number of pbench agent users.
 from http import HTTPStatus
 import os
 
-from flask import Flask
+from flask import Flask, request, Response
 from flask_cors import CORS
 from flask_restful import Api
 import werkzeug
@@ -24,6 +24,7 @@ from pbench.server.api.resources.datasets_metadata import DatasetsMetadata
 from pbench.server.api.resources.datasets_visualize import DatasetsVisualize
 from pbench.server.api.resources.endpoint_configure import EndpointConfig
 from pbench.server.api.resources.query_apis.datasets.datasets import Datasets
+from pbench.server.api.resources.query_apis.datasets.datasets_bulk import DatasetsBulk
 from pbench.server.api.resources.query_apis.datasets.datasets_detail import (
     DatasetsDetail,
 )
@@ -38,7 +39,7 @@ from pbench.server.api.resources.query_apis.datasets_search import DatasetsSearc
 from pbench.server.api.resources.relay import Relay
 from pbench.server.api.resources.server_audit import ServerAudit
 from pbench.server.api.resources.server_settings import ServerSettings
-from pbench.server.api.resources.upload import Upload
+from pbench.server.api.resources.upload import ResumableUpload, Upload
 import pbench.server.auth.auth as Auth
 from pbench.server.database import init_db
 from pbench.server.database.database import Database
@@ -64,6 +65,13 @@ def register_endpoints(api: Api, app: Flask, config: PbenchServerConfig):
         endpoint="datasets",
         resource_class_args=(config,),
     )
+    api.add_resource(
+        DatasetsBulk,
+        f"{base_uri}/datasets/bulk",
+        f"{base_uri}/datasets/bulk/<string:job>",
+        endpoint="datasets_bulk",
+        resource_class_args=(config,),
+    )
     api.add_resource(
         DatasetsCompare,
         f"{base_uri}/compare",
@@ -173,6 +181,12 @@ def register_endpoints(api: Api, app: Flask, config: PbenchServerConfig):
         endpoint="upload",
         resource_class_args=(config,),
     )
+    api.add_resource(
+        ResumableUpload,
+        f"{base_uri}/upload/<string:filename>/<string:resource_id>",
+        endpoint="upload_session",
+        resource_class_args=(config,),
+    )
 
 
 def get_server_config() -> PbenchServerConfig:
@@ -211,6 +225,19 @@ def create_app(server_config: PbenchServerConfig) -> Flask:
         """Called from app context teardown hook to end the database session"""
         Database.db_session.remove()
 
+    def reset_statement_count():
+        """Called before each request to reset the SQL statement count"""
+        Database.reset_statement_count()
+
+    def report_statement_count(response: Response) -> Response:
+        """Called after each request to report the SQL statement count"""
+        count = Database.statement_count()
+        response.headers["X-Pbench-SQL-Statements"] = str(count)
+        app.logger.debug(
+            "{} {} executed {} SQL statements", request.method, request.path, count
+        )
+        return response
+
     app = Flask(__name__.split(".")[0])
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
@@ -231,6 +258,8 @@ def create_app(server_config: PbenchServerConfig) -> Flask:
         raise
 
     app.teardown_appcontext(shutdown_session)
+    app.before_request(reset_statement_count)
+    app.after_request(report_statement_count)
 
     class InsufficientStorage(werkzeug.exceptions.HTTPException):
         code = HTTPStatus.INSUFFICIENT_STORAGE.value
@@ -1809,6 +1809,35 @@ class ApiBase(Resource):
 
         return metadata
 
+    @staticmethod
+    def _get_datasets_metadata(
+        datasets: list[Dataset], requested_items: list[str]
+    ) -> dict[int, JSON]:
+        """Get requested metadata for a list of Datasets
+
+        This produces the same result as calling `_get_dataset_metadata` for
+        each dataset, but with a constant number of SQL queries rather than
+        one or more for each key of each dataset.
+
+        Args:
+            datasets : List of Dataset objects
+            requested_items : List of metadata key names
+
+        Raises:
+            MetadataError : SQL error in retrieval
+
+        Returns:
+            A dict associating each dataset ID with a JSON object (Python dict)
+            containing a key-value pair for each requested metadata key.
+        """
+        if not requested_items:
+            return {d.id: {} for d in datasets}
+
+        user: Optional[User] = None
+        if any(Metadata.get_native_key(i) == Metadata.USER for i in requested_items):
+            user = Auth.token_auth.current_user()
+        return Metadata.getvalues(datasets, requested_items, user)
+
     @staticmethod
     def _set_dataset_metadata(
         dataset: Dataset, metadata: dict[str, JSONVALUE]
@@ -5,7 +5,7 @@ from flask import current_app, jsonify
 from flask.wrappers import Response
 from pquisby.lib.post_processing import BenchmarkName, InputType, QuisbyProcessing
 
-from pbench.server import OperationCode, PbenchServerConfig
+from pbench.server import JSONOBJECT, OperationCode, PbenchServerConfig
 from pbench.server.api.resources import (
     APIAbort,
     ApiAuthorization,
@@ -21,42 +21,16 @@ from pbench.server.api.resources import (
     Schema,
 )
 from pbench.server.cache_manager import CacheManager, CacheManagerError
-from pbench.server.database.models.datasets import Dataset, Metadata
+from pbench.server.quisby_cache import QuisbyCache
+from pbench.server.utils import get_benchmark_name
 
 
 class DatasetsCompare(ApiBase):
     """
     This class implements the Server API used to retrieve comparison data for visualization.
-    """
-
-    @staticmethod
-    def get_benchmark_name(dataset: Dataset) -> str:
-        """Convenience function to get dataset's benchmark
-
-        The Pbench Server intake constructs a server.benchmark metadata key to
-        represent the benchmark type. This helper implements a fallback for
-        datasets processed prior to the implementation of server.benchmark to
-        avoid null values, by using the Pbench Agent metadata.log "script"
-        value if that exists and then a constant fallback value.
 
-        TODO: This is a workaround from the transition to server.benchmark in
-        order to cleanly support earlier datasets on the staging server. This
-        can be removed at some point, but it's not critical.
-
-        Args:
-            dataset: Dataset object
-
-        Returns:
-            A lowercase benchmark identifer string, including the value defined
-            by Metadata.SERVER_BENCHMARK_UNKNOWN if we can't find a value.
-        """
-        benchmark = Metadata.getvalue(dataset, Metadata.SERVER_BENCHMARK)
-
-        if not benchmark:
-            benchmark = Metadata.getvalue(dataset, "dataset.metalog.pbench.script")
-            if not benchmark:
-                benchmark = Metadata.SERVER_BENCHMARK_UNKNOWN
-        return benchmark
+    Comparison results are saved in a persistent QuisbyCache.
+    """
 
     def __init__(self, config: PbenchServerConfig):
         super().__init__(
@@ -110,7 +84,7 @@ class DatasetsCompare(ApiBase):
             )
 
             # Determine the dataset benchmark and check consistency
-            benchmark = DatasetsCompare.get_benchmark_name(dataset)
+            benchmark = get_benchmark_name(dataset)
             if not benchmark_choice:
                 benchmark_choice = benchmark
             elif benchmark != benchmark_choice:
@@ -125,28 +99,37 @@ class DatasetsCompare(ApiBase):
                 HTTPStatus.BAD_REQUEST, f"Unsupported Benchmark: {benchmark}"
             )
 
-        cache_m = CacheManager(self.config, current_app.logger)
-        stream_file = {}
-        for dataset in datasets:
+        def compare() -> JSONOBJECT:
+            cache_m = CacheManager.shared(self.config, current_app.logger)
+            stream_file = {}
+            for dataset in datasets:
+                try:
+                    file = cache_m.get_inventory_bytes(
+                        dataset.resource_id, "result.csv"
+                    )
+                except CacheManagerError as e:
+                    raise APIAbort(
+                        HTTPStatus.BAD_REQUEST,
+                        "unable to extract postprocessed data from {dataset.name}",
+                    ) from e
+                except Exception as e:
+                    raise APIInternalError(
+                        f"Unexpected error extracting postprocessed data from {dataset.name}"
+                    ) from e
+                stream_file[dataset.name] = file
+
             try:
-                file = cache_m.get_inventory_bytes(dataset.resource_id, "result.csv")
-            except CacheManagerError as e:
-                raise APIAbort(
-                    HTTPStatus.BAD_REQUEST,
-                    "unable to extract postprocessed data from {dataset.name}",
-                ) from e
+                return QuisbyProcessing().compare_csv_to_json(
+                    benchmark_type, InputType.STREAM, stream_file
+                )
             except Exception as e:
-                raise APIInternalError(
-                    f"Unexpected error extracting postprocessed data from {dataset.name}"
-                ) from e
-            stream_file[dataset.name] = file
-
-        try:
-            quisby_response = QuisbyProcessing().compare_csv_to_json(
-                benchmark_type, InputType.STREAM, stream_file
-            )
-        except Exception as e:
-            raise APIInternalError(f"Comparison failed with {str(e)!r}")
+                raise APIInternalError(f"Comparison failed with {str(e)!r}")
+
+        # Results are immutable for a set of datasets, so a repeated
+        # comparison doesn't need to extract or process anything.
+        quisby_response = QuisbyCache(self.config, current_app.logger).lookup(
+            "compare", benchmark, datasets, compare
+        )
 
         if quisby_response["status"] != "success":
             raise APIInternalError(
@@ -67,7 +67,7 @@ class DatasetsContents(ApiBase):
         target = params.uri.get("target")
         path = Path("." if target in ("/", None) else target)
 
-        cache_m = CacheManager(self.config, current_app.logger)
+        cache_m = CacheManager.shared(self.config, current_app.logger)
         try:
             info = cache_m.find_entry(dataset.resource_id, path)
         except (BadDirpath, CacheExtractBadPath, TarballNotFound) as e:
@@ -1,14 +1,37 @@
+import base64
+from collections import OrderedDict
+import datetime
 from http import HTTPStatus
-from typing import Any
+import json
+import threading
+import time
+from typing import Any, Optional
 from urllib.parse import urlencode, urlparse
 
 from flask import current_app
 from flask.json import jsonify
 from flask.wrappers import Request, Response
-from sqlalchemy import and_, asc, BigInteger, Boolean, cast, desc, func, or_, String
+from sqlalchemy import (
+    and_,
+    asc,
+    BigInteger,
+    Boolean,
+    cast,
+    desc,
+    false,
+    func,
+    literal,
+    or_,
+    select,
+    String,
+    true,
+    type_coerce,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import ProgrammingError, StatementError
 from sqlalchemy.orm import aliased, Query
 from sqlalchemy.sql.expression import Alias, BinaryExpression, ColumnElement
+from sqlalchemy.types import NullType
 
 from pbench.server import JSON, JSONOBJECT, OperationCode, PbenchServerConfig
 from pbench.server.api.resources import (
@@ -85,10 +108,85 @@ def urlencode_json(json: JSON) -> str:
     """We must properly encode the metadata query parameter as a list of keys."""
     new_json = {}
     for k, v in sorted(json.items()):
-        new_json[k] = ",".join(v) if k in ("metadata", "filter") else v
+        new_json[k] = ",".join(v) if k in ("metadata", "filter", "sort") else v
     return urlencode(new_json)
 
 
+"""The query parameters which determine the selection of datasets"""
+SELECTION_PARAMS = ("access", "end", "filter", "mine", "name", "owner", "start")
+
+
+class KeyspaceCache:
+    """A cache of metadata keyspace summaries for dataset selections.
+
+    Summarizing the keyspace requires a walk through the metadata of all the
+    selected datasets, which we'd rather not repeat each time the dashboard
+    asks. A cached summary is valid until Dataset or Metadata rows change
+    (see Metadata.generation). As this doesn't notice changes made by other
+    server processes, each summary also has a limited lifetime.
+    """
+
+    # The maximum number of cached selections
+    SIZE = 64
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, tuple[int, float, JSONOBJECT]] = OrderedDict()
+
+    @staticmethod
+    def key(auth_id: Optional[str], params: JSONOBJECT) -> str:
+        """Identify a dataset selection
+
+        Args:
+            auth_id: The authenticated user ID, or None
+            params: The API query parameters
+
+        Returns:
+            A cache key for the selection
+        """
+        selection = {k: params[k] for k in SELECTION_PARAMS if k in params}
+        return json.dumps([auth_id, selection], sort_keys=True, default=str)
+
+    def get(self, key: str) -> Optional[JSONOBJECT]:
+        """Find a cached keyspace summary
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached summary, or None if there's no valid summary
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+            generation, expiration, summary = entry
+            if generation != Metadata.generation or expiration < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return summary
+
+    def put(self, key: str, generation: int, summary: JSONOBJECT, lifetime: int):
+        """Cache a keyspace summary
+
+        Args:
+            key: The cache key
+            generation: The Metadata generation when we computed the summary
+            summary: The keyspace summary
+            lifetime: The lifetime of the cached summary in seconds
+        """
+        with self.lock:
+            self.entries[key] = (generation, time.time() + lifetime, summary)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.SIZE:
+                self.entries.popitem(last=False)
+
+
+"""The cache of keyspace summaries shared by all DatasetsList requests"""
+KEYSPACE_CACHE = KeyspaceCache()
+
+
 class DatasetsList(ApiBase):
     """API class to list datasets based on database metadata."""
 
@@ -115,6 +213,8 @@ class DatasetsList(ApiBase):
                     # Pagination
                     Parameter("offset", ParamType.INT),
                     Parameter("limit", ParamType.INT),
+                    Parameter("cursor", ParamType.STRING),
+                    Parameter("total", ParamType.BOOLEAN),
                     # Output control
                     Parameter("daterange", ParamType.BOOLEAN),
                     Parameter("keysummary", ParamType.BOOLEAN),
@@ -137,13 +237,112 @@ class DatasetsList(ApiBase):
                 authorization=ApiAuthorizationType.USER_ACCESS,
             ),
         )
+        self.keysummary_lifetime = config.getint(
+            "pbench-server", "keysummary-cache-lifetime", fallback=60
+        )
+
+    @staticmethod
+    def encode_cursor(sort: list[str], values: list[Any]) -> str:
+        """Construct an opaque cursor identifying a position in the list
+
+        Args:
+            sort: The list of sort terms
+            values: The sort values of the last dataset on the page
+
+        Returns:
+            A URL-safe cursor string
+        """
+        encoded = []
+        for v in values:
+            if isinstance(v, datetime.datetime):
+                v = {"datetime": v.isoformat()}
+            encoded.append(v)
+        data = json.dumps({"sort": sort, "values": encoded}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort: list[str], count: int) -> list[Any]:
+        """Decode the sort values from a cursor
+
+        Args:
+            cursor: A cursor constructed by `encode_cursor`
+            sort: The list of sort terms
+            count: The number of sort values
+
+        Raises:
+            APIAbort(BAD_REQUEST) if the cursor is invalid, or doesn't match
+                the sort terms of the query
+
+        Returns:
+            The sort values of the last dataset on the previous page
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values = []
+            for v in data["values"]:
+                if isinstance(v, dict):
+                    v = datetime.datetime.fromisoformat(v["datetime"])
+                values.append(v)
+            valid = data["sort"] == sort and len(values) == count
+        except (ValueError, TypeError, KeyError):
+            valid = False
+        if not valid:
+            raise APIAbort(HTTPStatus.BAD_REQUEST, f"Invalid cursor {cursor!r}")
+        return values
+
+    @staticmethod
+    def after_cursor(
+        keyset: list[tuple[ColumnElement, bool]], values: list[Any]
+    ) -> ColumnElement:
+        """Construct a filter selecting datasets after a cursor position
+
+        For sort columns (a, b, c) in ascending order this is
+
+            a > A or (a = A and (b > B or (b = B and c > C)))
+
+        where descending columns use "<" instead, and NULL values sort after
+        all other values (as if they were larger, which is PostgreSQL's
+        default ordering).
+
+        Args:
+            keyset: The sort columns, each with a flag indicating whether the
+                sort is ascending
+            values: The sort values of the last dataset on the previous page
+
+        Returns:
+            A SQLAlchemy filter expression
+        """
+        expression = None
+        for (sorter, ascending), raw in reversed(list(zip(keyset, values))):
+            # Compare the raw values, as we selected them, without conversion
+            column = type_coerce(sorter, NullType)
+            value = literal(raw, NullType)
+            if raw is None:
+                after = false() if ascending else column.is_not(None)
+                same = column.is_(None)
+            else:
+                after = (
+                    or_(column > value, column.is_(None))
+                    if ascending
+                    else column < value
+                )
+                same = column == value
+            expression = (
+                after if expression is None else or_(after, and_(same, expression))
+            )
+        return expression
 
     def get_paginated_obj(
-        self, query: Query, json: JSON, raw_params: ApiParams, url: str
+        self,
+        query: Query,
+        json: JSON,
+        raw_params: ApiParams,
+        url: str,
+        keyset: list[tuple[ColumnElement, bool]],
     ) -> tuple[list[JSONOBJECT], dict[str, str]]:
         """Helper function to return a slice of datasets (constructed according
-        to the user specified limit and an offset number) and a paginated object
-        containing next page url and total items count.
+        to the user specified limit and an offset number or cursor) and a
+        paginated object containing next page url and total items count.
 
         E.g. specifying the following limit and offset values will result in the
         corresponding dataset slice:
@@ -152,11 +351,22 @@ class DatasetsList(ApiBase):
             "limit": 10 -> dataset[0: 10]
             "offset": 20 -> dataset[20: total_items_count]
 
+        An offset requires the database to find and skip all the preceding
+        datasets, and the total count requires finding all the datasets, for
+        each page. Instead, the "next_cursor" value of a page can be given as
+        the "cursor" parameter of the next query to select only the datasets
+        which sort after the last dataset of the previous page. The "next_url"
+        of a cursor query specifies the next cursor rather than an offset, and
+        the total count of selected datasets is reported only if the "total"
+        parameter is specified.
+
         Args:
             query: A SQLAlchemy query object
             json: The query parameters in normalized JSON form
             raw_params: The original API parameters for reference
             url: The API URL
+            keyset: The sort columns of the query, each with a flag indicating
+                whether the sort is ascending
 
         Returns:
             The list of Dataset objects matched by the query and a pagination
@@ -164,14 +374,22 @@ class DatasetsList(ApiBase):
         """
         paginated_result = {}
         query = query.distinct()
+        sort = json.get("sort", ["dataset.resource_id"])
+        cursor = json.get("cursor")
+        if cursor is not None and "offset" in json:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST, "'offset' and 'cursor' cannot be used together"
+            )
 
         Database.dump_query(query, current_app.logger)
 
         # This is the first actual query: so if we've constructed a query that
         # the DB engine can't handle, we'll fail here. Try to report as much
         # detail as possible in the log.
+        total_count = None
         try:
-            total_count = query.count()
+            if cursor is None or json.get("total"):
+                total_count = query.count()
         except Exception as e:
             try:
                 q = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
@@ -180,36 +398,82 @@ class DatasetsList(ApiBase):
                 msg = f"Unable to compile query for {json} -> {str(uhoh)!r} after {str(e)!r}"
             raise APIInternalError(msg)
 
-        # Shift the query search by user specified offset value,
-        # otherwise return the batch of results starting from the
-        # first queried item.
+        # Shift the query search by user specified offset value, or select the
+        # datasets after the cursor; otherwise return the batch of results
+        # starting from the first queried item.
         offset = json.get("offset", 0)
         if offset:
             query = query.offset(offset)
+        elif cursor:
+            values = self.decode_cursor(cursor, sort, len(keyset))
+            query = query.filter(self.after_cursor(keyset, values))
 
-        # Get the user specified limit, otherwise return all the items
+        # Get the user specified limit, otherwise return all the items. We ask
+        # for one more than the limit to find out whether there's another
+        # page without needing the total count.
         limit = json.get("limit")
         if limit:
-            query = query.limit(limit)
+            query = query.limit(limit + 1)
 
         items = query.all()
+        more = bool(limit) and len(items) > limit
+        if more:
+            items = items[:limit]
         raw = raw_params.query.copy()
         next_offset = offset + len(items)
-        if next_offset < total_count:
-            json["offset"] = str(next_offset)
-            raw["offset"] = str(next_offset)
+        if more:
+            # The sort values are the last columns of each result row
+            next_cursor = self.encode_cursor(sort, list(items[-1][-len(keyset) :]))
+            paginated_result["next_cursor"] = next_cursor
+            if cursor is None:
+                json["offset"] = str(next_offset)
+                raw["offset"] = str(next_offset)
+            else:
+                json["cursor"] = next_cursor
             parsed_url = urlparse(url)
             next_url = parsed_url._replace(query=urlencode_json(json)).geturl()
         else:
-            if limit:
+            if limit and cursor is None:
                 raw["offset"] = str(total_count)
             next_url = ""
 
         paginated_result["parameters"] = raw
         paginated_result["next_url"] = next_url
-        paginated_result["total"] = total_count
+        if total_count is not None:
+            paginated_result["total"] = total_count
         return items, paginated_result
 
+    @staticmethod
+    def metadata_query(
+        query: Query, auth_id: Optional[str]
+    ) -> tuple[Query, dict[str, Alias]]:
+        """Join a Dataset query with the Metadata namespaces and the owner,
+        so that it can be filtered by filter_query.
+
+        Args:
+            query: a SQLAlchemy Query selecting Datasets
+            auth_id: the authenticated user ID, if any, which selects the
+                "user" namespace
+
+        Returns:
+            The joined query, and the Metadata table alias for each namespace
+        """
+        aliases = {
+            Metadata.METALOG: aliased(Metadata),
+            Metadata.SERVER: aliased(Metadata),
+            Metadata.GLOBAL: aliased(Metadata),
+            Metadata.USER: aliased(Metadata),
+        }
+        for key, table in aliases.items():
+            terms = [table.dataset_ref == Dataset.id, table.key == key]
+            if key == Metadata.USER:
+                if not auth_id:
+                    continue
+                terms.append(table.user_ref == auth_id)
+            query = query.outerjoin(table, and_(*terms))
+        query = query.outerjoin(User, User.id == Dataset.owner_id)
+        return query, aliases
+
     @staticmethod
     def filter_query(
         filters: list[str], aliases: dict[str, Alias], query: Query
@@ -391,40 +655,84 @@ class DatasetsList(ApiBase):
 
         return query.filter(and_(*and_list))
 
-    def accumulate(self, aggregate: JSONOBJECT, key: str, value: Any):
-        """Recursive helper to accumulate the metadata namespace
+    @staticmethod
+    def keypaths(query: Query) -> list[tuple[list[str], bool]]:
+        """Find the distinct metadata key paths of the selected datasets
 
-        Iterate through a list of metadata key/value pairs to construct a
-        hierarchical aggregation of all metadata keys across the selected
-        datasets. Each key in the hierarchy is represented as a key in a
-        nested JSON object. "Leaf" keys have the value None. E.g.,
+        A recursive SQL query walks the JSON value of each Metadata row of the
+        selected datasets, so that only the distinct key paths are returned to
+        the server rather than all of the metadata.
 
-            {
-                "dataset": {"name": None, "metalog": {"pbench": {"script": None}}},
-                "server": {"deletion": None, "tarball-path": None},
-                "global": {"server": {"legacy": {"sha1": None}}}
-            }
+        PostgreSQL and SQLite (which we use for unit tests) have different JSON
+        functions: we use "jsonb_each" for PostgreSQL, and "json_each" for
+        SQLite, with a JSON array to represent each key path.
 
         Args:
-            aggregate: a JSONOBJECT to update with the recursive key/value
-            key: the current metadata key path element
-            value: the current metadata key's value
+            query: The basic filtered SQLAlchemy query object
+
+        Returns:
+            A list of key paths, each with a flag indicating whether the key
+            has a JSON object value at any of the datasets
         """
-        if isinstance(value, dict):
-            p = aggregate.get(key)
-            if p is None:
-                p = {}
-                aggregate[key] = p
-            for k, v in value.items():
-                self.accumulate(p, k, v)
-        elif key not in aggregate:
-            aggregate[key] = None
+        ids = query.with_entities(Dataset.id).subquery()
+        postgresql = Database.db_session.get_bind().dialect.name == "postgresql"
+        if postgresql:
+            value = cast(Metadata.value, JSONB)
+            roots = select(
+                func.jsonb_build_array(Metadata.key).label("path"),
+                value.label("value"),
+                (func.jsonb_typeof(value) == "object").label("object"),
+            )
+        else:
+            roots = select(
+                func.json_array(Metadata.key).label("path"),
+                Metadata.value.label("value"),
+                (func.json_type(Metadata.value) == "object").label("object"),
+            )
+        tree = roots.where(Metadata.dataset_ref.in_(select(ids.c.id))).cte(
+            "keytree", recursive=True
+        )
+        if postgresql:
+            member = func.jsonb_each(tree.c.value).table_valued("key", "value")
+            branch = select(
+                tree.c.path.op("||")(func.jsonb_build_array(member.c.key)),
+                member.c.value,
+                func.jsonb_typeof(member.c.value) == "object",
+            )
+        else:
+            member = func.json_each(tree.c.value).table_valued("key", "value", "type")
+            branch = select(
+                func.json_insert(tree.c.path, "$[#]", member.c.key),
+                member.c.value,
+                member.c.type == "object",
+            )
+        tree = tree.union_all(
+            branch.select_from(tree.join(member, true())).where(tree.c.object)
+        )
+        paths = []
+        for path, is_object in Database.db_session.execute(
+            select(tree.c.path, tree.c.object).distinct()
+        ).all():
+            paths.append(
+                (json.loads(path) if isinstance(path, str) else path, bool(is_object))
+            )
+        return paths
 
     def keyspace(self, query: Query) -> JSONOBJECT:
         """Aggregate the dataset metadata keyspace
 
-        Run the query we've compiled, and process the metadata collections
-        attached to each dataset.
+        Construct a hierarchical aggregation of all metadata keys across the
+        selected datasets. Each key in the hierarchy is represented as a key
+        in a nested JSON object. "Leaf" keys have the value None. E.g.,
+
+            {
+                "dataset": {"name": None, "metalog": {"pbench": {"script": None}}},
+                "server": {"deletion": None, "tarball-path": None},
+                "global": {"server": {"legacy": {"sha1": None}}}
+            }
+
+        If a key has a JSON object value for some datasets and a simple value
+        for others, it's represented as a JSON object.
 
         Args:
             query: The basic filtered SQLAlchemy query object
@@ -434,24 +742,27 @@ class DatasetsList(ApiBase):
         """
         Database.dump_query(query, current_app.logger)
         aggregate: JSONOBJECT = {}
-
-        results = query.all()
-        for result in results:
-            # NOTE: to allow sorting by User.username, our query is defined to
-            # return (Dataset, User), so we need to isolate the Dataset from
-            # the tuple.
-            dataset = result[0]
-            if not aggregate:
-                columns = {c.name: None for c in Dataset.__table__._columns}
-                columns["owner"] = None
-                aggregate.update({"dataset": columns})
-            for m in dataset.metadatas:
-                # "metalog" is a top-level key in the Metadata schema, but we
-                # report it as a sub-key of "dataset".
-                if m.key == Metadata.METALOG:
-                    self.accumulate(aggregate["dataset"], m.key, m.value)
-                else:
-                    self.accumulate(aggregate, m.key, m.value)
+        if query.with_entities(Dataset.id).first() is None:
+            return {"keys": aggregate}
+
+        columns = {c.name: None for c in Dataset.__table__._columns}
+        columns["owner"] = None
+        aggregate["dataset"] = columns
+        for path, is_object in self.keypaths(query):
+            # "metalog" is a top-level key in the Metadata schema, but we
+            # report it as a sub-key of "dataset".
+            if path[0] == Metadata.METALOG:
+                path = [Metadata.DATASET] + path
+            node = aggregate
+            for key in path[:-1]:
+                if not isinstance(node.get(key), dict):
+                    node[key] = {}
+                node = node[key]
+            if is_object:
+                if not isinstance(node.get(path[-1]), dict):
+                    node[path[-1]] = {}
+            elif path[-1] not in node:
+                node[path[-1]] = None
         return {"keys": aggregate}
 
     def daterange(self, query: Query) -> JSONOBJECT:
@@ -545,7 +856,7 @@ class DatasetsList(ApiBase):
                 if second == Metadata.METALOG:
                     native_key = keys.pop(0).lower()
                 elif second == "owner":
-                    sorter = order(User.username)
+                    sorter = User.username
                 else:
                     try:
                         c = getattr(Dataset, second)
@@ -556,20 +867,42 @@ class DatasetsList(ApiBase):
 
                     # For native SQL columns, use the SQL type unless
                     # explicitly overridden.
-                    sorter = order(c if defaulted_type else c.cast(cast_to))
+                    sorter = c if defaulted_type else c.cast(cast_to)
             if sorter is None:
-                casted = cast(aliases[native_key].value[keys].as_string(), cast_to)
-                query = query.add_column(casted)
-                sorter = order(casted)
-            sorters.append(sorter)
-
-        # Apply our list of sort terms
-        query = query.order_by(*sorters)
+                sorter = cast(aliases[native_key].value[keys].as_string(), cast_to)
+            sorters.append((sorter, order))
+
+        # Add the dataset ID as a final unique sort key, so that the order of
+        # datasets is completely determined by the sort values, which allows a
+        # cursor to identify the position of a dataset in the list. We order
+        # NULL values (for missing metadata keys) explicitly as PostgreSQL
+        # does by default, last when ascending and first when descending,
+        # because SQLite disagrees.
+        sorters.append((Dataset.id, asc))
+        keyset = []
+        ordering = []
+        for i, (sorter, order) in enumerate(sorters):
+            # Select the sort values so that we can construct a cursor from the
+            # last dataset on the page. We want the raw values, as the result
+            # of a SQL CAST isn't necessarily what SQLAlchemy expects to see.
+            query = query.add_columns(type_coerce(sorter, NullType).label(f"sort_{i}"))
+            keyset.append((sorter, order is asc))
+            if order is asc:
+                ordering.append(order(sorter).nulls_last())
+            else:
+                ordering.append(order(sorter).nulls_first())
+        query = query.order_by(*ordering)
 
         try:
             results, paginated_result = self.get_paginated_obj(
-                query=query, json=json, raw_params=raw_params, url=request.url
+                query=query,
+                json=json,
+                raw_params=raw_params,
+                url=request.url,
+                keyset=keyset,
             )
+        except APIAbort:
+            raise
         except (AttributeError, ProgrammingError, StatementError) as e:
             raise APIInternalError(
                 f"Constructed SQL for {json} isn't executable"
@@ -579,21 +912,28 @@ class DatasetsList(ApiBase):
 
         keys = json.get("metadata")
 
+        # NOTE: to allow sorting by User.username, our query is defined to
+        # return (Dataset, User), so we need to isolate the Dataset from the
+        # tuple.
+        datasets = [result[0] for result in results]
+
+        # Collect the metadata for the entire page at once, rather than with
+        # separate queries for each dataset. As for a single dataset, a
+        # failure to retrieve the metadata reports each key as None.
+        try:
+            metadata = self._get_datasets_metadata(datasets, keys)
+        except MetadataError:
+            metadata = {d.id: {k: None for k in keys or []} for d in datasets}
+
         response = []
-        for result in results:
-            # NOTE: to allow sorting by User.username, our query is defined to
-            # return (Dataset, User), so we need to isolate the Dataset from
-            # the tuple.
-            dataset = result[0]
-            d = {
-                "name": dataset.name,
-                "resource_id": dataset.resource_id,
-            }
-            try:
-                d["metadata"] = self._get_dataset_metadata(dataset, keys)
-            except MetadataError:
-                d["metadata"] = None
-            response.append(d)
+        for dataset in datasets:
+            response.append(
+                {
+                    "name": dataset.name,
+                    "resource_id": dataset.resource_id,
+                    "metadata": metadata.get(dataset.id),
+                }
+            )
 
         paginated_result["results"] = response
         return paginated_result
@@ -652,21 +992,9 @@ class DatasetsList(ApiBase):
                    }             }           }               }
                   }             }           }               }
         """
-        aliases = {
-            Metadata.METALOG: aliased(Metadata),
-            Metadata.SERVER: aliased(Metadata),
-            Metadata.GLOBAL: aliased(Metadata),
-            Metadata.USER: aliased(Metadata),
-        }
-        query = Database.db_session.query(Dataset).add_entity(User)
-        for key, table in aliases.items():
-            terms = [table.dataset_ref == Dataset.id, table.key == key]
-            if key == Metadata.USER:
-                if not auth_id:
-                    continue
-                terms.append(table.user_ref == auth_id)
-            query = query.outerjoin(table, and_(*terms))
-        query = query.outerjoin(User, User.id == Dataset.owner_id)
+        query, aliases = self.metadata_query(
+            Database.db_session.query(Dataset).add_entity(User), auth_id
+        )
 
         if "start" in json and "end" in json:
             query = query.filter(Dataset.uploaded.between(json["start"], json["end"]))
@@ -711,7 +1039,13 @@ class DatasetsList(ApiBase):
         # daterange, and acquire a normal list of datasets only if neither was
         # specified.
         if json.get("keysummary"):
-            result.update(self.keyspace(query))
+            key = KeyspaceCache.key(auth_id, json)
+            keyspace = KEYSPACE_CACHE.get(key)
+            if keyspace is None:
+                generation = Metadata.generation
+                keyspace = self.keyspace(query)
+                KEYSPACE_CACHE.put(key, generation, keyspace, self.keysummary_lifetime)
+            result.update(keyspace)
             done = True
         if json.get("daterange"):
             result.update(self.daterange(query))
@@ -5,7 +5,7 @@ from flask import current_app, jsonify
 from flask.wrappers import Response
 from pquisby.lib.post_processing import BenchmarkName, InputType, QuisbyProcessing
 
-from pbench.server import OperationCode, PbenchServerConfig
+from pbench.server import JSONOBJECT, OperationCode, PbenchServerConfig
 from pbench.server.api.resources import (
     APIAbort,
     ApiAuthorizationType,
@@ -19,13 +19,17 @@ from pbench.server.api.resources import (
     ParamType,
     Schema,
 )
-from pbench.server.api.resources.datasets_compare import DatasetsCompare
 from pbench.server.cache_manager import CacheManager, CacheManagerError
+from pbench.server.quisby_cache import QuisbyCache
+from pbench.server.utils import get_benchmark_name
 
 
 class DatasetsVisualize(ApiBase):
     """
     This class implements the Server API used to retrieve data for visualization.
+
+    Visualization results are saved in a persistent QuisbyCache, which the
+    indexer fills for newly indexed datasets.
     """
 
     def __init__(self, config: PbenchServerConfig):
@@ -57,32 +61,37 @@ class DatasetsVisualize(ApiBase):
         """
 
         dataset = params.uri["dataset"]
-        benchmark = DatasetsCompare.get_benchmark_name(dataset)
+        benchmark = get_benchmark_name(dataset)
         benchmark_type = BenchmarkName.__members__.get(benchmark.upper())
         if not benchmark_type:
             raise APIAbort(
                 HTTPStatus.BAD_REQUEST, f"Unsupported Benchmark: {benchmark}"
             )
 
-        cache_m = CacheManager(self.config, current_app.logger)
-        try:
-            file = cache_m.get_inventory_bytes(dataset.resource_id, "result.csv")
-        except CacheManagerError as e:
-            raise APIAbort(
-                HTTPStatus.BAD_REQUEST,
-                "unable to extract postprocessed data from {dataset.name}",
-            ) from e
-        except Exception as e:
-            raise APIInternalError(
-                f"Unexpected error extracting postprocessed data from {dataset.name}"
-            ) from e
+        def visualize() -> JSONOBJECT:
+            cache_m = CacheManager.shared(self.config, current_app.logger)
+            try:
+                file = cache_m.get_inventory_bytes(dataset.resource_id, "result.csv")
+            except CacheManagerError as e:
+                raise APIAbort(
+                    HTTPStatus.BAD_REQUEST,
+                    "unable to extract postprocessed data from {dataset.name}",
+                ) from e
+            except Exception as e:
+                raise APIInternalError(
+                    f"Unexpected error extracting postprocessed data from {dataset.name}"
+                ) from e
 
-        try:
-            quisby_response = QuisbyProcessing().extract_data(
-                benchmark_type, dataset.name, InputType.STREAM, file
-            )
-        except Exception as e:
-            raise APIInternalError(f"Visualization failed with {str(e)!r}")
+            try:
+                return QuisbyProcessing().extract_data(
+                    benchmark_type, dataset.name, InputType.STREAM, file
+                )
+            except Exception as e:
+                raise APIInternalError(f"Visualization failed with {str(e)!r}")
+
+        quisby_response = QuisbyCache(self.config, current_app.logger).lookup(
+            "visualize", benchmark, [dataset], visualize
+        )
 
         if quisby_response["status"] != "success":
             raise APIInternalError(
@@ -1,7 +1,6 @@
 from dataclasses import dataclass
 import datetime
 import errno
-import hashlib
 from http import HTTPStatus
 import json
 import os
@@ -31,7 +30,12 @@ from pbench.server.api.resources import (
     Type,
 )
 import pbench.server.auth.auth as Auth
-from pbench.server.cache_manager import CacheManager, DuplicateTarball, MetadataError
+from pbench.server.cache_manager import (
+    CacheManager,
+    DuplicateTarball,
+    MetadataError,
+    Tarball,
+)
 from pbench.server.database.models.audit import (
     Audit,
     AuditReason,
@@ -47,7 +51,9 @@ from pbench.server.database.models.datasets import (
     OperationName,
     OperationState,
 )
+from pbench.server.intake_stream import StreamCopier
 from pbench.server.sync import Sync
+from pbench.server.tarball_index import TarballIndex, TarballScanner
 from pbench.server.utils import UtcTimeHelper
 
 
@@ -66,6 +72,13 @@ class Access:
     stream: IO[bytes]
 
 
+@dataclass
+class Received:
+    length: int
+    metadata: Optional[JSONOBJECT] = None
+    index: Optional[TarballIndex] = None
+
+
 def str_to_json(value: str, _) -> JSONOBJECT:
     try:
         return json.loads(value)
@@ -101,12 +114,14 @@ class IntakeBase(ApiBase):
         optional metadata to be set.
     _stream: decodes the intake data and provides the length and byte IO
         stream to be read into a temporary file.
-    """
 
-    CHUNK_SIZE = 65536
+    Subclasses which don't stream the tarball in a single request can instead
+    override the _reserve and _receive hooks, which reserve the private intake
+    directory and deliver the verified tarball into it.
+    """
 
-    def __init__(self, config: PbenchServerConfig, schema: ApiSchema):
-        super().__init__(config, schema)
+    def __init__(self, config: PbenchServerConfig, *schemas: ApiSchema):
+        super().__init__(config, *schemas)
         self.temporary = config.ARCHIVE / CacheManager.TEMPORARY
         self.backup_dir = config.BACKUP
         self.temporary.mkdir(mode=0o755, parents=True, exist_ok=True)
@@ -172,6 +187,25 @@ class IntakeBase(ApiBase):
             )
         return metadata
 
+    @staticmethod
+    def check_filename(filename: str):
+        """Check that an intake filename is a tarball name without a path
+
+        Args:
+            filename: The tarball filename
+
+        Raises:
+            APIAbort on a bad filename
+        """
+        if os.path.basename(filename) != filename:
+            raise APIAbort(HTTPStatus.BAD_REQUEST, "Filename must not contain a path")
+
+        if not Dataset.is_tarball(filename):
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"File extension not supported, must be {Dataset.TARBALL_SUFFIX}",
+            )
+
     def _backup_tarball(self, tarball_path: Path, md5_str: str) -> Path:
         """Helper function which creates a backup copy of a tarball file
 
@@ -240,6 +274,131 @@ class IntakeBase(ApiBase):
         """
         raise NotImplementedError()
 
+    def _reserve(self, intake: Intake) -> Path:
+        """Reserve a private intake directory for the tarball
+
+        We isolate each uploaded tarball into a private MD5-based subdirectory
+        in order to retain the original tarball stem name for the cache
+        manager while giving us protection against multiple tarballs with the
+        same name. (A duplicate MD5 will have already failed, so that's not a
+        concern.)
+
+        Args:
+            intake: The Intake parameters produced by _identify
+
+        Raises:
+            APIAbort with CONFLICT if the directory already exists
+
+        Returns:
+            The intake directory path
+        """
+        tmp_dir = self.temporary / intake.md5
+        try:
+            tmp_dir.mkdir()
+        except FileExistsError as e:
+            raise APIAbort(
+                HTTPStatus.CONFLICT,
+                "Dataset is currently being uploaded",
+            ) from e
+        return tmp_dir
+
+    def _receive(self, intake: Intake, request: Request, tarball: Path) -> Received:
+        """Receive the tarball into the intake directory and verify it
+
+        The default is to copy the tarball byte stream provided by _stream.
+        The MD5 is computed, and the tarball members are indexed (capturing
+        the metadata.log) in other threads as the data passes through, so
+        that we don't need to read the tarball again once it's written.
+
+        Args:
+            intake: The Intake parameters produced by _identify
+            request: The Flask request object
+            tarball: The path of the tarball in the intake directory
+
+        Raises:
+            APIAbort if the tarball can't be written, or is the wrong length,
+            or has the wrong MD5
+
+        Returns:
+            The length of the tarball, and the metadata and member index
+            gathered from the stream
+        """
+        stream = self._stream(intake, request)
+
+        if stream.length <= 0:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"'Content-Length' {stream.length} must be greater than 0",
+            )
+
+        # NOTE: We know that the MD5 is unique at this point; so even if
+        # two tarballs with the same name are uploaded concurrently, by
+        # writing into a temporary directory named for the MD5 we're
+        # assured that they can't conflict.
+        metadata_log = f"{Dataset.stem(tarball)}/metadata.log"
+        scanner = TarballScanner([metadata_log])
+        copier = StreamCopier(stream.stream, stream.length, [scanner.feed])
+        try:
+            with tarball.open(mode="wb") as ofp:
+                result = copier.copy(ofp)
+        except OSError as exc:
+            if exc.errno == errno.ENOSPC:
+                usage = shutil.disk_usage(tarball.parent)
+                current_app.logger.error(
+                    "Archive filesystem is {:.3}% full, upload failure {} ({})",
+                    float(usage.used) / float(usage.total) * 100.0,
+                    Dataset.stem(tarball),
+                    humanize.naturalsize(stream.length),
+                )
+                raise APIAbort(HTTPStatus.INSUFFICIENT_STORAGE, "Out of space")
+            raise APIInternalError(
+                f"Unexpected error encountered during file upload: {str(exc)!r} "
+            ) from exc
+        except Exception as e:
+            raise APIInternalError(
+                "Unexpected error encountered during file upload: {str(e)!r}"
+            ) from e
+        finally:
+            scanner.finish()
+
+        if result.received != stream.length:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"Expected {stream.length} bytes but received {result.received} bytes",
+            )
+        elif result.md5 != intake.md5:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"MD5 checksum {result.md5} does not match expected {intake.md5}",
+            )
+        current_app.logger.info(
+            "INTAKE {} received {} bytes in {:.3f} seconds ({:.1f} MB/s)",
+            intake.name,
+            result.received,
+            result.seconds,
+            result.rate,
+        )
+
+        # If the scan failed, the cache manager will try again from the file.
+        metadata = None
+        index = scanner.index(tarball)
+        if index:
+            try:
+                log = scanner.captured.get(metadata_log)
+                lines = log.decode().splitlines(keepends=True) if log else []
+                metadata = Tarball.parse_metadata(lines)
+            except Exception as e:
+                current_app.logger.warning(
+                    "INTAKE {} metadata.log can't be parsed: {}", intake.name, e
+                )
+        else:
+            current_app.logger.warning(
+                "INTAKE {} can't be indexed as it's received: {}",
+                intake.name,
+                scanner.error,
+            )
+        return Received(stream.length, metadata, index)
+
     def _cleanup(self, args: ApiParams, intake: Intake, notes: list[str]):
         """Clean up after a completed upload
 
@@ -320,38 +479,13 @@ class IntakeBase(ApiBase):
             metadata = self.process_metadata(intake.metadata)
             attributes = {"access": intake.access, "metadata": metadata}
 
-            if os.path.basename(filename) != filename:
-                raise APIAbort(
-                    HTTPStatus.BAD_REQUEST, "Filename must not contain a path"
-                )
-
-            if not Dataset.is_tarball(filename):
-                raise APIAbort(
-                    HTTPStatus.BAD_REQUEST,
-                    f"File extension not supported, must be {Dataset.TARBALL_SUFFIX}",
-                )
-
+            self.check_filename(filename)
             dataset_name = Dataset.stem(filename)
 
-            # NOTE: we isolate each uploaded tarball into a private MD5-based
-            # subdirectory in order to retain the original tarball stem name
-            # for the cache manager while giving us protection against multiple
-            # tarballs with the same name. (A duplicate MD5 will have already
-            # failed, so that's not a concern.)
-            try:
-                tmp_dir = self.temporary / intake.md5
-                tmp_dir.mkdir()
-            except FileExistsError as e:
-                raise APIAbort(
-                    HTTPStatus.CONFLICT,
-                    "Dataset is currently being uploaded",
-                ) from e
-            else:
-                intake_dir = tmp_dir
+            intake_dir = self._reserve(intake)
             tar_full_path = intake_dir / filename
             md5_full_path = intake_dir / f"{filename}.md5"
 
-            bytes_received = 0
             current_app.logger.info(
                 "INTAKE (pre) {} {} for {} to {}",
                 self.name,
@@ -411,64 +545,14 @@ class IntakeBase(ApiBase):
                 attributes=attributes,
             )
 
-            # Now we're ready to pull the tarball, so ask our helper for the
-            # length and data stream.
-            stream = self._stream(intake, request)
-
-            if stream.length <= 0:
-                raise APIAbort(
-                    HTTPStatus.BAD_REQUEST,
-                    f"'Content-Length' {stream.length} must be greater than 0",
-                )
-
             # An exception from this point on MAY leave an uploaded tar file
             # (possibly partial, or corrupted); remove it if possible on
             # error recovery.
             recovery.add(lambda: tar_full_path.unlink(missing_ok=True))
 
-            # NOTE: We know that the MD5 is unique at this point; so even if
-            # two tarballs with the same name are uploaded concurrently, by
-            # writing into a temporary directory named for the MD5 we're
-            # assured that they can't conflict.
-            try:
-                with tar_full_path.open(mode="wb") as ofp:
-                    hash_md5 = hashlib.md5()
-
-                    while True:
-                        chunk = stream.stream.read(self.CHUNK_SIZE)
-                        bytes_received += len(chunk)
-                        if len(chunk) == 0 or bytes_received > stream.length:
-                            break
-                        ofp.write(chunk)
-                        hash_md5.update(chunk)
-            except OSError as exc:
-                if exc.errno == errno.ENOSPC:
-                    usage = shutil.disk_usage(tar_full_path.parent)
-                    current_app.logger.error(
-                        "Archive filesystem is {:.3}% full, upload failure {} ({})",
-                        float(usage.used) / float(usage.total) * 100.0,
-                        dataset.name,
-                        humanize.naturalsize(stream.length),
-                    )
-                    raise APIAbort(HTTPStatus.INSUFFICIENT_STORAGE, "Out of space")
-                raise APIInternalError(
-                    f"Unexpected error encountered during file upload: {str(exc)!r} "
-                ) from exc
-            except Exception as e:
-                raise APIInternalError(
-                    "Unexpected error encountered during file upload: {str(e)!r}"
-                ) from e
-
-            if bytes_received != stream.length:
-                raise APIAbort(
-                    HTTPStatus.BAD_REQUEST,
-                    f"Expected {stream.length} bytes but received {bytes_received} bytes",
-                )
-            elif hash_md5.hexdigest() != intake.md5:
-                raise APIAbort(
-                    HTTPStatus.BAD_REQUEST,
-                    f"MD5 checksum {hash_md5.hexdigest()} does not match expected {intake.md5}",
-                )
+            # Now we're ready to pull the tarball, so ask our helper to write
+            # and verify it.
+            received = self._receive(intake, request, tar_full_path)
 
             # From this point attempt to remove the MD5 file on error exit
             recovery.add(lambda: md5_full_path.unlink(missing_ok=True))
@@ -487,13 +571,15 @@ class IntakeBase(ApiBase):
 
             # Create a cache manager object
             try:
-                cache_m = CacheManager(self.config, current_app.logger)
+                cache_m = CacheManager.shared(self.config, current_app.logger)
             except Exception as e:
                 raise APIInternalError("Unable to map the cache manager") from e
 
             # Move the files to their final location
             try:
-                tarball = cache_m.create(tar_full_path)
+                tarball = cache_m.create(
+                    tar_full_path, received.metadata, received.index
+                )
             except DuplicateTarball as exc:
                 raise APIAbort(
                     HTTPStatus.BAD_REQUEST,
@@ -595,10 +681,10 @@ class IntakeBase(ApiBase):
                 enable_next = [OperationName.INDEX] if should_index else None
                 if not should_index:
                     notes.append("Indexing is disabled by 'archive only' setting.")
-                self._cleanup(args, intake, notes)
                 Sync(current_app.logger, OperationName.UPLOAD).update(
                     dataset=dataset, state=OperationState.OK, enabled=enable_next
                 )
+                self._cleanup(args, intake, notes)
                 if notes:
                     attributes["notes"] = notes
 
@@ -609,7 +695,7 @@ class IntakeBase(ApiBase):
                     dataset.name,
                     float(usage.used) / float(usage.total) * 100.0,
                     humanize.naturalsize(usage.free),
-                    humanize.naturalsize(stream.length),
+                    humanize.naturalsize(received.length),
                 )
                 Audit.create(
                     root=audit, status=AuditStatus.SUCCESS, attributes=attributes
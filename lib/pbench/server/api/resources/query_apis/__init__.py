@@ -1,6 +1,12 @@
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
 from datetime import datetime
 from http import HTTPStatus
-from typing import Callable, List, Optional
+import json
+import os
+import threading
+import time
+from typing import Any, List, Optional
 from urllib.parse import urljoin
 from urllib.request import Request
 
@@ -9,8 +15,10 @@ from dateutil.relativedelta import relativedelta
 from flask import current_app
 from flask.wrappers import Response
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
 
-from pbench.server import JSONOBJECT, PbenchServerConfig
+from pbench.server import JSON, JSONOBJECT, PbenchServerConfig
 from pbench.server.api.resources import (
     APIAbort,
     ApiBase,
@@ -57,6 +65,292 @@ class PostprocessError(Exception):
         self.data = data
 
 
+@dataclass
+class ConnectionStatistics:
+    """Elasticsearch connection pool counters for a server worker process.
+
+    Fields:
+        requests: the number of requests sent to Elasticsearch
+        connections: the number of connections opened to Elasticsearch
+    """
+
+    requests: int = 0
+    connections: int = 0
+
+    @property
+    def reused(self) -> int:
+        """The number of requests sent on an already open connection"""
+        return max(self.requests - self.connections, 0)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    """An HTTP connection pool which counts the connections it opens"""
+
+    statistics: ConnectionStatistics
+
+    def _new_conn(self):
+        self.statistics.connections += 1
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """An HTTPS connection pool which counts the connections it opens"""
+
+    statistics: ConnectionStatistics
+
+    def _new_conn(self):
+        self.statistics.connections += 1
+        return super()._new_conn()
+
+
+class ElasticAdapter(HTTPAdapter):
+    """A requests transport adapter which counts the connections opened by
+    its connection pools."""
+
+    def __init__(self, statistics: ConnectionStatistics, **kwargs):
+        self.statistics = statistics
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        statistics = self.statistics
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type(
+                "HTTPConnectionPool",
+                (_CountingHTTPConnectionPool,),
+                {"statistics": statistics},
+            ),
+            "https": type(
+                "HTTPSConnectionPool",
+                (_CountingHTTPSConnectionPool,),
+                {"statistics": statistics},
+            ),
+        }
+
+    def send(self, *args, **kwargs) -> requests.Response:
+        self.statistics.requests += 1
+        return super().send(*args, **kwargs)
+
+
+class ElasticSession:
+    """A persistent HTTP session for Elasticsearch queries.
+
+    Each server worker process shares one session across API calls, so that
+    Elasticsearch connections (and their TLS handshakes) are kept alive and
+    reused rather than opened for each query. The session's connection pool
+    size, retries and timeouts are taken from the `Indexing` section of the
+    server configuration:
+
+        pool_size: the maximum number of connections kept open to the
+            Elasticsearch server (default 10)
+        pool_retries: the number of times to retry a failed connection
+            (default 0)
+        connect_timeout: seconds to wait for a connection (default 10)
+        read_timeout: seconds to wait for a response (by default, wait as
+            long as it takes: a synchronous update or delete by query of a
+            large dataset can legitimately take a long time)
+    """
+
+    # The process-wide session; see ElasticSession.shared()
+    _shared: Optional["ElasticSession"] = None
+    _shared_pid: Optional[int] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, config: PbenchServerConfig):
+        """Construct a session
+
+        Args:
+            config: server configuration
+        """
+        self.ca_bundle = config.get("Indexing", "ca_bundle")
+        self.pool_size = config.getint("Indexing", "pool_size", fallback=10)
+        self.pool_retries = config.getint("Indexing", "pool_retries", fallback=0)
+        self.timeout = (
+            config.getfloat("Indexing", "connect_timeout", fallback=10.0),
+            config.getfloat("Indexing", "read_timeout", fallback=None),
+        )
+        self.statistics = ConnectionStatistics()
+        adapter = ElasticAdapter(
+            self.statistics,
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=self.pool_retries,
+        )
+        self.session = requests.Session()
+        self.session.verify = self.ca_bundle
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def shared(cls, config: PbenchServerConfig) -> "ElasticSession":
+        """Return the process-wide Elasticsearch session
+
+        A forked child process, or a different configuration, gets a new
+        session.
+
+        Args:
+            config: server configuration
+
+        Returns:
+            The shared session
+        """
+        with cls._shared_lock:
+            session = cls._shared
+            if (
+                not session
+                or cls._shared_pid != os.getpid()
+                or session.ca_bundle != config.get("Indexing", "ca_bundle")
+            ):
+                if session:
+                    session.close()
+                session = cls(config)
+                cls._shared = session
+                cls._shared_pid = os.getpid()
+            return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request to Elasticsearch on a pooled connection
+
+        Args:
+            method: the HTTP method (e.g., "GET")
+            url: the Elasticsearch URL
+            kwargs: additional requests parameters
+
+        Returns:
+            The Elasticsearch response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
+
+    def report(self) -> dict[str, Any]:
+        """Report the connection pool statistics
+
+        Returns:
+            A dict of connection pool counters
+        """
+        return {**asdict(self.statistics), "reused": self.statistics.reused}
+
+
+@dataclass
+class CachedResponse:
+    """A cached Elasticsearch response.
+
+    Fields:
+        resource_id: the resource ID of the dataset, or None
+        expiration: the time at which the cached response expires
+        payload: the Elasticsearch response payload
+    """
+
+    resource_id: Optional[str]
+    expiration: float
+    payload: bytes
+
+
+class ResponseCache:
+    """A cache of Elasticsearch responses for dataset views.
+
+    The indexed data of a dataset changes only when it's indexed or
+    re-indexed, so the dataset views can reuse a response until the dataset's
+    index map changes: the cache keys of these APIs include the IndexMap
+    version. As this doesn't notice every change made by other server
+    processes (for example, a re-index into the existing indices), each
+    response also has a limited lifetime.
+
+    The cache is bounded by the total size of the cached response payloads,
+    evicting the least recently used responses first.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Find a cached response
+
+        The response is cached as the raw payload, so that each caller gets
+        its own copy of the response document to postprocess.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached response payload, or None if there's no valid response
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry.expiration < time.time():
+                self._remove(key)
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry.payload
+
+    def put(
+        self,
+        key: str,
+        resource_id: Optional[str],
+        payload: bytes,
+        lifetime: int,
+        limit: int,
+    ):
+        """Cache a response
+
+        Args:
+            key: The cache key
+            resource_id: The resource ID of the dataset, or None
+            payload: The Elasticsearch response payload
+            lifetime: The lifetime of the cached response in seconds
+            limit: The maximum total size of the cached responses in bytes
+        """
+        if len(payload) > limit:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = CachedResponse(
+                resource_id, time.time() + lifetime, payload
+            )
+            self.size += len(payload)
+            while self.size > limit:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, resource_id: str):
+        """Discard the cached responses for a dataset
+
+        Args:
+            resource_id: The resource ID of the dataset
+        """
+        with self.lock:
+            for key in [
+                k for k, e in self.entries.items() if e.resource_id == resource_id
+            ]:
+                self._remove(key)
+
+    def clear(self):
+        """Discard all cached responses and reset the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.size = self.hits = self.misses = 0
+
+    def _remove(self, key: str):
+        """Remove a cached response: the caller must hold the lock"""
+        self.size -= len(self.entries.pop(key).payload)
+
+
+"""The cache of Elasticsearch responses shared by all ElasticBase requests"""
+RESPONSE_CACHE = ResponseCache()
+
+
 class ElasticBase(ApiBase):
     """
     A base class for Elasticsearch queries that allows subclasses to provide
@@ -102,7 +396,6 @@ class ElasticBase(ApiBase):
         super().__init__(config, *schemas)
         self.prefix = config.get("Indexing", "index_prefix")
         self.es_url = config.get("Indexing", "uri")
-        self.ca_bundle = config.get("Indexing", "ca_bundle")
 
     @staticmethod
     def _build_elasticsearch_query(
@@ -352,14 +645,71 @@ class ElasticBase(ApiBase):
         """
         raise NotImplementedError()
 
-    def _call(
-        self, method: Callable, params: ApiParams, context: ApiContext
-    ) -> Response:
+    def cache_key(self, params: ApiParams, context: ApiContext) -> Optional[str]:
+        """
+        Identify a query whose Elasticsearch response can be cached.
+
+        The base class doesn't cache responses; this can be overridden by
+        subclasses whose responses are determined by the key.
+
+        Args:
+            params: Type-normalized client parameters
+            context: API context dictionary
+
+        Returns:
+            A cache key, or None if the response can't be cached
+        """
+        return None
+
+    def cacheable(self, es_json: JSON, context: ApiContext) -> bool:
+        """
+        Determine whether an Elasticsearch response can be cached.
+
+        This is called only for queries with a cache key, and can be
+        overridden by subclasses which can cache only some responses.
+
+        Args:
+            es_json: Elasticsearch Response payload
+            context: API context dictionary
+
+        Returns:
+            True if the response can be cached
+        """
+        return True
+
+    def _cache_response(
+        self, key: str, es_response: requests.Response, context: ApiContext
+    ):
+        """
+        Cache an Elasticsearch response, subject to the configured lifetime
+        and total size of the cached responses.
+
+        Args:
+            key: The cache key
+            es_response: The Elasticsearch response
+            context: API context dictionary
+        """
+        dataset = context.get("dataset")
+        lifetime = self.config.getint(
+            "pbench-server", "elasticsearch-cache-lifetime", fallback=300
+        )
+        size = self.config.getint(
+            "pbench-server", "elasticsearch-cache-size", fallback=64
+        )
+        RESPONSE_CACHE.put(
+            key,
+            dataset.resource_id if dataset else None,
+            es_response.content,
+            lifetime,
+            size * 1024 * 1024,
+        )
+
+    def _call(self, method: str, params: ApiParams, context: ApiContext) -> Response:
         """
         Perform the requested call to Elasticsearch, and handle any exceptions.
 
         Args:
-            method: requests package callable (e.g., requests.get)
+            method: HTTP method for the Elasticsearch request (e.g., "GET")
             params: Type-normalized client parameters
             context: API context dictionary
 
@@ -375,77 +725,99 @@ class ElasticBase(ApiBase):
         except KeyError as e:
             raise APIInternalError(f"problem in preprocess, missing {e}") from e
 
-        url = None
+        # A dataset view may be able to reuse a cached response to an
+        # identical Elasticsearch query.
         try:
-            # prepare payload for Elasticsearch query
-            es_request = self.assemble(params, context)
-            if not es_request:
-                current_app.logger.info("ASSEMBLE disabled Elasticsearch call")
-            else:
-                path = es_request.get("path")
-                url = urljoin(self.es_url, path)
-                current_app.logger.info(
-                    "ASSEMBLE returned URL {!r}, {!r}",
-                    url,
-                    es_request.get("kwargs").get("json"),
-                )
+            cache_key = self.cache_key(params, context)
         except Exception as e:
             if isinstance(e, APIAbort):
                 raise
-            raise APIInternalError("Elasticsearch assembly error") from e
-
-        es_response = None
-        json_response = {}
-        if es_request:
+            raise APIInternalError("Elasticsearch cache error") from e
+        cached = RESPONSE_CACHE.get(cache_key) if cache_key else None
+        if cached is not None:
+            current_app.logger.debug(
+                "{} using cached Elasticsearch response ({} hits, {} misses)",
+                klasname,
+                RESPONSE_CACHE.hits,
+                RESPONSE_CACHE.misses,
+            )
+            json_response = json.loads(cached)
+        else:
+            url = None
             try:
-                # perform the Elasticsearch query
-                es_response: requests.Response = method(
-                    url, **es_request["kwargs"], verify=self.ca_bundle
-                )
-                current_app.logger.debug(
-                    "ES query response {}:{}",
-                    es_response.reason,
-                    es_response.status_code,
-                )
-                es_response.raise_for_status()
-                json_response = es_response.json()
-            except requests.exceptions.HTTPError as e:
-                current_app.logger.error(
-                    "{} HTTP error {} from Elasticsearch request {} -> {}",
-                    klasname,
-                    e,
-                    es_request,
-                    e.response.text if e.response else "<unknown>",
-                )
-                raise APIAbort(
-                    HTTPStatus.BAD_GATEWAY,
-                    f"Elasticsearch query failure {e.response.reason} ({e.response.status_code})",
-                )
-            except requests.exceptions.ConnectionError:
-                current_app.logger.error(
-                    "{}: connection refused during the Elasticsearch request", klasname
-                )
-                raise APIAbort(
-                    HTTPStatus.BAD_GATEWAY,
-                    "Network problem, could not reach Elasticsearch",
-                )
-            except requests.exceptions.Timeout:
-                current_app.logger.error(
-                    "{}: connection timed out during the Elasticsearch request",
-                    klasname,
-                )
-                raise APIAbort(
-                    HTTPStatus.GATEWAY_TIMEOUT,
-                    "Connection timed out, could reach Elasticsearch",
-                )
-            except requests.exceptions.InvalidURL as e:
-                raise APIInternalError(f"Invalid Elasticsearch URL {url}") from e
+                # prepare payload for Elasticsearch query
+                es_request = self.assemble(params, context)
+                if not es_request:
+                    current_app.logger.info("ASSEMBLE disabled Elasticsearch call")
+                else:
+                    path = es_request.get("path")
+                    url = urljoin(self.es_url, path)
+                    current_app.logger.info(
+                        "ASSEMBLE returned URL {!r}, {!r}",
+                        url,
+                        es_request.get("kwargs").get("json"),
+                    )
             except Exception as e:
-                raise APIInternalError(f"Unexpected backend error '{e}'") from e
+                if isinstance(e, APIAbort):
+                    raise
+                raise APIInternalError("Elasticsearch assembly error") from e
+
+            json_response = {}
+            if es_request:
+                try:
+                    # perform the Elasticsearch query
+                    es_session = ElasticSession.shared(self.config)
+                    es_response = es_session.request(
+                        method, url, **es_request["kwargs"]
+                    )
+                    current_app.logger.debug(
+                        "ES query response {}:{} {}",
+                        es_response.reason,
+                        es_response.status_code,
+                        es_session.report(),
+                    )
+                    es_response.raise_for_status()
+                    json_response = es_response.json()
+                    if cache_key and self.cacheable(json_response, context):
+                        self._cache_response(cache_key, es_response, context)
+                except requests.exceptions.HTTPError as e:
+                    current_app.logger.error(
+                        "{} HTTP error {} from Elasticsearch request {} -> {}",
+                        klasname,
+                        e,
+                        es_request,
+                        e.response.text if e.response else "<unknown>",
+                    )
+                    raise APIAbort(
+                        HTTPStatus.BAD_GATEWAY,
+                        f"Elasticsearch query failure {e.response.reason} ({e.response.status_code})",
+                    )
+                except requests.exceptions.ConnectionError:
+                    current_app.logger.error(
+                        "{}: connection refused during the Elasticsearch request",
+                        klasname,
+                    )
+                    raise APIAbort(
+                        HTTPStatus.BAD_GATEWAY,
+                        "Network problem, could not reach Elasticsearch",
+                    )
+                except requests.exceptions.Timeout:
+                    current_app.logger.error(
+                        "{}: connection timed out during the Elasticsearch request",
+                        klasname,
+                    )
+                    raise APIAbort(
+                        HTTPStatus.GATEWAY_TIMEOUT,
+                        "Connection timed out, could reach Elasticsearch",
+                    )
+                except requests.exceptions.InvalidURL as e:
+                    raise APIInternalError(f"Invalid Elasticsearch URL {url}") from e
+                except Exception as e:
+                    raise APIInternalError(f"Unexpected backend error '{e}'") from e
 
         try:
             # postprocess Elasticsearch response
-            return self.postprocess(json_response, context)
+            response = self.postprocess(json_response, context)
         except PostprocessError as e:
             msg = f"{klasname}: {str(e)}"
             current_app.logger.error("{}", msg)
@@ -453,6 +825,13 @@ class ElasticBase(ApiBase):
         except Exception as e:
             raise APIInternalError(f"Unexpected backend exception '{e}'") from e
 
+        # Let clients revalidate a cacheable view instead of downloading it
+        # again.
+        if cache_key and isinstance(response, Response):
+            response.add_etag()
+            response = response.make_conditional(context["request"])
+        return response
+
     def _post(self, params: ApiParams, req: Request, context: ApiContext) -> Response:
         """Handle a Pbench server POST operation involving Elasticsearch
 
@@ -467,7 +846,7 @@ class ElasticBase(ApiBase):
             context: The API context dictionary
         """
         context["request"] = req
-        return self._call(requests.post, params, context)
+        return self._call("POST", params, context)
 
     def _delete(self, params: ApiParams, req: Request, context: ApiContext) -> Response:
         """Handle a Pbench server DELETE operation involving Elasticsearch
@@ -483,7 +862,7 @@ class ElasticBase(ApiBase):
             context: The API context dictionary
         """
         context["request"] = req
-        return self._call(requests.post, params, context)
+        return self._call("POST", params, context)
 
     def _get(self, params: ApiParams, req: Request, context: ApiContext) -> Response:
         """Handle a GET operation involving a call to Elasticsearch
@@ -499,4 +878,4 @@ class ElasticBase(ApiBase):
             context: The API context dictionary
         """
         context["request"] = req
-        return self._call(requests.get, params, context)
+        return self._call("GET", params, context)
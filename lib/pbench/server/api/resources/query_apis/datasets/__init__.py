@@ -1,4 +1,6 @@
 from http import HTTPStatus
+import json
+import time
 from typing import AnyStr, List, NoReturn, Optional, Union
 
 from pbench.server import JSON, PbenchServerConfig
@@ -46,8 +48,22 @@ class IndexMapBase(ElasticBase):
     Note that dataset 'name' is a required schema parameter for all the classes
     extending this class. The common 'preprocess' provides json context with a
     dataset that's passed to the assemble and postprocess methods.
+
+    Subclasses which set CACHE_RESPONSES reuse cached Elasticsearch responses
+    until the dataset's index map, access or owner changes. Any postprocess
+    context must be set up by 'preprocess', as a cached response bypasses
+    'assemble'.
     """
 
+    # Cache Elasticsearch responses for this API
+    CACHE_RESPONSES = False
+
+    # Template mappings by index name, with their expiration time: templates
+    # change only when the server is upgraded, but that's done by another
+    # process.
+    MAPPINGS: dict[str, tuple[float, JSON]] = {}
+    MAPPINGS_LIFETIME = 300
+
     # Mapping for client friendly ES index names and ES internal index names
     ES_INTERNAL_INDEX_NAMES = {
         "iterations": {
@@ -106,6 +122,35 @@ class IndexMapBase(ElasticBase):
         )
         context["dataset"] = dataset
 
+    def cache_key(self, params: ApiParams, context: ApiContext) -> Optional[str]:
+        """Identify a dataset query by the API, the dataset and its index map
+        version, and the client parameters.
+
+        Args:
+            params: Type-normalized client parameters
+            context: API context dictionary
+
+        Returns:
+            A cache key, or None if the API doesn't cache responses
+        """
+        if not self.CACHE_RESPONSES:
+            return None
+        dataset: Dataset = context["dataset"]
+        return json.dumps(
+            [
+                self.__class__.__name__,
+                dataset.resource_id,
+                dataset.access,
+                dataset.owner_id,
+                IndexMap.version(dataset),
+                params.uri,
+                params.query,
+                params.body,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+
     def get_index(
         self,
         dataset: Dataset,
@@ -176,13 +221,22 @@ class IndexMapBase(ElasticBase):
             JSON containing whitelisted keys of the index and corresponding
             values.
         """
-        template = Template.find(document["index"])
+        index = document["index"]
+        cached = IndexMapBase.MAPPINGS.get(index)
+        if cached and cached[0] > time.time():
+            mappings = cached[1]
+        else:
+            mappings = Template.find(index).mappings
+            IndexMapBase.MAPPINGS[index] = (
+                time.time() + IndexMapBase.MAPPINGS_LIFETIME,
+                mappings,
+            )
 
         # Only keep the whitelisted fields
         return {
             "properties": {
                 key: value
-                for key, value in template.mappings["properties"].items()
+                for key, value in mappings["properties"].items()
                 if key in document["whitelist"]
             }
         }
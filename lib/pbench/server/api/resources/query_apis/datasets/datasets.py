@@ -16,7 +16,11 @@ from pbench.server.api.resources import (
     ParamType,
     Schema,
 )
-from pbench.server.api.resources.query_apis import ApiContext, PostprocessError
+from pbench.server.api.resources.query_apis import (
+    ApiContext,
+    PostprocessError,
+    RESPONSE_CACHE,
+)
 from pbench.server.api.resources.query_apis.datasets import IndexMapBase
 from pbench.server.cache_manager import CacheManager
 from pbench.server.database.models.audit import AuditReason, AuditStatus, AuditType
@@ -270,6 +274,10 @@ class Datasets(IndexMapBase):
                 }
             context["auditing"]["attributes"]["results"] = results
 
+            # The indexed documents have changed, so any cached views of the
+            # dataset are out of date.
+            RESPONSE_CACHE.invalidate(dataset.resource_id)
+
             if failures == 0:
                 if action == "update":
                     access = context.get("access")
@@ -286,7 +294,7 @@ class Datasets(IndexMapBase):
                         ) from e
                 elif action == "delete":
                     try:
-                        cache_m = CacheManager(self.config, current_app.logger)
+                        cache_m = CacheManager.shared(self.config, current_app.logger)
                         cache_m.delete(dataset.resource_id)
                         dataset.delete()
 
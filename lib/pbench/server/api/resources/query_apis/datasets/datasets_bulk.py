@@ -0,0 +1,681 @@
+from collections import defaultdict
+from http import HTTPStatus
+import re
+import threading
+import time
+from typing import Optional
+from urllib.parse import urljoin
+
+from flask import current_app, Flask, jsonify
+from flask.wrappers import Request, Response
+
+from pbench.server import JSONOBJECT, OperationCode, PbenchServerConfig
+from pbench.server.api.resources import (
+    APIAbort,
+    ApiAttributes,
+    ApiContext,
+    ApiMethod,
+    ApiParams,
+    ApiSchema,
+    MissingParameters,
+    Parameter,
+    ParamType,
+    Schema,
+)
+from pbench.server.api.resources.datasets_list import DatasetsList
+from pbench.server.api.resources.query_apis import (
+    ElasticBase,
+    ElasticSession,
+    RESPONSE_CACHE,
+)
+import pbench.server.auth.auth as Auth
+from pbench.server.bulk_job import BulkJob, JobNotFound, JobRecord
+from pbench.server.cache_manager import CacheManager
+from pbench.server.database.database import Database
+from pbench.server.database.models.audit import (
+    Audit,
+    AuditReason,
+    AuditStatus,
+    AuditType,
+)
+from pbench.server.database.models.datasets import (
+    Dataset,
+    Operation,
+    OperationName,
+    OperationState,
+)
+from pbench.server.database.models.index_map import IndexMap
+from pbench.server.database.models.users import User
+from pbench.server.sync import Sync
+
+
+class DatasetsBulk(ElasticBase):
+    """Update or delete a set of Pbench datasets
+
+    Change the owner and/or access of, or delete, a set of datasets selected
+    by a list of resource IDs and/or a list of metadata filter expressions
+    (as for the datasets list API).
+
+    The Elasticsearch documents of all the datasets are updated or deleted by
+    a few asynchronous `_update_by_query` or `_delete_by_query` tasks, each
+    covering all of the selected datasets which occupy the same set of
+    indices, rather than by a call per dataset. The client is given a job ID
+    with which to follow progress; once all the Elasticsearch tasks are
+    complete, the Dataset rows are updated or deleted, with the operational
+    state and audit records, in a few SQL transactions.
+
+    Called as `POST /api/v1/datasets/bulk` with a JSON body like
+    `{"datasets": [...], "filter": [...], "access": "public", "owner": "user"}`
+    or `DELETE /api/v1/datasets/bulk` with `{"datasets": [...], "filter": [...]}`;
+    and `GET /api/v1/datasets/bulk/{job}` reports the job.
+    """
+
+    # The maximum number of dataset resource IDs in the query of one
+    # Elasticsearch task
+    TERMS_LIMIT = 1000
+
+    # Elasticsearch query parameters for each task
+    ES_PARAMS = {
+        "ignore_unavailable": "true",
+        "refresh": "true",
+        "wait_for_completion": "false",
+    }
+
+    def __init__(self, config: PbenchServerConfig):
+        selection = (
+            Parameter("datasets", ParamType.LIST, element_type=ParamType.STRING),
+            Parameter(
+                "filter",
+                ParamType.LIST,
+                element_type=ParamType.STRING,
+                string_list=",",
+            ),
+        )
+        super().__init__(
+            config,
+            ApiSchema(
+                ApiMethod.POST,
+                OperationCode.UPDATE,
+                body_schema=Schema(
+                    *selection,
+                    Parameter("access", ParamType.ACCESS),
+                    Parameter("owner", ParamType.USER),
+                ),
+                attributes=ApiAttributes(
+                    "update",
+                    OperationName.UPDATE,
+                    require_stable=True,
+                    require_map=False,
+                ),
+            ),
+            ApiSchema(
+                ApiMethod.DELETE,
+                OperationCode.DELETE,
+                body_schema=Schema(*selection),
+                attributes=ApiAttributes(
+                    "delete",
+                    OperationName.DELETE,
+                    require_stable=True,
+                    require_map=False,
+                ),
+            ),
+            ApiSchema(
+                ApiMethod.GET,
+                OperationCode.READ,
+                uri_schema=Schema(Parameter("job", ParamType.STRING)),
+            ),
+        )
+        self.temporary = config.ARCHIVE / CacheManager.TEMPORARY
+        self.poll = config.getint("pbench-server", "bulk-job-poll", fallback=10)
+
+    @staticmethod
+    def _user() -> User:
+        """Identify the authenticated user
+
+        Raises:
+            APIAbort with UNAUTHORIZED if the client isn't authenticated
+
+        Returns:
+            The authenticated User
+        """
+        user = Auth.token_auth.current_user()
+        if not user:
+            raise APIAbort(HTTPStatus.UNAUTHORIZED, "Authentication is required")
+        return user
+
+    def _select(self, params: ApiParams, user: User) -> list[Dataset]:
+        """Find the selected datasets, and check that the user may modify
+        them.
+
+        A user other than an administrator may only modify their own datasets:
+        naming another user's dataset fails, and a filter selects only the
+        user's datasets.
+
+        Args:
+            params: API parameters
+            user: the authenticated user
+
+        Raises:
+            APIAbort on failure
+
+        Returns:
+            The selected datasets
+        """
+        resource_ids = params.body.get("datasets")
+        filters = params.body.get("filter")
+        if not resource_ids and not filters:
+            raise MissingParameters(["datasets", "filter"])
+
+        query = Database.db_session.query(Dataset)
+        if resource_ids:
+            named = query.filter(Dataset.resource_id.in_(resource_ids)).all()
+            missing = set(resource_ids) - {d.resource_id for d in named}
+            if missing:
+                raise APIAbort(
+                    HTTPStatus.NOT_FOUND,
+                    f"Datasets {sorted(missing)} not found",
+                )
+            if not user.is_admin():
+                others = [d.resource_id for d in named if d.owner_id != str(user.id)]
+                if others:
+                    raise APIAbort(
+                        HTTPStatus.FORBIDDEN,
+                        f"User {user.username} is not authorized to modify "
+                        f"datasets {sorted(others)}",
+                    )
+            if not filters:
+                return named
+            query = query.filter(Dataset.resource_id.in_(resource_ids))
+        if not user.is_admin():
+            query = query.filter(Dataset.owner_id == str(user.id))
+        query, aliases = DatasetsList.metadata_query(query, str(user.id))
+        return DatasetsList.filter_query(filters, aliases, query).all()
+
+    def _plan(self, datasets: list[Dataset]) -> list[JSONOBJECT]:
+        """Group the Elasticsearch work into tasks
+
+        Each task covers a set of indices, and the datasets occupying all of
+        those indices, so that a task never searches an index for datasets
+        which have no documents there. Datasets which occupy the same indices,
+        for example because they were indexed in the same month, share a task.
+
+        Args:
+            datasets: the selected datasets
+
+        Returns:
+            A list of task descriptions
+        """
+        if not datasets:
+            return []
+        rows = (
+            Database.db_session.query(IndexMap.index, Dataset.resource_id)
+            .join(Dataset, IndexMap.dataset_ref == Dataset.id)
+            .filter(IndexMap.dataset_ref.in_([d.id for d in datasets]))
+            .all()
+        )
+        occupants: dict[str, set[str]] = defaultdict(set)
+        for index, resource_id in rows:
+            occupants[index].add(resource_id)
+        groups: dict[frozenset[str], list[str]] = defaultdict(list)
+        for index, resource_ids in occupants.items():
+            groups[frozenset(resource_ids)].append(index)
+
+        tasks = []
+        for resource_ids, indices in groups.items():
+            ids = sorted(resource_ids)
+            for i in range(0, len(ids), self.TERMS_LIMIT):
+                tasks.append(
+                    {
+                        "id": "",
+                        "indices": sorted(indices),
+                        "datasets": ids[i : i + self.TERMS_LIMIT],
+                        "completed": False,
+                        "results": {},
+                        "error": None,
+                    }
+                )
+        return sorted(tasks, key=lambda t: (t["indices"], t["datasets"]))
+
+    def _start(self, record: JobRecord, task: JSONOBJECT):
+        """Submit an asynchronous Elasticsearch task
+
+        A task which can't be submitted is recorded as completed with an
+        error, so that its datasets are reported as failed.
+
+        Args:
+            record: the job record
+            task: the task description
+        """
+        ids = task["datasets"]
+        json = {
+            "query": {
+                "dis_max": {
+                    "queries": [
+                        {"terms": {"run.id": ids}},
+                        {"terms": {"run_data_parent": ids}},
+                    ]
+                }
+            }
+        }
+        if record.action == "update":
+            authorization = {}
+            if record.access:
+                authorization["access"] = record.access
+            if record.owner:
+                authorization["owner"] = record.owner
+            json["script"] = {
+                "source": "ctx._source.authorization.putAll(params.authorization)",
+                "lang": "painless",
+                "params": {"authorization": authorization},
+            }
+        url = urljoin(
+            self.es_url, f"{','.join(task['indices'])}/_{record.action}_by_query"
+        )
+        try:
+            response = ElasticSession.shared(self.config).request(
+                "POST", url, json=json, params=self.ES_PARAMS
+            )
+            response.raise_for_status()
+            task["id"] = response.json()["task"]
+        except Exception as e:
+            current_app.logger.error(
+                "BULK {} unable to start {} task on {}: {}",
+                record.id,
+                record.action,
+                task["indices"],
+                e,
+            )
+            task["completed"] = True
+            task["error"] = f"Unable to start Elasticsearch task: {str(e)!r}"
+
+    def _check(self, record: JobRecord, task: JSONOBJECT):
+        """Check whether an Elasticsearch task is complete
+
+        A failure to reach Elasticsearch leaves the task incomplete, to be
+        checked again later; but a task which Elasticsearch doesn't know is
+        recorded as completed with an error.
+
+        Args:
+            record: the job record
+            task: the task description
+        """
+        try:
+            response = ElasticSession.shared(self.config).request(
+                "GET", urljoin(self.es_url, f"_tasks/{task['id']}")
+            )
+            if response.status_code == HTTPStatus.NOT_FOUND:
+                task["completed"] = True
+                task["error"] = "Elasticsearch task not found"
+                return
+            response.raise_for_status()
+            status = response.json()
+        except Exception as e:
+            current_app.logger.warning(
+                "BULK {} unable to check task {}: {}", record.id, task["id"], e
+            )
+            return
+        if not status.get("completed"):
+            return
+        task["completed"] = True
+        result = status.get("response", {})
+        task["results"] = {
+            f: result.get(f) or 0
+            for f in ("deleted", "updated", "total", "version_conflicts")
+        }
+        task["results"]["failures"] = len(result.get("failures", []))
+        if "error" in status:
+            error = status["error"]
+            task["error"] = error.get("reason", str(error))
+
+    def _finalize(self, record: JobRecord):
+        """Update or delete the Dataset rows once all tasks are complete
+
+        Datasets covered by a task which failed, even partially, are neither
+        updated nor deleted, and their operational state is set to FAILED so
+        that the operation can be retried.
+
+        Args:
+            record: the job record
+        """
+        failed = set()
+        for task in record.tasks:
+            if task["error"] or task["results"].get("failures"):
+                failed.update(task["datasets"])
+        datasets = (
+            Database.db_session.query(Dataset)
+            .filter(Dataset.resource_id.in_(record.datasets))
+            .all()
+        )
+        names = {d.resource_id: d.name for d in datasets}
+        for d in datasets:
+            RESPONSE_CACHE.invalidate(d.resource_id)
+
+        done = [d for d in datasets if d.resource_id not in failed]
+        component = OperationName[record.action.upper()]
+        sync = Sync(logger=current_app.logger, component=component)
+        message = f"Unable to {record.action} some indexed documents"
+        if record.action == "update":
+            for d in done:
+                if record.access:
+                    d.access = record.access
+                if record.owner:
+                    d.owner_id = record.owner
+            try:
+                Database.db_session.commit()
+            except Exception as e:
+                Database.db_session.rollback()
+                current_app.logger.error(
+                    "BULK {} unable to update datasets: {}", record.id, e
+                )
+                failed.update(d.resource_id for d in done)
+                message = f"Unable to update dataset: {str(e)!r}"
+                done = []
+            sync.update_all(done, OperationState.OK)
+        else:
+            cache_m = CacheManager.shared(self.config, current_app.logger)
+            deleted = []
+            for d in done:
+                try:
+                    cache_m.delete(d.resource_id)
+                except Exception as e:
+                    current_app.logger.error(
+                        "BULK {} unable to delete {} from the cache: {}",
+                        record.id,
+                        d.name,
+                        e,
+                    )
+                    failed.add(d.resource_id)
+                    continue
+                Database.db_session.delete(d)
+                deleted.append(d)
+            try:
+                Database.db_session.commit()
+            except Exception as e:
+                Database.db_session.rollback()
+                current_app.logger.error(
+                    "BULK {} unable to delete datasets: {}", record.id, e
+                )
+                failed.update(d.resource_id for d in deleted)
+                message = f"Unable to delete dataset: {str(e)!r}"
+        sync.update_all(
+            [d for d in datasets if d.resource_id in failed],
+            OperationState.FAILED,
+            message,
+        )
+
+        audits = []
+        for resource_id, name in names.items():
+            attributes = {"job": record.id}
+            if resource_id in failed:
+                attributes["message"] = message
+            audits.append(
+                Audit.build(
+                    root_id=record.audits.get(resource_id),
+                    name=record.action,
+                    operation=OperationCode[record.action.upper()],
+                    object_type=AuditType.DATASET,
+                    object_id=resource_id,
+                    object_name=name,
+                    user_id=record.user_id,
+                    user_name=record.username,
+                    status=(
+                        AuditStatus.FAILURE
+                        if resource_id in failed
+                        else AuditStatus.SUCCESS
+                    ),
+                    reason=AuditReason.INTERNAL if resource_id in failed else None,
+                    attributes=attributes,
+                )
+            )
+        Audit.add_all(audits)
+        record.failed = sorted(failed)
+        record.state = "done"
+        current_app.logger.info(
+            "BULK {} {} {} datasets, {} failed: {}",
+            record.id,
+            record.action,
+            len(record.datasets),
+            len(record.failed),
+            record.results(),
+        )
+
+    def _advance(self, job: BulkJob) -> JobRecord:
+        """Check the job's Elasticsearch tasks, and finalize the job when all
+        are complete.
+
+        This can be called concurrently by any server process: the job lock
+        ensures that the job is finalized only once.
+
+        Args:
+            job: the bulk job
+
+        Raises:
+            JobNotFound: there's no such job
+
+        Returns:
+            The updated job record
+        """
+        with job.lock():
+            record = job.load()
+            if record.done:
+                return record
+            for task in record.tasks:
+                if not task["completed"]:
+                    self._check(record, task)
+            if all(t["completed"] for t in record.tasks):
+                self._finalize(record)
+            job.save(record)
+        return record
+
+    def _watch(self, app: Flask, job: BulkJob):
+        """Advance a job in the background until it's done, so that the
+        datasets are finalized even if the client never asks for the job
+        status.
+
+        Args:
+            app: the Flask application
+            job: the bulk job
+        """
+        while True:
+            time.sleep(self.poll)
+            with app.app_context():
+                try:
+                    if self._advance(job).done:
+                        break
+                except JobNotFound:
+                    break
+                except Exception as e:
+                    app.logger.warning("BULK {} unable to advance: {}", job.id, e)
+                finally:
+                    Database.db_session.remove()
+
+    def _submit(self, params: ApiParams, req: Request, context: ApiContext):
+        """Start a bulk update or delete job
+
+        Args:
+            params: API parameters
+            req: the original Request object
+            context: API context dictionary
+
+        Raises:
+            APIAbort on failure
+
+        Returns:
+            202 (ACCEPTED) with the job status, or 200 (OK) if the job is
+            already done because none of the datasets have indexed documents
+        """
+        user = self._user()
+        action = context["attributes"].action
+        access: Optional[str] = None
+        owner: Optional[str] = None
+        if action == "update":
+            access = params.body.get("access")
+            owner = params.body.get("owner")
+            if not access and not owner:
+                raise MissingParameters(["access", "owner"])
+
+        datasets = self._select(params, user)
+        if datasets:
+            working = (
+                Database.db_session.query(Operation)
+                .filter(
+                    Operation.dataset_ref.in_([d.id for d in datasets]),
+                    Operation.state == OperationState.WORKING,
+                )
+                .all()
+            )
+            if working:
+                busy = sorted({o.dataset.name for o in working})
+                raise APIAbort(HTTPStatus.CONFLICT, f"Datasets {busy} are working")
+
+        job = BulkJob(self.temporary)
+        job.prune()
+        record = JobRecord(
+            id=job.id,
+            action=action,
+            user_id=str(user.id),
+            username=user.username,
+            created=time.time(),
+            access=access,
+            owner=owner,
+            datasets=[d.resource_id for d in datasets],
+        )
+
+        attributes = {"job": job.id}
+        if access:
+            attributes["access"] = access
+        if owner:
+            attributes["owner"] = owner
+        audits = [
+            Audit.build(
+                operation=OperationCode[action.upper()],
+                status=AuditStatus.BEGIN,
+                user=user,
+                name=action,
+                dataset=d,
+                attributes=attributes,
+            )
+            for d in datasets
+        ]
+        if audits:
+            Audit.add_all(audits)
+        record.audits = {a.object_id: a.id for a in audits}
+
+        component = context["attributes"].operation_name
+        sync = Sync(logger=current_app.logger, component=component)
+        try:
+            sync.update_all(datasets, OperationState.WORKING)
+        except Exception as e:
+            current_app.logger.warning(
+                "BULK {} unable to set {} operational state: '{}'",
+                job.id,
+                OperationState.WORKING.name,
+                e,
+            )
+            Audit.add_all(
+                [
+                    Audit.build(
+                        root=a,
+                        status=AuditStatus.FAILURE,
+                        reason=AuditReason.INTERNAL,
+                        attributes={"message": "Unable to set operational state"},
+                    )
+                    for a in audits
+                ]
+            )
+            raise APIAbort(HTTPStatus.CONFLICT, "Unable to set operational state")
+
+        record.tasks = self._plan(datasets)
+        for task in record.tasks:
+            self._start(record, task)
+        current_app.logger.info(
+            "BULK {} {} {} datasets by {} with {} tasks",
+            job.id,
+            action,
+            len(datasets),
+            user.username,
+            len(record.tasks),
+        )
+        with job.lock():
+            if all(t["completed"] for t in record.tasks):
+                self._finalize(record)
+            job.save(record)
+        if not record.done and self.poll > 0:
+            threading.Thread(
+                target=self._watch,
+                args=(current_app._get_current_object(), job),
+                daemon=True,
+            ).start()
+
+        response = jsonify(record.status())
+        host = self._get_uri_base(req).host
+        response.headers[
+            "location"
+        ] = f"{host}{current_app.server_config.rest_uri}/datasets/bulk/{job.id}"
+        response.status_code = HTTPStatus.OK if record.done else HTTPStatus.ACCEPTED
+        return response
+
+    def _post(self, params: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Start a bulk update of the access and/or owner of datasets
+
+        Args:
+            params: API parameters
+                Body parameters: datasets, filter, access, owner
+            req: the original Request object
+            context: API context dictionary
+
+        Returns:
+            The job status
+        """
+        return self._submit(params, req, context)
+
+    def _delete(self, params: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Start a bulk delete of datasets
+
+        Args:
+            params: API parameters
+                Body parameters: datasets, filter
+            req: the original Request object
+            context: API context dictionary
+
+        Returns:
+            The job status
+        """
+        return self._submit(params, req, context)
+
+    def _get(self, params: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Report the status of a bulk job, advancing it if its Elasticsearch
+        tasks have completed.
+
+        Only the user who submitted the job, or an administrator, can see it.
+
+        Args:
+            params: API parameters
+                URI parameters: job
+            req: the original Request object
+            context: API context dictionary
+
+        Raises:
+            APIAbort on failure
+
+        Returns:
+            The job status
+        """
+        user = self._user()
+        id = params.uri.get("job") if params.uri else None
+        if not id:
+            raise MissingParameters(["job"])
+        if not re.fullmatch(r"[0-9a-f]{32}", id):
+            raise APIAbort(HTTPStatus.NOT_FOUND, f"No bulk dataset job {id!r}")
+        job = BulkJob(self.temporary, id)
+        try:
+            record = job.load()
+            if record.user_id != str(user.id) and not user.is_admin():
+                raise APIAbort(
+                    HTTPStatus.FORBIDDEN,
+                    f"User {user.username} is not authorized to see job {id}",
+                )
+            record = self._advance(job)
+        except JobNotFound as e:
+            raise APIAbort(HTTPStatus.NOT_FOUND, str(e)) from e
+        return jsonify(record.status())
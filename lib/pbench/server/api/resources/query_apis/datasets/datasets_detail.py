@@ -1,4 +1,5 @@
 from http import HTTPStatus
+from typing import Optional
 
 from flask import jsonify, Response
 
@@ -28,6 +29,8 @@ class DatasetsDetail(IndexMapBase):
     Get detailed data from the run document for a dataset by name.
     """
 
+    CACHE_RESPONSES = True
+
     def __init__(self, config: PbenchServerConfig):
         super().__init__(
             config,
@@ -52,6 +55,32 @@ class DatasetsDetail(IndexMapBase):
             ),
         )
 
+    def preprocess(self, params: ApiParams, context: ApiContext):
+        """
+        Identify the dataset, and copy the client's metadata request to the
+        context for the postprocessor.
+
+        Args:
+            params: API parameter set
+            context: API context dictionary
+        """
+        super().preprocess(params, context)
+        context["metadata"] = params.query.get("metadata")
+
+    def cache_key(self, params: ApiParams, context: ApiContext) -> Optional[str]:
+        """
+        The requested server metadata is added by the postprocessor, so it
+        doesn't select a different Elasticsearch response.
+
+        Args:
+            params: API parameter set
+            context: API context dictionary
+
+        Returns:
+            A cache key
+        """
+        return super().cache_key(params._replace(query={}), context)
+
     def assemble(self, params: ApiParams, context: ApiContext) -> JSON:
         """
         Get details for a specific Pbench dataset which is either owned
@@ -69,14 +98,9 @@ class DatasetsDetail(IndexMapBase):
                     caller needs to see. (If not specified, no metadata will be
                     returned.)
 
-        context: Context passed from preprocess method: used to propagate the
-            requested set of metadata to the postprocess method.
+        context: Context passed from preprocess method
         """
         dataset = context["dataset"]
-
-        # Copy client's metadata request to CONTEXT for postprocessor
-        context["metadata"] = params.query.get("metadata")
-
         indices = self.get_index(dataset, "run-data")
 
         return {
@@ -107,7 +107,9 @@ class DatasetsMappings(ApiBase):
                         mappings["properties"][property]["properties"].keys()
                     )
 
-            # construct response object
-            return jsonify(result)
+            # construct response object, which the client can revalidate
+            response = jsonify(result)
+            response.add_etag()
+            return response.make_conditional(req)
         except TemplateNotFound as e:
             raise APIInternalError("Unexpected template error") from e
@@ -1,8 +1,9 @@
 from http import HTTPStatus
+from typing import Optional
 
 from flask import current_app, jsonify, Response
 
-from pbench.server import JSONOBJECT, OperationCode, PbenchServerConfig
+from pbench.server import JSON, JSONOBJECT, OperationCode, PbenchServerConfig
 from pbench.server.api.resources import (
     ApiAuthorizationType,
     APIInternalError,
@@ -27,6 +28,8 @@ class SampleNamespace(IndexMapBase):
     selecting for certain fields or certain values within those fields.
     """
 
+    CACHE_RESPONSES = True
+
     def __init__(self, config: PbenchServerConfig):
         super().__init__(
             config,
@@ -182,6 +185,7 @@ class SampleValues(IndexMapBase):
 
     DOCUMENT_SIZE = 10000  # Number of documents to return in one page
     SCROLL_EXPIRY = "1m"  # Scroll id expires in 1 minute
+    CACHE_RESPONSES = True
 
     def __init__(self, config: PbenchServerConfig):
         super().__init__(
@@ -206,6 +210,39 @@ class SampleValues(IndexMapBase):
             ),
         )
 
+    def cache_key(self, params: ApiParams, context: ApiContext) -> Optional[str]:
+        """
+        Scrolling to the next page of a query depends on the state of the
+        Elasticsearch scroll context, so only the first page can be cached.
+
+        Args:
+            params: Type-normalized client parameters
+            context: API context dictionary
+
+        Returns:
+            A cache key, or None for a scroll request
+        """
+        if params.body.get("scroll_id"):
+            return None
+        return super().cache_key(params, context)
+
+    def cacheable(self, es_json: JSON, context: ApiContext) -> bool:
+        """
+        A response with more documents than fit in one page is returned with
+        a scroll ID, which expires: so we cache only complete responses.
+
+        Args:
+            es_json: Elasticsearch Response payload
+            context: API context dictionary
+
+        Returns:
+            True if the response has no further pages
+        """
+        try:
+            return int(es_json["hits"]["total"]["value"]) <= self.DOCUMENT_SIZE
+        except (KeyError, TypeError, ValueError):
+            return False
+
     def assemble(self, params: ApiParams, context: ApiContext) -> JSONOBJECT:
         """
         Construct an Elasticsearch query which returns a list of data values
@@ -1,13 +1,18 @@
+import errno
 from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import quote
 
-from flask import Response
+from flask import current_app, jsonify, Response
 from flask.wrappers import Request
+from werkzeug.http import parse_content_range_header
 
-from pbench.server import PbenchServerConfig
+from pbench.server import JSONOBJECT, PbenchServerConfig
 from pbench.server.api.resources import (
     APIAbort,
     ApiAuthorizationType,
     ApiContext,
+    APIInternalError,
     ApiMethod,
     ApiParams,
     ApiSchema,
@@ -15,13 +20,61 @@ from pbench.server.api.resources import (
     ParamType,
     Schema,
 )
-from pbench.server.api.resources.intake_base import Access, Intake, IntakeBase
+from pbench.server.api.resources.intake_base import Access, Intake, IntakeBase, Received
+import pbench.server.auth.auth as Auth
 from pbench.server.database.models.audit import AuditType, OperationCode
-from pbench.server.database.models.datasets import Dataset
+from pbench.server.database.models.datasets import Dataset, DatasetNotFound
+from pbench.server.database.models.users import User
+from pbench.server.upload_session import (
+    BadRange,
+    SessionIncomplete,
+    SessionMismatch,
+    SessionNotFound,
+    SessionRecord,
+    UploadSession,
+)
+
+
+def authenticated_user() -> User:
+    """Identify the authenticated user
+
+    Raises:
+        APIAbort with UNAUTHORIZED if the client isn't authenticated
+
+    Returns:
+        The authenticated User
+    """
+    user = Auth.token_auth.current_user()
+    if not user:
+        raise APIAbort(HTTPStatus.UNAUTHORIZED, "Verifying user_id failed")
+    return user
+
+
+def session_status(record: SessionRecord) -> JSONOBJECT:
+    """Describe the state of a resumable upload session
+
+    Args:
+        record: The session record
+
+    Returns:
+        A JSON object describing the session
+    """
+    return {
+        "name": record.name,
+        "resource_id": record.md5,
+        "length": record.length,
+        "received": record.received,
+        "missing": record.missing,
+    }
 
 
 class Upload(IntakeBase):
-    """Accept a dataset from a client"""
+    """Accept a dataset from a client
+
+    A PUT uploads the entire tarball in a single request; a POST initiates
+    (or resumes) a resumable upload session, which is continued through the
+    ResumableUpload API.
+    """
 
     def __init__(self, config: PbenchServerConfig):
         super().__init__(
@@ -40,6 +93,21 @@ class Upload(IntakeBase):
                 audit_name="upload",
                 authorization=ApiAuthorizationType.NONE,
             ),
+            ApiSchema(
+                ApiMethod.POST,
+                OperationCode.CREATE,
+                uri_schema=Schema(Parameter("filename", ParamType.STRING)),
+                query_schema=Schema(
+                    Parameter("access", ParamType.ACCESS),
+                    Parameter("length", ParamType.INT, required=True),
+                    Parameter(
+                        "metadata", ParamType.LIST, element_type=ParamType.STRING
+                    ),
+                ),
+                audit_type=AuditType.NONE,
+                audit_name="upload",
+                authorization=ApiAuthorizationType.NONE,
+            ),
         )
 
     def _identify(self, args: ApiParams, request: Request) -> Intake:
@@ -117,3 +185,325 @@ class Upload(IntakeBase):
     def _put(self, args: ApiParams, req: Request, context: ApiContext) -> Response:
         """Launch the upload operation from an HTTP PUT"""
         return self._intake(args, req, context)
+
+    def _post(self, args: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Initiate or resume a resumable upload session
+
+        POST /api/v1/upload/<filename>?length=<length>
+
+        The "Content-MD5" header and the "access" and "metadata" query
+        parameters are the same as for a PUT, and are validated here so that
+        we can fail before any data is sent. The tarball chunks are then sent
+        to the URI returned in the "location" header.
+
+        If a session for the same tarball already exists, it's returned so
+        that the client can resume sending the missing byte ranges. Sessions
+        which have been abandoned are removed.
+
+        Args:
+            args: API parameters
+                URI parameters: filename
+                Query parameters: tarball length, desired access and metadata
+            req: The original Request object containing query parameters
+            context: API context dictionary (not used by this function)
+
+        Raises:
+            APIAbort on failure
+
+        Returns:
+            201 (CREATED) for a new session or 200 (OK) for an existing
+            session, with the session status; or 200 (OK) if the dataset
+            already exists.
+        """
+        user = authenticated_user()
+        intake = self._identify(args, req)
+        self.check_filename(intake.name)
+        self.process_metadata(intake.metadata)
+        length = args.query["length"]
+        if length <= 0:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST, f"Length {length} must be greater than 0"
+            )
+
+        try:
+            Dataset.query(resource_id=intake.md5)
+        except DatasetNotFound:
+            pass
+        else:
+            return jsonify(
+                {
+                    "message": "Dataset already exists",
+                    "name": Dataset.stem(intake.name),
+                    "resource_id": intake.md5,
+                }
+            )
+
+        if (self.temporary / intake.md5).exists():
+            raise APIAbort(HTTPStatus.CONFLICT, "Dataset is currently being uploaded")
+
+        UploadSession.prune(self.temporary)
+        session = UploadSession(self.temporary, intake.md5)
+        try:
+            record, created = session.create(
+                intake.name, length, intake.access, intake.metadata, user.id
+            )
+        except SessionMismatch as e:
+            raise APIAbort(HTTPStatus.CONFLICT, str(e)) from e
+        current_app.logger.info(
+            "UPLOAD session {} {} {} for {}, {} bytes missing",
+            "created" if created else "resumed",
+            intake.md5,
+            intake.name,
+            user.username,
+            record.length - sum(e - s for s, e in record.received),
+        )
+        response = jsonify(session_status(record))
+        host = self._get_uri_base(req).host
+        response.headers["location"] = (
+            f"{host}{current_app.server_config.rest_uri}"
+            f"/upload/{quote(intake.name)}/{intake.md5}"
+        )
+        response.status_code = HTTPStatus.CREATED if created else HTTPStatus.OK
+        return response
+
+
+class ResumableUpload(IntakeBase):
+    """Continue a resumable upload session
+
+    GET reports the byte ranges received so far; PUT writes a chunk of the
+    tarball at the offset given by the "Content-Range" header; POST finalizes
+    the session, verifying the MD5 and creating the dataset as for a single
+    PUT upload; and DELETE abandons the session.
+    """
+
+    def __init__(self, config: PbenchServerConfig):
+        uri_schema = Schema(
+            Parameter("filename", ParamType.STRING),
+            Parameter("resource_id", ParamType.STRING),
+        )
+        super().__init__(
+            config,
+            ApiSchema(
+                ApiMethod.POST,
+                OperationCode.CREATE,
+                uri_schema=uri_schema,
+                audit_type=AuditType.NONE,
+                audit_name="upload",
+                authorization=ApiAuthorizationType.NONE,
+            ),
+            ApiSchema(
+                ApiMethod.GET,
+                OperationCode.READ,
+                uri_schema=uri_schema,
+                authorization=ApiAuthorizationType.NONE,
+            ),
+            ApiSchema(
+                ApiMethod.PUT,
+                OperationCode.UPDATE,
+                uri_schema=uri_schema,
+                authorization=ApiAuthorizationType.NONE,
+            ),
+            ApiSchema(
+                ApiMethod.DELETE,
+                OperationCode.DELETE,
+                uri_schema=uri_schema,
+                authorization=ApiAuthorizationType.NONE,
+            ),
+        )
+
+    def _session(self, args: ApiParams) -> tuple[UploadSession, SessionRecord]:
+        """Find the session, and check that the client owns it
+
+        Args:
+            args: API parameters
+                URI parameters: filename and resource_id
+
+        Raises:
+            APIAbort on failure
+
+        Returns:
+            The upload session and its record
+        """
+        user = authenticated_user()
+        session = UploadSession(self.temporary, args.uri["resource_id"])
+        try:
+            record = session.load()
+        except SessionNotFound as e:
+            raise APIAbort(HTTPStatus.NOT_FOUND, str(e)) from e
+        if record.user_id != user.id:
+            raise APIAbort(
+                HTTPStatus.FORBIDDEN,
+                f"User {user.username} is not authorized to upload {record.name!r}",
+            )
+        if record.name != args.uri["filename"]:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"Upload session {record.md5!r} is for {record.name!r}",
+            )
+        return session, record
+
+    def _identify(self, args: ApiParams, request: Request) -> Intake:
+        """Identify the tarball from the upload session record
+
+        Args:
+            args: API parameters
+                URI parameters: filename and resource_id
+            request: The original Request object (not used by this function)
+
+        Returns:
+            An Intake object capturing the critical information
+
+        Raises:
+            APIAbort on failure
+        """
+        _, record = self._session(args)
+        return Intake(record.name, record.md5, record.access, record.metadata, uri=None)
+
+    def _reserve(self, intake: Intake) -> Path:
+        """Link the completed tarball into a private intake directory
+
+        The session is kept until the dataset has been created (see
+        _cleanup), so a failure doesn't discard the chunks received.
+
+        Args:
+            intake: The Intake parameters produced by _identify
+
+        Raises:
+            APIAbort on failure
+
+        Returns:
+            The intake directory path
+        """
+        session = UploadSession(self.temporary, intake.md5)
+        try:
+            session.finalize(self.temporary / intake.md5)
+        except SessionNotFound as e:
+            raise APIAbort(HTTPStatus.NOT_FOUND, str(e)) from e
+        except SessionIncomplete as e:
+            raise APIAbort(HTTPStatus.BAD_REQUEST, str(e)) from e
+        except FileExistsError as e:
+            raise APIAbort(
+                HTTPStatus.CONFLICT, "Dataset is currently being uploaded"
+            ) from e
+        return self.temporary / intake.md5
+
+    def _receive(self, intake: Intake, request: Request, tarball: Path) -> Received:
+        """Verify the MD5 of the assembled tarball
+
+        Most of the tarball has normally been hashed already as the chunks
+        arrived, so we only need to hash the remainder.
+
+        Args:
+            intake: The Intake parameters produced by _identify
+            request: The Flask request object (not used by this function)
+            tarball: The path of the tarball in the intake directory
+
+        Raises:
+            APIAbort if the MD5 doesn't match, in which case the session is
+            discarded, as the client will have to send the tarball again
+
+        Returns:
+            The length of the tarball (the cache manager reads the metadata
+            and builds the member index from the tarball file)
+        """
+        session = UploadSession(self.temporary, intake.md5)
+        try:
+            md5, hashed = session.digest(tarball)
+            length = tarball.stat().st_size
+        except Exception as e:
+            raise APIInternalError(f"Unable to verify MD5 of {tarball.name}") from e
+        current_app.logger.info(
+            "UPLOAD session {} hashed {} of {} bytes as they arrived",
+            intake.md5,
+            hashed,
+            length,
+        )
+        if md5 != intake.md5:
+            session.remove()
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"MD5 checksum {md5} does not match expected {intake.md5}",
+            )
+        return Received(length)
+
+    def _cleanup(self, args: ApiParams, intake: Intake, notes: list[str]):
+        """Remove the session once the dataset has been created
+
+        Args:
+            args: API parameters (not used by this function)
+            intake: The Intake parameters produced by _identify
+            notes: A list of error strings to report problems (not used by
+                this function)
+        """
+        UploadSession(self.temporary, intake.md5).remove()
+
+    def _get(self, args: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Report the byte ranges received
+
+        GET /api/v1/upload/<filename>/<resource_id>
+        """
+        _, record = self._session(args)
+        return jsonify(session_status(record))
+
+    def _put(self, args: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Write a chunk of the tarball
+
+        PUT /api/v1/upload/<filename>/<resource_id>
+
+        The "Content-Range" header (e.g., "bytes 0-1048575/4194304") gives the
+        offset of the chunk, which is the request payload. Chunks may be sent
+        in any order, in parallel, and may be resent.
+        """
+        session, record = self._session(args)
+        content_range = parse_content_range_header(req.headers.get("Content-Range"))
+        if not content_range or content_range.units != "bytes":
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                "Missing or invalid 'Content-Range' header",
+            )
+        if content_range.length != record.length:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"'Content-Range' length {content_range.length} doesn't match "
+                f"the upload length {record.length}",
+            )
+        count = content_range.stop - content_range.start
+        if req.content_length != count:
+            raise APIAbort(
+                HTTPStatus.BAD_REQUEST,
+                f"'Content-Length' {req.content_length} doesn't match "
+                f"'Content-Range' length {count}",
+            )
+        try:
+            record = session.write(content_range.start, req.stream, count)
+        except SessionNotFound as e:
+            raise APIAbort(HTTPStatus.NOT_FOUND, str(e)) from e
+        except BadRange as e:
+            raise APIAbort(HTTPStatus.BAD_REQUEST, str(e)) from e
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise APIAbort(HTTPStatus.INSUFFICIENT_STORAGE, "Out of space")
+            raise APIInternalError(
+                f"Unexpected error encountered during chunk upload: {str(e)!r}"
+            ) from e
+        return jsonify(session_status(record))
+
+    def _post(self, args: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Finalize the session, and create the dataset
+
+        POST /api/v1/upload/<filename>/<resource_id>
+
+        An MD5 mismatch discards the session; any other failure keeps it, so
+        that the client can try again to finalize it.
+        """
+        return self._intake(args, req, context)
+
+    def _delete(self, args: ApiParams, req: Request, context: ApiContext) -> Response:
+        """Abandon the session
+
+        DELETE /api/v1/upload/<filename>/<resource_id>
+        """
+        session, record = self._session(args)
+        session.remove()
+        current_app.logger.info("UPLOAD session {} abandoned", record.md5)
+        return "deleted", HTTPStatus.OK
@@ -1,21 +1,148 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
 from http import HTTPStatus
+import threading
+import time
 from typing import Optional
 
 from flask import current_app, Flask, request
 from flask_httpauth import HTTPTokenAuth
 from flask_restful import abort
 from jwt import ExpiredSignatureError
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.exceptions import Unauthorized
 
 from pbench.server import PbenchServerConfig
 from pbench.server.auth import OpenIDClient
+from pbench.server.database.database import Database
 from pbench.server.database.models.api_keys import APIKey
 from pbench.server.database.models.users import Roles, User, UserDuplicate
 
+
+@dataclass
+class CachedIdentity:
+    """The user identity of a verified authorization token.
+
+    Fields:
+        expiration: the time at which the cached identity expires
+        user_id: the user ID
+        username: the username
+        roles: the user's roles
+    """
+
+    expiration: float
+    user_id: str
+    username: str
+    roles: list[str]
+
+    def user(self) -> User:
+        """Construct the User object for the identity without a database
+        query.
+
+        Returns:
+            A User object in the current database session
+        """
+        user = User(id=self.user_id, username=self.username, roles=self.roles)
+        make_transient_to_detached(user)
+        return Database.db_session.merge(user, load=False)
+
+
+class TokenCache:
+    """A cache of verified authorization tokens.
+
+    Verifying a token requires an API key query and, for an OIDC token, a
+    signature check and a User query. A verified token's user identity is
+    cached, by a hash of the token, until the token expires or the cache
+    lifetime passes, whichever is sooner. As we don't notice when an API key
+    is deleted by another server process, the lifetime should be short.
+    """
+
+    # The maximum number of cached tokens
+    SIZE = 1024
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, CachedIdentity] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        """Identify a token without keeping the token itself
+
+        Args:
+            token: The authorization token
+
+        Returns:
+            A cache key for the token
+        """
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[CachedIdentity]:
+        """Find the cached identity of a token
+
+        Args:
+            token: The authorization token
+
+        Returns:
+            The cached identity, or None if there's no valid identity
+        """
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry.expiration <= time.time():
+                del self.entries[key]
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, token: str, user: User, expiration: float):
+        """Cache the identity of a verified token
+
+        Args:
+            token: The authorization token
+            user: The token's user
+            expiration: The time at which the cached identity expires
+        """
+        if expiration <= time.time():
+            return
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = CachedIdentity(
+                expiration, user.id, user.username, user.roles
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.SIZE:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """Discard the cached identity of a token
+
+        Args:
+            token: The authorization token
+        """
+        with self.lock:
+            self.entries.pop(self.key(token), None)
+
+    def clear(self):
+        """Discard all cached identities and reset the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
 # Module public
 token_auth = HTTPTokenAuth("Bearer")
 oidc_client: Optional[OpenIDClient] = None
 
+"""The cache of verified tokens shared by all requests"""
+TOKEN_CACHE = TokenCache()
+
 
 def setup_app(app: Flask, server_config: PbenchServerConfig):
     """Setup the given Flask app from the given Pbench Server configuration
@@ -139,7 +266,11 @@ def verify_auth_oidc(auth_token: str) -> Optional[User]:
 
     If the token is not an API key (which requires a cached user identity)
     we'll create or update a User record so we can translate the user UUID to
-    a username.
+    a username. The User record is written only when the token's username or
+    roles differ from it.
+
+    The identity of a verified token is cached (see TokenCache) for the
+    configured "token-cache-lifetime", or until the token expires.
 
     Args:
         auth_token : Token to authenticate
@@ -147,8 +278,19 @@ def verify_auth_oidc(auth_token: str) -> Optional[User]:
     Returns:
         User object if the verification succeeds, None on failure.
     """
+    cached = TOKEN_CACHE.get(auth_token)
+    if cached:
+        return cached.user()
+
+    current_app.logger.debug(
+        "Token cache miss ({} hits, {} misses)", TOKEN_CACHE.hits, TOKEN_CACHE.misses
+    )
+    expiration = time.time() + current_app.server_config.getint(
+        "pbench-server", "token-cache-lifetime", fallback=60
+    )
     user = verify_auth_api_key(auth_token)
     if user:
+        TOKEN_CACHE.put(auth_token, user, expiration)
         return user
 
     # If it's not an API key, try decoding it as an OIDC token.
@@ -181,6 +323,9 @@ def verify_auth_oidc(auth_token: str) -> Optional[User]:
                 "provider. Please report this problem to a system "
                 "administrator."
             )
-    else:
+    elif user.username != username or user.roles != roles:
         user.update(username=username, roles=roles)
+    TOKEN_CACHE.put(
+        auth_token, user, min(expiration, float(token_payload.get("exp", expiration)))
+    )
     return user
@@ -0,0 +1,170 @@
+"""Persistent state of bulk dataset update and delete jobs.
+
+A bulk job updates the access or owner of, or deletes, a set of datasets. The
+Elasticsearch work is submitted as a few asynchronous `_update_by_query` or
+`_delete_by_query` tasks, each covering many datasets; the job is complete
+when all of its tasks are complete, and is then finalized by updating or
+deleting the SQL rows of the datasets.
+
+Each job is kept as a "<id>.json" record in a "bulk" directory under the
+intake TEMPORARY directory, so that any server process can report or advance
+it, with a "<id>.lock" file which serializes updates to the record.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import time
+from typing import Optional
+import uuid
+
+from pbench.server import JSONOBJECT
+from pbench.server.cache_manager import LockManager
+from pbench.server.cache_policy import load_record, save_record
+
+
+class JobNotFound(Exception):
+    def __init__(self, id: str):
+        self.id = id
+
+    def __str__(self) -> str:
+        return f"No bulk dataset job {self.id!r}"
+
+
+@dataclass
+class JobRecord:
+    """The persistent state of a bulk job.
+
+    Each task is a JSON object with the Elasticsearch task "id" (empty if the
+    task couldn't be submitted), the "indices" and "datasets" (resource IDs)
+    it covers, whether it's "completed", its "results" and any "error".
+
+    Fields:
+        id: the job ID
+        action: "update" or "delete"
+        user_id: the ID of the user who submitted the job
+        username: the name of the user who submitted the job
+        created: the time the job was submitted
+        access: the new access of the datasets, for an update
+        owner: the ID of the new owner of the datasets, for an update
+        datasets: the resource IDs of the datasets
+        audits: the ID of the BEGIN audit record of each dataset
+        tasks: the Elasticsearch tasks
+        state: "running" until all tasks are complete and the job has been
+            finalized, then "done"
+        failed: the resource IDs of the datasets which couldn't be updated
+            or deleted
+    """
+
+    id: str = ""
+    action: str = ""
+    user_id: str = ""
+    username: str = ""
+    created: float = 0.0
+    access: Optional[str] = None
+    owner: Optional[str] = None
+    datasets: list[str] = field(default_factory=list)
+    audits: dict[str, int] = field(default_factory=dict)
+    tasks: list[JSONOBJECT] = field(default_factory=list)
+    state: str = "running"
+    failed: list[str] = field(default_factory=list)
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+    def results(self) -> JSONOBJECT:
+        """Summarize the Elasticsearch task results"""
+        fields = ("deleted", "updated", "total", "version_conflicts", "failures")
+        results = {f: 0 for f in fields}
+        for task in self.tasks:
+            for f in fields:
+                results[f] += task.get("results", {}).get(f, 0)
+        return results
+
+    def status(self) -> JSONOBJECT:
+        """Describe the job for a client"""
+        return {
+            "job": self.id,
+            "action": self.action,
+            "state": self.state,
+            "datasets": len(self.datasets),
+            "tasks": {
+                "total": len(self.tasks),
+                "completed": sum(1 for t in self.tasks if t["completed"]),
+            },
+            "results": self.results(),
+            "failed": self.failed,
+        }
+
+
+class BulkJob:
+    """Manage the on-disk state of a bulk job."""
+
+    DIRECTORY = "bulk"
+    SUFFIX = ".json"
+    LOCK_SUFFIX = ".lock"
+
+    # Remove completed job records after a day
+    LIFETIME = 24 * 60 * 60
+
+    def __init__(self, temporary: Path, id: Optional[str] = None):
+        """Identify a bulk job
+
+        Args:
+            temporary: the intake temporary directory
+            id: the job ID, or None to allocate a new one
+        """
+        self.directory = temporary / self.DIRECTORY
+        self.id = id if id else uuid.uuid4().hex
+        self.path = self.directory / f"{self.id}{self.SUFFIX}"
+        self.lock_path = self.directory / f"{self.id}{self.LOCK_SUFFIX}"
+
+    def lock(self) -> LockManager:
+        """Serialize updates to the job record across server processes"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return LockManager(self.lock_path, exclusive=True)
+
+    def load(self) -> JobRecord:
+        """Load the job record
+
+        Raises:
+            JobNotFound: there's no such job
+
+        Returns:
+            the job record
+        """
+        record = load_record(JobRecord, self.path)
+        if record.id != self.id:
+            raise JobNotFound(self.id)
+        return record
+
+    def save(self, record: JobRecord):
+        """Save the job record
+
+        Args:
+            record: the job record
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        save_record(record, self.path)
+
+    def prune(self) -> int:
+        """Remove the records of jobs completed more than a day ago
+
+        Returns:
+            the number of job records removed
+        """
+        removed = 0
+        if not self.directory.is_dir():
+            return removed
+        expired = time.time() - self.LIFETIME
+        for path in self.directory.glob(f"*{self.SUFFIX}"):
+            job = BulkJob(self.directory.parent, path.stem)
+            try:
+                if path.stat().st_mtime > expired or not job.load().done:
+                    continue
+            except (FileNotFoundError, JobNotFound):
+                continue
+            path.unlink(missing_ok=True)
+            job.lock_path.unlink(missing_ok=True)
+            removed += 1
+        return removed
@@ -4,26 +4,45 @@ from datetime import datetime
 from enum import auto, Enum
 import errno
 import fcntl
+import json
 from logging import Logger
+import lzma
 import math
+import mmap
+import os
 from pathlib import Path
+import posixpath
 import shlex
 import shutil
 import subprocess
+import tarfile
+import threading
 import time
-from typing import Any, IO, Optional, Union
+from typing import Any, IO, Iterable, Iterator, Optional, Union
 
 import humanize
 
 from pbench.common import MetadataLog, selinux
+from pbench.common.exceptions import UnsupportedTarballFormat
 from pbench.server import JSONOBJECT, OperationCode, PathLike, PbenchServerConfig
+from pbench.server.cache_policy import (
+    AccessRecord,
+    CacheEntry,
+    get_policy,
+    ReclaimState,
+)
 from pbench.server.database.models.audit import Audit, AuditStatus, AuditType
 from pbench.server.database.models.datasets import Dataset, DatasetNotFound, Metadata
+from pbench.server.tarball_index import TarballIndex
 from pbench.server.utils import get_tarball_md5
 
-RECLAIM_BYTES_PAD = 1024  # Pad unpack reclaim requests by this much
 MB_BYTES = 1024 * 1024  # Bytes in Mb
 
+# Permission bits of unpacked tarball members we never set, as `tar -x` by an
+# ordinary user with the usual umask would: the set-ID and sticky bits, and
+# group and other write permission.
+UNPACK_MODE_MASK = 0o7022
+
 
 class CacheManagerError(Exception):
     """Base class for exceptions raised from this module."""
@@ -101,6 +120,15 @@ class TarballUnpackError(CacheManagerError):
         self.error = error
 
 
+class TarballFormatError(TarballUnpackError, UnsupportedTarballFormat):
+    """A tarball member is outside the dataset's top level directory.
+
+    This is also an UnsupportedTarballFormat, as the indexer reports it.
+    """
+
+    pass
+
+
 class TarballModeChangeError(CacheManagerError):
     """An error occurred trying to fix unpacked tarball permissions."""
 
@@ -133,6 +161,7 @@ class CacheObject:
         resolve_type: type of File/Directory after resolution
         size: size of the File
         type: type of the File/Directory/Symlink
+        mode: permissions recorded in the tarball, if known
     """
 
     name: str
@@ -141,6 +170,7 @@ class CacheObject:
     resolve_type: Optional[CacheType]
     size: Optional[int]
     type: CacheType
+    mode: Optional[int] = None
 
     @classmethod
     def create(cls, root: Path, path: Path) -> "CacheObject":
@@ -201,6 +231,275 @@ CacheMapEntry = dict[str, Union[CacheObject, "CacheMap"]]
 CacheMap = dict[str, CacheMapEntry]
 
 
+class CacheMapFile:
+    """A persistent, memory-mapped representation of a cache map.
+
+    Building the cache map requires a walk of the entire unpacked tree, with
+    several system calls per entry, so we save it in a file alongside the
+    unpacked tree. Any process can then find an entry by mapping the file and
+    decoding only the records it needs, without walking the tree or even
+    loading the full map.
+
+    The file begins with a header line identifying the unpacked root
+    directory it describes, followed by a record line for each entry in the
+    tree:
+
+        <parent>\x1f<name>\x1f[<type>, <size>, <resolve_type>, <resolve_path>, <mode>]
+
+    Each field is JSON encoded, which guarantees that it contains no control
+    characters, and the records are sorted; so the records for an entry's
+    children are contiguous, and any record can be found with a binary
+    search. The root directory has the empty string as both parent and name.
+    """
+
+    MAGIC = b"pbench-cachemap 2"
+    SEP = b"\x1f"
+
+    def __init__(self, path: Path, data: mmap.mmap, start: int):
+        """Construct a CacheMapFile; see open().
+
+        Args:
+            path: the path of the cache map file
+            data: the memory-mapped file
+            start: the offset of the first record
+        """
+        self.path = path
+        self.data = data
+        self.start = start
+
+    @staticmethod
+    def _header(root: Path) -> bytes:
+        """Identify a specific instance of an unpacked directory tree.
+
+        Args:
+            root: the root of the unpacked tree
+
+        Returns:
+            the cache map file header line
+        """
+        st = root.stat()
+        return b"%s %d %d %d\n" % (
+            __class__.MAGIC,
+            st.st_dev,
+            st.st_ino,
+            st.st_mtime_ns,
+        )
+
+    @staticmethod
+    def _key(parent: str, name: Optional[str] = None) -> bytes:
+        """Encode the sortable key of a record.
+
+        Args:
+            parent: the location of the entry's parent directory
+            name: the entry name, or None to match all children of the parent
+
+        Returns:
+            the encoded record key or key prefix
+        """
+        key = json.dumps(parent).encode() + __class__.SEP
+        if name is not None:
+            key += json.dumps(name).encode() + __class__.SEP
+        return key
+
+    @staticmethod
+    def write(path: Path, root: Path, cmap: CacheMapEntry):
+        """Save a cache map to a file.
+
+        The file is replaced atomically, so that concurrent readers see either
+        the old or the new version.
+
+        Args:
+            path: the path of the cache map file
+            root: the root of the unpacked tree
+            cmap: the root entry of the cache map
+        """
+        records = []
+
+        def encode(parent: str, entry: CacheMapEntry):
+            d: CacheObject = entry["details"]
+            records.append(
+                __class__._key(parent, d.name)
+                + json.dumps(
+                    [
+                        d.type.name,
+                        d.size,
+                        d.resolve_type.name if d.resolve_type else None,
+                        str(d.resolve_path) if d.resolve_path else None,
+                        d.mode,
+                    ]
+                ).encode()
+            )
+            for child in entry.get("children", {}).values():
+                encode(str(d.location), child)
+
+        encode("", cmap)
+        records.sort()
+        temp = path.with_name(f".{path.name}.{os.getpid()}")
+        try:
+            with temp.open("wb") as f:
+                f.write(__class__._header(root))
+                for record in records:
+                    f.write(record)
+                    f.write(b"\n")
+            temp.replace(path)
+        finally:
+            temp.unlink(missing_ok=True)
+
+    @classmethod
+    def open(cls, path: Path, root: Path) -> Optional["CacheMapFile"]:
+        """Map a cache map file, if it describes the unpacked tree.
+
+        A map file that doesn't match the current unpacked tree is stale, and
+        is removed.
+
+        Args:
+            path: the path of the cache map file
+            root: the root of the unpacked tree
+
+        Returns:
+            a CacheMapFile, or None if there's no valid map file
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            data = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped
+            data = None
+        finally:
+            os.close(fd)
+        try:
+            header = cls._header(root)
+        except FileNotFoundError:
+            header = None
+        if not data or not header or data[: len(header)] != header:
+            if data:
+                data.close()
+            path.unlink(missing_ok=True)
+            return None
+        return cls(path, data, len(header))
+
+    def close(self):
+        """Unmap the file."""
+        self.data.close()
+
+    def _seek(self, key: bytes) -> int:
+        """Find the first record which sorts at or after a key.
+
+        Args:
+            key: an encoded key or key prefix
+
+        Returns:
+            the offset of the record, or the file size if none
+        """
+        data = self.data
+        lo, hi = self.start, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b"\n", lo, mid) + 1 or lo
+            end = data.find(b"\n", start) + 1
+            if data[start:end] < key:
+                lo = end
+            else:
+                hi = start
+        return lo
+
+    def _records(self, prefix: bytes) -> Iterator[bytes]:
+        """Iterate through the records beginning with a key prefix.
+
+        Args:
+            prefix: an encoded key or key prefix
+
+        Returns:
+            a generator of the record lines
+        """
+        data = self.data
+        offset = self._seek(prefix)
+        while data[offset : offset + len(prefix)] == prefix:
+            end = data.find(b"\n", offset)
+            yield data[offset:end]
+            offset = end + 1
+
+    @staticmethod
+    def _details(record: bytes) -> CacheObject:
+        """Decode a cache map record.
+
+        Args:
+            record: the record line
+
+        Returns:
+            the CacheObject described by the record
+        """
+        parent, name, value = (json.loads(f) for f in record.split(__class__.SEP))
+        ftype, size, resolve_type, resolve_path, mode = value
+        return CacheObject(
+            name=name,
+            location=Path(parent, name) if parent else Path("."),
+            resolve_path=Path(resolve_path) if resolve_path is not None else None,
+            resolve_type=CacheType[resolve_type] if resolve_type else None,
+            size=size,
+            type=CacheType[ftype],
+            mode=mode,
+        )
+
+    def modes(self) -> dict[str, int]:
+        """Collect the permissions recorded in the tarball
+
+        Returns:
+            the mode of each entry, by location, where it's known
+        """
+        modes = {}
+        for record in self.data[self.start :].splitlines():
+            details = self._details(record)
+            if details.mode is not None:
+                modes[str(details.location)] = details.mode
+        return modes
+
+    def find(self, path: Path) -> CacheMapEntry:
+        """Locate a node in the cache map
+
+        This is equivalent to Tarball.find_entry; only a directory's
+        immediate children are decoded, so their own entries have no
+        "children".
+
+        Args:
+            path: relative path of the subdirectory/file
+
+        Raises:
+            BadDirpath if the directory/file path doesn't correspond to an
+                entity within the tarball.
+
+        Returns:
+            cache map entry
+        """
+        parent = ""
+        name = ""
+        for i, part in enumerate(("",) + path.parts):
+            if i:
+                parent = "." if i == 1 else str(Path(*path.parts[: i - 1]))
+                name = part
+            record = next(self._records(self._key(parent, name)), None)
+            if record is None:
+                raise BadDirpath(
+                    f"Can't resolve path {str(path)!r}: component {part!r} is missing."
+                )
+            details = self._details(record)
+            if details.type is not CacheType.DIRECTORY and i < len(path.parts):
+                raise BadDirpath(
+                    f"Found a file {part!r} where a directory was expected in path {str(path)!r}"
+                )
+        entry: CacheMapEntry = {"details": details}
+        if details.type is CacheType.DIRECTORY:
+            children: CacheMap = {}
+            for record in self._records(self._key(str(details.location))):
+                child = self._details(record)
+                children[child.name] = {"details": child}
+            entry["children"] = children
+        return entry
+
+
 class LockRef:
     """Keep track of a cache lock passed off to a caller"""
 
@@ -472,6 +771,11 @@ class Tarball:
         # Record the path of the companion MD5 file
         self.md5_path: Path = path.with_suffix(".xz.md5")
 
+        # Record the path of the companion member index file, and the index
+        # when we've loaded it
+        self.index_path: Path = path.with_suffix(".xz.index")
+        self.index: Optional[TarballIndex] = None
+
         # Record where cached unpacked data would live
         self.cache: Path = controller.cache / self.resource_id
 
@@ -496,6 +800,11 @@ class Tarball:
         # timestamp
         self.last_ref: Path = self.cache / "last_ref"
 
+        # Record the path of the persistent cache map, and the mapped file
+        # when we've opened it
+        self.cachemap_path: Path = self.cache / "cachemap"
+        self.cachemap_file: Optional[CacheMapFile] = None
+
         # Record the path of the companion MD5 file
         self.md5_path: Path = path.with_suffix(".xz.md5")
 
@@ -505,6 +814,14 @@ class Tarball:
         # Cache results metadata when it's been processed
         self.metadata: Optional[JSONOBJECT] = None
 
+        # Serialize changes to the unpacked state between threads sharing the
+        # Tarball object. (The cache lock file only coordinates processes.)
+        self.mutex = threading.Lock()
+
+        # The inode and modification time of the unpacked tree when we last
+        # checked the unpacked state
+        self.unpacked_stamp: Optional[tuple[int, int]] = None
+
     def check_unpacked(self):
         """Determine whether a tarball has been unpacked.
 
@@ -514,6 +831,54 @@ class Tarball:
         if unpack.is_dir():
             self.unpacked = unpack
 
+    def get_unpacked_stamp(self) -> Optional[tuple[int, int]]:
+        """Identify the unpacked tree
+
+        Unpacking the tarball again creates a new root directory; and nothing
+        but unpacking changes the contents of the root directory, so its inode
+        and modification time identify the version of the unpacked tree.
+
+        Returns:
+            the inode and modification time in nanoseconds of the unpacked
+            tree, or None if it isn't unpacked
+        """
+        try:
+            st = (self.cache / self.name).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def revalidate(self) -> bool:
+        """Check that a long-lived Tarball still matches the on-disk state
+
+        Another process may have deleted the dataset, or unpacked or reclaimed
+        its cache, since we last looked. When the unpacked tree has changed,
+        we discard the cache map and check the unpacked state again.
+
+        We also refresh the Dataset, as the one we have may belong to the
+        database session of an earlier API call.
+
+        Returns:
+            False if the tarball no longer exists
+        """
+        if not self.tarball_path or not self.tarball_path.exists():
+            return False
+        with self.mutex:
+            stamp = self.get_unpacked_stamp()
+            if stamp != self.unpacked_stamp:
+                self.unpacked_stamp = stamp
+                self.unpacked = None
+                self.cachemap = None
+                if self.cachemap_file:
+                    self.cachemap_file.close()
+                    self.cachemap_file = None
+                self.check_unpacked()
+        try:
+            self.dataset = Dataset.query(resource_id=self.resource_id)
+        except DatasetNotFound:
+            self.dataset = None
+        return True
+
     # Most of the "operational" methods below this point should be called only
     # through Controller and/or CacheManager methods, in order to properly manage
     # aspects of the cache manager structure outside the scope of the Tarball.
@@ -639,8 +1004,12 @@ class Tarball:
         This must be called with the cache locked (shared lock is enough)
         and unpacked.
 
+        The map is also saved in the cache directory, so that other processes
+        (and later CacheManager instances) can use it without walking the
+        tree again.
+
         NOTE: this structure isn't removed when we release the cache, as the
-        data remains valid so long as the dataset exists.
+        data remains valid so long as the unpacked tree exists.
         """
         cmap: CacheMapEntry = {
             "details": CacheObject.create(self.unpacked, self.unpacked)
@@ -657,6 +1026,53 @@ class Tarball:
             parent_map["children"] = curr
 
         self.cachemap = cmap
+        try:
+            CacheMapFile.write(self.cachemap_path, self.unpacked, cmap)
+        except Exception as e:
+            self.controller.logger.warning(
+                "Unable to save cache map for {}: {}", self.name, e
+            )
+
+    def open_map(self) -> Optional[CacheMapFile]:
+        """Open the persistent cache map, if it's valid.
+
+        Returns:
+            the mapped cache map file, or None
+        """
+        if not self.cachemap_file and self.unpacked:
+            self.cachemap_file = CacheMapFile.open(self.cachemap_path, self.unpacked)
+        return self.cachemap_file
+
+    def get_modes(self) -> dict[str, int]:
+        """Get the permissions recorded in the tarball
+
+        The unpacked tree doesn't have all of them (see unpack), so they're
+        kept in the cache map. This must be called with the cache locked and
+        unpacked.
+
+        Returns:
+            the mode of each member, by location relative to the unpacked
+            root, where it's known
+        """
+        if not self.cachemap and self.open_map():
+            return self.cachemap_file.modes()
+        modes = {}
+        entries = deque((self.cachemap,) if self.cachemap else ())
+        while entries:
+            entry = entries.popleft()
+            details: CacheObject = entry["details"]
+            if details.mode is not None:
+                modes[str(details.location)] = details.mode
+            entries.extend(entry.get("children", {}).values())
+        return modes
+
+    def remove_map(self):
+        """Discard the cache map, including the persistent file."""
+        self.cachemap = None
+        if self.cachemap_file:
+            self.cachemap_file.close()
+            self.cachemap_file = None
+        self.cachemap_path.unlink(missing_ok=True)
 
     def find_entry(self, path: Path) -> CacheMapEntry:
         """Locate a node in the cache map
@@ -677,10 +1093,15 @@ class Tarball:
                 " we expect relative path to the root directory."
             )
 
-        if not self.cachemap:
+        if not self.cachemap and not self.open_map():
             with LockManager(self.lock) as lock:
                 self.get_results(lock)
 
+        # Prefer a map we've built in memory, but otherwise look up the entry
+        # in the persistent map without decoding the whole thing.
+        if not self.cachemap and self.cachemap_file:
+            return self.cachemap_file.find(path)
+
         if str(path) == ".":
             return self.cachemap
 
@@ -799,9 +1220,44 @@ class Tarball:
             tarball_path, f"Unexpected error from {tar_path}: {error_text!r}"
         )
 
+    def build_index(self, index: Optional[TarballIndex] = None):
+        """Index the tarball members for partial extraction.
+
+        This is done when a tarball is uploaded, so that we can extract single
+        files (for example, "metadata.log" or "result.csv") without unpacking
+        the entire tarball. Without an index, we'll fall back to unpacking, so
+        errors here are logged but otherwise ignored.
+
+        Args:
+            index: an index already built while the tarball was received;
+                otherwise we read the tarball to build one
+        """
+        try:
+            if not index:
+                index = TarballIndex.build(self.tarball_path)
+            index.save(self.index_path)
+        except Exception as e:
+            self.logger.warning("Unable to index members of {}: {}", self.name, e)
+
+    def load_index(self) -> Optional[TarballIndex]:
+        """Load the tarball member index, if it's valid.
+
+        Returns:
+            the member index, or None
+        """
+        if not self.index:
+            self.index = TarballIndex.load(self.index_path, self.tarball_path)
+        return self.index
+
     def get_inventory(self, path: str) -> dict[str, Any]:
         """Return a JSON description of a tarball member file.
 
+        If the tarball isn't already unpacked, we use the member index to find
+        a directory or regular file, and to extract only the file, without
+        locking or loading the cache. Anything else, including a path through
+        a symlinked directory or a path the index doesn't know, is resolved in
+        the unpacked tree.
+
         If "path" is a directory, release the cache lock and return the path
         and type.
 
@@ -830,18 +1286,33 @@ class Tarball:
                 "type": CacheType.FILE,
                 "stream": Inventory(self.tarball_path.open("rb")),
             }
-        else:
-            with LockManager(self.lock) as lock:
-                artifact: Path = self.get_results(lock) / path
-                if artifact.is_dir():
-                    stream = None
-                    type = CacheType.DIRECTORY
-                elif artifact.is_file():
-                    stream = Inventory(artifact.open("rb"), lock=lock.keep())
-                    type = CacheType.FILE
-                else:
-                    raise CacheExtractBadPath(self.tarball_path, path)
-            return {"name": path, "type": type, "stream": stream}
+
+        name = TarballIndex.normalize(f"{self.name}/{path}")
+        if name != self.name and not (name and name.startswith(f"{self.name}/")):
+            raise CacheExtractBadPath(self.tarball_path, path)
+
+        index = self.load_index() if not self.unpacked else None
+        if index:
+            member = index.members.get(name)
+            if member and member.kind == "dir":
+                return {"name": path, "type": CacheType.DIRECTORY, "stream": None}
+            elif member and member.kind == "file":
+                stream = Inventory(index.open(self.tarball_path, member))
+                return {"name": path, "type": CacheType.FILE, "stream": stream}
+            # Resolving links, or a path the index doesn't know, requires the
+            # unpacked tree
+
+        with LockManager(self.lock) as lock:
+            artifact: Path = self.get_results(lock) / name[len(self.name) + 1 :]
+            if artifact.is_dir():
+                stream = None
+                type = CacheType.DIRECTORY
+            elif artifact.is_file():
+                stream = Inventory(artifact.open("rb"), lock=lock.keep())
+                type = CacheType.FILE
+            else:
+                raise CacheExtractBadPath(self.tarball_path, path)
+        return {"name": path, "type": type, "stream": stream}
 
     @staticmethod
     def _get_metadata(tarball_path: Path) -> JSONOBJECT:
@@ -855,11 +1326,24 @@ class Tarball:
         """
         name = Dataset.stem(tarball_path)
         data = Tarball.extract(tarball_path, f"{name}/metadata.log")
+        try:
+            return Tarball.parse_metadata(e.decode() for e in data)
+        finally:
+            data.close()
+
+    @staticmethod
+    def parse_metadata(lines: Iterable[str]) -> JSONOBJECT:
+        """Parse the contents of a metadata.log file.
+
+        Args:
+            lines: the lines of the metadata.log file
+
+        Returns:
+            A JSON representation of the dataset `metadata.log`
+        """
         metadata_log = MetadataLog()
-        metadata_log.read_file(e.decode() for e in data)
-        data.close()
-        metadata = {s: dict(metadata_log.items(s)) for s in metadata_log.sections()}
-        return metadata
+        metadata_log.read_file(lines)
+        return {s: dict(metadata_log.items(s)) for s in metadata_log.sections()}
 
     @staticmethod
     def subprocess_run(
@@ -901,6 +1385,205 @@ class Tarball:
                     f"{cmd[0]} exited with status {process.returncode}:  {process.stderr.strip()!r}",
                 )
 
+    def unpack(self) -> JSONOBJECT:
+        """Unpack the tarball into the cache directory.
+
+        We stream the tarball through Python's lzma and tarfile modules, and
+        in the same pass make each file and directory readable by everyone,
+        add up the unpacked size, and build the cache map, rather than running
+        separate `tar`, `find ... chmod`, `du`, and directory walks over the
+        tree. Ownership isn't preserved, but permissions and times are, so that
+        the indexer can describe the members from the unpacked tree; those of
+        directories are restored only after their contents have been written.
+        The permissions recorded in the tarball are also saved in the cache
+        map, as we don't set them all.
+
+        Members with absolute paths, paths outside the dataset's top level
+        directory, or paths which traverse a symlink unpacked from the tarball
+        are rejected, as are hard links to anything else. Device and FIFO
+        members are ignored. We never set the bits of UNPACK_MODE_MASK.
+
+        This must be called with the cache locked exclusively.
+
+        Raises:
+            TarballFormatError if a member is outside the top level directory
+            TarballUnpackError if the tarball can't be unpacked
+            TarballModeChangeError if permissions can't be set
+
+        Returns:
+            statistics on the unpack for the audit record
+        """
+        beg = time.time()
+        root = self.cache / self.name
+        prefix = self.name + "/"
+        cmap: CacheMapEntry = {
+            "details": CacheObject(
+                name="",
+                location=Path("."),
+                resolve_path=None,
+                resolve_type=None,
+                size=None,
+                type=CacheType.DIRECTORY,
+            ),
+            "children": {},
+        }
+        links: set[str] = set()
+        unresolved: list[tuple[CacheMapEntry, Path, int]] = []
+        directories: list[tarfile.TarInfo] = []
+        size = 0
+        files = 0
+
+        def under_link(name: str) -> bool:
+            """Check whether a member name is, or is beneath, a symlink."""
+            while name:
+                if name in links:
+                    return True
+                name = posixpath.dirname(name)
+            return False
+
+        def map_entry(name: str) -> Optional[CacheMapEntry]:
+            """Find or create the map entry for a member, and its parents."""
+            if name == self.name:
+                return cmap
+            if not name.startswith(prefix):
+                return None
+            entry = cmap
+            location = Path(".")
+            for part in name[len(prefix) :].split("/"):
+                location /= part
+                children = entry.setdefault("children", {})
+                if part not in children:
+                    children[part] = {
+                        "details": CacheObject(
+                            name=part,
+                            location=location,
+                            resolve_path=None,
+                            resolve_type=None,
+                            size=None,
+                            type=CacheType.DIRECTORY,
+                        ),
+                        "children": {},
+                    }
+                entry = children[part]
+            return entry
+
+        try:
+            with lzma.open(self.tarball_path) as xz, tarfile.open(
+                fileobj=xz, mode="r|"
+            ) as tar:
+                for info in tar:
+                    name = TarballIndex.normalize(info.name)
+                    if not name or name == ".":
+                        raise TarballFormatError(
+                            self.tarball_path, f"unsafe member path {info.name!r}"
+                        )
+                    if name != self.name and not name.startswith(prefix):
+                        raise TarballFormatError(
+                            self.tarball_path,
+                            f"member {info.name!r} is outside {self.name!r}",
+                        )
+                    if under_link(posixpath.dirname(name)):
+                        raise TarballUnpackError(
+                            self.tarball_path,
+                            f"member {info.name!r} is beneath a symlink",
+                        )
+                    path = self.cache / name
+                    if info.isdir():
+                        path.mkdir(parents=True, exist_ok=True)
+                        directories.append(info)
+                        map_entry(name)["details"].mode = info.mode
+                        continue
+                    if not (info.isreg() or info.issym() or info.islnk()):
+                        continue
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    if path.is_symlink() or path.exists():
+                        path.unlink()
+                    if info.isreg():
+                        with path.open("wb") as f:
+                            shutil.copyfileobj(tar.extractfile(info), f, MB_BYTES)
+                        try:
+                            path.chmod((info.mode | 0o444) & ~UNPACK_MODE_MASK)
+                        except OSError as e:
+                            raise TarballModeChangeError(path, str(e)) from e
+                        os.utime(path, (info.mtime, info.mtime))
+                        size += info.size
+                        files += 1
+                    elif info.issym():
+                        path.symlink_to(info.linkname)
+                        os.utime(path, (info.mtime, info.mtime), follow_symlinks=False)
+                        links.add(name)
+                    else:
+                        target = TarballIndex.normalize(info.linkname)
+                        if (
+                            not target
+                            or not target.startswith(prefix)
+                            or under_link(target)
+                        ):
+                            raise TarballUnpackError(
+                                self.tarball_path,
+                                f"unsafe hard link {info.name!r} to {info.linkname!r}",
+                            )
+                        os.link(self.cache / target, path)
+                        files += 1
+                    entry = map_entry(name)
+                    if entry:
+                        entry.pop("children", None)
+                        if info.isreg():
+                            entry["details"] = CacheObject(
+                                name=path.name,
+                                location=path.relative_to(root),
+                                resolve_path=None,
+                                resolve_type=None,
+                                size=info.size,
+                                type=CacheType.FILE,
+                                mode=info.mode,
+                            )
+                        else:
+                            # Links are described once the whole tree exists,
+                            # as their targets may not have been unpacked yet.
+                            unresolved.append((entry, path, info.mode))
+
+            for info in reversed(directories):
+                path = self.cache / TarballIndex.normalize(info.name)
+                try:
+                    path.chmod((info.mode | 0o555) & ~UNPACK_MODE_MASK)
+                except OSError as e:
+                    raise TarballModeChangeError(path, str(e)) from e
+                os.utime(path, (info.mtime, info.mtime))
+        except CacheManagerError:
+            shutil.rmtree(root, ignore_errors=True)
+            raise
+        except (OSError, EOFError, lzma.LZMAError, tarfile.TarError) as e:
+            shutil.rmtree(root, ignore_errors=True)
+            raise TarballUnpackError(self.tarball_path, str(e)) from e
+
+        if not root.is_dir():
+            raise TarballUnpackError(
+                self.tarball_path, f"tarball doesn't contain {self.name!r}"
+            )
+
+        for entry, path, mode in unresolved:
+            entry["details"] = CacheObject.create(root, path)
+            entry["details"].mode = mode
+
+        self.unpacked = root
+        self.unpacked_size = size
+        self.cachemap = cmap
+        try:
+            CacheMapFile.write(self.cachemap_path, root, cmap)
+        except Exception as e:
+            self.controller.logger.warning(
+                "Unable to save cache map for {}: {}", self.name, e
+            )
+
+        elapsed = time.time() - beg
+        return {
+            "seconds": round(elapsed, 3),
+            "bytes": size,
+            "files": files,
+            "MB_per_second": round(size / MB_BYTES / elapsed, 2) if elapsed else 0,
+        }
+
     def get_unpacked_size(self) -> int:
         """Get the unpacked size of a dataset
 
@@ -943,84 +1626,124 @@ class Tarball:
             the root Path of the unpacked directory tree
         """
 
-        if not self.unpacked:
-            lock.upgrade()
-
-            # If necessary, attempt to reclaim some unused cache so we have
-            # enough room.
-            if self.controller and self.controller.cache_manager:
-                self.controller.cache_manager.reclaim_cache(
-                    goal_bytes=self.get_unpacked_size() + RECLAIM_BYTES_PAD
-                )
-
-            audit = None
-            error = None
-            try:
-                audit = Audit.create(
-                    name="cache",
-                    operation=OperationCode.CREATE,
-                    status=AuditStatus.BEGIN,
-                    user_name=Audit.BACKGROUND_USER,
-                    object_type=AuditType.DATASET,
-                    object_id=self.resource_id,
-                    object_name=self.name,
-                )
-            except Exception as e:
-                self.controller.logger.warning(
-                    "Unable to audit unpack for {}: '{}'", self.name, e
-                )
-
-            try:
-                tar_command = "tar -x --no-same-owner --delay-directory-restore "
-                tar_command += f"--force-local --file='{str(self.tarball_path)}'"
-                self.subprocess_run(
-                    tar_command, self.cache, TarballUnpackError, self.tarball_path
-                )
-                find_command = "find . ( -type d -exec chmod ugo+rx {} + ) -o ( -type f -exec chmod ugo+r {} + )"
-                self.subprocess_run(
-                    find_command, self.cache, TarballModeChangeError, self.cache
-                )
-                self.unpacked = self.cache / self.name
-            except Exception as e:
-                error = str(e)
-                raise
-            finally:
-                if audit:
-                    attributes = {"error": error} if error else {}
-                    Audit.create(
-                        root=audit,
-                        status=AuditStatus.FAILURE if error else AuditStatus.SUCCESS,
-                        attributes=attributes,
+        # Threads sharing this Tarball object must not unpack or map it at the
+        # same time: the cache lock doesn't exclude threads of one process.
+        with self.mutex:
+            size: Optional[int] = None
+            hit = bool(self.unpacked)
+            if not self.unpacked:
+                lock.upgrade()
+                self.remove_map()
+
+                audit = None
+                error = None
+                attributes = {}
+                try:
+                    audit = Audit.create(
+                        name="cache",
+                        operation=OperationCode.CREATE,
+                        status=AuditStatus.BEGIN,
+                        user_name=Audit.BACKGROUND_USER,
+                        object_type=AuditType.DATASET,
+                        object_id=self.resource_id,
+                        object_name=self.name,
+                    )
+                except Exception as e:
+                    self.controller.logger.warning(
+                        "Unable to audit unpack for {}: '{}'", self.name, e
                     )
-                lock.downgrade()
 
-        # Even if we have an unpacked directory, if it wasn't done under this
-        # CacheManager instance we may not have a cachemap, so be prepared to
-        # build one.
-        if not self.cachemap:
-            self.build_map()
+                try:
+                    attributes = self.unpack()
+                    size = attributes["bytes"]
+                except Exception as e:
+                    error = str(e)
+                    raise
+                finally:
+                    if audit:
+                        if error:
+                            attributes = {"error": error}
+                        Audit.create(
+                            root=audit,
+                            status=AuditStatus.FAILURE
+                            if error
+                            else AuditStatus.SUCCESS,
+                            attributes=attributes,
+                        )
+                    lock.downgrade()
+
+            # Even if we have an unpacked directory, if it wasn't done under
+            # this CacheManager instance we may not have a cachemap; use the
+            # persistent map if there is one, but be prepared to build one.
+            if not self.cachemap and not self.open_map():
+                self.build_map()
+            self.unpacked_stamp = self.get_unpacked_stamp()
 
         self.last_ref.touch(exist_ok=True)
 
-        # If we have a Dataset, and haven't already done this, compute the
-        # unpacked size and record it in metadata so we can use it later.
+        # If we have a Dataset, and haven't already done this, record the
+        # unpacked size in metadata so we can use it later. We count the size
+        # while unpacking, but a tree we didn't unpack must be measured.
         if self.dataset and not Metadata.getvalue(
             self.dataset, Metadata.SERVER_UNPACKED
         ):
             try:
-                process = subprocess.run(
-                    ["du", "-s", "-B1", str(self.unpacked)],
-                    capture_output=True,
-                    text=True,
-                )
-                if process.returncode == 0:
-                    size = int(process.stdout.split("\t", maxsplit=1)[0])
+                if size is None:
+                    process = subprocess.run(
+                        ["du", "-s", "-B1", str(self.unpacked)],
+                        capture_output=True,
+                        text=True,
+                    )
+                    if process.returncode == 0:
+                        size = int(process.stdout.split("\t", maxsplit=1)[0])
+                if size is not None:
                     self.unpacked_size = size
                     Metadata.setvalue(self.dataset, Metadata.SERVER_UNPACKED, size)
             except Exception as e:
                 self.logger.warning("usage check failed: {}", e)
+
+        self.record_access(hit, size)
+
+        # If unpacking took the cache over its high watermark, start reclaiming
+        # space ahead of the next unpack.
+        if not hit and self.controller.cache_manager:
+            self.controller.cache_manager.start_reclaimer()
         return self.unpacked
 
+    def record_access(self, hit: bool, size: Optional[int] = None):
+        """Record a reference to the cached dataset
+
+        The eviction policies use the access count, the size, and the GDSF
+        clock at the last reference; and the hit and miss counts are reported
+        with the cache statistics.
+
+        The record is updated under its own lock, so that concurrent
+        references from other server processes (and threads) aren't lost.
+
+        Args:
+            hit: the dataset was already unpacked
+            size: the unpacked size, if known
+        """
+        try:
+            lock = self.cache / AccessRecord.LOCK
+            with self.mutex, LockManager(lock, exclusive=True):
+                record = AccessRecord.load(self.cache)
+                record.accesses += 1
+                if hit:
+                    record.hits += 1
+                else:
+                    record.misses += 1
+                if size is not None:
+                    record.size = size
+                elif not record.size:
+                    record.size = self.get_unpacked_size()
+                record.clock = ReclaimState.load(self.controller.cache).clock
+                record.save(self.cache)
+        except Exception as e:
+            self.controller.logger.warning(
+                "Unable to record access to {}: {}", self.name, e
+            )
+
     def cache_delete(self):
         """Remove the unpacked tarball directory and all contents.
 
@@ -1032,7 +1755,7 @@ class Tarball:
         command, generally through the `pbench-reclaim.timer` service, which
         calls this method only when the cache is unlocked and aged out.
         """
-        self.cachemap = None
+        self.remove_map()
         if self.unpacked:
             try:
                 shutil.rmtree(self.unpacked)
@@ -1056,7 +1779,11 @@ class Tarball:
             self.isolator = None
             self.tarball_path = None
             self.md5_path = None
+            self.index_path = None
         else:
+            if self.index_path:
+                self.index_path.unlink(missing_ok=True)
+                self.index_path = None
             if self.md5_path:
                 try:
                     self.md5_path.unlink()
@@ -1083,7 +1810,7 @@ class Controller:
     but the audit report generator will flag it.
     """
 
-    def __init__(self, path: Path, cache: Path, logger: Logger):
+    def __init__(self, path: Path, cache: Path, logger: Logger, discover: bool = True):
         """Manage the representation of a controller archive on disk.
 
         In this context, the path parameter refers to a controller directory
@@ -1094,6 +1821,8 @@ class Controller:
             path: Controller ARCHIVE directory path
             cache: The base of the cache tree
             logger: Logger object
+            discover: Discover the controller's existing tarballs; when False,
+                tarballs are added individually as they're found
         """
         self.logger = logger
 
@@ -1118,7 +1847,8 @@ class Controller:
         # Discover the tarballs that already exist.
         # Depends on instance properties and should remain at the end of the
         # constructor!
-        self._discover_tarballs()
+        if discover:
+            self._discover_tarballs()
 
     def _add_if_tarball(self, file: Path, md5: Optional[str] = None):
         """Check for a tar file, and create an object
@@ -1238,6 +1968,44 @@ class CacheManager:
     # discovery will ignore this directory.
     TEMPORARY = "UPLOAD"
 
+    # The process-wide CacheManager instance; see CacheManager.shared()
+    _shared: Optional["CacheManager"] = None
+    _shared_pid: Optional[int] = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, options: PbenchServerConfig, logger: Logger) -> "CacheManager":
+        """Return the process-wide CacheManager
+
+        API calls share a single long-lived CacheManager in each server worker
+        process, so that the Controller and Tarball objects, and their cache
+        maps, which we discover while handling one API call are available to
+        the next. Each Tarball is revalidated against the ARCHIVE and CACHE
+        trees when it's found.
+
+        A forked child process, or a different configuration, gets a new
+        CacheManager.
+
+        Args:
+            options: PbenchServerConfig configuration object
+            logger: A Pbench python Logger
+
+        Returns:
+            The shared CacheManager
+        """
+        with cls._shared_lock:
+            cm = cls._shared
+            if (
+                not cm
+                or cls._shared_pid != os.getpid()
+                or cm.archive_root != options.ARCHIVE
+                or cm.cache_root != options.CACHE
+            ):
+                cm = cls(options, logger)
+                cls._shared = cm
+                cls._shared_pid = os.getpid()
+            return cm
+
     @staticmethod
     def delete_if_empty(directory: Path) -> None:
         """Delete a directory only if it exists and is empty.
@@ -1288,6 +2056,25 @@ class CacheManager:
         # resource_id.
         self.datasets: dict[str, Tarball] = {}
 
+        # Serialize changes to the indices between threads sharing the
+        # CacheManager
+        self.mutex = threading.RLock()
+
+        # The cache eviction policy, and the percentages of the cache file
+        # system in use at which the background reclaim starts and stops.
+        self.reclaim_policy: str = options.get(
+            "pbench-server", "cache-reclaim-policy", fallback="lru"
+        )
+        self.high_watermark: int = options.getint(
+            "pbench-server", "cache-high-watermark", fallback=80
+        )
+        self.low_watermark: int = options.getint(
+            "pbench-server", "cache-low-watermark", fallback=70
+        )
+
+        # The background reclaim process, if we've started one
+        self.reclaimer: Optional[subprocess.Popen] = None
+
     def full_discovery(self) -> "CacheManager":
         """Discover the ARCHIVE and CACHE trees
 
@@ -1297,7 +2084,8 @@ class CacheManager:
         Full discovery is not required in order to find, create, or delete a
         specific dataset.
         """
-        self._discover_controllers()
+        with self.mutex:
+            self._discover_controllers()
         return self
 
     def __contains__(self, dataset_id: str) -> bool:
@@ -1367,17 +2155,86 @@ class CacheManager:
             if file.is_dir() and file.name != CacheManager.TEMPORARY:
                 self._add_controller(file)
 
+    def _forget(self, tarball: Tarball):
+        """Drop a dataset which no longer exists from the indices
+
+        Args:
+            tarball: The Tarball object of the dataset
+        """
+        for owner in (self, tarball.controller):
+            owner.datasets.pop(tarball.resource_id, None)
+            owner.tarballs.pop(tarball.name, None)
+
+    def _add_tarball(self, path: Path, dataset_id: str) -> Tarball:
+        """Add a single dataset tarball
+
+        Add the tarball's controller, if it isn't already known, without
+        discovering any of the controller's other datasets.
+
+        Args:
+            path: The tarball path within the ARCHIVE tree
+            dataset_id: The resource ID of the dataset
+
+        Returns:
+            The Tarball object
+        """
+        directory = path.parent
+        if directory.name == dataset_id:
+            directory = directory.parent
+        controller = self.controllers.get(directory.name)
+        if not controller:
+            controller = Controller(
+                directory, self.options.CACHE, self.logger, discover=False
+            )
+            controller.cache_manager = self
+            self.controllers[controller.name] = controller
+        if dataset_id not in controller.datasets:
+            controller._add_if_tarball(path, dataset_id)
+        tarball = controller.datasets[dataset_id]
+        self.tarballs[tarball.name] = tarball
+        self.datasets[dataset_id] = tarball
+        return tarball
+
+    def _search_archive(self, dataset_id: str) -> Optional[Path]:
+        """Search the ARCHIVE tree for a dataset tarball
+
+        This is expensive: we look first for a resource ID isolation directory
+        in each controller, and then for an older tarball at the top level of
+        a controller directory, which requires reading each MD5 file.
+
+        Args:
+            dataset_id: The resource ID of the dataset
+
+        Returns:
+            The tarball path, or None if it's not found
+        """
+        controllers = [
+            d
+            for d in self.archive_root.iterdir()
+            if d.is_dir() and d.name != self.TEMPORARY
+        ]
+        for directory in controllers:
+            isolator = directory / dataset_id
+            if isolator.is_dir():
+                for file in isolator.glob(f"*{Dataset.TARBALL_SUFFIX}"):
+                    return file
+        for directory in controllers:
+            for file in directory.glob(f"*{Dataset.TARBALL_SUFFIX}"):
+                if get_tarball_md5(file) == dataset_id:
+                    return file
+        return None
+
     def find_dataset(self, dataset_id: str) -> Tarball:
-        """Search the ARCHIVE tree for a matching dataset tarball.
+        """Find the tarball of a dataset in the ARCHIVE tree.
 
         This will build the Controller and Tarball object for that dataset if
-        they do not already exist.
-
-        FIXME: This builds the entire Controller, which will discover all
-        datasets within the controller. This could be streamlined.
+        they do not already exist, without discovering any other datasets.
 
-        This allows a targeted minimal entry for mutation without discovering
-        the entire tree.
+        The tarball path is normally found directly from the dataset's
+        `server.tarball-path` metadata; we only search the ARCHIVE tree if the
+        metadata is missing or stale, and then repair the metadata. A dataset
+        we've found before is revalidated, in case another process has deleted
+        it or changed its cache.
 
         Args:
             dataset_id: The resource ID of a dataset that might exist somewhere
@@ -1390,19 +2247,45 @@ class CacheManager:
         Returns:
             A Tarball object representing the dataset that was found.
         """
-        if dataset_id in self.datasets:
-            return self.datasets[dataset_id]
-
-        # The dataset isn't already known; so search for it in the ARCHIVE tree
-        # and (if found) discover the controller containing that dataset.
-        for dir_entry in self.archive_root.iterdir():
-            if dir_entry.is_dir() and dir_entry.name != self.TEMPORARY:
-                for file in dir_entry.glob(f"**/*{Dataset.TARBALL_SUFFIX}"):
-                    md5 = get_tarball_md5(file)
-                    if md5 == dataset_id:
-                        self._add_controller(dir_entry)
-                        return self.datasets[dataset_id]
-        raise TarballNotFound(dataset_id)
+        with self.mutex:
+            tarball = self.datasets.get(dataset_id)
+            if tarball:
+                if tarball.revalidate():
+                    return tarball
+                self._forget(tarball)
+
+            dataset = None
+            path = None
+            try:
+                dataset = Dataset.query(resource_id=dataset_id)
+                path = Metadata.getvalue(dataset, Metadata.TARBALL_PATH)
+            except DatasetNotFound:
+                pass
+            except Exception as e:
+                self.logger.warning("Unable to look up dataset {}: {}", dataset_id, e)
+
+            if path:
+                tarball_path = Path(path)
+                if (
+                    tarball_path.is_file()
+                    and Dataset.is_tarball(tarball_path)
+                    and tarball_path.is_relative_to(self.archive_root)
+                ):
+                    return self._add_tarball(tarball_path, dataset_id)
+
+            # The dataset's location isn't known; so search for it in the
+            # ARCHIVE tree, and remember where we found it.
+            tarball_path = self._search_archive(dataset_id)
+            if not tarball_path:
+                raise TarballNotFound(dataset_id)
+            if dataset:
+                try:
+                    Metadata.setvalue(dataset, Metadata.TARBALL_PATH, str(tarball_path))
+                except Exception as e:
+                    self.logger.warning(
+                        "Unable to record tarball path for {}: {}", dataset_id, e
+                    )
+            return self._add_tarball(tarball_path, dataset_id)
 
     # These are wrappers for controller and tarball operations which need to be
     # aware of higher-level constructs in the Pbench Server cache manager such as
@@ -1424,7 +2307,12 @@ class CacheManager:
     #   Remove the tarball and MD5 file from ARCHIVE after uncaching the
     #   unpacked directory tree.
 
-    def create(self, tarfile_path: Path) -> Tarball:
+    def create(
+        self,
+        tarfile_path: Path,
+        metadata: Optional[JSONOBJECT] = None,
+        index: Optional[TarballIndex] = None,
+    ) -> Tarball:
         """Bring a new tarball under cache manager management.
 
         Move a dataset tarball and companion MD5 file into the specified
@@ -1436,6 +2324,11 @@ class CacheManager:
 
         Args:
             tarfile_path: dataset tarball path
+            metadata: the parsed metadata.log, if it was captured while the
+                tarball was received ({} if the tarball has none); otherwise
+                we extract it from the tarball
+            index: the tarball member index, if it was built while the
+                tarball was received; otherwise we build it from the tarball
 
         Raises
             BadDirpath: Failure on extracting the file from tarball
@@ -1453,7 +2346,8 @@ class CacheManager:
         controller_name = None
         errwhy = "unknown"
         try:
-            metadata = Tarball._get_metadata(tarfile_path)
+            if metadata is None:
+                metadata = Tarball._get_metadata(tarfile_path)
         except Exception as e:
             metadata = None
             errwhy = str(e)
@@ -1475,17 +2369,24 @@ class CacheManager:
                 controller_name,
             )
 
-        if name in self.tarballs:
-            raise DuplicateTarball(name)
-        if controller_name in self.controllers:
-            controller = self.controllers[controller_name]
-        else:
-            controller = Controller.create(controller_name, self.options, self.logger)
-            self.controllers[controller_name] = controller
-        tarball = controller.create_tarball(tarfile_path)
+        with self.mutex:
+            known = self.tarballs.get(name)
+            if known:
+                if known.revalidate():
+                    raise DuplicateTarball(name)
+                self._forget(known)
+            if controller_name in self.controllers:
+                controller = self.controllers[controller_name]
+            else:
+                controller = Controller.create(
+                    controller_name, self.options, self.logger
+                )
+                self.controllers[controller_name] = controller
+            tarball = controller.create_tarball(tarfile_path)
+            self.tarballs[tarball.name] = tarball
+            self.datasets[tarball.resource_id] = tarball
         tarball.metadata = metadata
-        self.tarballs[tarball.name] = tarball
-        self.datasets[tarball.resource_id] = tarball
+        tarball.build_index(index)
         return tarball
 
     def find_entry(self, dataset_id: str, path: Path) -> dict[str, Any]:
@@ -1536,46 +2437,54 @@ class CacheManager:
         Args:
             dataset_id: Dataset resource ID to delete
         """
-        try:
-            tarball = self.find_dataset(dataset_id)
-        except TarballNotFound:
-            return
-        name = tarball.name
-        tarball.controller.delete(dataset_id)
-        del self.datasets[dataset_id]
-        del self.tarballs[name]
+        with self.mutex:
+            try:
+                tarball = self.find_dataset(dataset_id)
+            except TarballNotFound:
+                return
+            name = tarball.name
+            tarball.controller.delete(dataset_id)
+            del self.datasets[dataset_id]
+            del self.tarballs[name]
 
-        self._clean_empties(tarball.controller_name)
+            self._clean_empties(tarball.controller_name)
 
-    def reclaim_cache(self, goal_pct: float = 0.0, goal_bytes: int = 0) -> bool:
+    def reclaim_cache(
+        self,
+        goal_pct: float = 0.0,
+        goal_bytes: int = 0,
+        policy: Optional[str] = None,
+        wait: bool = True,
+    ) -> bool:
         """Reclaim unused caches to free disk space.
 
         The cache tree need not be fully discovered at this point; we can
         reclaim cache even on a partial tree. This is driven by discovery of
         the cache directory tree, looking for <resource_id> directories that
-        contain an unpacked tarball root rather than only the `lock` and
-        `last_ref` files.
+        contain an unpacked tarball root rather than only the `lock`,
+        `last_ref`, and `access` files.
+
+        This is a "best effort" operation. It will free unlocked caches, in the
+        order chosen by the eviction policy, until both the goal % and the
+        absolute goal bytes (rounded up to the next megabyte) are available, or
+        until there are no more unlocked cached tarballs.
 
-        This is a "best effort" operation. It will free unlocked caches, oldest
-        first, until both the goal % and the absolute goal bytes (rounded up to
-        the next megabyte) are available, or until there are no more unlocked
-        cached tarballs.
+        Only one reclaim runs at a time across all server processes.
 
         Args:
             goal_pct: goal percent of cache filesystem free
             goal_bytes: goal in bytes
+            policy: the name of the eviction policy, overriding the configured
+                `cache-reclaim-policy`
+            wait: wait for a concurrent reclaim to finish rather than giving up
+
+        Raises:
+            ValueError: the eviction policy is unknown
 
         Returns:
             True if both goals are met, or False otherwise
         """
 
-        @dataclass
-        class Candidate:
-            """Keep track of cache reclamation candidates"""
-
-            last_ref: float  # last reference timestamp
-            cache: Path  # Unpacked artifact directory
-
         @dataclass
         class GoalCheck:
             """Report goal check"""
@@ -1588,6 +2497,8 @@ class CacheManager:
             usage = shutil.disk_usage(self.cache_root)
             return GoalCheck(usage.free >= goal, usage)
 
+        evictor = get_policy(policy if policy else self.reclaim_policy)
+
         # Our reclamation goal can be expressed as % of total, absolute bytes,
         # or both. We normalize to a single "bytes free" goal.
         usage = shutil.disk_usage(self.cache_root)
@@ -1598,90 +2509,132 @@ class CacheManager:
         if usage.free >= goal:
             return True
 
-        total_count = 0
-        reclaimed = 0
-        reclaim_failed = 0
+        reclaim_lock = LockRef(self.cache_root / ReclaimState.LOCK)
+        try:
+            reclaim_lock.acquire(exclusive=True, wait=wait)
+        except OSError as e:
+            reclaim_lock.lock.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                self.logger.info("RECLAIM: skipped because another is running")
+                return reached_goal().reached
+            raise
 
-        # Identify cached datasets by examining the cache directory tree
-        candidates = deque()
-        for d in self.cache_root.iterdir():
-            if not d.is_dir():
-                self.logger.warning(
-                    "RECLAIM: found unexpected file in cache root: {}", d
-                )
-                continue
-            total_count += 1
-            last_ref = 0.0
-            unpacked = None
-            for f in d.iterdir():
-                if f.name == "last_ref":
-                    last_ref = f.stat().st_mtime
-                elif f.is_dir():
-                    unpacked = f
-                if last_ref and unpacked:
-                    break
-            if unpacked:
-                candidates.append(Candidate(last_ref, unpacked))
-
-        # Sort the candidates by last_ref timestamp, putting the oldest at
-        # the head of the queue. We'll flush each cache tree until we reach
-        # our goals.
-        candidates = sorted(candidates, key=lambda c: c.last_ref)
-        has_cache = len(candidates)
-        for candidate in candidates:
-            name = candidate.cache.name
-            cache_d = candidate.cache.parent
-            resource_id = cache_d.name
-
-            # Only if the dataset we're flushing has already been discovered,
-            # we want to update the Tarball object so that we don't break it.
-            # If it hasn't been discovered under this cache instance, that's
-            # fine because discovery will notice that the cache is empty.
-            if resource_id in self.datasets:
-                target = self.datasets[resource_id]
-            else:
-                target = None
-            error = None
-            try:
-                ts = datetime.fromtimestamp(candidate.last_ref)
-                self.logger.info(
-                    "RECLAIM: removing cache for {} (referenced {})", name, ts
-                )
-                with LockManager(cache_d / "lock", exclusive=True, wait=False):
-                    try:
-                        if target:
-                            target.cache_delete()
-                        else:
-                            shutil.rmtree(candidate.cache)
-                    except Exception as e:
-                        reclaim_failed += 1
-                        error = e
-                    else:
-                        reclaimed += 1
-                        if reached_goal().reached:
-                            break
-            except OSError as e:
-                if e.errno in (errno.EAGAIN, errno.EACCES):
-                    self.logger.info(
-                        "RECLAIM: skipping {} because cache is locked", name
+        try:
+            state = ReclaimState.load(self.cache_root)
+            state.runs += 1
+            total_count = 0
+            reclaimed = 0
+            reclaim_failed = 0
+
+            # Identify cached datasets by examining the cache directory tree
+            candidates: list[CacheEntry] = []
+            for d in self.cache_root.iterdir():
+                if d.name.startswith("."):
+                    continue
+                if not d.is_dir():
+                    self.logger.warning(
+                        "RECLAIM: found unexpected file in cache root: {}", d
                     )
-                    # Don't reclaim a cache that's in use
                     continue
-                reclaim_failed += 1
-                error = e
+                total_count += 1
+                last_ref = 0.0
+                unpacked = None
+                for f in d.iterdir():
+                    if f.name == "last_ref":
+                        last_ref = f.stat().st_mtime
+                    elif f.is_dir():
+                        unpacked = f
+                    if last_ref and unpacked:
+                        break
+                if unpacked:
+                    record = AccessRecord.load(d)
+                    candidates.append(
+                        CacheEntry(
+                            resource_id=d.name,
+                            cache=unpacked,
+                            last_ref=last_ref,
+                            accesses=record.accesses,
+                            size=record.size,
+                            clock=record.clock,
+                        )
+                    )
+
+            # Sort the candidates into eviction order by the policy. We'll
+            # flush each cache tree until we reach our goals.
+            candidates = evictor.order(candidates)
+            has_cache = len(candidates)
+            for candidate in candidates:
+                name = candidate.cache.name
+                cache_d = candidate.cache.parent
+                resource_id = candidate.resource_id
+
+                # Only if the dataset we're flushing has already been
+                # discovered, we want to update the Tarball object so that we
+                # don't break it. If it hasn't been discovered under this cache
+                # instance, that's fine because discovery will notice that the
+                # cache is empty.
+                if resource_id in self.datasets:
+                    target = self.datasets[resource_id]
+                else:
+                    target = None
+                error = None
+                try:
+                    ts = datetime.fromtimestamp(candidate.last_ref)
+                    self.logger.info(
+                        "RECLAIM: removing cache for {} (referenced {}, {} accesses, {})",
+                        name,
+                        ts,
+                        candidate.accesses,
+                        humanize.naturalsize(candidate.size),
+                    )
+                    with LockManager(cache_d / "lock", exclusive=True, wait=False):
+                        try:
+                            if target:
+                                target.cache_delete()
+                            else:
+                                # The cache map file is beside, not inside,
+                                # the unpacked tree.
+                                shutil.rmtree(candidate.cache)
+                                (cache_d / "cachemap").unlink(missing_ok=True)
+                        except Exception as e:
+                            reclaim_failed += 1
+                            error = e
+                        else:
+                            reclaimed += 1
+                            state.evictions += 1
+                            state.reclaimed += candidate.size
+                            evictor.evicted(candidate, state)
+                            if reached_goal().reached:
+                                break
+                except OSError as e:
+                    if e.errno in (errno.EAGAIN, errno.EACCES):
+                        self.logger.info(
+                            "RECLAIM: skipping {} because cache is locked", name
+                        )
+                        # Don't reclaim a cache that's in use
+                        continue
+                    reclaim_failed += 1
+                    error = e
+                except Exception as e:
+                    reclaim_failed += 1
+                    error = e
+                if error:
+                    self.logger.error("RECLAIM: {} failed with '{}'", name, error)
+            try:
+                state.save(self.cache_root)
             except Exception as e:
-                reclaim_failed += 1
-                error = e
-            if error:
-                self.logger.error("RECLAIM: {} failed with '{}'", name, error)
+                self.logger.warning("RECLAIM: unable to save state: {}", e)
+        finally:
+            reclaim_lock.release()
         goal_check = reached_goal()
         free_pct = goal_check.usage.free * 100.0 / goal_check.usage.total
         self.logger.info(
-            "RECLAIM {} (goal {}%, {}): {} datasets, "
+            "RECLAIM {} (goal {}%, {}, policy {}): {} datasets, "
             "{} had cache: {} reclaimed and {} errors: {:.1f}% free",
             "achieved" if goal_check.reached else "partial",
             goal_pct,
             humanize.naturalsize(goal_bytes),
+            evictor.name,
             total_count,
             has_cache,
             reclaimed,
@@ -1689,3 +2642,107 @@ class CacheManager:
             free_pct,
         )
         return goal_check.reached
+
+    def reclaim_watermark(self, wait: bool = True) -> bool:
+        """Reclaim cache to the low watermark if it's above the high watermark
+
+        The watermarks are the `cache-high-watermark` and `cache-low-watermark`
+        percentages of the cache file system in use.
+
+        Args:
+            wait: wait for a concurrent reclaim to finish rather than giving up
+
+        Returns:
+            True if the cache is below the high watermark on completion
+        """
+        usage = shutil.disk_usage(self.cache_root)
+        used_pct = (usage.total - usage.free) * 100.0 / usage.total
+        if used_pct < self.high_watermark:
+            return True
+        self.reclaim_cache(goal_pct=100.0 - self.low_watermark, wait=wait)
+        usage = shutil.disk_usage(self.cache_root)
+        return (usage.total - usage.free) * 100.0 / usage.total < self.high_watermark
+
+    def start_reclaimer(self) -> bool:
+        """Start a background reclaim if the cache is above its high watermark
+
+        This runs `pbench-tree-manage --reclaim-watermark` as a separate
+        process, so that reclaiming cache space runs ahead of demand, rather
+        than holding up an API call when the cache is full. The cache lock
+        files only exclude other processes, so a reclaimer thread could remove
+        a dataset which another thread is using.
+
+        Only one background reclaim is started at a time by a CacheManager.
+
+        Returns:
+            True if a reclaim was started
+        """
+        with self.mutex:
+            if self.reclaimer and self.reclaimer.poll() is None:
+                return False
+            self.reclaimer = None
+            try:
+                usage = shutil.disk_usage(self.cache_root)
+                used_pct = (usage.total - usage.free) * 100.0 / usage.total
+                if used_pct < self.high_watermark:
+                    return False
+                command = [
+                    str(self.options.BINDIR / "pbench-tree-manage"),
+                    "--reclaim-watermark",
+                ]
+                if self.options.files:
+                    command.extend(("--config", self.options.files[-1]))
+                self.reclaimer = subprocess.Popen(
+                    command,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+            except Exception as e:
+                self.logger.warning("Unable to start cache reclaim: {}", e)
+                return False
+            self.logger.info("Started cache reclaim at {:.1f}% used", used_pct)
+            return True
+
+    def cache_statistics(self) -> JSONOBJECT:
+        """Report the cache counters
+
+        The counters are aggregated from the access records of every dataset
+        which has been cached, and the reclaim state.
+
+        Returns:
+            A JSON object of cache statistics
+        """
+        datasets = 0
+        cached = 0
+        cached_bytes = 0
+        hits = 0
+        misses = 0
+        for d in self.cache_root.iterdir():
+            if d.name.startswith(".") or not d.is_dir():
+                continue
+            record = AccessRecord.load(d)
+            datasets += 1
+            hits += record.hits
+            misses += record.misses
+            if any(f.is_dir() for f in d.iterdir()):
+                cached += 1
+                cached_bytes += record.size
+        state = ReclaimState.load(self.cache_root)
+        usage = shutil.disk_usage(self.cache_root)
+        return {
+            "policy": self.reclaim_policy,
+            "high_watermark": self.high_watermark,
+            "low_watermark": self.low_watermark,
+            "used_pct": round((usage.total - usage.free) * 100.0 / usage.total, 1),
+            "datasets": datasets,
+            "cached": cached,
+            "cached_bytes": cached_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "evictions": state.evictions,
+            "reclaimed_bytes": state.reclaimed,
+            "reclaim_runs": state.runs,
+        }
@@ -0,0 +1,275 @@
+"""Cache eviction policies and statistics.
+
+The CacheManager reclaims cache space by removing unpacked dataset trees from
+the CACHE directory tree. An eviction policy decides the order in which cached
+datasets are removed, from a CacheEntry describing each candidate.
+
+Each dataset's cache directory has an "access" file recording how often the
+cached data has been referenced, and whether each reference found the dataset
+already unpacked (a hit) or had to unpack it (a miss). The CACHE root has a
+".reclaim" file recording the eviction counters and the GDSF "clock".
+
+Policies are registered by name with the `register_policy` decorator, and are
+selected with the `cache-reclaim-policy` option of the `pbench-server` section
+of the server configuration.
+"""
+
+from dataclasses import asdict, dataclass, fields
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple, Type, TypeVar
+
+MB_BYTES = 1024 * 1024  # Bytes in Mb
+
+
+@dataclass
+class CacheEntry:
+    """Describe a cached dataset which is a candidate for eviction.
+
+    Fields:
+        resource_id: the dataset resource ID
+        cache: the root of the unpacked dataset tree
+        last_ref: the time of the last reference
+        accesses: the number of references to the dataset
+        size: the unpacked size of the dataset, or 0 if unknown
+        clock: the GDSF clock at the last reference
+    """
+
+    resource_id: str
+    cache: Path
+    last_ref: float
+    accesses: int
+    size: int
+    clock: float
+
+
+class EvictionPolicy:
+    """Order cached datasets for eviction.
+
+    Subclasses define a name and a priority: the datasets with the lowest
+    priority are evicted first.
+    """
+
+    name: str = ""
+
+    def priority(self, entry: CacheEntry) -> Any:
+        """Compute the eviction priority of a cached dataset.
+
+        Args:
+            entry: the cached dataset
+
+        Returns:
+            a sortable priority value
+        """
+        raise NotImplementedError()
+
+    def order(self, entries: List[CacheEntry]) -> List[CacheEntry]:
+        """Sort cached datasets into eviction order.
+
+        Args:
+            entries: the cached datasets
+
+        Returns:
+            the datasets, in the order they should be evicted
+        """
+        return sorted(entries, key=self.priority)
+
+    def evicted(self, entry: CacheEntry, state: "ReclaimState"):
+        """Update the reclaim state after evicting a dataset.
+
+        Args:
+            entry: the evicted dataset
+            state: the reclaim state
+        """
+        pass
+
+
+POLICIES: Dict[str, Type[EvictionPolicy]] = {}
+
+P = TypeVar("P", bound=Type[EvictionPolicy])
+
+
+def register_policy(cls: P) -> P:
+    """Class decorator to register an eviction policy by name."""
+    POLICIES[cls.name] = cls
+    return cls
+
+
+def get_policy(name: str) -> EvictionPolicy:
+    """Construct a registered eviction policy.
+
+    Args:
+        name: the name of the policy
+
+    Raises:
+        ValueError if there's no policy by that name
+
+    Returns:
+        an eviction policy
+    """
+    try:
+        return POLICIES[name.lower()]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown cache eviction policy {name!r}: expected one of {sorted(POLICIES)}"
+        ) from None
+
+
+@register_policy
+class LRUPolicy(EvictionPolicy):
+    """Evict the least recently used datasets first."""
+
+    name = "lru"
+
+    def priority(self, entry: CacheEntry) -> float:
+        return entry.last_ref
+
+
+@register_policy
+class LFUPolicy(EvictionPolicy):
+    """Evict the least frequently used datasets first, and the least recently
+    used of those which are used equally often."""
+
+    name = "lfu"
+
+    def priority(self, entry: CacheEntry) -> Tuple[int, float]:
+        return entry.accesses, entry.last_ref
+
+
+@register_policy
+class GDSFPolicy(EvictionPolicy):
+    """Greedy-Dual-Size-Frequency: evict datasets with the lowest frequency
+    per megabyte first.
+
+    The priority of each dataset is the "clock" at its last reference plus its
+    access count divided by its size. Each eviction advances the clock to the
+    priority of the evicted dataset, so that datasets which were popular long
+    ago eventually age out in favor of those referenced since.
+
+    Datasets of unknown size, or smaller than a megabyte, are treated as a
+    megabyte.
+    """
+
+    name = "gdsf"
+
+    def priority(self, entry: CacheEntry) -> float:
+        return entry.clock + entry.accesses / max(entry.size / MB_BYTES, 1.0)
+
+    def evicted(self, entry: CacheEntry, state: "ReclaimState"):
+        state.clock = max(state.clock, self.priority(entry))
+
+
+D = TypeVar("D")
+
+
+def load_record(cls: Callable[..., D], path: Path) -> D:
+    """Load a dataclass from a JSON file, ignoring a missing or bad file."""
+    try:
+        with path.open("r") as f:
+            data = json.load(f)
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+    except (OSError, ValueError, TypeError, AttributeError):
+        return cls()
+
+
+def save_record(record: Any, path: Path):
+    """Save a dataclass to a JSON file, atomically replacing the old file."""
+    temp = path.with_name(f".{path.name}.{os.getpid()}")
+    try:
+        with temp.open("w") as f:
+            json.dump(asdict(record), f)
+        temp.replace(path)
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+@dataclass
+class AccessRecord:
+    """The reference history of a cached dataset.
+
+    This is kept in an "access" file in the dataset's cache directory, and
+    persists when the unpacked tree is removed so that we can account for
+    misses on datasets which have been evicted. The "access.lock" file
+    serializes updates to the record.
+
+    Fields:
+        accesses: the number of references to the dataset
+        hits: the number of references which found the dataset unpacked
+        misses: the number of references which had to unpack the dataset
+        size: the unpacked size of the dataset, or 0 if unknown
+        clock: the GDSF clock at the last reference
+    """
+
+    FILE = "access"
+    LOCK = "access.lock"
+
+    accesses: int = 0
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+    clock: float = 0.0
+
+    @classmethod
+    def load(cls, cache: Path) -> "AccessRecord":
+        """Load the access record of a dataset.
+
+        Args:
+            cache: the dataset's cache directory
+
+        Returns:
+            the access record, or an empty record
+        """
+        return load_record(cls, cache / cls.FILE)
+
+    def save(self, cache: Path):
+        """Save the access record of a dataset.
+
+        Args:
+            cache: the dataset's cache directory
+        """
+        save_record(self, cache / self.FILE)
+
+
+@dataclass
+class ReclaimState:
+    """The cache eviction counters and the GDSF clock.
+
+    This is kept in a ".reclaim" file at the root of the CACHE tree, and the
+    ".reclaim.lock" file serializes reclaim operations.
+
+    Fields:
+        clock: the GDSF clock
+        evictions: the number of datasets evicted from the cache
+        reclaimed: the number of bytes reclaimed
+        runs: the number of reclaim operations
+    """
+
+    FILE = ".reclaim"
+    LOCK = ".reclaim.lock"
+
+    clock: float = 0.0
+    evictions: int = 0
+    reclaimed: int = 0
+    runs: int = 0
+
+    @classmethod
+    def load(cls, cache_root: Path) -> "ReclaimState":
+        """Load the reclaim state.
+
+        Args:
+            cache_root: the root of the CACHE tree
+
+        Returns:
+            the reclaim state, or an initial state
+        """
+        return load_record(cls, cache_root / cls.FILE)
+
+    def save(self, cache_root: Path):
+        """Save the reclaim state.
+
+        Args:
+            cache_root: the root of the CACHE tree
+        """
+        save_record(self, cache_root / self.FILE)
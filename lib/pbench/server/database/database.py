@@ -1,10 +1,11 @@
 from logging import DEBUG, Logger
 from pathlib import Path
+import threading
 from urllib.parse import urlparse
 
 from alembic import command
 from alembic.config import Config
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base, Query, scoped_session, sessionmaker
 from sqlalchemy_utils import create_database, database_exists
 
@@ -15,6 +16,11 @@ class Database:
     # Create declarative base model that our model can inherit from
     Base = declarative_base()
     db_session = None
+    engine = None
+
+    # The number of SQL statements executed by each thread, which allows the
+    # API to report the SQL cost of each request.
+    statistics = threading.local()
 
     @staticmethod
     def get_engine_uri(config: PbenchServerConfig) -> str:
@@ -65,6 +71,7 @@ class Database:
         # nothing.
 
         engine = create_engine(db_uri)
+        event.listen(engine, "before_cursor_execute", Database._count_statement)
         db_url = urlparse(db_uri)
         if db_url.scheme == "sqlite":
             Database.Base.metadata.create_all(bind=engine)
@@ -77,6 +84,7 @@ class Database:
             with engine.begin() as connection:
                 alembic_cfg.attributes["connection"] = connection
                 command.upgrade(alembic_cfg, "head")
+        Database.engine = engine
         Database.db_session = scoped_session(
             sessionmaker(bind=engine, autocommit=False, autoflush=False)
         )
@@ -92,6 +100,41 @@ class Database:
             bind=engine.execution_options(isolation_level="SERIALIZABLE")
         )
 
+    @staticmethod
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        """SQLAlchemy engine event hook to count executed SQL statements"""
+        Database.statistics.statements = Database.statement_count() + 1
+
+    @staticmethod
+    def reset_statement_count():
+        """Reset the current thread's count of executed SQL statements"""
+        Database.statistics.statements = 0
+
+    @staticmethod
+    def statement_count() -> int:
+        """Return the number of SQL statements executed by the current thread
+        since the count was last reset.
+
+        Returns:
+            The number of statements
+        """
+        return getattr(Database.statistics, "statements", 0)
+
+    @staticmethod
+    def after_fork():
+        """Detach a forked child process from the parent's DB connections.
+
+        A child process inherits the parent's connection pool and session
+        registry, but must never use the parent's sockets. We forget the
+        inherited session without closing it (which would roll back the
+        parent's transaction) and replace the engine's pool so that the
+        child opens its own connections on demand.
+        """
+        if Database.db_session is None:
+            return
+        Database.db_session.registry.clear()
+        Database.engine.dispose(close=False)
+
     @staticmethod
     def dump_query(query: Query, logger: Logger, level: int = DEBUG):
         """Dump a fully resolved SQL query if DEBUG logging is enabled
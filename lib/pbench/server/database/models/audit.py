@@ -175,7 +175,7 @@ class Audit(Database.Base):
     BACKGROUND_USER = "BACKGROUND"  # Operation performed in background
 
     @staticmethod
-    def create(
+    def build(
         root: Optional["Audit"] = None,
         user: Optional[User] = None,
         dataset: Optional[Dataset] = None,
@@ -191,8 +191,8 @@ class Audit(Database.Base):
         attributes: Optional[JSONOBJECT] = None,
         **kwargs,
     ) -> "Audit":
-        """A simple factory method to construct a new Audit setting and
-        add it to the database.
+        """A simple factory method to construct a new Audit setting without
+        adding it to the database: see create() and add_all().
 
         The "root" parameter is a shortcut to copy values from a reference
         "root" Audit record, for updates and finalization to a sequence.
@@ -232,8 +232,7 @@ class Audit(Database.Base):
             kwargs : Any other defined column names (e.g., root_id, timestamp)
 
         Returns:
-            A new Audit object initialized with the parameters and added
-            to the database.
+            A new Audit object initialized with the parameters.
         """
         audit = Audit()
 
@@ -281,10 +280,75 @@ class Audit(Database.Base):
 
         for n, v in kwargs.items():
             setattr(audit, n, v)
+        return audit
+
+    @staticmethod
+    def create(
+        root: Optional["Audit"] = None,
+        user: Optional[User] = None,
+        dataset: Optional[Dataset] = None,
+        name: Optional[str] = None,
+        operation: Optional[OperationCode] = None,
+        object_type: Optional[AuditType] = None,
+        object_id: Optional[str] = None,
+        object_name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        user_name: Optional[str] = None,
+        status: Optional[AuditStatus] = None,
+        reason: Optional[AuditReason] = None,
+        attributes: Optional[JSONOBJECT] = None,
+        **kwargs,
+    ) -> "Audit":
+        """Construct a new Audit setting, as for build(), and add it to the
+        database.
 
+        Returns:
+            A new Audit object initialized with the parameters and added
+            to the database.
+        """
+        audit = Audit.build(
+            root=root,
+            user=user,
+            dataset=dataset,
+            name=name,
+            operation=operation,
+            object_type=object_type,
+            object_id=object_id,
+            object_name=object_name,
+            user_id=user_id,
+            user_name=user_name,
+            status=status,
+            reason=reason,
+            attributes=attributes,
+            **kwargs,
+        )
         audit.add()
         return audit
 
+    @staticmethod
+    def add_all(audits: list["Audit"]):
+        """Add a set of Audit objects to the database in a single transaction.
+
+        Args:
+            audits: Audit objects constructed by build()
+
+        Raises:
+            AuditSqlError : problem interacting with Database
+        """
+        try:
+            Database.db_session.add_all(audits)
+            Database.db_session.commit()
+        except Exception as e:
+            Database.db_session.rollback()
+            raise decode_sql_error(
+                e,
+                on_duplicate=AuditDuplicate,
+                on_null=AuditNullKey,
+                fallback=AuditSqlError,
+                operation="add_all",
+                audit=audits[0] if audits else None,
+            ) from e
+
     @staticmethod
     def query(
         start: Optional[datetime] = None,
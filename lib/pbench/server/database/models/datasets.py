@@ -6,9 +6,20 @@ import re
 from typing import Any, Dict, List, Optional, Union
 
 from dateutil import parser as date_parser
-from sqlalchemy import Column, Enum, event, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy import (
+    and_,
+    Column,
+    Enum,
+    event,
+    ForeignKey,
+    Integer,
+    JSON,
+    or_,
+    String,
+    Text,
+)
 from sqlalchemy.exc import DataError, SQLAlchemyError
-from sqlalchemy.orm import Query, relationship, validates
+from sqlalchemy.orm import ORMExecuteState, Query, relationship, Session, validates
 
 from pbench.server.database.database import Database
 from pbench.server.database.models import decode_sql_error, TZDateTime
@@ -401,7 +412,22 @@ class Dataset(Database.Base):
             metadata_log = Metadata.get(self, Metadata.METALOG).value
         except MetadataNotFound:
             metadata_log = None
-        operations = Operation.by_dataset(self)
+        return self._as_dict(metadata_log, Operation.by_dataset(self))
+
+    def _as_dict(
+        self, metadata_log: Optional[Any], operations: list["Operation"]
+    ) -> Dict[str, Any]:
+        """Build the dictionary representation of the dataset from its
+        `metadata.log` data and operational records, which the caller may
+        have fetched for many datasets at once.
+
+        Args:
+            metadata_log: The "metalog" metadata value, or None
+            operations: The dataset's operational records
+
+        Returns
+            Dictionary representation of the DB object
+        """
         return {
             "access": self.access,
             "name": self.name,
@@ -531,6 +557,26 @@ class Operation(Database.Base):
             .all()
         )
 
+    @staticmethod
+    def by_datasets(datasets: list[Dataset]) -> dict[int, list["Operation"]]:
+        """Return all operational records for a list of datasets.
+
+        Args:
+            datasets: Dataset objects
+
+        Returns:
+            a dict associating each dataset ID with a list (possibly empty) of
+            operational records
+        """
+        operations = {d.id: [] for d in datasets}
+        for o in (
+            Database.db_session.query(Operation)
+            .filter(Operation.dataset_ref.in_(list(operations)))
+            .all()
+        ):
+            operations[o.dataset_ref].append(o)
+        return operations
+
     @staticmethod
     def by_operation(
         dataset: Dataset, operation: OperationName
@@ -621,6 +667,12 @@ class Metadata(Database.Base):
     # {"dataset.created": "3000-03-30T03:30:30.303030+00:00"}
     DATASET = "dataset"
 
+    # Not a key: a count of committed changes to Dataset and Metadata rows
+    # made by this process, which allows caching information derived from the
+    # metadata of many datasets. Changes made by other processes aren't
+    # counted.
+    generation = 0
+
     # The Dataset name column can be modified by the owner
     #
     # {"dataset.name": "my name string"}
@@ -683,6 +735,21 @@ class Metadata(Database.Base):
     # }
     TARBALL_PATH = "server.tarball-path"
 
+    # INDEX_CHECKPOINT records the progress of an incomplete tool data
+    # indexing operation, so that a later pbench-index run can resume it: the
+    # operation, the tool data sources which have been completely indexed, and
+    # the index map of the documents indexed so far. It's cleared when the
+    # operation completes successfully, or when the dataset is re-indexed.
+    #
+    # {
+    #   "server.index-checkpoint": {
+    #       "operation": "TOOLINDEX",
+    #       "sources": ["1-default/sample1/host/iostat"],
+    #       "index_map": {"tool-data-iostat": ["...tool-data-iostat.2021-05"]}
+    #   }
+    # }
+    SERVER_INDEX_CHECKPOINT = "server.index-checkpoint"
+
     # --- Standard Metadata keys
 
     # Metadata keys that clients can update
@@ -886,6 +953,24 @@ class Metadata(Database.Base):
             except MetadataNotFound:
                 return None
             value = meta.value
+        return Metadata._getpath(dataset, key, native_key, keys, value)
+
+    @staticmethod
+    def _getpath(
+        dataset: Dataset, key: str, native_key: str, keys: list[str], value: JSON
+    ) -> Optional[JSON]:
+        """Returns the value of a dotted key path within a native key value.
+
+        Args:
+            dataset : associated dataset
+            key : hierarchical key path (for error reporting)
+            native_key : the native key
+            keys : the remaining elements of the key path
+            value : the value of the native key
+
+        Returns:
+            Value of the key path
+        """
         name = native_key
         for i in keys:
             # If we have a nested key, and the `value` at this level isn't
@@ -902,6 +987,98 @@ class Metadata(Database.Base):
             value = value[name]
         return value
 
+    @staticmethod
+    def getvalues(
+        datasets: list[Dataset], keys: list[str], user: Optional[User] = None
+    ) -> dict[int, dict[str, Optional[JSON]]]:
+        """Returns the values of metadata keys for a list of datasets.
+
+        This is equivalent to calling `getvalue` for each key of each dataset,
+        but it fetches all the necessary Metadata rows with a single query,
+        (and, for the "dataset" namespace, the Operation rows with another),
+        rather than querying for each key of each dataset.
+
+        A key which `getvalue` would reject, because it's malformed or because
+        the key path is inconsistent with the stored data, has the value None.
+
+        Args:
+            datasets : the datasets
+            keys : hierarchical key paths to fetch
+            user : User-specific key value (used only for "user." namespace)
+
+        Raises:
+            MetadataSqlError : SQL error in retrieval
+
+        Returns:
+            A dict associating each dataset ID with a dict of key path values
+        """
+        paths: dict[str, list[str]] = {}
+        for key in keys:
+            path = key.split(".")
+            if "" not in path:
+                paths[key] = [path[0].lower()] + path[1:]
+        natives = {p[0] for p in paths.values()}
+        native_rows = natives - {Metadata.DATASET}
+        if Metadata.DATASET in natives:
+            native_rows.add(Metadata.METALOG)
+
+        rows: dict[tuple[int, str], JSON] = {}
+        operations: dict[int, list[Operation]] = {}
+        try:
+            if datasets and native_rows:
+                shared = native_rows - {Metadata.USER}
+                terms = [and_(Metadata.key.in_(shared), Metadata.user_ref.is_(None))]
+                if Metadata.USER in native_rows:
+                    terms.append(
+                        and_(
+                            Metadata.key == Metadata.USER,
+                            Metadata.user_ref == user.id
+                            if user
+                            else Metadata.user_ref.is_(None),
+                        )
+                    )
+                query = Database.db_session.query(
+                    Metadata.dataset_ref, Metadata.key, Metadata.value
+                ).filter(
+                    Metadata.dataset_ref.in_([d.id for d in datasets]), or_(*terms)
+                )
+                for dataset_ref, native_key, value in query.all():
+                    rows[(dataset_ref, native_key)] = value
+            if datasets and Metadata.DATASET in natives:
+                operations = Operation.by_datasets(datasets)
+        except SQLAlchemyError as e:
+            Metadata.logger.error("Can't get {} from DB: {}", keys, str(e))
+            raise MetadataSqlError(e, operation="getvalues", keys=keys) from e
+
+        values = {}
+        for dataset in datasets:
+            metadata = {}
+            as_dict = None
+            for key in keys:
+                metadata[key] = None
+                if key not in paths:
+                    continue
+                native_key, *path = paths[key]
+                if native_key == Metadata.DATASET:
+                    if as_dict is None:
+                        as_dict = dataset._as_dict(
+                            rows.get((dataset.id, Metadata.METALOG)),
+                            operations[dataset.id],
+                        )
+                    value = as_dict
+                elif (dataset.id, native_key) in rows:
+                    value = rows[(dataset.id, native_key)]
+                else:
+                    continue
+                try:
+                    metadata[key] = Metadata._getpath(
+                        dataset, key, native_key, path, value
+                    )
+                except MetadataError:
+                    pass
+            values[dataset.id] = metadata
+        return values
+
     @staticmethod
     def validate(dataset: Optional[Dataset], key: str, value: Any) -> Any:
         """Validate a metadata value.
@@ -1171,3 +1348,38 @@ def check_required(target, args, kwargs):
         raise MetadataMissingParameter("key")
     if "value" not in kwargs:
         raise MetadataMissingKeyValue(kwargs.get("key"))
+
+
+def _note_changes(session: Session):
+    """Note uncommitted changes to Dataset or Metadata rows in the session."""
+    session.info["metadata_changed"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def check_flush(session: Session, flush_context):
+    """Listen for flushes which change Dataset or Metadata rows."""
+    for o in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(o, (Dataset, Metadata)):
+            _note_changes(session)
+            break
+
+
+@event.listens_for(Session, "do_orm_execute")
+def check_execute(orm_execute_state: ORMExecuteState):
+    """Listen for bulk updates and deletes of Dataset or Metadata rows."""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        if any(m.class_ in (Dataset, Metadata) for m in orm_execute_state.all_mappers):
+            _note_changes(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_commit")
+def count_changes(session: Session):
+    """Count committed changes to Dataset or Metadata rows."""
+    if session.info.pop("metadata_changed", False):
+        Metadata.generation += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changes(session: Session):
+    """Forget uncommitted changes to Dataset or Metadata rows."""
+    session.info.pop("metadata_changed", None)
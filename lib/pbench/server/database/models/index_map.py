@@ -1,6 +1,6 @@
 from typing import Iterator, NewType, Optional
 
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, func, Integer, String
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import relationship
 
@@ -76,6 +76,11 @@ class IndexMap(Database.Base):
     index = Column(String(255), index=True, nullable=False)
     dataset = relationship("Dataset")
 
+    # Count the index map changes committed for each dataset (by ID) in this
+    # process, so that information derived from indexed data can be cached.
+    # Changes made by other processes aren't counted: see IndexMap.version.
+    generations: dict[int, int] = {}
+
     @classmethod
     def create(cls, dataset: Dataset, map: IndexMapType):
         """
@@ -210,6 +215,36 @@ class IndexMap(Database.Base):
         except SQLAlchemyError as e:
             raise IndexMapSqlError(e, operation="exists", dataset=dataset, name="any")
 
+    @classmethod
+    def version(cls, dataset: Dataset) -> tuple[int, int, int]:
+        """Identify the current state of the dataset's index map.
+
+        The version changes when index map rows are added to or removed from
+        the dataset by any process, or when this process commits a change to
+        the dataset's index map.
+
+        Args:
+            dataset: Dataset object
+
+        Raises:
+            IndexMapSqlError: problem interacting with Database
+
+        Returns:
+            The number of index map rows, the highest row ID, and the number
+            of changes committed by this process
+        """
+        try:
+            count, last = (
+                Database.db_session.query(
+                    func.count(IndexMap.id), func.max(IndexMap.id)
+                )
+                .filter(IndexMap.dataset == dataset)
+                .one()
+            )
+        except SQLAlchemyError as e:
+            raise IndexMapSqlError(e, operation="version", dataset=dataset, name="any")
+        return count, last or 0, cls.generations.get(dataset.id, 0)
+
     def __str__(self) -> str:
         """
         Return a string representation of the map object
@@ -224,6 +259,7 @@ class IndexMap(Database.Base):
         """Commit changes to the database."""
         try:
             Database.db_session.commit()
+            cls.generations[dataset.id] = cls.generations.get(dataset.id, 0) + 1
         except Exception as e:
             Database.db_session.rollback()
             raise decode_sql_error(
@@ -8,18 +8,25 @@ import csv
 from datetime import datetime, timedelta
 import errno
 import hashlib
+from itertools import islice
 import json
 import logging
 import math
 from operator import itemgetter
 import os
+import queue
 from random import SystemRandom
 import re
 import socket
+import stat
 import tarfile
+import threading
+from time import perf_counter
 from time import sleep as _sleep
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 from urllib.parse import urlparse
 
+import numpy as np
 from urllib3 import Timeout
 
 from pbench.common import MetadataLog
@@ -33,6 +40,7 @@ from pbench.common.exceptions import (
     UnsupportedTarballFormat,
 )
 import pbench.server
+from pbench.server import JSONOBJECT, tool_stdout
 from pbench.server.cache_manager import Tarball
 from pbench.server.database.models.datasets import Dataset
 from pbench.server.database.models.index_map import IndexMapType
@@ -82,6 +90,10 @@ VERSION = "4.0.0"
 # Standard normalized date/time format
 _STD_DATETIME_FMT = pbench._STD_DATETIME_FMT
 
+# The first timestamp (in seconds since the epoch) which can't be represented
+# by a Python datetime (year 10000).
+_MAX_EPOCH_SECONDS = 253402300800
+
 # Maximum length of messages logged by es_index()
 _MAX_ERRMSG_LENGTH = 16384
 
@@ -96,6 +108,13 @@ _op_type = "create"
 _read_timeout = 100000 * 60.0
 _request_timeout = 100000 * 60.0
 
+# Default depth of the queue between the thread generating indexing actions
+# and the bulk submission stage, and the default number of actions sent in
+# each bulk request; both can be overridden in the "Indexing" section of the
+# server configuration.
+BULK_QUEUE_DEPTH = 2000
+BULK_BATCH_SIZE = 500
+
 # global - defaults to normal dict, ordered dict for unit tests
 _dict_const = dict
 
@@ -148,10 +167,124 @@ def get_es(config):
     return Elasticsearch(hosts, max_retries=0, timeout=timeoutobj, ca_certs=ca_bundle)
 
 
-def es_index(es, actions, errorsfp, logger, _dbg=0):
+class ActionQueue:
+    """Generate indexing actions in a separate thread.
+
+    The actions generator (e.g., PbenchTarBall.make_all_actions()) is run by
+    a producer thread which feeds a bounded queue, while the caller iterates
+    over the queue to serialize and submit the actions. This allows parsing
+    and document construction to proceed while the bulk indexer waits on
+    Elasticsearch, and vice versa.
+
+    We track the time the producer spends blocked on a full queue (the
+    consumer is the bottleneck) and the time the consumer spends blocked on
+    an empty queue (the producer is the bottleneck).
+
+    Any exception raised by the actions generator is re-raised by the
+    consumer once all previously generated actions have been consumed.
+    """
+
+    _DONE = object()
+    _POLL = 0.1
+
+    def __init__(self, actions: Iterator[JSONOBJECT], depth: int):
+        """Construct an action queue.
+
+        Args:
+            actions: generator of indexing actions
+            depth: maximum number of actions held in the queue
+        """
+        self.actions = actions
+        self.queue = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.produced = 0
+        self.consumed = 0
+        self.full_time = 0.0
+        self.empty_time = 0.0
+        self.thread = threading.Thread(
+            target=self._produce, name="pbench-index-actions", daemon=True
+        )
+
+    def _put(self, item) -> bool:
+        """Add an item to the queue, waiting for room if necessary.
+
+        Args:
+            item: the action to queue
+
+        Returns:
+            False if the queue was closed while we were waiting
+        """
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        beg = perf_counter()
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.queue.put(item, timeout=self._POLL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.full_time += perf_counter() - beg
+
+    def _produce(self):
+        """Producer thread: drain the actions generator into the queue."""
+        try:
+            for action in self.actions:
+                if not self._put(action):
+                    return
+                self.produced += 1
+        except BaseException as e:
+            self.error = e
+        self._put(self._DONE)
+
+    def __iter__(self) -> Iterator[JSONOBJECT]:
+        self.thread.start()
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                beg = perf_counter()
+                item = None
+                while item is None and not self.stopped.is_set():
+                    try:
+                        item = self.queue.get(timeout=self._POLL)
+                    except queue.Empty:
+                        continue
+                self.empty_time += perf_counter() - beg
+                if item is None:
+                    return
+            if item is self._DONE:
+                break
+            self.consumed += 1
+            yield item
+        if self.error:
+            raise self.error
+
+    def close(self):
+        """Stop the producer thread, discarding any queued actions."""
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+def es_index(
+    es, actions, errorsfp, logger, _dbg=0, queue_depth: int = 0, batch_size: int = 0
+):
     """
     es_index Encapsulate the interface to the pyesbulk module index code.
 
+    When a queue depth is given, the actions are generated by a separate
+    thread (see ActionQueue); when a batch size is given, the actions are
+    serialized and submitted by a separate bulk indexing stage in requests of
+    that many actions. This allows the generation of documents to overlap
+    with the Elasticsearch requests.
+
     Args:
         es ([Elasticsearch]): An Elasticsearch object instance from either
             the "elasticsearch1" (Elasticsearch V1) or "elasticsearch"
@@ -159,12 +292,43 @@ def es_index(es, actions, errorsfp, logger, _dbg=0):
         actions ([type]): Elasticsearch bulk index action tuples
         errorsfp ([type]): A file pointer for error reporting
         logger ([type]): Standard logging object for use by bulk indexer
+        queue_depth: Maximum number of pending generated actions, or 0 to
+            generate the actions on demand
+        batch_size: Number of actions per bulk request, or 0 to use the
+            pyesbulk streaming default
 
     Returns:
         tuple of (start time, end time, indexed count, duplicate count, failed
         count, and retries)
     """
-    return pyesbulk.streaming_bulk(es, actions, errorsfp, logger)
+    pipeline = None
+    if queue_depth > 0:
+        pipeline = ActionQueue(actions, queue_depth)
+        actions = pipeline
+    try:
+        if batch_size > 0:
+            return pyesbulk.parallel_bulk(
+                es,
+                actions,
+                errorsfp,
+                logger,
+                chunk_size=batch_size,
+                thread_count=1,
+                queue_size=1,
+            )
+        return pyesbulk.streaming_bulk(es, actions, errorsfp, logger)
+    finally:
+        if pipeline:
+            pipeline.close()
+            logger.debug(
+                "bulk pipeline: {:d} actions generated, {:d} submitted;"
+                " generation blocked on a full queue for {:.2f}s,"
+                " submission waited on an empty queue for {:.2f}s",
+                pipeline.produced,
+                pipeline.consumed,
+                pipeline.full_time,
+                pipeline.empty_time,
+            )
 
 
 class PbenchData:
@@ -174,6 +338,7 @@ class PbenchData:
 
         * make_source_id()
         * mk_abs_timestamp_millis()
+        * mk_abs_timestamps_millis()
         * generate_index_name()
 
     We also provide a set of metadata.log convenience methods that are not to
@@ -218,8 +383,41 @@ class PbenchData:
         """Construct a source ID (MD5 value) by first converting the python object to
         JSON, and then computing the hash of the resulting string.
         """
-        the_bytes = json.dumps(source, sort_keys=True).encode("utf-8")
-        return hashlib.md5(the_bytes).hexdigest()
+        return PbenchData.make_source_payload(source)[0]
+
+    @staticmethod
+    def make_source_payload(
+        source: JSONOBJECT, extra: Optional[JSONOBJECT] = None
+    ) -> Tuple[str, str]:
+        """Construct a source ID and the bulk payload of the source document,
+        serializing the document only once.
+
+        The ID is the MD5 of the canonical (sorted key) JSON of the source, as
+        it has always been, so that re-indexing a dataset produces the same
+        IDs. The same JSON, with the extra fields (which don't contribute to
+        the ID) spliced into the top-level object, is the payload: the bulk
+        client sends a string source unchanged rather than serializing the
+        source dictionary again.
+
+        Args:
+            source: the source document
+            extra: additional top-level fields for the payload, which replace
+                any fields of the same name in the source
+
+        Returns:
+            A tuple of the source ID and the JSON payload
+        """
+        canonical = json.dumps(source, sort_keys=True)
+        source_id = hashlib.md5(canonical.encode("utf-8")).hexdigest()
+        if not extra:
+            return source_id, canonical
+        if not extra.keys().isdisjoint(source):
+            # Splicing would duplicate the keys, so merge the dictionaries.
+            return source_id, json.dumps({**source, **extra}, sort_keys=True)
+        fields = json.dumps(extra, sort_keys=True)[1:]
+        if canonical == "{}":
+            return source_id, "{" + fields
+        return source_id, f"{canonical[:-1]}, {fields}"
 
     def mk_abs_timestamp_millis(self, orig_ts):
         """Convert the given millis since the epoch relative or absolute
@@ -294,6 +492,61 @@ class PbenchData:
             )
         return ts.strftime(_STD_DATETIME_FMT)
 
+    def mk_abs_timestamps_millis(
+        self, orig_ts: List[Optional[str]]
+    ) -> List[Optional[str]]:
+        """Convert a column of millis since the epoch relative or absolute
+        timestamps to absolute ISO string timestamps, all at once.
+
+        This is the vectorized equivalent of mk_abs_timestamp_millis(),
+        including the correction of timestamps relative to the start of the
+        run: the fractional seconds are rounded to microseconds (half to even)
+        exactly as `datetime` does, so that the results are identical.
+
+        Any timestamp which cannot be converted this way (not a float, out of
+        range, or outside the run) is returned as None, and the caller must
+        use mk_abs_timestamp_millis() to convert or report it.
+
+        Args:
+            orig_ts: the original timestamps, in milliseconds since the epoch
+
+        Returns:
+            A list of ISO timestamp strings, or None, in the original order
+        """
+
+        def to_float(ts) -> float:
+            try:
+                return float(ts)
+            except Exception:
+                return math.nan
+
+        ms = np.array([to_float(ts) for ts in orig_ts], dtype=np.float64)
+        start = np.datetime64(self.ptb.start_run_ts, "us")
+        end = np.datetime64(self.ptb.end_run_ts, "us")
+        secs = ms / 1000
+        valid = np.isfinite(secs) & (secs >= 0) & (secs < _MAX_EPOCH_SECONDS)
+        ms = np.where(valid, ms, 0.0)
+        secs = np.where(valid, secs, 0.0)
+
+        # Mirror datetime.utcfromtimestamp(secs).
+        whole = np.floor(secs)
+        usecs = whole.astype(np.int64) * 1000000 + np.round(
+            (secs - whole) * 1e6
+        ).astype(np.int64)
+        ts = usecs.astype("datetime64[us]")
+
+        # Mirror start_run_ts + timedelta(0, 0, ms * 1000) for timestamps which
+        # appear to be relative to the start of the run.
+        newts = start + np.round(ms * 1000).astype(np.int64).astype("timedelta64[us]")
+        before = ts < start
+        ts = np.where(before, newts, ts)
+        valid &= ts <= end
+
+        return [
+            str(val) if ok else None
+            for val, ok in zip(np.datetime_as_string(ts, unit="us"), valid)
+        ]
+
     def generate_index_name(self, template_name, source, toolname=None):
         """Return a fully formed index name given its template, prefix, source
         data (for an @timestamp field) and an optional tool name."""
@@ -1807,9 +2060,15 @@ def _noop(arg):
 
 
 class ToolData(PbenchData):
+    # The number of rows of each unified .csv file converted at a time.
+    UNIFIED_BLOCK_ROWS = 4096
+
     def __init__(self, ptb, iteration, sample, host, tool):
         super().__init__(ptb)
         self.toolname = tool
+        # Identifies this source of tool data within the dataset, for
+        # recording indexing progress.
+        self.source_key = ToolSource(iteration, sample, host, tool).key
         self.idxctx.opctx.append(
             _dict_const(
                 tbname=ptb.tbname,
@@ -1889,39 +2148,15 @@ class ToolData(PbenchData):
             self.basepath = basepath
             self.files = files
 
-    def _make_source_unified(self):
-        """Create one JSON document per identifier, per timestamp from
-        the data found in multiple csv files.
-
-        This algorithm is only applicable to 2 or more csv files which
-        contain data about 1 or more identifiers.
+    def _unified_mappings(self):
+        """Derive the unification mappings from the header rows of all the
+        .csv files.
 
-        The approach is to process each .csv file at the same time,
-        reading one row from each in lock step. The field data found
-        in each column across all files for a given identifier at the
-        same timestamp are unified into one JSON document.
-
-        For example, given 2 csv files:
-
-          * file0.csv
-            * timestamp_ms,id0_foo,id1_foo,id2_foo
-              * 00000, 1.0, 2.0, 3.0
-              * 00001, 1.1, 2.1, 3.1
-          * file1.csv
-            * timestamp_ms,id0_bar,id1_bar,id2_bar
-              * 00000, 4.0, 5.0, 6.0
-              * 00001, 4.1, 5.1, 6.1
-
-        The output would be 6 JSON records, one for each 3 identifiers
-        at each of two timestamps, with the fields "foo" and "bar" in
-        each:
-
-          [ { "@timestamp": 00000, "id": "id0", "foo": 1.0, "bar": 4.0 },
-            { "@timestamp": 00000, "id": "id1", "foo": 2.0, "bar": 5.0 },
-            { "@timestamp": 00000, "id": "id2", "foo": 3.0, "bar": 6.0 },
-            { "@timestamp": 00001, "id": "id0", "foo": 1.1, "bar": 4.1 },
-            { "@timestamp": 00001, "id": "id1", "foo": 2.1, "bar": 5.1 },
-            { "@timestamp": 00001, "id": "id2", "foo": 3.1, "bar": 6.1 } ]
+        Returns:
+            A tuple of the class list, the (klass, metric, converter) mapping
+            of each .csv file, the identifiers, the mapping of each .csv file
+            column to its (identifier, subfield), and the metadata of each
+            identifier
         """
         # Class list is generated from the handler data
         class_list = _dict_const()
@@ -2059,34 +2294,130 @@ class ToolData(PbenchData):
                         if colmd:
                             metadata[identifier] = colmd
 
-        # At this point, we have processed all the data about csv files
-        # and are ready to start reading the contents of all the csv
-        # files and building the unified records.
-        def rows_generator():
-            # We use this generator to highlight the process of reading from
-            # all the csv files, reading one row from each of the csv files,
-            # returning that as a dictionary of csv file to row read, which
-            # in turn is yielded by the generator.
-            idx = 0
-            while True:
-                # Read a row from each .csv file
-                rows = _dict_const()
-                for csvf in self.files:
-                    try:
-                        rows[csvf["basename"]] = next(csvf["reader"])
-                    except StopIteration:
-                        # This should handle the case of mismatched number of
-                        # rows across all .csv files. All readers which have
-                        # finished will emit a StopIteration.
-                        pass
-                if not rows:
-                    # None of the csv file readers returned any rows to
-                    # process, so we're done.
-                    break
-                # Yield the one dictionary that contains each newly read row
-                # from all the csv files.
-                yield idx, rows
-                idx += 1
+        return class_list, metric_mapping, identifiers, field_mapping, metadata
+
+    def _unified_datum(self, identifiers, metadata, class_list, ts_val, first, idx):
+        """Create the base documents, one per identifier, for one row of
+        unified .csv data.
+
+        Args:
+            identifiers: the identifiers found in the .csv column headers
+            metadata: the metadata of each identifier
+            class_list: the classes of the .csv files
+            ts_val: the absolute timestamp string of the row
+            first: the original timestamp of the row
+            idx: the row number
+
+        Returns:
+            A dictionary mapping each identifier to its base document, and a
+            dictionary mapping each class (or None) to a dictionary of the
+            document field of each identifier holding the data of that class
+        """
+        # We are now ready to create a base document per identifier to
+        # hold all the fields from the various columns. Given the two
+        # input dictionaries, "identifiers" and "metadata", we create
+        # an output dictionary, "datum", which has keys for all the
+        # identifiers and a base dictionary for forming the JSON docs.
+
+        # For example, given these inputs:
+        #   * identifiers = { "id0": True, "id1": True }
+        #   * metadata = { "id0": { "f1": "foo", "f2": "bar" },
+        #                  "id1": { "f1": "faz", "f2": "baz" } }
+        # The for loop below would generate the following dictionary:
+        #   * datum = { "id0": { "@timestamp": ts_str,
+        #                        "run": self.run_metadata,
+        #                        "sample": self.sample_metadata,
+        #                        "iteration": self.iteration_metadata,
+        #                        self.toolname: { "id": "id0",
+        #                                         "f1": "foo",
+        #                                         "f2": "bar" } },
+        #               "id1": { "@timestamp": ts_str,
+        #                        "run": self.run_metadata,
+        #                        "sample": self.sample_metadata,
+        #                        "iteration": self.iteration_metadata,
+        #                        self.toolname: { "id": "id1",
+        #                                         "f1": "faz",
+        #                                         "f2": "baz" } },
+
+        datum = _dict_const()
+        dests = {klass: {} for klass in class_list.keys()}
+        dests[None] = {}
+        for identifier in identifiers.keys():
+            tooldoc = _dict_const()
+            datum[identifier] = _dict_const(
+                [
+                    # Since they are all the same, we use the first to
+                    # generate the real timestamp.
+                    ("@timestamp", ts_val),
+                    ("@timestamp_original", str(first)),
+                    ("run", self.run_metadata),
+                    ("iteration", self.iteration_metadata),
+                    ("sample", self.sample_metadata),
+                    (self.toolname, tooldoc),
+                ]
+            )
+            dests[None][identifier] = tooldoc
+            if identifier != "__none__":
+                tooldoc["id"] = identifier
+            tooldoc["@idx"] = idx
+            try:
+                md = metadata[identifier]
+            except KeyError:
+                pass
+            else:
+                tooldoc.update(md)
+            for klass in class_list.keys():
+                tooldoc[klass] = dests[klass][identifier] = _dict_const()
+        return datum, dests
+
+    def _make_source_unified(self):
+        """Create one JSON document per identifier, per timestamp from
+        the data found in multiple csv files.
+
+        This algorithm is only applicable to 2 or more csv files which
+        contain data about 1 or more identifiers.
+
+        The approach is to read the .csv files in lockstep, a block of
+        UNIFIED_BLOCK_ROWS rows at a time, converting the timestamp column
+        of each block at once (see mk_abs_timestamps_millis()). The field
+        data found in each column across all files for a given identifier
+        at the same row are then unified into one JSON document, using the
+        column mapping derived once from the headers.
+
+        For example, given 2 csv files:
+
+          * file0.csv
+            * timestamp_ms,id0_foo,id1_foo,id2_foo
+              * 00000, 1.0, 2.0, 3.0
+              * 00001, 1.1, 2.1, 3.1
+          * file1.csv
+            * timestamp_ms,id0_bar,id1_bar,id2_bar
+              * 00000, 4.0, 5.0, 6.0
+              * 00001, 4.1, 5.1, 6.1
+
+        The output would be 6 JSON records, one for each 3 identifiers
+        at each of two timestamps, with the fields "foo" and "bar" in
+        each:
+
+          [ { "@timestamp": 00000, "id": "id0", "foo": 1.0, "bar": 4.0 },
+            { "@timestamp": 00000, "id": "id1", "foo": 2.0, "bar": 5.0 },
+            { "@timestamp": 00000, "id": "id2", "foo": 3.0, "bar": 6.0 },
+            { "@timestamp": 00001, "id": "id0", "foo": 1.1, "bar": 4.1 },
+            { "@timestamp": 00001, "id": "id1", "foo": 2.1, "bar": 5.1 },
+            { "@timestamp": 00001, "id": "id2", "foo": 3.1, "bar": 6.1 } ]
+        """
+        (
+            class_list,
+            metric_mapping,
+            identifiers,
+            field_mapping,
+            metadata,
+        ) = self._unified_mappings()
+
+        # The (column, identifier, subfield) tuples of each .csv file.
+        columns = _dict_const()
+        for fname, fmap in field_mapping.items():
+            columns[fname] = [(i, *fmap[i]) for i in range(1, len(fmap))]
 
         self.logger.info(
             "tool-data-indexing: tool {}, gen unified begin for {}",
@@ -2095,114 +2426,88 @@ class ToolData(PbenchData):
         )
         prev_first = None
         prev_ts_val = None
-        for idx, rows in rows_generator():
-            # Verify timestamps are all the same for this row.
-            tstamp = None
-            first = None
-            for fname in rows.keys():
-                tstamp = rows[fname][0]
-                if first is None:
-                    first = tstamp
-                elif first != tstamp:
-                    self.logger.warning(
-                        "tool-data-indexing: {} csv files have"
-                        " inconsistent timestamps per row ({})",
-                        self.toolname,
-                        self.ptb._tbctx,
-                    )
-                    self.counters["inconsistent_timestamps_across_csv_files"] += 1
-                    break
-            # We are now ready to create a base document per identifier to
-            # hold all the fields from the various columns. Given the two
-            # input dictionaries, "identifiers" and "metadata", we create
-            # an output dictionary, "datum", which has keys for all the
-            # identifiers and a base dictionary for forming the JSON docs.
-
-            # For example, given these inputs:
-            #   * identifiers = { "id0": True, "id1": True }
-            #   * metadata = { "id0": { "f1": "foo", "f2": "bar" },
-            #                  "id1": { "f1": "faz", "f2": "baz" } }
-            # The for loop below would generate the following dictionary:
-            #   * datum = { "id0": { "@timestamp": ts_str,
-            #                        "run": self.run_metadata,
-            #                        "sample": self.sample_metadata,
-            #                        "iteration": self.iteration_metadata,
-            #                        self.toolname: { "id": "id0",
-            #                                         "f1": "foo",
-            #                                         "f2": "bar" } },
-            #               "id1": { "@timestamp": ts_str,
-            #                        "run": self.run_metadata,
-            #                        "sample": self.sample_metadata,
-            #                        "iteration": self.iteration_metadata,
-            #                        self.toolname: { "id": "id1",
-            #                                         "f1": "faz",
-            #                                         "f2": "baz" } },
-
-            # The timestamp is taken from the "first" timestamp, converted
-            # to a floating point value in seconds, and then formatted as a
-            # string.
-            ts_val = self.mk_abs_timestamp_millis(first)
-            assert (
-                prev_ts_val is None or prev_ts_val <= ts_val
-            ), "prev_ts_val ({!r}, {!r}) > first ({!r}, {!r})".format(
-                prev_ts_val, prev_first, ts_val, first
-            )
-            prev_first = first
-            prev_ts_val = ts_val
-            datum = _dict_const()
-            for identifier in identifiers.keys():
-                datum[identifier] = _dict_const(
-                    [
-                        # Since they are all the same, we use the first to
-                        # generate the real timestamp.
-                        ("@timestamp", ts_val),
-                        ("@timestamp_original", str(first)),
-                        ("run", self.run_metadata),
-                        ("iteration", self.iteration_metadata),
-                        ("sample", self.sample_metadata),
-                        (self.toolname, _dict_const()),
-                    ]
+        base = 0
+        while True:
+            # The next block of rows of each .csv file; a file which has run
+            # out of rows contributes none.
+            tables = _dict_const()
+            for csvf in self.files:
+                tables[csvf["basename"]] = list(
+                    islice(csvf["reader"], self.UNIFIED_BLOCK_ROWS)
                 )
-                if identifier != "__none__":
-                    datum[identifier][self.toolname]["id"] = identifier
-                datum[identifier][self.toolname]["@idx"] = idx
-                try:
-                    md = metadata[identifier]
-                except KeyError:
-                    pass
-                else:
-                    datum[identifier][self.toolname].update(md)
-                for klass in class_list.keys():
-                    datum[identifier][self.toolname][klass] = _dict_const()
-            # Now we can perform the mapping from multiple .csv files to JSON
-            # documents using a known field hierarchy (no identifiers in field
-            # names) with the identifiers as additional metadata. Note that we
-            # are constructing this document just from the current row of data
-            # taken from all .csv files (assumes timestamps are the same).
-            for fname, row in rows.items():
-                klass, metric, converter = metric_mapping[fname]
-                for i, val in enumerate(row):
-                    if i == 0:
-                        continue
-                    # Given an fname and a column offset, return the
-                    # identifier from the header
-                    identifier, subfield = field_mapping[fname][i]
-                    if klass is not None:
-                        _d = datum[identifier][self.toolname][klass]
-                    else:
-                        _d = datum[identifier][self.toolname]
-                    if subfield:
-                        if metric not in _d:
-                            _d[metric] = _dict_const()
-                        _d[metric][subfield] = converter(val)
-                    else:
-                        _d[metric] = converter(val)
-            # At this point we have fully mapped all data from all .csv files
-            # to their proper fields for each identifier. Now we can yield
-            # records for each of the identifiers.
-            for _id, source in datum.items():
-                source_id = PbenchData.make_source_id(source)
-                yield source, source_id
+            nrows = max((len(table) for table in tables.values()), default=0)
+            if nrows == 0:
+                break
+
+            # The timestamp of each row is taken from the first .csv file
+            # which still has that row; we convert the block's all at once.
+            # (An empty row has no timestamp, and fails the per-row
+            # consistency check below.)
+            firsts = [None] * nrows
+            for table in reversed(tables.values()):
+                for n, row in enumerate(table):
+                    firsts[n] = row[0] if row else None
+            ts_vals = self.mk_abs_timestamps_millis(firsts)
+
+            for n in range(nrows):
+                idx = base + n
+                rows = _dict_const()
+                for fname, table in tables.items():
+                    if n < len(table):
+                        rows[fname] = table[n]
+                # Verify timestamps are all the same for this row.
+                tstamp = None
+                first = None
+                for fname in rows.keys():
+                    tstamp = rows[fname][0]
+                    if first is None:
+                        first = tstamp
+                    elif first != tstamp:
+                        self.logger.warning(
+                            "tool-data-indexing: {} csv files have"
+                            " inconsistent timestamps per row ({})",
+                            self.toolname,
+                            self.ptb._tbctx,
+                        )
+                        self.counters["inconsistent_timestamps_across_csv_files"] += 1
+                        break
+                ts_val = ts_vals[n]
+                if ts_val is None:
+                    # The batch conversion could not handle this timestamp: let
+                    # the individual conversion handle it, or report the error.
+                    ts_val = self.mk_abs_timestamp_millis(first)
+                assert (
+                    prev_ts_val is None or prev_ts_val <= ts_val
+                ), "prev_ts_val ({!r}, {!r}) > first ({!r}, {!r})".format(
+                    prev_ts_val, prev_first, ts_val, first
+                )
+                prev_first = first
+                prev_ts_val = ts_val
+                datum, class_dests = self._unified_datum(
+                    identifiers, metadata, class_list, ts_val, first, idx
+                )
+                for fname, row in rows.items():
+                    klass, metric, converter = metric_mapping[fname]
+                    cols = columns[fname]
+                    if len(row) != len(cols) + 1:
+                        # The row doesn't match the header: map what we have.
+                        cols = [
+                            (i, *field_mapping[fname][i]) for i in range(1, len(row))
+                        ]
+                    # The document field of each identifier receiving the data
+                    # of this .csv file.
+                    dests = class_dests[klass]
+                    for i, identifier, subfield in cols:
+                        _d = dests[identifier]
+                        if subfield:
+                            if metric not in _d:
+                                _d[metric] = _dict_const()
+                            _d[metric][subfield] = converter(row[i])
+                        else:
+                            _d[metric] = converter(row[i])
+                for source in datum.values():
+                    yield source
+            base += nrows
         self.logger.info(
             "tool-data-indexing: tool {}, end unified for {}",
             self.toolname,
@@ -2277,8 +2582,7 @@ class ToolData(PbenchData):
                         column = header[col]
                         _d[metric][column] = converter(val)
 
-                source_id = PbenchData.make_source_id(datum)
-                yield datum, source_id
+                yield datum
                 idx += 1
             self.logger.info(
                 "tool-data-indexing: tool {}, individual end {}",
@@ -2318,245 +2622,6 @@ class ToolData(PbenchData):
         }
     }
 
-    def _stdout_keyval(self, file_object, converter, path):
-        """Process a line of a stdout key/value pair output file, building up the
-        record (dict) by adding each key/value pair found, associating them
-        with the previously encountered timestamp.  A record is yielded as one
-        JSON object when indexed.
-
-        The format for files considered by this method is as follows:
-
-         * each line of the file contains an ascii-numeric key and a
-           numeric (integer or floating point) value separated by a ':'
-         * the keyword, `timestamp`, is recognized to be the
-           timestamp value to be associated with all following
-           key/value pairs until the next `timestamp` keyword
-           is encountered
-         * all key/value pairs are treated as fields of one JSON
-           document with the associated timestamp to be indexed
-
-        An example file format:
-
-        timestamp: 12345.00
-        key0: 100.0
-        key1: 100.1
-        ...
-        keyN: 100.N
-        timestamp: 12345.01
-        key0: 100.0
-        key1: 100.1
-        ...
-        keyN: 100.N
-        timestamp: ...
-
-        """
-        record = None
-        prev_gauge = None
-        ts_orig = None
-        prev_ts_orig = None
-        try:
-            # Fetch the remaps table to see if any naming conflicts need to be
-            # resolved.
-            remaps = self._remaps[self.toolname]
-        except KeyError:
-            remaps = None
-        idx = 0
-        self.logger.info(
-            "tool-data-indexing: tool {}, stdout keyval start {}", self.toolname, path
-        )
-        for line in file_object:
-            if line.startswith("timestamp:"):
-                prev_ts_orig = ts_orig
-                if record:
-                    # timestamp delimits records, yield last record.
-                    if not record[self.toolname]["rate"]:
-                        # For first record, rate will be empty, so
-                        # don't emit it.
-                        del record[self.toolname]["rate"]
-                    yield record
-                    idx += 1
-                    # Be sure to remember the record we just emitted
-                    # so that it is available for rate calculations.
-                    prev_gauge = record[self.toolname]["gauge"]
-                # Get the second column, the timestamp value, which is
-                # *seconds* since the epoch, and then convert to millis
-                # since the epoch.
-                ts_orig = float(line.split(":")[1])
-                assert (
-                    prev_ts_orig is None or prev_ts_orig <= ts_orig
-                ), f"prev_ts_orig {prev_ts_orig!r} > ts_orig {ts_orig!r}"
-                ts_str = self.mk_abs_timestamp_millis(ts_orig * 1000)
-                record = _dict_const()
-                record["@timestamp"] = ts_str
-                record["@timestamp_original"] = str(ts_orig)
-                record["run"] = self.run_metadata
-                record["iteration"] = self.iteration_metadata
-                record["sample"] = self.sample_metadata
-                record[self.toolname] = _dict_const()
-                record[self.toolname]["@idx"] = idx
-                record[self.toolname]["gauge"] = gauge = _dict_const()
-                record[self.toolname]["rate"] = rate = _dict_const()
-            elif ts_orig is None:
-                # We have not encountered a timestamp yet, so ignore
-                # all lines until the first timestamp.
-                continue
-            else:
-                key, value = line.strip().split(" ")
-                parts = key.split("_", 1)
-                if len(parts) == 1:
-                    # For keys that are not split into stat and substat, look
-                    # to see if the stat needs to be rename to avoid conflict
-                    # with other keys that might share the same prefix.
-                    if remaps is not None:
-                        try:
-                            stat = remaps["key"][key]
-                        except KeyError:
-                            stat = key
-                    else:
-                        stat = key
-                    gauge[stat] = converter(value)
-                    if prev_ts_orig:
-                        # Note we don't record the rate on the first value
-                        # encountered.
-                        duration = ts_orig - prev_ts_orig
-                        value_diff = int(value) - prev_gauge[stat]
-                        the_rate = value_diff / duration
-                        rate[stat] = the_rate
-                else:
-                    assert len(parts) == 2, "Logic error! parts is not parts!"
-                    stat = parts[0]
-                    substat = parts[1]
-                    if stat not in gauge:
-                        gauge[stat] = _dict_const()
-                    gauge[stat][substat] = converter(value)
-                    if prev_ts_orig:
-                        # Note we don't record the rate on the first value
-                        # encountered.
-                        duration = (ts_orig / 1000) - (prev_ts_orig / 1000)
-                        value_diff = int(value) - prev_gauge[stat][substat]
-                        the_rate = value_diff / duration
-                        if stat not in rate:
-                            rate[stat] = _dict_const()
-                        rate[stat][substat] = the_rate
-        if record and record[self.toolname]["gauge"]:
-            yield record
-        self.logger.info(
-            "tool-data-indexing: tool {}, stdout keyval end {}", self.toolname, path
-        )
-
-    def _stdout_procint(self, file_object, converter, path):
-        """Process the two-dimensional proc-interrupts output.
-
-        An example file format:
-        timestamp: 1394048617.043209234
-                   CPU0       CPU1       CPU2       CPU3
-          0:         25          0          0          0   IO-APIC-edge      timer
-          1:         10          0          0          0   IO-APIC-edge      i8042
-        NMI:          0          0          0          0   Non-maskable interrupts
-        LOC:      48687      45068      40188      65602   Local timer interrupts
-        SPU:          0          0          0          0   Spurious interrupts
-        """
-        cpu_column_ids = None
-        cpu_count = None
-        ts_str = None
-        ts_orig = None
-        prev_ts_orig = None
-        prev_gauges = _dict_const()
-        idx = 0
-        self.logger.info(
-            "tool-data-indexing: tool {}, stdout procint start {}", self.toolname, path
-        )
-        for line in file_object:
-            if line.startswith("timestamp:"):
-                idx += 1
-                prev_ts_orig = ts_orig
-                # Get the second column, the timestamp value, which is
-                # *seconds* since the epoch, and then convert to millis
-                # since the epoch.
-                ts_orig = float(line.split(":")[1])
-                assert (
-                    prev_ts_orig is None or prev_ts_orig <= ts_orig
-                ), f"prev_ts_orig {prev_ts_orig!r} > ts_orig {ts_orig!r}"
-                ts_str = self.mk_abs_timestamp_millis(ts_orig * 1000)
-                # The next line is assumed to be the header, so instead of
-                # looping to get to it, we just pull it out and process it
-                # here.
-                header = next(file_object)
-                columns = header.split()
-                cpu_column_ids = []
-                for cpu in columns:
-                    if not cpu.startswith("CPU"):
-                        raise Exception(
-                            "Bad proc-interrupts-stdout.txt file encountered"
-                        )
-                    cpu_column_ids.append(cpu[3:])
-                cpu_count = len(cpu_column_ids)
-                continue
-            parts = line[:-1].split(None, 1 + cpu_count)
-            int_id = parts[0][:-1]
-            if int_id in ("ERR", "MIS"):
-                record = _dict_const()
-                record["@timestamp"] = ts_str
-                record["@timestamp_original"] = str(ts_orig)
-                record["run"] = self.run_metadata
-                record["iteration"] = self.iteration_metadata
-                record["sample"] = self.sample_metadata
-                record[self.toolname] = _dict_const()
-                record[self.toolname]["@idx"] = idx
-                record[self.toolname]["int_id"] = int_id
-                record[self.toolname]["gauge"] = value = converter(parts[1])
-                if int_id in prev_gauges:
-                    duration = ts_orig - prev_ts_orig
-                    value_diff = value - prev_gauges[int_id]
-                    the_rate = value_diff / duration
-                    record[self.toolname]["rate"] = the_rate
-                prev_gauges[int_id] = value
-                yield record
-            else:
-                desc_str = parts[-1]
-                col = 1
-                records = []
-                cpu_gauges = []
-                for cpu in cpu_column_ids:
-                    val = converter(parts[col])
-                    col += 1
-                    record = _dict_const()
-                    record["@timestamp"] = ts_str
-                    record["@timestamp_original"] = str(ts_orig)
-                    record["run"] = self.run_metadata
-                    record["iteration"] = self.iteration_metadata
-                    record["sample"] = self.sample_metadata
-                    record[self.toolname] = _dict_const()
-                    record[self.toolname]["@idx"] = idx
-                    record[self.toolname]["int_id"] = int_id
-                    record[self.toolname]["cpu_id"] = cpu
-                    record[self.toolname]["desc"] = desc_str
-                    record[self.toolname]["gauge"] = val
-                    records.append(record)
-                    cpu_gauges.append(val)
-                if int_id in prev_gauges:
-                    prev_cpu_gauges = prev_gauges[int_id]
-                    col = 0
-                    duration = ts_orig - prev_ts_orig
-                    for record in records:
-                        value_diff = (
-                            record[self.toolname]["gauge"] - prev_cpu_gauges[col]
-                        )
-                        the_rate = value_diff / duration
-                        record[self.toolname]["rate"] = the_rate
-                prev_gauges[int_id] = cpu_gauges
-                for record in records:
-                    yield record
-        self.logger.info(
-            "tool-data-indexing: tool {}, stdout procint end {}", self.toolname, path
-        )
-        return
-
-    _subformats = {
-        "procint": _stdout_procint,
-        "keyval": _stdout_keyval,
-    }
-
     def _make_source_stdout(self):
         """Read the given set of files one at a time, emitting a record for each data
         set associated with a timestamp. The timestamp is expected to be on a
@@ -2567,7 +2632,8 @@ class ToolData(PbenchData):
         Where the timestamp value represents the number of seconds since the epoch.
 
         Following that timestamp line will be a payload of data formatted in
-        one of the supported "sub-formats" (see _subformats array above).
+        one of the supported "sub-formats", each of which has a parser
+        registered in pbench.server.tool_stdout.
         """
         for output_file in self.files:
             handler_rec = output_file["handler_rec"]
@@ -2577,22 +2643,21 @@ class ToolData(PbenchData):
             except KeyError:
                 converter = _noop
             try:
-                func = self._subformats[subformat]
+                parser_class = tool_stdout.PARSERS[subformat]
             except KeyError:
                 self.logger.warning(
                     "tool-data-indexing: encountered unrecognized"
                     " sub-format, '{}', not one of {!r} ({})",
                     subformat,
-                    [key for key in self._subformats.keys()],
+                    [key for key in tool_stdout.PARSERS.keys()],
                     self.ptb._tbctx,
                 )
                 self.counters["unrecognized_subformat"] += 1
                 continue
+            parser = parser_class(self, converter, output_file["path"])
             path = os.path.join(self.ptb.extracted_root, output_file["path"])
             with open(path, "r") as file_object:
-                for record in func(self, file_object, converter, output_file["path"]):
-                    source_id = PbenchData.make_source_id(record)
-                    yield record, source_id
+                yield from parser.parse(file_object)
 
     def _make_source_json(self):
         """Process JSON files in the form of an outer JSON array of ready to
@@ -2704,8 +2769,7 @@ class ToolData(PbenchData):
 
                 # Any further transformations needed should be done here.
 
-                source_id = PbenchData.make_source_id(source)
-                yield source, source_id
+                yield source
                 idx += 1
             self.logger.info(
                 "tool-data-indexing: tool {}, json end {}", self.toolname, df["path"]
@@ -2714,7 +2778,11 @@ class ToolData(PbenchData):
 
     def make_source(self):
         """Simple jump method to pick the correct source generator based on the
-        handler's prospectus."""
+        handler's prospectus.
+
+        Each generator yields the source documents, without IDs, which are
+        computed along with the bulk payload as the actions are generated.
+        """
         if not self.files:
             # If we do not have any data files for this tool, ignore it.
             return
@@ -2850,6 +2918,45 @@ def get_md5sum_of_dir(dir, parentid):
     return h.hexdigest()
 
 
+def check_source_ids(
+    es: Elasticsearch, actions: Iterator[JSONOBJECT], batch_size: int = 1000
+) -> Counter:
+    """Check whether the IDs of tool data documents are already indexed.
+
+    Each document is looked up by its ID in the index it would be written to,
+    in batches, without fetching the source. A document which is found would
+    be reported as a duplicate if the dataset were re-indexed; one which
+    isn't found would be indexed as a new document, either because its ID has
+    changed or because the dataset's tool data hasn't been indexed.
+
+    Args:
+        es: an Elasticsearch client
+        actions: tool data actions, as from mk_tool_data_actions()
+        batch_size: the number of documents to look up in each request
+
+    Returns:
+        Counts of the "documents", and of those "found" and "missing"
+    """
+    counts = Counter(documents=0, found=0, missing=0)
+
+    def check(batch: List[JSONOBJECT]):
+        docs = [{"_index": a["_index"], "_id": a["_id"]} for a in batch]
+        response = es.mget(body={"docs": docs}, _source=False)
+        for doc in response["docs"]:
+            counts["found" if doc.get("found") else "missing"] += 1
+        counts["documents"] += len(batch)
+
+    batch = []
+    for action in actions:
+        batch.append(action)
+        if len(batch) >= batch_size:
+            check(batch)
+            batch = []
+    if batch:
+        check(batch)
+    return counts
+
+
 def valid_ip(address):
     try:
         socket.inet_aton(address)
@@ -3161,6 +3268,49 @@ class Sample:
         self.path = os.path.join(iteration.path, name)
 
 
+class ToolSource(NamedTuple):
+    """Identify a source of tool data within a dataset.
+
+    Each source is the data of one tool, on one host, for one sample of one
+    iteration, and is indexed independently of the others: a ToolData object
+    for the source can be constructed from these fields.
+    """
+
+    iteration: str
+    sample: str
+    host: str
+    tool: str
+
+    @property
+    def key(self) -> str:
+        """The key recording the indexing progress of the source."""
+        return f"{self.iteration}/{self.sample}/{self.host}/{self.tool}"
+
+
+class TarMember(NamedTuple):
+    """A member of an unpacked tar ball.
+
+    This provides the subset of the `tarfile.TarInfo` interface used by the
+    indexer, with the member type expressed as a `tarfile` type constant.
+    """
+
+    name: str
+    type: bytes
+    mode: int
+    mtime: float
+    size: int = 0
+    linkpath: str = ""
+
+    def isdir(self) -> bool:
+        return self.type == tarfile.DIRTYPE
+
+    def isfile(self) -> bool:
+        return self.type == tarfile.REGTYPE
+
+    def issym(self) -> bool:
+        return self.type == tarfile.SYMTYPE
+
+
 class PbenchTarBall:
     """Encapsulation of the data structures representing the contents of a
     pbench tar ball.
@@ -3194,12 +3344,6 @@ class PbenchTarBall:
         tb_stat = os.stat(self.tbname)
         mtime = datetime.utcfromtimestamp(tb_stat.st_mtime)
 
-        # TODO: Although we index from unpacked files on the file
-        # system, we repeatedly reference the list of TarInfo records from the
-        # Python tarfile package rather than navigating the file tree directly.
-        # This could likely be improved.
-        self.tb = tarfile.open(self.tbname)
-
         # Build a map showing the documents in each Elasticsearch index so we
         # can find them later to UPDATE or DELETE without searching all
         # indices.
@@ -3210,42 +3354,31 @@ class PbenchTarBall:
         # }
         self.index_map: IndexMapType = {}
 
-        # This is the top-level name of the run - it should be the common
-        # first component of every member of the tar ball.
+        # This is the top-level name of the run, which is the common first
+        # component of every member of the tar ball: the cache manager won't
+        # unpack a tar ball with any other member, raising a TarballFormatError
+        # (which is an UnsupportedTarballFormat).
         dirname = os.path.basename(self.tbname)
         self.dirname = dirname[: dirname.rfind(".tar.xz")]
-        # ... but let's make sure ...
-        #
-        # ... while we are at it, we verify we have a metadata.log file in the
-        # tar ball before we start extracting.
-        metadata_log_path = self.dirname + "/metadata.log"
-        metadata_log_found = False
-        self.members = self.tb.getmembers()
-        for m in self.members:
-            if m.name == metadata_log_path:
-                metadata_log_found = True
-            sampled_prefix = m.name.split(os.path.sep)[0]
-            if sampled_prefix != self.dirname:
-                # All members of the tar ball should have self.dirname as its
-                # prefix.
-                raise UnsupportedTarballFormat(
-                    '{} - directory prefix should be "{}", but is'
-                    ' "{}" instead, for tar ball member "{}"'.format(
-                        self.tbname, self.dirname, sampled_prefix, m.name
-                    )
-                )
-        if not metadata_log_found:
-            raise UnsupportedTarballFormat(
-                '{} - tar ball is missing "{}".'.format(self.tbname, metadata_log_path)
-            )
 
         self.extracted_root = tarobj.cache
-        if not os.path.isdir(os.path.join(self.extracted_root, self.dirname)):
+        unpacked = os.path.join(self.extracted_root, self.dirname)
+        if not os.path.isdir(unpacked):
             raise UnsupportedTarballFormat(
                 '{} - extracted tar ball directory "{}" does not'
-                " exist.".format(
-                    self.tbname, os.path.join(self.extracted_root, self.dirname)
-                )
+                " exist.".format(self.tbname, unpacked)
+            )
+
+        # Describe the members of the tar ball from the unpacked tree, rather
+        # than decompressing the tar ball a second time, and verify we have a
+        # metadata.log file before we go any further.
+        metadata_log_path = self.dirname + "/metadata.log"
+        self.members = self.scan_members(
+            self.extracted_root, self.dirname, tarobj.get_modes()
+        )
+        if not any(m.name == metadata_log_path for m in self.members):
+            raise UnsupportedTarballFormat(
+                '{} - tar ball is missing "{}".'.format(self.tbname, metadata_log_path)
             )
 
         # Construct the @metadata and run metadata dictionaries from the
@@ -3427,6 +3560,70 @@ class PbenchTarBall:
         except KeyError:
             self.index_map[root_idx] = [index]
 
+    @staticmethod
+    def scan_members(
+        root: str, dirname: str, modes: Optional[Dict[str, int]] = None
+    ) -> List[TarMember]:
+        """Describe the members of an unpacked tar ball.
+
+        We walk the unpacked tree once, without following symlinks, listing
+        each directory before its contents and the contents of a directory in
+        name order, so that, as in a tar ball, every member follows its
+        parent directory. The cache manager restores the times of the members
+        as it unpacks them, but not all of their modes (it makes everything
+        readable by everyone), so it gives us the modes recorded in the tar
+        ball; we use the mode of the unpacked member only if that's missing.
+        As `tar` does, we describe the second and later names of a hard linked
+        file as links to the first.
+
+        Args:
+            root: the directory into which the tar ball was unpacked
+            dirname: the name of the top-level directory of the tar ball
+            modes: the modes recorded in the tar ball, by path relative to
+                the top-level directory (which is ".")
+
+        Returns:
+            the list of members, beginning with the top-level directory
+        """
+        members: List[TarMember] = []
+        inodes = {}
+        modes = modes or {}
+        prefix_l = len(dirname) + 1
+
+        def member(path: str, name: str, st: os.stat_result) -> Optional[TarMember]:
+            mode = modes.get(name[prefix_l:] or ".", stat.S_IMODE(st.st_mode))
+            if stat.S_ISDIR(st.st_mode):
+                return TarMember(name, tarfile.DIRTYPE, mode, st.st_mtime)
+            if stat.S_ISLNK(st.st_mode):
+                return TarMember(
+                    name, tarfile.SYMTYPE, mode, st.st_mtime, 0, os.readlink(path)
+                )
+            if stat.S_ISREG(st.st_mode):
+                if st.st_nlink > 1:
+                    first = inodes.setdefault((st.st_dev, st.st_ino), name)
+                    if first != name:
+                        return TarMember(
+                            name, tarfile.LNKTYPE, mode, st.st_mtime, 0, first
+                        )
+                return TarMember(name, tarfile.REGTYPE, mode, st.st_mtime, st.st_size)
+            return None
+
+        def walk(path: str, name: str):
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+            for entry in entries:
+                child = f"{name}/{entry.name}"
+                m = member(entry.path, child, entry.stat(follow_symlinks=False))
+                if m:
+                    members.append(m)
+                    if m.isdir():
+                        walk(entry.path, child)
+
+        top = os.path.join(root, dirname)
+        members.append(member(top, dirname, os.lstat(top)))
+        walk(top, dirname)
+        return members
+
     def gen_files_by_partial_path(self, path):
         """Generator for all files in the tar ball which match the given path
         pattern.
@@ -3925,9 +4122,8 @@ class PbenchTarBall:
             source["authorization"] = self.authorization
             yield source
 
-    def mk_tool_data(self):
-        """Yield ToolData() objects for each tool directory found in the
-        hierarhcy.
+    def mk_tool_sources(self) -> Iterator[ToolSource]:
+        """Yield a ToolSource for each tool directory found in the hierarhcy.
 
         Tool data are stored in various files in the tar ball under a specific
         hierarchy.  The structure looks like the following:
@@ -3958,48 +4154,64 @@ class PbenchTarBall:
                     tool_names = list(tools_data.keys())
                     tool_names.sort()
                     for tool in tool_names:
-                        yield ToolData(
-                            self, iteration.name, sample.name, hostname, tool
-                        )
+                        yield ToolSource(iteration.name, sample.name, hostname, tool)
         return
 
+    def mk_tool_data(self):
+        """Yield ToolData() objects for each tool directory found in the
+        hierarchy (see mk_tool_sources())."""
+        for source in self.mk_tool_sources():
+            yield ToolData(self, *source)
+
     def mk_tool_data_actions(self):
         """Generate all the tool data actions from the entire run hierarchy."""
         self.idxctx.logger.debug("start")
         count = 0
         for td in self.mk_tool_data():
-            # Each ToolData object, td, that is returned here represents how
-            # data collected for that tool across all hosts is to be returned.
-            # The make_source method returns a generator that will emit each
-            # source document for the appropriate unit of tool data.  Each has
-            # the option of constructing that data as best fits its tool data.
-            # The tool data for each tool is kept in its own index to allow
-            # for different curation policies for each tool.
-            asource = td.make_source()
-            if not asource:
-                continue
-            for source, source_id in asource:
-                try:
-                    idx_name = td.generate_index_name(
-                        "tool-data", source, toolname=td.toolname
-                    )
-                except BadDate:
-                    pass
-                else:
-                    self.map_document(f"tool-data-{td.toolname}", idx_name)
-                    source["@generated-by"] = self.idxctx.get_tracking_id()
-                    source["authorization"] = self.authorization
-                    action = _dict_const(
-                        _op_type=_op_type,
-                        _index=idx_name,
-                        _id=source_id,
-                        _source=source,
-                    )
-                    count += 1
-                    yield action
+            for action in self.mk_tool_source_actions(td):
+                count += 1
+                yield action
         self.idxctx.logger.debug("end [{:d} tool data documents]", count)
         return
 
+    def mk_tool_source_actions(self, td: "ToolData"):
+        """Generate the actions for a single source of tool data.
+
+        Args:
+            td: a ToolData object yielded by mk_tool_data()
+        """
+        # Each ToolData object, td, that is returned here represents how
+        # data collected for that tool across all hosts is to be returned.
+        # The make_source method returns a generator that will emit each
+        # source document for the appropriate unit of tool data.  Each has
+        # the option of constructing that data as best fits its tool data.
+        # The tool data for each tool is kept in its own index to allow
+        # for different curation policies for each tool.
+        asource = td.make_source()
+        if not asource:
+            return
+        extra = {
+            "@generated-by": self.idxctx.get_tracking_id(),
+            "authorization": self.authorization,
+        }
+        for source in asource:
+            try:
+                idx_name = td.generate_index_name(
+                    "tool-data", source, toolname=td.toolname
+                )
+            except BadDate:
+                pass
+            else:
+                self.map_document(f"tool-data-{td.toolname}", idx_name)
+                source_id, payload = PbenchData.make_source_payload(source, extra)
+                action = _dict_const(
+                    _op_type=_op_type,
+                    _index=idx_name,
+                    _id=source_id,
+                    _source=payload,
+                )
+                yield action
+
     def mk_result_data_actions(self):
         """Generate all the result data actions."""
         self.idxctx.logger.debug("start")
@@ -4075,6 +4287,13 @@ class IdxContext:
         self.getuid = os.getuid
         self.TS = self.config.TS
 
+        self.bulk_queue_depth = self.config.getint(
+            "Indexing", "bulk_queue_depth", fallback=BULK_QUEUE_DEPTH
+        )
+        self.bulk_batch_size = self.config.getint(
+            "Indexing", "bulk_batch_size", fallback=BULK_BATCH_SIZE
+        )
+
         self.es = get_es(self.config)
         self.templates = PbenchTemplates(
             self.config.LIBDIR,
@@ -1,12 +1,32 @@
 """Initialising Indexing class"""
 
 from argparse import Namespace
-from collections import deque
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+import multiprocessing
 import os
 from pathlib import Path
+import pickle
+import queue
 import signal
 import tempfile
-from typing import Callable, List, NamedTuple, Optional, Tuple
+import time
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+from pquisby.lib.post_processing import BenchmarkName, InputType, QuisbyProcessing
 
 from pbench.common.exceptions import (
     BadDate,
@@ -14,20 +34,33 @@ from pbench.common.exceptions import (
     TemplateError,
     UnsupportedTarballFormat,
 )
-from pbench.server import OperationCode, tstos
+from pbench.server import JSONOBJECT, OperationCode, tstos
 from pbench.server.cache_manager import CacheManager, LockManager, Tarball
+from pbench.server.database.database import Database
 from pbench.server.database.models.audit import Audit, AuditStatus
 from pbench.server.database.models.datasets import (
     Dataset,
     DatasetError,
     Metadata,
+    MetadataError,
     OperationName,
     OperationState,
 )
 from pbench.server.database.models.index_map import IndexMap
-from pbench.server.indexer import es_index, IdxContext, PbenchTarBall, VERSION
+from pbench.server.indexer import (
+    check_source_ids,
+    es_index,
+    get_es,
+    IdxContext,
+    PbenchTarBall,
+    ToolData,
+    ToolSource,
+    VERSION,
+)
+from pbench.server.quisby_cache import QuisbyCache
 from pbench.server.report import Report
 from pbench.server.sync import Sync
+from pbench.server.utils import get_benchmark_name
 
 
 class SigIntException(Exception):
@@ -87,6 +120,203 @@ class TarballData(NamedTuple):
     tarball: str
 
 
+@dataclass
+class Throughput:
+    """Accumulated indexing statistics for one indexing process."""
+
+    datasets: int = 0
+    documents: int = 0
+    seconds: float = 0.0
+
+
+class WorkerResult(NamedTuple):
+    """The result of indexing one tarball in a worker process.
+
+    This is returned to the parent process, which owns all of the dataset
+    state updates, so it must be picklable.
+    """
+
+    resource_id: str
+    tbname: Optional[str]
+    error: str
+    es_res: Optional[Tuple[int, int, int, int, int, int]]
+    index_map: Optional[JSONOBJECT]
+    opctx: List[JSONOBJECT]
+    ie_filepath: str
+    pid: int
+
+
+# The Index object of a worker process, inherited from the parent by fork.
+_worker_index: Optional["Index"] = None
+
+
+def _worker_init(index: "Index"):
+    """Initialize a pbench-index worker process.
+
+    The worker is forked from the parent, so it must not share the parent's
+    database connections or Elasticsearch connection pool. Signals are only
+    handled by the parent: SIGTERM takes the default action so that the
+    parent can terminate its workers.
+
+    Args:
+        index: the parent's Index object
+    """
+    global _worker_index
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGQUIT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    Database.after_fork()
+    if index.idxctx.es is not None:
+        index.idxctx.es = get_es(index.idxctx.config)
+    _worker_index = index
+
+
+def _index_worker(resource_id: str, tb: str, tmpdir: str) -> WorkerResult:
+    """Generate and index the documents of one tarball in a worker process.
+
+    Args:
+        resource_id: the dataset resource ID
+        tb: the tarball path
+        tmpdir: the temporary directory of the indexing run
+
+    Returns:
+        A WorkerResult describing the outcome
+    """
+    index = _worker_index
+    idxctx = index.idxctx
+    idxctx.opctx = []
+    ie_filepath = Path(
+        tmpdir, f"{index.name}.{idxctx.TS}.{resource_id}.indexing-errors.json"
+    )
+    ptb = None
+    es_res = None
+    try:
+        dataset = Dataset.query(resource_id=resource_id)
+        tarobj = index.cache_manager.find_dataset(resource_id)
+        with LockManager(tarobj.lock) as lock:
+            tarobj.get_results(lock)
+            ptb = PbenchTarBall(idxctx, dataset, tmpdir, tarobj)
+            with ie_filepath.open(mode="w") as fp:
+                es_res = index._index_dataset(dataset, ptb, fp)
+            index._cache_visualization(dataset, tarobj)
+    except UnsupportedTarballFormat as e:
+        tb_res = index.emit_error(idxctx.logger.warning, "TB_META_ABSENT", e)
+    except BadDate as e:
+        tb_res = index.emit_error(idxctx.logger.warning, "BAD_DATE", e)
+    except FileNotFoundError as e:
+        tb_res = index.emit_error(idxctx.logger.warning, "FILE_NOT_FOUND_ERROR", e)
+    except BadMDLogFormat as e:
+        tb_res = index.emit_error(idxctx.logger.warning, "BAD_METADATA", e)
+    except Exception as e:
+        tb_res = index.emit_error(idxctx.logger.exception, "GENERIC_ERROR", e)
+    else:
+        failures = es_res[4]
+        tb_res = index.error_code["OP_ERROR" if failures > 0 else "OK"]
+    return WorkerResult(
+        resource_id=resource_id,
+        tbname=ptb.tbname if ptb else None,
+        error=tb_res.name,
+        es_res=tuple(es_res) if es_res else None,
+        index_map=ptb.index_map if ptb else None,
+        opctx=idxctx.opctx,
+        ie_filepath=str(ie_filepath),
+        pid=os.getpid(),
+    )
+
+
+class ToolSourceBatch(NamedTuple):
+    """A batch of the actions of one tool data source, generated in a worker
+    process.
+
+    Each worker sends the actions of a source in batches of at most
+    TOOL_BATCH_SIZE actions, so that the process indexing the dataset can
+    submit them to Elasticsearch as they arrive. The last batch of a source
+    is marked "done", and carries the indices the source used, its ToolData
+    and template counters, and the exception, if any, which stopped it. This
+    must be picklable.
+    """
+
+    key: str
+    actions: List[JSONOBJECT]
+    done: bool = False
+    index_map: Optional[JSONOBJECT] = None
+    opctx: Optional[List[JSONOBJECT]] = None
+    template_counters: Optional[Counter] = None
+    error: Optional[Exception] = None
+
+
+# The number of actions in each ToolSourceBatch
+TOOL_BATCH_SIZE = 1000
+
+# The number of batches each tool data worker may queue before it waits for
+# the process indexing the dataset to catch up
+TOOL_QUEUE_DEPTH = 4
+
+
+def _tool_worker(
+    ptb: PbenchTarBall,
+    sources: multiprocessing.Queue,
+    batches: multiprocessing.Queue,
+):
+    """Generate the actions of tool data sources in a worker process.
+
+    The worker is forked from the process indexing the dataset, and only
+    generates documents: it must not share that process's database
+    connections, and leaves all signal handling to it. It takes sources from
+    the shared queue until it finds None, sending the actions of each, in
+    order, on its own bounded queue; and then sends None.
+
+    Args:
+        ptb: the PbenchTarBall of the dataset
+        sources: the queue of ToolSource tuples to generate
+        batches: the queue on which to send the ToolSourceBatch tuples
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGQUIT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    Database.after_fork()
+    templates = ptb.idxctx.templates
+    while True:
+        source: Optional[ToolSource] = sources.get()
+        if source is None:
+            break
+        ptb.idxctx.opctx = []
+        ptb.index_map = {}
+        templates.counters = Counter()
+        error = None
+        batch = []
+        try:
+            td = ToolData(ptb, *source)
+            for action in ptb.mk_tool_source_actions(td):
+                batch.append(action)
+                if len(batch) >= TOOL_BATCH_SIZE:
+                    batches.put(ToolSourceBatch(source.key, batch))
+                    batch = []
+        except Exception as e:
+            # The exception is pickled by the queue's feeder thread, where a
+            # failure would be lost.
+            try:
+                pickle.dumps(e)
+                error = e
+            except Exception:
+                error = Exception(f"{type(e).__name__}: {e}")
+        batches.put(
+            ToolSourceBatch(
+                source.key,
+                batch,
+                done=True,
+                index_map=ptb.index_map,
+                opctx=ptb.idxctx.opctx,
+                template_counters=templates.counters,
+                error=error,
+            )
+        )
+    batches.put(None)
+
+
 class Index:
     """class used to identify and process tarballs selected for indexing.
 
@@ -96,6 +326,7 @@ class Index:
     """
 
     BATCH_SIZE = 100  # Number of READY datasets to grab at once
+    CHECKPOINT_INTERVAL = 30.0  # Minimum seconds between checkpoint updates
 
     error_code = Errors(
         ErrorCode("OK", 0, None, "Successful completion"),
@@ -159,6 +390,19 @@ class Index:
         # Manage synchronization between components
         self.sync: Sync = Sync(idxctx.logger, self.operation)  # Build a sync object
 
+        # Quisby results for the dashboard, which we fill for new datasets
+        self.quisby_cache: QuisbyCache = QuisbyCache(idxctx.config, idxctx.logger)
+
+        # Number of worker processes indexing tarballs concurrently
+        self.workers: int = max(getattr(options, "workers", None) or 1, 1)
+
+        # Number of worker processes generating the tool data of each dataset
+        # concurrently
+        self.tool_workers: int = max(getattr(options, "tool_workers", None) or 1, 1)
+
+        # Indexing statistics, by process ID
+        self.throughput: Dict[int, Throughput] = {}
+
     def collect_tb(self) -> Tuple[int, List[TarballData]]:
         """Collect tarballs that need indexing
 
@@ -294,6 +538,729 @@ class Index:
 
         return res
 
+    def _update_index_map(
+        self, dataset: Dataset, tbname: str, index_map: JSONOBJECT
+    ) -> None:
+        """Record the indexed documents of a dataset in its IndexMap.
+
+        A pbench-index --tool-data follows a pbench-index and generates only
+        the tool-specific documents: we want to merge that with the existing
+        document map. On the other hand, a re-index should replace the entire
+        index. We accomplish this by overwriting each duplicate index key
+        separately.
+
+        Args:
+            dataset: the indexed dataset
+            tbname: the tarball name, for logging
+            index_map: the map of index names to document IDs
+        """
+        try:
+            if IndexMap.exists(dataset):
+                IndexMap.merge(dataset, index_map)
+            else:
+                IndexMap.create(dataset, index_map)
+        except DatasetError as e:
+            self.idxctx.logger.exception("Dataset error on {}: {}", tbname, e)
+        except Exception as e:
+            self.idxctx.logger.exception(
+                "Unexpected Metadata error on {}: {}", tbname, e
+            )
+
+    def _load_checkpoint(self, dataset: Dataset) -> JSONOBJECT:
+        """Find the indexing progress recorded for a dataset.
+
+        A checkpoint recorded by a different operation isn't relevant: for
+        example, a re-index replaces all of the documents.
+
+        Args:
+            dataset: the dataset being indexed
+
+        Returns:
+            The completed sources and index map of this operation, which are
+            empty if the operation has no checkpoint
+        """
+        try:
+            checkpoint = Metadata.getvalue(dataset, Metadata.SERVER_INDEX_CHECKPOINT)
+        except MetadataError as e:
+            self.idxctx.logger.warning(
+                "Unable to load indexing checkpoint of {}: {}", dataset.name, e
+            )
+            checkpoint = None
+        if not checkpoint or checkpoint.get("operation") != self.operation.name:
+            return {"sources": [], "index_map": {}}
+        return {
+            "sources": checkpoint.get("sources", []),
+            "index_map": checkpoint.get("index_map", {}),
+        }
+
+    def _save_checkpoint(
+        self, dataset: Dataset, sources: List[str], index_map: JSONOBJECT
+    ) -> None:
+        """Record the indexing progress of a dataset.
+
+        Failure to record a checkpoint doesn't affect the indexing; a later
+        run will just repeat more of the work.
+
+        Args:
+            dataset: the dataset being indexed
+            sources: the keys of the completely indexed tool data sources
+            index_map: the index map of the documents indexed so far
+        """
+        try:
+            Metadata.setvalue(
+                dataset,
+                Metadata.SERVER_INDEX_CHECKPOINT,
+                {
+                    "operation": self.operation.name,
+                    "sources": sources,
+                    "index_map": index_map,
+                },
+            )
+        except MetadataError as e:
+            self.idxctx.logger.warning(
+                "Unable to record indexing checkpoint of {}: {}", dataset.name, e
+            )
+
+    def _clear_checkpoint(self, dataset: Dataset) -> None:
+        """Discard the indexing progress recorded for a dataset, if any.
+
+        Args:
+            dataset: the dataset being indexed
+        """
+        try:
+            if Metadata.getvalue(dataset, Metadata.SERVER_INDEX_CHECKPOINT):
+                Metadata.setvalue(dataset, Metadata.SERVER_INDEX_CHECKPOINT, None)
+        except MetadataError as e:
+            self.idxctx.logger.warning(
+                "Unable to clear indexing checkpoint of {}: {}", dataset.name, e
+            )
+
+    def _index_dataset(self, dataset: Dataset, ptb: PbenchTarBall, fp) -> Tuple:
+        """Generate and index the documents of a dataset.
+
+        Tool data is indexed a source (iteration, sample, host, and tool) at a
+        time, recording each source in the dataset's indexing checkpoint once
+        Elasticsearch has accepted all of its documents. If a previous run was
+        interrupted, or failed to index some of the documents, the sources it
+        completed are skipped.
+
+        The checkpoint holds all the completed sources, so rather than
+        rewriting it after every source, we write it at most once every
+        CHECKPOINT_INTERVAL seconds, and when we stop with sources not yet
+        recorded.
+
+        Args:
+            dataset: the dataset to index
+            ptb: the PbenchTarBall of the dataset
+            fp: the file for recording indexing errors
+
+        Returns:
+            The es_index tuple of (start time, end time, successes,
+            duplicates, failures, retries), summed across sources
+        """
+        idxctx = self.idxctx
+        if not self.options.index_tool_data:
+            # Re-generating the run documents invalidates the progress of any
+            # earlier tool data indexing.
+            self._clear_checkpoint(dataset)
+            return es_index(
+                idxctx.es,
+                ptb.make_all_actions(),
+                fp,
+                idxctx.logger,
+                idxctx._dbg,
+                queue_depth=idxctx.bulk_queue_depth,
+                batch_size=idxctx.bulk_batch_size,
+            )
+
+        checkpoint = self._load_checkpoint(dataset)
+        sources: List[str] = checkpoint["sources"]
+        completed = set(sources)
+        for root, indices in checkpoint["index_map"].items():
+            for index in indices:
+                ptb.map_document(root, index)
+
+        beg = end = None
+        totals = [0, 0, 0, 0]
+        resumed: List[str] = []
+        saved = time.monotonic()
+        unsaved = finished = False
+        generated = self._tool_source_actions(ptb, completed, resumed)
+        try:
+            for key, actions in generated:
+                s_beg, s_end, *counts = es_index(
+                    idxctx.es,
+                    actions,
+                    fp,
+                    idxctx.logger,
+                    idxctx._dbg,
+                    queue_depth=idxctx.bulk_queue_depth,
+                    batch_size=idxctx.bulk_batch_size,
+                )
+                if beg is None:
+                    beg = s_beg
+                end = s_end
+                totals = [t + c for t, c in zip(totals, counts)]
+                if counts[2] == 0:
+                    sources.append(key)
+                    completed.add(key)
+                    unsaved = True
+                    if time.monotonic() - saved >= self.CHECKPOINT_INTERVAL:
+                        self._save_checkpoint(dataset, sources, ptb.index_map)
+                        saved = time.monotonic()
+                        unsaved = False
+            finished = True
+        finally:
+            generated.close()
+            # A complete, successful run discards the checkpoint below, so
+            # there's no point in recording the last sources first.
+            if unsaved and not (finished and totals[2] == 0):
+                self._save_checkpoint(dataset, sources, ptb.index_map)
+        if resumed:
+            idxctx.logger.info(
+                "{}: skipped {:d} tool data sources indexed by a previous run",
+                ptb.tbname,
+                len(resumed),
+            )
+        if totals[2] == 0:
+            self._clear_checkpoint(dataset)
+        if beg is None:
+            beg = end = time.time()
+        return (beg, end, *totals)
+
+    def _tool_source_actions(
+        self, ptb: PbenchTarBall, completed: Set[str], resumed: List[str]
+    ) -> Iterator[Tuple[str, Iterable[JSONOBJECT]]]:
+        """Generate the actions of each tool data source of a dataset which
+        hasn't already been indexed.
+
+        With more than one tool worker, the sources are fanned out to forked
+        worker processes, each of which streams the actions of one source at
+        a time in batches (see _tool_worker); we index a source from each
+        worker in turn as the actions arrive, merging the source's index map
+        and counters into the dataset's once it's complete, while the other
+        workers generate theirs. A worker waits once it has TOOL_QUEUE_DEPTH
+        batches queued, so no more than that many batches per worker are
+        held in memory.
+
+        Args:
+            ptb: the PbenchTarBall of the dataset
+            completed: the keys of the sources already indexed
+            resumed: the list to which the keys of skipped sources are added
+
+        Returns:
+            a generator of the key and actions of each source
+        """
+        if self.tool_workers <= 1:
+            for td in ptb.mk_tool_data():
+                if td.source_key in completed:
+                    resumed.append(td.source_key)
+                    continue
+                yield td.source_key, ptb.mk_tool_source_actions(td)
+            return
+
+        pending: Deque[ToolSource] = deque()
+        for source in ptb.mk_tool_sources():
+            if source.key in completed:
+                resumed.append(source.key)
+            else:
+                pending.append(source)
+        if len(pending) <= 1:
+            for source in pending:
+                yield source.key, ptb.mk_tool_source_actions(ToolData(ptb, *source))
+            return
+
+        idxctx = self.idxctx
+        context = multiprocessing.get_context("fork")
+        sources = context.Queue()
+        for source in pending:
+            sources.put(source)
+        workers: List[Tuple[multiprocessing.Process, multiprocessing.Queue]] = []
+        for _ in range(min(self.tool_workers, len(pending))):
+            sources.put(None)
+            batches = context.Queue(maxsize=TOOL_QUEUE_DEPTH)
+            worker = context.Process(target=_tool_worker, args=(ptb, sources, batches))
+            worker.start()
+            workers.append((worker, batches))
+
+        def receive(
+            worker: multiprocessing.Process, batches: multiprocessing.Queue
+        ) -> Optional[ToolSourceBatch]:
+            """Wait for the next batch from a worker, which might die."""
+            while True:
+                alive = worker.is_alive()
+                try:
+                    return batches.get(timeout=1.0)
+                except queue.Empty:
+                    if not alive:
+                        raise Exception(
+                            f"Tool data worker {worker.pid} exited with status"
+                            f" {worker.exitcode}"
+                        )
+
+        def stream(
+            worker: multiprocessing.Process,
+            batches: multiprocessing.Queue,
+            batch: ToolSourceBatch,
+        ) -> Iterator[JSONOBJECT]:
+            """Yield the actions of a source, merging its index map and
+            counters into the dataset's once it's complete."""
+            while True:
+                yield from batch.actions
+                if batch.done:
+                    break
+                batch = receive(worker, batches)
+            idxctx.opctx.extend(batch.opctx)
+            idxctx.templates.counters.update(batch.template_counters)
+            for root, indices in batch.index_map.items():
+                for index in indices:
+                    ptb.map_document(root, index)
+            if batch.error:
+                raise batch.error
+
+        try:
+            # Each worker sends the actions of its sources in order, so we
+            # take a source from each worker in turn, and index it while the
+            # others generate their next batches.
+            active = deque(workers)
+            while active:
+                worker, batches = active.popleft()
+                batch = receive(worker, batches)
+                if batch is None:
+                    continue
+                actions = stream(worker, batches, batch)
+                yield batch.key, actions
+                # Make sure we've consumed the whole source before we take
+                # the next source from this worker.
+                for _ in actions:
+                    pass
+                active.append((worker, batches))
+        finally:
+            for worker, batches in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+                batches.close()
+            sources.cancel_join_thread()
+            sources.close()
+
+    def check_ids(self, resource_ids: List[str], fp: TextIO) -> int:
+        """Report whether re-indexing the tool data of datasets would change
+        the IDs of any of their documents.
+
+        This is a migration aid for changes to the way we construct document
+        IDs: the tool data documents of each dataset are generated, but not
+        indexed, and the ID of each is looked up in Elasticsearch. Nothing is
+        changed in Elasticsearch or the database.
+
+        Args:
+            resource_ids: the resource IDs of the datasets to check
+            fp: the stream on which to report the results
+
+        Returns:
+            0 if every document ID is already indexed, or the OP_ERROR code if
+            any isn't, or if a dataset can't be checked
+        """
+        idxctx = self.idxctx
+        status = self.error_code["OK"]
+        with tempfile.TemporaryDirectory(
+            prefix=f"{self.name}.", dir=idxctx.config.TMP
+        ) as tmpdir:
+            for resource_id in resource_ids:
+                try:
+                    dataset = Dataset.query(resource_id=resource_id)
+                    tarobj = self.cache_manager.find_dataset(resource_id)
+                    with LockManager(tarobj.lock) as lock:
+                        tarobj.get_results(lock)
+                        ptb = PbenchTarBall(idxctx, dataset, tmpdir, tarobj)
+                        counts = check_source_ids(idxctx.es, ptb.mk_tool_data_actions())
+                except Exception as e:
+                    idxctx.logger.warning(
+                        "Unable to check the document IDs of {}: {}", resource_id, e
+                    )
+                    print(f"{resource_id}: unable to check document IDs: {e}", file=fp)
+                    status = self.error_code["OP_ERROR"]
+                    continue
+                idxctx.logger.info(
+                    "Checked the document IDs of {}: {}", resource_id, dict(counts)
+                )
+                print(
+                    f"{dataset.name} ({resource_id}): {counts['documents']:d} tool"
+                    f" data documents, {counts['missing']:d} IDs not indexed",
+                    file=fp,
+                )
+                if counts["missing"]:
+                    status = self.error_code["OP_ERROR"]
+        return status.value
+
+    def _cache_visualization(self, dataset: Dataset, tarobj: Tarball):
+        """Fill the Quisby cache with the visualization of a newly indexed
+        dataset, while its "result.csv" is at hand in the unpacked tarball.
+
+        This is only an optimization, so errors are logged and ignored.
+
+        Args:
+            dataset: the indexed dataset
+            tarobj: the unpacked dataset tarball
+        """
+        if self.options.index_tool_data or not tarobj.unpacked:
+            return
+        try:
+            benchmark = get_benchmark_name(dataset)
+            benchmark_type = BenchmarkName.__members__.get(benchmark.upper())
+            result_csv = tarobj.unpacked / "result.csv"
+            if not benchmark_type or not result_csv.is_file():
+                return
+            self.quisby_cache.lookup(
+                "visualize",
+                benchmark,
+                [dataset],
+                lambda: QuisbyProcessing().extract_data(
+                    benchmark_type,
+                    dataset.name,
+                    InputType.STREAM,
+                    result_csv.read_text(),
+                ),
+            )
+        except Exception as e:
+            self.idxctx.logger.warning(
+                "Unable to cache the visualization of {}: {}", dataset.name, e
+            )
+
+    @staticmethod
+    def _finish_audit(audit: Audit, tb_res: ErrorCode) -> None:
+        """Finalize the indexing Audit record of a dataset.
+
+        Args:
+            audit: the BEGIN audit record
+            tb_res: the indexing result
+        """
+        doneness = AuditStatus.SUCCESS
+        attributes = None
+
+        # TODO: can we categorize anything as "WARNING"?
+        if tb_res != Index.error_code["OK"]:
+            doneness = AuditStatus.FAILURE
+            attributes = {"message": tb_res.message}
+        Audit.create(root=audit, status=doneness, attributes=attributes)
+
+    def _report_indexing_errors(
+        self, ie_filepath: Path, tb: str, end: Optional[int]
+    ) -> None:
+        """Post the indexing errors file, if any, and remove it.
+
+        Args:
+            ie_filepath: the indexing errors file written by es_index
+            tb: the tarball path
+            end: the timestamp at which indexing ended
+        """
+        idxctx = self.idxctx
+        try:
+            ie_len = ie_filepath.stat().st_size
+        except FileNotFoundError:
+            # Above operation never made it to actual indexing, ignore.
+            pass
+        except SigTermException:
+            # Re-raise a SIGTERM to avoid it being lumped in with
+            # general exception handling below.
+            raise
+        except Exception:
+            idxctx.logger.exception(
+                "Unexpected error handling" " indexing errors file: {}",
+                ie_filepath,
+            )
+        else:
+            # Success fetching indexing error file size.
+            if ie_len > len(tb) + 1:
+                try:
+                    self.report.post_status(
+                        tstos(end) if end else tstos(), "errors", ie_filepath
+                    )
+                except Exception:
+                    idxctx.logger.exception(
+                        "Unexpected error issuing" " report status with errors: {}",
+                        ie_filepath,
+                    )
+        finally:
+            # Unconditionally remove the indexing errors file.
+            try:
+                os.remove(ie_filepath)
+            except SigTermException:
+                # Re-raise a SIGTERM to avoid it being lumped in with
+                # general exception handling below.
+                raise
+            except Exception:
+                pass
+
+    def _record_outcome(
+        self,
+        dataset: Dataset,
+        tb: str,
+        tb_res: ErrorCode,
+        indexed: Path,
+        erred: Path,
+        skipped: Path,
+    ) -> None:
+        """Record the indexing result of a dataset.
+
+        Distinguish failure cases, so we can retry the indexing easily if
+        possible.
+
+        Only if the indexing was successful do we request the next operation
+        (tool indexing). Otherwise we record the error in the
+        `server.errors.index` metadata and leave the dataset in INDEXING state.
+
+        Args:
+            dataset: the indexed dataset
+            tb: the tarball path
+            tb_res: the indexing result
+            indexed: list file of successfully indexed tarballs
+            erred: list file of tarballs which failed to index
+            skipped: list file of tarballs which were skipped
+        """
+        error_code = self.error_code
+        if tb_res.success:
+            self.idxctx.logger.info(
+                "{}: {}: success",
+                self.idxctx.TS,
+                os.path.basename(tb),
+            )
+            # Success
+            with indexed.open(mode="a") as fp:
+                print(tb, file=fp)
+            self.sync.update(
+                dataset=dataset,
+                state=OperationState.OK,
+                enabled=self.enabled,
+            )
+        elif tb_res is error_code["OP_ERROR"]:
+            with erred.open(mode="a") as fp:
+                print(tb, file=fp)
+            self.sync.error(dataset, f"{tb_res.value}:{tb_res.message}")
+        elif tb_res in (error_code["CFG_ERROR"], error_code["BAD_CFG"]):
+            assert False, (
+                f"Unexpected tar ball handling "
+                f"result status {tb_res.value:d} for dataset {dataset}"
+            )
+        elif tb_res.tarball_error:
+            # # Quietly skip these errors
+            with skipped.open(mode="a") as fp:
+                print(tb, file=fp)
+            self.sync.error(dataset, f"{tb_res.value}:{tb_res.message}")
+        else:
+            with erred.open(mode="a") as fp:
+                print(tb, file=fp)
+            self.sync.error(dataset, f"{tb_res.value}:{tb_res.message}")
+
+    def _record_throughput(self, pid: int, documents: int, duration: float):
+        """Accumulate indexing throughput statistics for a process.
+
+        Args:
+            pid: the process ID which indexed a dataset
+            documents: the number of documents indexed
+            duration: the number of seconds spent indexing
+        """
+        stats = self.throughput.setdefault(pid, Throughput())
+        stats.datasets += 1
+        stats.documents += documents
+        stats.seconds += duration
+
+    def _throughput_report(self, elapsed: float) -> List[str]:
+        """Summarize the indexing throughput of this run.
+
+        Args:
+            elapsed: the wall clock duration of the run, in seconds
+
+        Returns:
+            A list of report lines
+        """
+        datasets = sum(t.datasets for t in self.throughput.values())
+        rate = datasets * 3600.0 / elapsed if elapsed > 0 else 0.0
+        lines = [
+            f"{datasets:d} datasets in {elapsed:.2f}s with {self.workers:d}"
+            f" worker(s): {rate:.2f} datasets/hour"
+        ]
+        for pid, t in sorted(self.throughput.items()):
+            dps = t.documents / t.seconds if t.seconds > 0 else 0.0
+            lines.append(
+                f"worker {pid:d}: {t.datasets:d} datasets, {t.documents:d}"
+                f" documents in {t.seconds:.2f}s ({dps:.2f} docs/sec)"
+            )
+        return lines
+
+    def _process_pool(
+        self,
+        tb_deque: Deque[TarballData],
+        tmpdir: str,
+        lists: Tuple[Path, Path, Path],
+        sigquit_interrupt: List[bool],
+        sighup_interrupt: List[bool],
+    ) -> int:
+        """Index tarballs concurrently using a pool of worker processes.
+
+        The workers only generate and submit the Elasticsearch documents: all
+        Sync, Audit and IndexMap updates are made by this (parent) process
+        as each worker completes, so that the dataset state is maintained
+        exactly as in the sequential case.
+
+        SIGQUIT stops the submission of new tarballs, letting the in-flight
+        ones complete; SIGHUP re-collects the pending tarballs without
+        disturbing the in-flight ones; SIGTERM terminates the workers and
+        fails the in-flight Audit records, leaving those datasets to be
+        picked up by the next run.
+
+        Args:
+            tb_deque: the tarballs to index
+            tmpdir: the temporary directory for this run
+            lists: the indexed, erred and skipped list files
+            sigquit_interrupt: SIGQUIT flag
+            sighup_interrupt: SIGHUP flag
+
+        Returns:
+            The number of tarballs processed
+        """
+        idxctx = self.idxctx
+        error_code = self.error_code
+        indexed, erred, skipped = lists
+        in_flight: Dict[Future, Tuple[TarballData, Audit]] = {}
+        count_processed_tb = 0
+
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_worker_init,
+            initargs=(self,),
+        )
+        try:
+            while tb_deque or in_flight:
+                while (
+                    tb_deque
+                    and len(in_flight) < self.workers
+                    and not sigquit_interrupt[0]
+                ):
+                    tbinfo: TarballData = tb_deque.popleft()
+                    dataset = tbinfo.dataset
+                    count_processed_tb += 1
+                    idxctx.logger.info(
+                        "Starting {} (size {:d})", tbinfo.tarball, tbinfo.size
+                    )
+                    try:
+                        self.cache_manager.find_dataset(dataset.resource_id)
+                    except Exception as e:
+                        self.sync.error(dataset, f"Unable to find dataset: {e!s}")
+                        continue
+                    audit = Audit.create(
+                        operation=OperationCode.UPDATE,
+                        name="index",
+                        status=AuditStatus.BEGIN,
+                        user_name=Audit.BACKGROUND_USER,
+                        dataset=dataset,
+                    )
+                    future = pool.submit(
+                        _index_worker, dataset.resource_id, tbinfo.tarball, tmpdir
+                    )
+                    in_flight[future] = (tbinfo, audit)
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tbinfo, audit = in_flight.pop(future)
+                    dataset = tbinfo.dataset
+                    tb = tbinfo.tarball
+                    ie_filepath = None
+                    end = None
+                    try:
+                        result: WorkerResult = future.result()
+                    except Exception as e:
+                        tb_res = self.emit_error(
+                            idxctx.logger.exception, "GENERIC_ERROR", e
+                        )
+                    else:
+                        tb_res = error_code[result.error]
+                        ie_filepath = Path(result.ie_filepath)
+                        idxctx.opctx.extend(result.opctx)
+                        if result.es_res:
+                            (
+                                beg,
+                                end,
+                                successes,
+                                duplicates,
+                                failures,
+                                retries,
+                            ) = result.es_res
+                            idxctx.logger.info(
+                                "done indexing {} in worker {:d} (start ts: {},"
+                                " end ts: {}, duration: {:.2f}s, successes: {:d},"
+                                " duplicates: {:d}, failures: {:d}, retries: {:d})",
+                                tb,
+                                result.pid,
+                                tstos(beg),
+                                tstos(end),
+                                end - beg,
+                                successes,
+                                duplicates,
+                                failures,
+                                retries,
+                            )
+                            self._record_throughput(
+                                result.pid, successes + duplicates, end - beg
+                            )
+                        if tb_res.success and result.index_map:
+                            self._update_index_map(
+                                dataset, result.tbname, result.index_map
+                            )
+                    self._finish_audit(audit, tb_res)
+                    if ie_filepath:
+                        self._report_indexing_errors(ie_filepath, tb, end)
+                    self._record_outcome(dataset, tb, tb_res, indexed, erred, skipped)
+                    idxctx.logger.info(
+                        "Finished{} {} (size {:d})",
+                        "[SIGQUIT]" if sigquit_interrupt[0] else "",
+                        tb,
+                        tbinfo.size,
+                    )
+
+                if sighup_interrupt[0]:
+                    status, new_tb = self.collect_tb()
+                    if status == 0:
+                        running = {t.dataset.resource_id for t, _ in in_flight.values()}
+                        new_tb = [
+                            t for t in new_tb if t.dataset.resource_id not in running
+                        ]
+                        if not set(new_tb).issuperset(tb_deque):
+                            idxctx.logger.info(
+                                "Tarballs previously marked for indexing are no longer present: {}",
+                                set(tb_deque).difference(new_tb),
+                            )
+                        tb_deque = deque(sorted(new_tb))
+                    idxctx.logger.info(
+                        "SIGHUP status (In flight: {}, Remaining: {}, Completed: {}, Errors_encountered: {})",
+                        sorted(Path(t.tarball).name for t, _ in in_flight.values()),
+                        len(tb_deque),
+                        count_processed_tb - len(in_flight),
+                        _count_lines(erred),
+                    )
+                    sighup_interrupt[0] = False
+        except SigTermException:
+            idxctx.logger.exception(
+                "Indexing interrupted by SIGTERM, terminating {:d} workers",
+                len(in_flight),
+            )
+            for child in multiprocessing.active_children():
+                child.terminate()
+            pool.shutdown(wait=True, cancel_futures=True)
+            for tbinfo, audit in in_flight.values():
+                Audit.create(
+                    root=audit,
+                    status=AuditStatus.FAILURE,
+                    attributes={"message": "Indexing interrupted by SIGTERM"},
+                )
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return count_processed_tb
+
     def process_tb(self, tarballs: List[TarballData]) -> int:
         """Process Tarballs For Indexing and create a summary report.
 
@@ -320,6 +1287,7 @@ class Index:
             prefix=f"{self.name}.", dir=idxctx.config.TMP
         ) as tmpdir:
             idxctx.logger.debug("start processing list of tar balls")
+            started = time.time()
             tb_list = Path(tmpdir, f"{self.name}.{idxctx.TS}.list")
             try:
                 with tb_list.open(mode="w") as lfp:
@@ -353,269 +1321,169 @@ class Index:
                 count_processed_tb = 0
 
                 try:
-                    while len(tb_deque) > 0:
-                        tbinfo: TarballData = tb_deque.popleft()
-                        size = tbinfo.size
-                        dataset = tbinfo.dataset
-                        tb = tbinfo.tarball
-                        count_processed_tb += 1
-
-                        idxctx.logger.info("Starting {} (size {:d})", tb, size)
-                        audit = None
-                        ptb = None
-                        tarobj: Optional[Tarball] = None
-                        tb_res = error_code["OK"]
-                        try:
-                            # We need the fully unpacked cache tree to index it
+                    if self.workers > 1:
+                        count_processed_tb = self._process_pool(
+                            tb_deque,
+                            tmpdir,
+                            (indexed, erred, skipped),
+                            sigquit_interrupt,
+                            sighup_interrupt,
+                        )
+                    else:
+                        while len(tb_deque) > 0:
+                            tbinfo: TarballData = tb_deque.popleft()
+                            size = tbinfo.size
+                            dataset = tbinfo.dataset
+                            tb = tbinfo.tarball
+                            count_processed_tb += 1
+                            end = None
+
+                            idxctx.logger.info("Starting {} (size {:d})", tb, size)
+                            audit = None
+                            ptb = None
+                            tarobj: Optional[Tarball] = None
+                            tb_res = error_code["OK"]
                             try:
-                                tarobj = self.cache_manager.find_dataset(
-                                    dataset.resource_id
-                                )
-                            except Exception as e:
-                                self.sync.error(
-                                    dataset,
-                                    f"Unable to find dataset: {e!s}",
-                                )
-                                continue
-
-                            with LockManager(tarobj.lock) as lock:
-                                tarobj.get_results(lock)
-                                audit = Audit.create(
-                                    operation=OperationCode.UPDATE,
-                                    name="index",
-                                    status=AuditStatus.BEGIN,
-                                    user_name=Audit.BACKGROUND_USER,
-                                    dataset=dataset,
-                                )
-
-                                # "Open" the tar ball represented by the tar ball object
-                                idxctx.logger.debug("open tar ball")
-                                ptb = PbenchTarBall(idxctx, dataset, tmpdir, tarobj)
-
-                                # Construct the generator for emitting all actions.
-                                # The `idxctx` dictionary is passed along to each
-                                # generator so that it can add its context for
-                                # error handling to the list.
-                                idxctx.logger.debug("generator setup")
-                                if self.options.index_tool_data:
-                                    actions = ptb.mk_tool_data_actions()
-                                else:
-                                    actions = ptb.make_all_actions()
-
-                                # Create a file where the pyesbulk package will
-                                # record all indexing errors that can't/won't be
-                                # retried.
-                                with ie_filepath.open(mode="w") as fp:
-                                    idxctx.logger.debug("begin indexing")
-                                    try:
-                                        signal.signal(signal.SIGINT, sigint_handler)
-                                        es_res = es_index(
-                                            idxctx.es,
-                                            actions,
-                                            fp,
-                                            idxctx.logger,
-                                            idxctx._dbg,
-                                        )
-                                    except SigIntException:
-                                        idxctx.logger.exception(
-                                            "Indexing interrupted by SIGINT, continuing to next tarball"
-                                        )
-                                        continue
-                                    finally:
-                                        # Turn off the SIGINT handler when not indexing.
-                                        signal.signal(signal.SIGINT, signal.SIG_IGN)
-                        except UnsupportedTarballFormat as e:
-                            tb_res = self.emit_error(
-                                idxctx.logger.warning, "TB_META_ABSENT", e
-                            )
-                        except BadDate as e:
-                            tb_res = self.emit_error(
-                                idxctx.logger.warning, "BAD_DATE", e
-                            )
-                        except FileNotFoundError as e:
-                            tb_res = self.emit_error(
-                                idxctx.logger.warning, "FILE_NOT_FOUND_ERROR", e
-                            )
-                        except BadMDLogFormat as e:
-                            tb_res = self.emit_error(
-                                idxctx.logger.warning, "BAD_METADATA", e
-                            )
-                        except SigTermException:
-                            idxctx.logger.exception(
-                                "Indexing interrupted by SIGTERM, terminating"
-                            )
-                            break
-                        except Exception as e:
-                            tb_res = self.emit_error(
-                                idxctx.logger.exception, "GENERIC_ERROR", e
-                            )
-                        else:
-                            beg, end, successes, duplicates, failures, retries = es_res
-                            idxctx.logger.info(
-                                "done indexing (start ts: {}, end ts: {}, duration:"
-                                " {:.2f}s, successes: {:d}, duplicates: {:d},"
-                                " failures: {:d}, retries: {:d})",
-                                tstos(beg),
-                                tstos(end),
-                                end - beg,
-                                successes,
-                                duplicates,
-                                failures,
-                                retries,
-                            )
-                            tb_res = error_code["OP_ERROR" if failures > 0 else "OK"]
-                        finally:
-                            if tb_res.success:
+                                # We need the fully unpacked cache tree to index it
                                 try:
+                                    tarobj = self.cache_manager.find_dataset(
+                                        dataset.resource_id
+                                    )
+                                except Exception as e:
+                                    self.sync.error(
+                                        dataset,
+                                        f"Unable to find dataset: {e!s}",
+                                    )
+                                    continue
+
+                                with LockManager(tarobj.lock) as lock:
+                                    tarobj.get_results(lock)
+                                    audit = Audit.create(
+                                        operation=OperationCode.UPDATE,
+                                        name="index",
+                                        status=AuditStatus.BEGIN,
+                                        user_name=Audit.BACKGROUND_USER,
+                                        dataset=dataset,
+                                    )
 
-                                    # Because we're on the `finally` path, we
-                                    # can get here without a PbenchTarBall
-                                    # object, so don't try to write an index
-                                    # map if there is none.
-                                    if ptb:
-                                        # A pbench-index --tool-data follows a
-                                        # pbench-index and generates only the
-                                        # tool-specific documents: we want to
-                                        # merge that with the existing document
-                                        # map. On the other hand, a re-index
-                                        # should replace the entire index. We
-                                        # accomplish this by overwriting each
-                                        # duplicate index key separately.
+                                    # "Open" the tar ball represented by the tar ball object
+                                    idxctx.logger.debug("open tar ball")
+                                    ptb = PbenchTarBall(idxctx, dataset, tmpdir, tarobj)
+
+                                    # Create a file where the pyesbulk package will
+                                    # record all indexing errors that can't/won't be
+                                    # retried.
+                                    with ie_filepath.open(mode="w") as fp:
+                                        idxctx.logger.debug("begin indexing")
                                         try:
-                                            if IndexMap.exists(dataset):
-                                                IndexMap.merge(dataset, ptb.index_map)
-                                            else:
-                                                IndexMap.create(dataset, ptb.index_map)
-                                        except Exception as e:
+                                            signal.signal(signal.SIGINT, sigint_handler)
+                                            es_res = self._index_dataset(
+                                                dataset, ptb, fp
+                                            )
+                                        except SigIntException:
                                             idxctx.logger.exception(
-                                                "Unexpected Metadata error on {}: {}",
-                                                ptb.tbname,
-                                                e,
+                                                "Indexing interrupted by SIGINT, continuing to next tarball"
                                             )
-                                except DatasetError as e:
-                                    idxctx.logger.exception(
-                                        "Dataset error on {}: {}", ptb.tbname, e
-                                    )
-                                except Exception as e:
-                                    idxctx.logger.exception(
-                                        "Unexpected error on {}: {}", ptb.tbname, e
-                                    )
-                            if audit:
-                                doneness = AuditStatus.SUCCESS
-                                attributes = None
-
-                                # TODO: can we categorize anything as "WARNING"?
-                                if tb_res != error_code["OK"]:
-                                    doneness = AuditStatus.FAILURE
-                                    attributes = {"message": tb_res.message}
-                                Audit.create(
-                                    root=audit, status=doneness, attributes=attributes
+                                            continue
+                                        finally:
+                                            # Turn off the SIGINT handler when not indexing.
+                                            signal.signal(signal.SIGINT, signal.SIG_IGN)
+                                    self._cache_visualization(dataset, tarobj)
+                            except UnsupportedTarballFormat as e:
+                                tb_res = self.emit_error(
+                                    idxctx.logger.warning, "TB_META_ABSENT", e
+                                )
+                            except BadDate as e:
+                                tb_res = self.emit_error(
+                                    idxctx.logger.warning, "BAD_DATE", e
+                                )
+                            except FileNotFoundError as e:
+                                tb_res = self.emit_error(
+                                    idxctx.logger.warning, "FILE_NOT_FOUND_ERROR", e
+                                )
+                            except BadMDLogFormat as e:
+                                tb_res = self.emit_error(
+                                    idxctx.logger.warning, "BAD_METADATA", e
                                 )
-                        try:
-                            ie_len = ie_filepath.stat().st_size
-                        except FileNotFoundError:
-                            # Above operation never made it to actual indexing, ignore.
-                            pass
-                        except SigTermException:
-                            # Re-raise a SIGTERM to avoid it being lumped in with
-                            # general exception handling below.
-                            raise
-                        except Exception:
-                            idxctx.logger.exception(
-                                "Unexpected error handling" " indexing errors file: {}",
-                                ie_filepath,
-                            )
-                        else:
-                            # Success fetching indexing error file size.
-                            if ie_len > len(tb) + 1:
-                                try:
-                                    self.report.post_status(
-                                        tstos(end), "errors", ie_filepath
-                                    )
-                                except Exception:
-                                    idxctx.logger.exception(
-                                        "Unexpected error issuing"
-                                        " report status with errors: {}",
-                                        ie_filepath,
-                                    )
-                        finally:
-                            # Unconditionally remove the indexing errors file.
-                            try:
-                                os.remove(ie_filepath)
                             except SigTermException:
-                                # Re-raise a SIGTERM to avoid it being lumped in with
-                                # general exception handling below.
-                                raise
-                            except Exception:
-                                pass
-
-                        # Distinguish failure cases, so we can retry the indexing
-                        # easily if possible.
-                        #
-                        # Only if the indexing was successful do we request the
-                        # next operation (tool indexing). Otherwise we record
-                        # the error in the `server.errors.index` metadata and
-                        # leave the dataset in INDEXING state.
-                        if tb_res.success:
-                            idxctx.logger.info(
-                                "{}: {}: success",
-                                idxctx.TS,
-                                os.path.basename(tb),
-                            )
-                            # Success
-                            with indexed.open(mode="a") as fp:
-                                print(tb, file=fp)
-                            self.sync.update(
-                                dataset=dataset,
-                                state=OperationState.OK,
-                                enabled=self.enabled,
-                            )
-                        elif tb_res is error_code["OP_ERROR"]:
-                            with erred.open(mode="a") as fp:
-                                print(tb, file=fp)
-                            self.sync.error(dataset, f"{tb_res.value}:{tb_res.message}")
-                        elif tb_res in (error_code["CFG_ERROR"], error_code["BAD_CFG"]):
-                            assert False, (
-                                f"Unexpected tar ball handling "
-                                f"result status {tb_res.value:d} for dataset {dataset}"
-                            )
-                        elif tb_res.tarball_error:
-                            # # Quietly skip these errors
-                            with skipped.open(mode="a") as fp:
-                                print(tb, file=fp)
-                            self.sync.error(dataset, f"{tb_res.value}:{tb_res.message}")
-                        else:
-                            with erred.open(mode="a") as fp:
-                                print(tb, file=fp)
-                            self.sync.error(dataset, f"{tb_res.value}:{tb_res.message}")
-                        idxctx.logger.info(
-                            "Finished{} {} (size {:d})",
-                            "[SIGQUIT]" if sigquit_interrupt[0] else "",
-                            tb,
-                            size,
-                        )
-
-                        if sigquit_interrupt[0]:
-                            break
-                        if sighup_interrupt[0]:
-                            status, new_tb = self.collect_tb()
-                            if status == 0:
-                                if not set(new_tb).issuperset(tb_deque):
-                                    idxctx.logger.info(
-                                        "Tarballs previously marked for indexing are no longer present",
-                                        set(tb_deque).difference(new_tb),
+                                idxctx.logger.exception(
+                                    "Indexing interrupted by SIGTERM, terminating"
+                                )
+                                break
+                            except Exception as e:
+                                tb_res = self.emit_error(
+                                    idxctx.logger.exception, "GENERIC_ERROR", e
+                                )
+                            else:
+                                (
+                                    beg,
+                                    end,
+                                    successes,
+                                    duplicates,
+                                    failures,
+                                    retries,
+                                ) = es_res
+                                idxctx.logger.info(
+                                    "done indexing (start ts: {}, end ts: {}, duration:"
+                                    " {:.2f}s, successes: {:d}, duplicates: {:d},"
+                                    " failures: {:d}, retries: {:d})",
+                                    tstos(beg),
+                                    tstos(end),
+                                    end - beg,
+                                    successes,
+                                    duplicates,
+                                    failures,
+                                    retries,
+                                )
+                                self._record_throughput(
+                                    os.getpid(), successes + duplicates, end - beg
+                                )
+                                tb_res = error_code[
+                                    "OP_ERROR" if failures > 0 else "OK"
+                                ]
+                            finally:
+                                # Because we're on the `finally` path, we can get
+                                # here without a PbenchTarBall object, so don't try
+                                # to write an index map if there is none.
+                                if tb_res.success and ptb:
+                                    self._update_index_map(
+                                        dataset, ptb.tbname, ptb.index_map
                                     )
-                                tb_deque = deque(sorted(new_tb))
+                                if audit:
+                                    self._finish_audit(audit, tb_res)
+                            self._report_indexing_errors(ie_filepath, tb, end)
+
+                            self._record_outcome(
+                                dataset, tb, tb_res, indexed, erred, skipped
+                            )
                             idxctx.logger.info(
-                                "SIGHUP status (Current tar ball indexed: ({}), Remaining: {}, Completed: {}, Errors_encountered: {}, Status: {})",
-                                Path(tb).name,
-                                len(tb_deque),
-                                count_processed_tb,
-                                _count_lines(erred),
-                                tb_res,
+                                "Finished{} {} (size {:d})",
+                                "[SIGQUIT]" if sigquit_interrupt[0] else "",
+                                tb,
+                                size,
                             )
-                            sighup_interrupt[0] = False
-                            continue
+
+                            if sigquit_interrupt[0]:
+                                break
+                            if sighup_interrupt[0]:
+                                status, new_tb = self.collect_tb()
+                                if status == 0:
+                                    if not set(new_tb).issuperset(tb_deque):
+                                        idxctx.logger.info(
+                                            "Tarballs previously marked for indexing are no longer present: {}",
+                                            set(tb_deque).difference(new_tb),
+                                        )
+                                    tb_deque = deque(sorted(new_tb))
+                                idxctx.logger.info(
+                                    "SIGHUP status (Current tar ball indexed: ({}), Remaining: {}, Completed: {}, Errors_encountered: {}, Status: {})",
+                                    Path(tb).name,
+                                    len(tb_deque),
+                                    count_processed_tb,
+                                    _count_lines(erred),
+                                    tb_res,
+                                )
+                                sighup_interrupt[0] = False
+                                continue
                 except SigTermException:
                     idxctx.logger.exception(
                         "Indexing interrupted by SIGQUIT, stop processing tarballs"
@@ -669,6 +1537,12 @@ class Index:
                     else:
                         subj = f"{self.name}.{idxctx.TS} - Indexed {idx:d} results"
 
+                throughput = None
+                if self.throughput:
+                    throughput = self._throughput_report(time.time() - started)
+                    for line in throughput:
+                        idxctx.logger.info("throughput: {}", line)
+
                 report_fname = Path(tmpdir, f"{self.name}.{idxctx.TS}.report")
                 with report_fname.open(mode="w") as fp:
                     print(subj, file=fp)
@@ -690,6 +1564,10 @@ class Index:
                         with skipped.open() as sfp:
                             for line in sorted(sfp):
                                 print(line.strip(), file=fp)
+                    if throughput:
+                        print("\nThroughput\n==========", file=fp)
+                        for line in throughput:
+                            print(line, file=fp)
                 try:
                     self.report.post_status(tstos(), "status", report_fname)
                 except SigTermException:
@@ -0,0 +1,174 @@
+"""Copy an intake byte stream to a file, hashing it off the request thread.
+
+The request thread reads the stream directly into a small pool of
+preallocated buffers (with `readinto` where the stream supports it) and
+writes each buffer to the output file. Each filled buffer is then handed to
+a set of consumer threads, for example one computing the MD5 and another
+scanning the tarball members, which work on the same buffer through a
+`memoryview` rather than a copy. A buffer is recycled once every consumer is
+done with it; when all the buffers are in use, the request thread waits,
+which limits the memory used by a slow consumer.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import queue
+import threading
+import time
+from typing import Any, Callable, IO, Optional
+
+
+@dataclass
+class CopyResult:
+    """The outcome of a stream copy.
+
+    Fields:
+        received: the number of bytes read from the stream, which may exceed
+            the expected length by one buffer (which isn't written) if the
+            stream is too long
+        md5: the MD5 of the bytes written
+        seconds: the elapsed time of the copy
+    """
+
+    received: int
+    md5: str
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        """The copy rate in MB/s"""
+        return self.received / (1024 * 1024) / max(self.seconds, 1e-9)
+
+
+class StreamCopier:
+    """Copy a byte stream of known length to a file."""
+
+    BUFFER_SIZE = 1024 * 1024
+    BUFFERS = 4
+
+    def __init__(
+        self,
+        stream: IO[bytes],
+        length: int,
+        consumers: Optional[list[Callable[[memoryview], Any]]] = None,
+        buffer_size: int = BUFFER_SIZE,
+        buffers: int = BUFFERS,
+    ):
+        """Prepare to copy a stream
+
+        Args:
+            stream: the source byte stream
+            length: the expected length of the stream
+            consumers: additional functions to be called, each in its own
+                thread, with each chunk of the stream in order
+            buffer_size: the size of each buffer
+            buffers: the number of buffers
+        """
+        self.stream = stream
+        self.length = length
+        self.md5 = hashlib.md5()
+        self.consumers = [self.md5.update] + (consumers if consumers else [])
+        self.buffers = [bytearray(buffer_size) for _ in range(buffers)]
+        self.views = [memoryview(b) for b in self.buffers]
+        self.free: queue.Queue = queue.Queue()
+        self.pending = [0] * buffers
+        self.lock = threading.Lock()
+        self.errors: list[Exception] = []
+
+    def _fill(self, view: memoryview) -> int:
+        """Read from the stream until the buffer is full or the stream ends
+
+        Args:
+            view: the buffer to fill
+
+        Returns:
+            the number of bytes read
+        """
+        readinto = getattr(self.stream, "readinto", None)
+        filled = 0
+        while filled < len(view):
+            if readinto:
+                count = readinto(view[filled:])
+            else:
+                data = self.stream.read(len(view) - filled)
+                count = len(data)
+                view[filled : filled + count] = data
+            if not count:
+                break
+            filled += count
+        return filled
+
+    def _consume(self, consumer: Callable[[memoryview], Any], chunks: queue.Queue):
+        """Feed each chunk to a consumer, and release the buffer
+
+        A consumer which fails is not called again, but we keep releasing the
+        buffers so that the copy can't stall.
+
+        Args:
+            consumer: the consumer function
+            chunks: a queue of (buffer index, length) pairs, ending with None
+        """
+        failed = False
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            i, count = chunk
+            if not failed:
+                try:
+                    consumer(self.views[i][:count])
+                except Exception as e:
+                    failed = True
+                    self.errors.append(e)
+            with self.lock:
+                self.pending[i] -= 1
+                if not self.pending[i]:
+                    self.free.put(i)
+
+    def copy(self, output: IO[bytes]) -> CopyResult:
+        """Copy the stream to the output file
+
+        We read at most one byte more than the expected length, so that a
+        stream which is too long can be detected without reading all of it.
+
+        Args:
+            output: the output file
+
+        Raises:
+            Any error from reading the stream or writing the file, or from a
+            consumer
+
+        Returns:
+            the result of the copy
+        """
+        start = time.perf_counter()
+        for i in range(len(self.buffers)):
+            self.free.put(i)
+        queues = [queue.Queue() for _ in self.consumers]
+        threads = [
+            threading.Thread(target=self._consume, args=(c, q), daemon=True)
+            for c, q in zip(self.consumers, queues)
+        ]
+        for t in threads:
+            t.start()
+        received = 0
+        try:
+            while True:
+                i = self.free.get()
+                want = min(len(self.views[i]), self.length + 1 - received)
+                count = self._fill(self.views[i][:want])
+                received += count
+                if not count or received > self.length:
+                    break
+                output.write(self.views[i][:count])
+                self.pending[i] = len(queues)
+                for q in queues:
+                    q.put((i, count))
+        finally:
+            for q in queues:
+                q.put(None)
+            for t in threads:
+                t.join()
+        if self.errors:
+            raise self.errors[0]
+        return CopyResult(received, self.md5.hexdigest(), time.perf_counter() - start)
@@ -110,6 +110,10 @@ class _MockStreamingBulk:
         # First dump the template report before we continue
         msb.mpt.report()
         for action in actions:
+            if isinstance(action.get("_source"), str):
+                # The indexer may provide a pre-serialized JSON source, which
+                # the bulk client sends unchanged.
+                action = {**action, "_source": json.loads(action["_source"])}
             msb.duplicates_tracker[action["_id"]] += 1
             dcnt = msb.duplicates_tracker[action["_id"]]
             if dcnt == 2:
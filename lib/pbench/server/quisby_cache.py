@@ -0,0 +1,163 @@
+"""A persistent cache of Quisby comparison and visualization results.
+
+Quisby processes the "result.csv" files of one or more datasets of the same
+benchmark into a form the dashboard can plot. Extracting each "result.csv"
+may require unpacking a dataset, and the processing itself isn't cheap; but
+the result depends only on the benchmark and the set of datasets, whose
+results are immutable. So we save each successful Quisby response, keyed by
+the kind of result ("compare" or "visualize"), the benchmark, and the sorted
+dataset resource IDs and names: Quisby labels the results with the dataset
+names, so renaming a dataset must miss the old result.
+
+The cache is a directory of JSON files under the CACHE tree (named with a
+leading "." so that cache reclaim doesn't mistake it for a dataset), shared
+by all server processes and the indexer. It's bounded by the total size of
+the files, configured by the `quisby-cache-size` option (in megabytes) of the
+`pbench-server` section; the least recently used results, by file
+modification time, which we update on each hit, are evicted first.
+"""
+
+import hashlib
+import json
+from logging import Logger
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from pbench.server import JSONOBJECT, PbenchServerConfig
+from pbench.server.cache_manager import LockManager, MB_BYTES
+from pbench.server.database.models.datasets import Dataset
+
+
+class QuisbyCache:
+    """Save and find Quisby results."""
+
+    DIRECTORY = ".quisby"
+    LOCK = ".lock"
+    SUFFIX = ".json"
+
+    def __init__(self, options: PbenchServerConfig, logger: Logger):
+        """Locate the cache
+
+        Args:
+            options: the server configuration
+            logger: a logger
+        """
+        self.root: Path = options.CACHE / self.DIRECTORY
+        self.limit = (
+            options.getint("pbench-server", "quisby-cache-size", fallback=256)
+            * MB_BYTES
+        )
+        self.logger = logger
+
+    @staticmethod
+    def key(kind: str, benchmark: str, datasets: Iterable[Dataset]) -> str:
+        """Compute the cache key of a Quisby result
+
+        Args:
+            kind: the kind of result, "compare" or "visualize"
+            benchmark: the benchmark name
+            datasets: the datasets, in any order
+
+        Returns:
+            the cache key
+        """
+        ids = sorted(f"{d.resource_id} {d.name}" for d in datasets)
+        ident = "\n".join([kind, benchmark.lower(), *ids])
+        return hashlib.sha256(ident.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[JSONOBJECT]:
+        """Find a cached result
+
+        Args:
+            key: the cache key
+
+        Returns:
+            the result, or None if it isn't cached
+        """
+        path = self.root / f"{key}{self.SUFFIX}"
+        try:
+            result = json.loads(path.read_bytes())
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning("Unable to read cached Quisby result {}: {}", key, e)
+            return None
+        return result
+
+    def put(self, key: str, result: JSONOBJECT):
+        """Save a result, evicting older results to stay within the limit
+
+        Args:
+            key: the cache key
+            result: the Quisby result
+        """
+        payload = json.dumps(result, separators=(",", ":")).encode()
+        if len(payload) > self.limit:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp = self.root / f".{key}.{os.getpid()}"
+        try:
+            temp.write_bytes(payload)
+            temp.replace(self.root / f"{key}{self.SUFFIX}")
+        finally:
+            temp.unlink(missing_ok=True)
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove the least recently used results until the cache is within
+        the size limit
+
+        Returns:
+            the number of results removed
+        """
+        removed = 0
+        with LockManager(self.root / self.LOCK, exclusive=True):
+            entries = []
+            for path in self.root.glob(f"*{self.SUFFIX}"):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            size = sum(e[1] for e in entries)
+            for _, length, path in sorted(entries):
+                if size <= self.limit:
+                    break
+                path.unlink(missing_ok=True)
+                size -= length
+                removed += 1
+        return removed
+
+    def lookup(
+        self,
+        kind: str,
+        benchmark: str,
+        datasets: Iterable[Dataset],
+        process: Callable[[], JSONOBJECT],
+    ) -> JSONOBJECT:
+        """Find a cached result, or compute and cache it
+
+        Only successful results are cached, and a failure to save the result
+        is logged but otherwise ignored.
+
+        Args:
+            kind: the kind of result, "compare" or "visualize"
+            benchmark: the benchmark name
+            datasets: the datasets
+            process: a function to compute the Quisby result
+
+        Returns:
+            the Quisby result
+        """
+        key = self.key(kind, benchmark, datasets)
+        result = self.get(key)
+        if result is None:
+            result = process()
+            if result.get("status") == "success":
+                try:
+                    self.put(key, result)
+                except Exception as e:
+                    self.logger.warning("Unable to cache Quisby result {}: {}", key, e)
+        return result
@@ -183,6 +183,78 @@ class Sync:
             time.sleep(self.DELAY)
         raise SyncSqlError(self.component, "update") from last_error
 
+    def update_all(
+        self,
+        datasets: list[Dataset],
+        state: OperationState,
+        message: Optional[str] = None,
+    ):
+        """Set the state of the component Operation for a set of datasets in
+        a single transaction.
+
+        Args:
+            datasets: The datasets
+            state: The new OperationState of the component Operation
+            message: An optional status message
+        """
+        if not datasets:
+            return
+
+        self.logger.debug(
+            "{} datasets did {} with message {!r}",
+            len(datasets),
+            state.name,
+            message,
+        )
+
+        # Don't reference the Datasets (which are outside our session scope)
+        # inside the context manager.
+        ids = [d.id for d in datasets]
+        if not message and state is OperationState.OK:
+            message = "OK"
+
+        for retry in range(self.RETRIES):
+            try:
+                with Database.maker.begin() as session:
+                    query = session.query(Operation).filter(
+                        Operation.name == self.component,
+                        Operation.dataset_ref.in_(ids),
+                    )
+                    Database.dump_query(query, self.logger)
+                    ops = {o.dataset_ref: o for o in query.all()}
+                    for ds_id in ids:
+                        op = ops.get(ds_id)
+                        if op:
+                            op.state = state
+                            if message:
+                                op.message = message
+                        else:
+                            session.add(
+                                Operation(
+                                    dataset_ref=ds_id,
+                                    name=self.component,
+                                    state=state,
+                                    message=message,
+                                )
+                            )
+                return
+            except Exception as e:
+                if (
+                    not isinstance(e, DBAPIError)
+                    or not hasattr(e, "orig")
+                    or not isinstance(e.orig, SerializationFailure)
+                ):
+                    self.logger.warning(
+                        "{} 'update_all' {} datasets error ({}): {}",
+                        self.component,
+                        len(ids),
+                        retry,
+                        str(e),
+                    )
+                last_error = e
+            time.sleep(self.DELAY)
+        raise SyncSqlError(self.component, "update_all") from last_error
+
     def error(self, dataset: Dataset, message: str):
         """
         Record an error in the component for which the Sync object was created.
@@ -0,0 +1,605 @@
+"""Random access to the members of a dataset tarball.
+
+An xz file is a sequence of independently compressed blocks. Each xz stream
+ends with an index of the compressed and uncompressed sizes of its blocks,
+which allows us to locate the block containing any uncompressed offset, and
+to decompress that block by itself.
+
+A TarballIndex combines the xz block index with the uncompressed offset and
+size of each tar member, so that we can extract a single member by
+decompressing only the blocks which contain it, rather than unpacking the
+entire tarball.
+
+NOTE: a tarball compressed by a single-threaded xz has a single block, and
+extracting a member still requires decompressing everything in front of it;
+but we stop as soon as we have the member data, and don't write anything to
+disk. Multi-threaded compression (e.g., `xz -T0`) produces many blocks.
+"""
+
+from collections import deque
+import io
+import json
+import lzma
+import os
+from pathlib import Path
+import posixpath
+import queue
+import tarfile
+import threading
+from typing import Iterable, Iterator, NamedTuple, Optional
+import zlib
+
+XZ_HEADER_MAGIC = b"\xfd7zXZ\x00"
+XZ_FOOTER_MAGIC = b"YZ"
+XZ_HEADER_SIZE = 12
+XZ_FOOTER_SIZE = 12
+
+# The size of the compressed data we feed to the decompressor at once
+CHUNK_SIZE = 64 * 1024
+
+
+class TarballIndexError(Exception):
+    """The tarball can't be indexed."""
+
+    def __init__(self, tarball: Path, error: str):
+        self.tarball = tarball
+        self.error = error
+
+    def __str__(self) -> str:
+        return f"Unable to index {self.tarball}: {self.error}"
+
+
+class XzBlock(NamedTuple):
+    """Describe one compressed block of an xz file.
+
+    Fields:
+        offset: the file offset of the compressed block
+        unpadded: the "unpadded size" of the compressed block
+        start: the uncompressed offset of the block data
+        size: the uncompressed size of the block data
+        flags: the stream flags of the containing xz stream
+    """
+
+    offset: int
+    unpadded: int
+    start: int
+    size: int
+    flags: int
+
+
+class Member(NamedTuple):
+    """Describe one tar member.
+
+    Fields:
+        kind: "file", "dir", "link", or "other"
+        size: the size of the member data
+        offset: the uncompressed offset of the member data
+    """
+
+    kind: str
+    size: int
+    offset: int
+
+
+def _crc32(data: bytes) -> bytes:
+    return zlib.crc32(data).to_bytes(4, "little")
+
+
+def _decode_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """Decode an xz variable length integer.
+
+    Args:
+        data: the encoded data
+        pos: the offset of the integer
+
+    Returns:
+        The integer value, and the offset following it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError("xz integer overflow")
+
+
+def _encode_varint(value: int) -> bytes:
+    """Encode an xz variable length integer.
+
+    Args:
+        value: the integer
+
+    Returns:
+        The encoded integer
+    """
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _padded(size: int) -> int:
+    """Round up to the 4-byte alignment of xz blocks and indices."""
+    return (size + 3) & ~3
+
+
+def read_xz_blocks(fp: io.BufferedIOBase, file_size: int) -> list[XzBlock]:
+    """Read the block index of an xz file.
+
+    The file may contain multiple concatenated streams, with optional stream
+    padding, so we work backwards from the end of the file, reading each
+    stream's footer and index.
+
+    Args:
+        fp: the open xz file
+        file_size: the size of the file
+
+    Raises:
+        ValueError if the file isn't a valid xz file
+
+    Returns:
+        The list of blocks in file order
+    """
+    streams: deque[list[tuple[int, int, int, int]]] = deque()
+    end = file_size
+    while end > 0:
+        fp.seek(end - 4)
+        if fp.read(4) == b"\x00\x00\x00\x00":
+            # Stream padding
+            end -= 4
+            continue
+        if end < XZ_HEADER_SIZE + XZ_FOOTER_SIZE:
+            raise ValueError("truncated xz stream")
+        fp.seek(end - XZ_FOOTER_SIZE)
+        footer = fp.read(XZ_FOOTER_SIZE)
+        if footer[10:] != XZ_FOOTER_MAGIC or _crc32(footer[4:10]) != footer[:4]:
+            raise ValueError("bad xz stream footer")
+        index_size = (int.from_bytes(footer[4:8], "little") + 1) * 4
+        flags = int.from_bytes(footer[8:10], "little")
+        index_start = end - XZ_FOOTER_SIZE - index_size
+        fp.seek(index_start)
+        index = fp.read(index_size)
+        if index[0] != 0 or _crc32(index[:-4]) != index[-4:]:
+            raise ValueError("bad xz stream index")
+        count, pos = _decode_varint(index, 1)
+        records = []
+        for _ in range(count):
+            unpadded, pos = _decode_varint(index, pos)
+            size, pos = _decode_varint(index, pos)
+            records.append((unpadded, size))
+        stream_start = (
+            index_start - sum(_padded(u) for u, _ in records) - XZ_HEADER_SIZE
+        )
+        fp.seek(stream_start)
+        header = fp.read(XZ_HEADER_SIZE)
+        if header[:6] != XZ_HEADER_MAGIC or header[6:8] != footer[8:10]:
+            raise ValueError("bad xz stream header")
+        offset = stream_start + XZ_HEADER_SIZE
+        blocks = []
+        for unpadded, size in records:
+            blocks.append((offset, unpadded, size, flags))
+            offset += _padded(unpadded)
+        streams.appendleft(blocks)
+        end = stream_start
+
+    result = []
+    start = 0
+    for blocks in streams:
+        for offset, unpadded, size, flags in blocks:
+            result.append(XzBlock(offset, unpadded, start, size, flags))
+            start += size
+    return result
+
+
+def _block_stream(fp: io.BufferedIOBase, block: XzBlock) -> Iterator[bytes]:
+    """Generate a standalone xz stream containing a single block.
+
+    Args:
+        fp: the open xz file
+        block: the block to wrap
+
+    Returns:
+        A generator of the chunks of the xz stream
+    """
+    flags = block.flags.to_bytes(2, "little")
+    yield XZ_HEADER_MAGIC + flags + _crc32(flags)
+    fp.seek(block.offset)
+    remaining = _padded(block.unpadded)
+    while remaining:
+        chunk = fp.read(min(remaining, CHUNK_SIZE))
+        if not chunk:
+            raise ValueError("truncated xz block")
+        remaining -= len(chunk)
+        yield chunk
+    index = b"\x00" + b"".join(
+        _encode_varint(v) for v in (1, block.unpadded, block.size)
+    )
+    index += b"\x00" * (_padded(len(index)) - len(index))
+    index += _crc32(index)
+    backward = (len(index) // 4 - 1).to_bytes(4, "little")
+    yield index + _crc32(backward + flags) + backward + flags + XZ_FOOTER_MAGIC
+
+
+class MemberReader(io.RawIOBase):
+    """A raw byte stream of the data of one tar member.
+
+    Only the xz blocks which contain the member's data are decompressed, and
+    decompression stops as soon as the member data is complete.
+    """
+
+    def __init__(self, tarball: Path, blocks: list[XzBlock], member: Member):
+        """Open the member data stream.
+
+        Args:
+            tarball: the tarball path
+            blocks: the xz blocks containing the member data
+            member: the tar member
+        """
+        super().__init__()
+        self.fp = tarball.open("rb")
+        self.chunks = self._decompress(blocks, member)
+        self.pending = b""
+
+    def _decompress(self, blocks: list[XzBlock], member: Member) -> Iterator[bytes]:
+        remaining = member.size
+        for block in blocks:
+            skip = max(member.offset - block.start, 0)
+            decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+            for chunk in _block_stream(self.fp, block):
+                data = decompressor.decompress(chunk)
+                if skip:
+                    if skip >= len(data):
+                        skip -= len(data)
+                        continue
+                    data = data[skip:]
+                    skip = 0
+                if data:
+                    data = data[:remaining]
+                    remaining -= len(data)
+                    yield data
+                    if not remaining:
+                        return
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.pending:
+            self.pending = next(self.chunks, b"")
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.fp.close()
+            self.chunks.close()
+        super().close()
+
+
+class TarballIndex:
+    """An index of the members of a dataset tarball and its xz blocks.
+
+    The index is built once, when the tarball is uploaded, and saved in a
+    companion file alongside the tarball.
+    """
+
+    VERSION = 1
+
+    def __init__(self, size: int, blocks: list[XzBlock], members: dict[str, Member]):
+        """Construct a tarball index; see build() and load().
+
+        Args:
+            size: the size of the tarball file
+            blocks: the xz blocks of the tarball
+            members: the tar members, by normalized name
+        """
+        self.size = size
+        self.blocks = blocks
+        self.members = members
+
+    @staticmethod
+    def normalize(name: str) -> Optional[str]:
+        """Normalize a tar member name or relative path.
+
+        Args:
+            name: a member name
+
+        Returns:
+            the normalized name, or None if it's outside the tarball
+        """
+        name = posixpath.normpath(name)
+        if name.startswith(("/", "..")):
+            return None
+        return name
+
+    @classmethod
+    def add_member(
+        cls, members: dict[str, Member], info: tarfile.TarInfo
+    ) -> Optional[str]:
+        """Add a tar member, and any missing parent directories, to an index.
+
+        Args:
+            members: the tar members, by normalized name
+            info: the tar member header
+
+        Returns:
+            the normalized member name, or None if it's outside the tarball
+        """
+        name = cls.normalize(info.name)
+        if not name:
+            return None
+        if info.isreg():
+            kind = "file"
+        elif info.isdir():
+            kind = "dir"
+        elif info.issym() or info.islnk():
+            kind = "link"
+        else:
+            kind = "other"
+        members[name] = Member(kind, info.size, info.offset_data)
+
+        # Tarballs needn't contain entries for every directory
+        parent = posixpath.dirname(name)
+        while parent and parent not in members:
+            members[parent] = Member("dir", 0, 0)
+            parent = posixpath.dirname(parent)
+        return name
+
+    @classmethod
+    def build(cls, tarball: Path) -> "TarballIndex":
+        """Index a tarball.
+
+        This requires reading through the entire decompressed tarball.
+
+        Args:
+            tarball: the tarball path
+
+        Raises:
+            TarballIndexError if the tarball can't be indexed
+
+        Returns:
+            a TarballIndex
+        """
+        try:
+            size = tarball.stat().st_size
+            with tarball.open("rb") as fp:
+                blocks = read_xz_blocks(fp, size)
+            members: dict[str, Member] = {}
+            # NOTE: tarfile's own xz support can't read concatenated streams
+            with lzma.open(tarball) as xz, tarfile.open(fileobj=xz, mode="r|") as tar:
+                for info in tar:
+                    cls.add_member(members, info)
+        except (OSError, EOFError, ValueError, lzma.LZMAError, tarfile.TarError) as e:
+            raise TarballIndexError(tarball, str(e)) from e
+        return cls(size, blocks, members)
+
+    def save(self, path: Path):
+        """Save the index, atomically replacing any previous version.
+
+        Args:
+            path: the index file path
+        """
+        temp = path.with_name(f".{path.name}.{os.getpid()}")
+        try:
+            with temp.open("w") as f:
+                json.dump(
+                    {
+                        "version": self.VERSION,
+                        "size": self.size,
+                        "blocks": self.blocks,
+                        "members": self.members,
+                    },
+                    f,
+                    separators=(",", ":"),
+                )
+            temp.replace(path)
+        finally:
+            temp.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path: Path, tarball: Path) -> Optional["TarballIndex"]:
+        """Load the index of a tarball, if it's valid.
+
+        Args:
+            path: the index file path
+            tarball: the tarball path
+
+        Returns:
+            a TarballIndex, or None if there's no valid index
+        """
+        try:
+            with path.open("r") as f:
+                data = json.load(f)
+            if data["version"] != cls.VERSION or data["size"] != tarball.stat().st_size:
+                return None
+            return cls(
+                data["size"],
+                [XzBlock(*b) for b in data["blocks"]],
+                {n: Member(*m) for n, m in data["members"].items()},
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def find(self, name: str) -> Optional[Member]:
+        """Find a tar member.
+
+        Args:
+            name: the member name
+
+        Returns:
+            the member, or None
+        """
+        name = self.normalize(name)
+        return self.members.get(name) if name else None
+
+    def open(self, tarball: Path, member: Member) -> io.BufferedReader:
+        """Open a byte stream of a member's data.
+
+        Args:
+            tarball: the tarball path
+            member: the member to extract
+
+        Returns:
+            A buffered byte stream
+        """
+        end = member.offset + member.size
+        blocks = [
+            b for b in self.blocks if b.start < end and b.start + b.size > member.offset
+        ]
+        return io.BufferedReader(MemberReader(tarball, blocks, member))
+
+
+class _QueueReader(io.RawIOBase):
+    """A raw byte stream of the chunks delivered through a queue.
+
+    A None chunk marks the end of the stream.
+    """
+
+    def __init__(self, chunks: queue.Queue):
+        super().__init__()
+        self.chunks = chunks
+        self.pending = memoryview(b"")
+        self.eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.pending and not self.eof:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.eof = True
+            else:
+                self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def drain(self):
+        """Discard the rest of the stream."""
+        self.pending = memoryview(b"")
+        while not self.eof:
+            self.eof = self.chunks.get() is None
+
+
+class TarballScanner:
+    """Index a tarball, and capture selected members, as it's streamed.
+
+    This lets us build the TarballIndex (and pick out "metadata.log") while a
+    tarball is being uploaded, instead of reading and decompressing the whole
+    tarball again once it's been written.
+
+    The compressed data is fed to the scanner in order, and decompressed in
+    the feeding thread; the tar headers are parsed by a scanner thread which
+    reads the decompressed data through a bounded queue. A tarball which
+    can't be decompressed or parsed doesn't raise an exception: the scan is
+    abandoned, and index() returns None, so the caller can fall back to
+    TarballIndex.build().
+    """
+
+    # The most decompressed data we produce from one decompress call, and the
+    # number of such chunks we queue for the scanner thread.
+    OUTPUT_SIZE = 1024 * 1024
+    QUEUE_SIZE = 8
+
+    def __init__(self, capture: Iterable[str] = ()):
+        """Start scanning a tarball stream.
+
+        Args:
+            capture: the names of (small) members whose data we keep
+        """
+        self.decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+        self.chunks: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self.capture = {TarballIndex.normalize(n) for n in capture} - {None}
+        self.members: dict[str, Member] = {}
+        self.captured: dict[str, bytes] = {}
+        self.error: Optional[str] = None
+        self.finished = False
+        self.thread = threading.Thread(target=self._scan, daemon=True)
+        self.thread.start()
+
+    def _scan(self):
+        """Parse the tar headers of the decompressed stream."""
+        reader = _QueueReader(self.chunks)
+        try:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                for info in tar:
+                    name = TarballIndex.add_member(self.members, info)
+                    if name in self.capture and name not in self.captured:
+                        if info.isreg():
+                            self.captured[name] = tar.extractfile(info).read()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            # Drain the stream (including any padding following the end of
+            # the tar archive, or everything after an error) so that feed()
+            # never blocks.
+            reader.drain()
+
+    def feed(self, data: bytes):
+        """Feed the next chunk of compressed tarball data.
+
+        Args:
+            data: a bytes-like chunk, which isn't referenced after we return
+        """
+        if self.error or self.finished:
+            return
+        try:
+            while data:
+                if self.decompressor.eof:
+                    # Concatenated xz streams may be separated by zero padding
+                    data = bytes(data).lstrip(b"\0")
+                    if not data:
+                        break
+                    self.decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+                out = self.decompressor.decompress(data, self.OUTPUT_SIZE)
+                while True:
+                    if out:
+                        self.chunks.put(out)
+                    if self.decompressor.eof or self.decompressor.needs_input:
+                        break
+                    out = self.decompressor.decompress(b"", self.OUTPUT_SIZE)
+                data = self.decompressor.unused_data if self.decompressor.eof else b""
+        except (lzma.LZMAError, EOFError) as e:
+            self.error = str(e)
+
+    def finish(self):
+        """Mark the end of the tarball stream, and wait for the scan."""
+        if self.finished:
+            return
+        self.finished = True
+        if not self.error and not self.decompressor.eof:
+            self.error = "truncated xz stream"
+        self.chunks.put(None)
+        self.thread.join()
+
+    def index(self, tarball: Path) -> Optional[TarballIndex]:
+        """Complete the index of the scanned tarball.
+
+        Args:
+            tarball: the tarball file, whose xz block index we read
+
+        Returns:
+            the TarballIndex, or None if the scan failed
+        """
+        self.finish()
+        if self.error:
+            return None
+        try:
+            size = tarball.stat().st_size
+            with tarball.open("rb") as fp:
+                blocks = read_xz_blocks(fp, size)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            return None
+        return TarballIndex(size, blocks, self.members)
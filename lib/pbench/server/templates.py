@@ -6,7 +6,7 @@ from logging import Logger
 from pathlib import Path
 import re
 import sys
-from typing import Any, AnyStr, Dict, Optional
+from typing import Any, AnyStr, Dict, Optional, Tuple
 
 import pyesbulk
 from sqlalchemy.sql.sqltypes import JSON
@@ -376,6 +376,10 @@ class TemplateFile:
             self.modified = self.mappings.modified
         self.loaded = False
 
+        # Index names by the date portion of the document @timestamp; many
+        # documents share a day, so we format each name only once.
+        self.index_names: Dict[str, str] = {}
+
     def load(self):
         """
         Load the associated JSON files into memory; including both the "main"
@@ -407,6 +411,7 @@ class TemplateFile:
             prefix=self.prefix, version=idxver, idxname=self.idxname
         )
         self.index_template = ip["template"]
+        self.index_names.clear()
         self.logger.info("Loaded template {} version {}", self.name, self.version)
 
         # Add a standard "authorization" sub-document into the document
@@ -452,6 +457,7 @@ class TemplateFile:
         self.index_pattern = template.template_pattern
         self.index_template = template.index_template
         self.idxname = template.idxname
+        self.index_names.clear()
 
     def resolve(self):
         """
@@ -517,23 +523,27 @@ class TemplateFile:
         Returns:
             The Elasticsearch index into which the source document will be indexed.
         """
-        version = self.version
-        idxname = self.idxname
-
         try:
             ts_val = source["@timestamp"]
         except KeyError as e:
             raise BadDate(f"missing {e} in a source document: {source!r}")
 
-        year, month, day = ts_val.split("T", 1)[0].split("-")[0:3]
-        return self.index_template.format(
+        date = ts_val.split("T", 1)[0]
+        try:
+            return self.index_names[date]
+        except KeyError:
+            pass
+        year, month, day = date.split("-")[0:3]
+        name = self.index_template.format(
             prefix=self.prefix,
-            version=version,
-            idxname=idxname,
+            version=self.version,
+            idxname=self.idxname,
             year=year,
             month=month,
             day=day,
         )
+        self.index_names[date] = name
+        return name
 
     def body(self) -> Dict[str, Any]:
         """
@@ -588,6 +598,9 @@ class PbenchTemplates:
         setting_dir = lib_dir / "settings"
 
         self.templates: Dict[str, TemplateFile] = {}
+        # Templates by (key, name), and by (key, None) for the first template
+        # added with each key, for generate_index_name.
+        self.lookup: Dict[Tuple[str, Optional[str]], TemplateFile] = {}
         self.idx_prefix: str = idx_prefix
         self.logger: Logger = logger
         self.known_tool_handlers: JSONOBJECT = known_tool_handlers
@@ -649,6 +662,8 @@ class PbenchTemplates:
             template: Template document
         """
         self.templates[template.idxname] = template
+        self.lookup.setdefault((template.key, template.name), template)
+        self.lookup.setdefault((template.key, None), template)
 
     def resolve(self):
         """
@@ -792,11 +807,9 @@ class PbenchTemplates:
         Returns
             expanded index name including date
         """
-        for t in self.templates.values():
-            if t.key == template_name and (toolname is None or t.name == toolname):
-                template = t
-                break
-        else:
+        try:
+            template = self.lookup[(template_name, toolname)]
+        except KeyError:
             self.counters["invalid_template_name"] += 1
             raise Exception(
                 "Invalid template name, '{}': {}".format(template_name, template_name)
@@ -0,0 +1,608 @@
+"""Parsers for "stdout" tool data files.
+
+Some tools (e.g., proc-vmstat and proc-interrupts) record their data as the
+periodic text output of the tool, where each sample starts with a line of the
+form
+
+    timestamp: 12345.00
+
+giving the time of the sample in seconds since the epoch, followed by the
+sample data in a tool-specific "subformat". Each sample becomes one or more
+documents, with gauges of the sampled values and rates of change from the
+previous sample.
+
+We read a file in large blocks and split it into sections, one per
+timestamp, and each parser converts a section at a time. The keys of a tool's
+samples rarely change from one sample to the next, so the parsers remember
+how to interpret the keys of the previous section, and, as long as they're
+the same, compute the rates of a whole section at once with numpy. Anything
+unusual (changed or duplicated keys, values which don't fit in 64 bits, or a
+zero duration) is handled a value at a time, exactly as the original line by
+line parsers do, so the documents are identical either way.
+
+Parsers are registered by subformat name with the `register_parser`
+decorator, and are selected by the "subformat" of the tool's handler record.
+"""
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+import numpy as np
+
+from pbench.server import JSONOBJECT
+
+# The size of the text blocks we read at once
+BLOCK_SIZE = 1024 * 1024
+
+# The largest magnitude of a value for which we compute rates with numpy:
+# the difference of two such values can't overflow 64 bits.
+VECTOR_LIMIT = 2**62
+
+
+class Section(NamedTuple):
+    """The lines of one timestamped sample of a stdout tool data file.
+
+    Fields:
+        timestamp: the "timestamp:" line starting the section
+        lines: the following lines, without line endings
+    """
+
+    timestamp: str
+    lines: List[str]
+
+
+def read_sections(file_object, block_size: int = BLOCK_SIZE) -> Iterator[Section]:
+    """Split a stdout tool data file into timestamped sections.
+
+    Lines before the first timestamp are ignored. Each section is yielded as
+    soon as the next timestamp (or the end of the file) is found.
+
+    Args:
+        file_object: the open text file
+        block_size: the number of characters to read at once
+
+    Returns:
+        a generator of the sections of the file
+    """
+    timestamp = None
+    lines = []
+    tail = ""
+    while True:
+        block = file_object.read(block_size)
+        if not block:
+            break
+        block_lines = (tail + block).split("\n")
+        tail = block_lines.pop()
+        for line in block_lines:
+            if line.startswith("timestamp:"):
+                if timestamp is not None:
+                    yield Section(timestamp, lines)
+                timestamp = line
+                lines = []
+            elif timestamp is not None:
+                lines.append(line)
+    if tail:
+        if tail.startswith("timestamp:"):
+            if timestamp is not None:
+                yield Section(timestamp, lines)
+            timestamp = tail
+            lines = []
+        elif timestamp is not None:
+            lines.append(tail)
+    if timestamp is not None:
+        yield Section(timestamp, lines)
+
+
+def int64_array(values: List[Any]) -> Optional[np.ndarray]:
+    """Convert the values of a section to a numpy array, if we can safely
+    compute rates from them with numpy.
+
+    Args:
+        values: integer values, either flat or a list of equal length rows
+
+    Returns:
+        the int64 array, or None if the values are out of range
+    """
+    try:
+        array = np.array(values, dtype=np.int64)
+    except (OverflowError, TypeError, ValueError):
+        return None
+    if array.size and (array.min() < -VECTOR_LIMIT or array.max() > VECTOR_LIMIT):
+        return None
+    return array
+
+
+class StdoutParser:
+    """Convert the sections of a stdout tool data file into documents.
+
+    Subclasses define a subformat name and implement records(). A parser is
+    constructed for each file, so it can keep the state it needs to compute
+    rates from one section to the next.
+    """
+
+    subformat: str = ""
+
+    def __init__(self, td, converter: Callable[[str], Any], path: str):
+        """Prepare to parse a file.
+
+        Args:
+            td: the ToolData object of the tool
+            converter: the conversion of a value string (e.g., int)
+            path: the path of the file in the dataset (for logging)
+        """
+        self.td = td
+        self.toolname = td.toolname
+        self.converter = converter
+        self.path = path
+        self.ts_orig = None
+        self.prev_ts_orig = None
+
+    def parse(self, file_object) -> Iterator[JSONOBJECT]:
+        """Generate the documents of the file.
+
+        Args:
+            file_object: the open text file
+
+        Returns:
+            a generator of the source documents
+        """
+        logger = self.td.logger
+        logger.info(
+            "tool-data-indexing: tool {}, stdout {} start {}",
+            self.toolname,
+            self.subformat,
+            self.path,
+        )
+        yield from self.records(read_sections(file_object))
+        logger.info(
+            "tool-data-indexing: tool {}, stdout {} end {}",
+            self.toolname,
+            self.subformat,
+            self.path,
+        )
+
+    def records(self, sections: Iterator[Section]) -> Iterator[JSONOBJECT]:
+        """Generate the documents of the sections of a file.
+
+        Args:
+            sections: the sections of the file
+
+        Returns:
+            a generator of the source documents
+        """
+        raise NotImplementedError()
+
+    def timestamp(self, section: Section) -> str:
+        """Advance to the timestamp of a new section.
+
+        The timestamp is *seconds* since the epoch, which we convert to
+        millis since the epoch.
+
+        Args:
+            section: the new section
+
+        Returns:
+            the absolute ISO string timestamp of the section
+        """
+        self.prev_ts_orig = self.ts_orig
+        self.ts_orig = float(section.timestamp.split(":")[1])
+        assert (
+            self.prev_ts_orig is None or self.prev_ts_orig <= self.ts_orig
+        ), f"prev_ts_orig {self.prev_ts_orig!r} > ts_orig {self.ts_orig!r}"
+        return self.td.mk_abs_timestamp_millis(self.ts_orig * 1000)
+
+    def record(self, ts_str: str, idx: int) -> JSONOBJECT:
+        """Construct a document with the common fields of the tool data.
+
+        Args:
+            ts_str: the absolute timestamp of the section
+            idx: the "@idx" of the document
+
+        Returns:
+            the new document, with an empty tool field
+        """
+        td = self.td
+        record = {}
+        record["@timestamp"] = ts_str
+        record["@timestamp_original"] = str(self.ts_orig)
+        record["run"] = td.run_metadata
+        record["iteration"] = td.iteration_metadata
+        record["sample"] = td.sample_metadata
+        record[self.toolname] = {"@idx": idx}
+        return record
+
+
+PARSERS: Dict[str, Type[StdoutParser]] = {}
+
+S = TypeVar("S", bound=Type[StdoutParser])
+
+
+def register_parser(cls: S) -> S:
+    """Class decorator to register a stdout parser by subformat name."""
+    PARSERS[cls.subformat] = cls
+    return cls
+
+
+class KeyTable:
+    """The interpretation of the keys of a keyval section.
+
+    Each key is either a "stat", or a "stat_substat" pair; a stat may be
+    renamed to avoid conflicting with the substats of another key sharing
+    the same prefix (see ToolData._remaps).
+    """
+
+    def __init__(self, keys: Tuple[str, ...], renames: Dict[str, str]):
+        """Interpret the keys of a section.
+
+        Args:
+            keys: the keys of the section, in order
+            renames: the stats to rename
+        """
+        self.keys = keys
+        self.fields = []
+        for key in keys:
+            parts = key.split("_", 1)
+            if len(parts) == 1:
+                self.fields.append((renames.get(key, key), None))
+            else:
+                self.fields.append((parts[0], parts[1]))
+        stats = {stat for stat, substat in self.fields if substat is None}
+        parents = {stat for stat, substat in self.fields if substat is not None}
+        # We can only handle the values of a section at once if each key has
+        # its own field, and no stat is both a value and a set of substats.
+        self.simple = len(set(self.fields)) == len(self.fields) and not (
+            stats & parents
+        )
+        self.substat = np.array(
+            [substat is not None for _, substat in self.fields], dtype=bool
+        )
+
+    def gauges(self, values: List[Any]) -> JSONOBJECT:
+        """Construct the nested field values of a simple key table.
+
+        Args:
+            values: the value of each key
+
+        Returns:
+            the stat (or stat and substat) fields and their values
+        """
+        fields = {}
+        for (stat, substat), value in zip(self.fields, values):
+            if substat is None:
+                fields[stat] = value
+            else:
+                try:
+                    fields[stat][substat] = value
+                except KeyError:
+                    fields[stat] = {substat: value}
+        return fields
+
+
+@register_parser
+class KeyvalParser(StdoutParser):
+    """Parse key/value samples, building one document per timestamp.
+
+    The format for files considered by this parser is as follows:
+
+     * each line of the file contains an ascii-numeric key and a
+       numeric (integer or floating point) value separated by a space
+     * the keyword, `timestamp`, is recognized to be the
+       timestamp value to be associated with all following
+       key/value pairs until the next `timestamp` keyword
+       is encountered
+     * all key/value pairs are treated as fields of one JSON
+       document with the associated timestamp to be indexed
+    """
+
+    subformat = "keyval"
+
+    def __init__(self, td, converter: Callable[[str], Any], path: str):
+        super().__init__(td, converter, path)
+        try:
+            # Fetch the remaps table to see if any naming conflicts need to
+            # be resolved.
+            self.renames = td._remaps[self.toolname]["key"]
+        except KeyError:
+            self.renames = {}
+        self.table: Optional[KeyTable] = None
+        self.prev_gauge: Optional[JSONOBJECT] = None
+        self.prev_values: Optional[np.ndarray] = None
+
+    def records(self, sections: Iterator[Section]) -> Iterator[JSONOBJECT]:
+        record = None
+        idx = 0
+        for section in sections:
+            if record:
+                # timestamp delimits records, yield last record.
+                if not record[self.toolname]["rate"]:
+                    # For first record, rate will be empty, so don't emit it.
+                    del record[self.toolname]["rate"]
+                yield record
+                idx += 1
+                # Be sure to remember the record we just emitted so that it
+                # is available for rate calculations.
+                self.prev_gauge = record[self.toolname]["gauge"]
+            record = self.record(self.timestamp(section), idx)
+            gauge, rate = self.convert(section.lines)
+            record[self.toolname]["gauge"] = gauge
+            record[self.toolname]["rate"] = rate
+        if record and record[self.toolname]["gauge"]:
+            yield record
+
+    def convert(self, lines: List[str]) -> Tuple[JSONOBJECT, JSONOBJECT]:
+        """Convert the lines of a section into gauges and rates.
+
+        Args:
+            lines: the "key value" lines of the section
+
+        Returns:
+            the gauge and rate fields of the document
+        """
+        keys = []
+        raw = []
+        for line in lines:
+            key, value = line.strip().split(" ")
+            keys.append(key)
+            raw.append(value)
+        keys = tuple(keys)
+        prev_table = self.table
+        if prev_table is None or prev_table.keys != keys:
+            self.table = KeyTable(keys, self.renames)
+        table = self.table
+        if not table.simple or self.converter is not int:
+            self.prev_values = None
+            return self.convert_lines(keys, raw)
+
+        values = [int(value) for value in raw]
+        gauge = table.gauges(values)
+        array = int64_array(values)
+        prev_values = self.prev_values
+        self.prev_values = array
+        rate = {}
+        if self.prev_ts_orig:
+            # Note we don't record the rate on the first value encountered.
+            duration = self.ts_orig - self.prev_ts_orig
+            # The substat rates have always been computed this way: since
+            # rates are compared only within a stat, we keep it.
+            sub_duration = (self.ts_orig / 1000) - (self.prev_ts_orig / 1000)
+            if (
+                table is prev_table
+                and array is not None
+                and prev_values is not None
+                and duration
+                and sub_duration
+            ):
+                durations = np.where(table.substat, sub_duration, duration)
+                rate = table.gauges(((array - prev_values) / durations).tolist())
+            else:
+                rate = self.rates(keys, values, duration, sub_duration)
+        return gauge, rate
+
+    def rates(
+        self,
+        keys: Tuple[str, ...],
+        values: List[int],
+        duration: float,
+        sub_duration: float,
+    ) -> JSONOBJECT:
+        """Compute the rates of a section from the previous gauges, a value at
+        a time.
+
+        Args:
+            keys: the keys of the section
+            values: the value of each key
+            duration: the seconds since the previous section
+            sub_duration: the duration used for the rates of substats
+
+        Returns:
+            the rate fields of the document
+        """
+        rate = {}
+        prev_gauge = self.prev_gauge
+        for (stat, substat), value in zip(self.table.fields, values):
+            if substat is None:
+                rate[stat] = (value - prev_gauge[stat]) / duration
+            else:
+                the_rate = (value - prev_gauge[stat][substat]) / sub_duration
+                if stat not in rate:
+                    rate[stat] = {}
+                rate[stat][substat] = the_rate
+        return rate
+
+    def convert_lines(
+        self, keys: Tuple[str, ...], raw: List[str]
+    ) -> Tuple[JSONOBJECT, JSONOBJECT]:
+        """Convert the lines of a section into gauges and rates a line at a
+        time, for keys which don't map to distinct fields or values which
+        aren't integers.
+
+        Args:
+            keys: the keys of the section
+            raw: the value string of each key
+
+        Returns:
+            the gauge and rate fields of the document
+        """
+        gauge = {}
+        rate = {}
+        prev_gauge = self.prev_gauge
+        ts_orig = self.ts_orig
+        prev_ts_orig = self.prev_ts_orig
+        converter = self.converter
+        for (stat, substat), value in zip(self.table.fields, raw):
+            if substat is None:
+                gauge[stat] = converter(value)
+                if prev_ts_orig:
+                    duration = ts_orig - prev_ts_orig
+                    value_diff = int(value) - prev_gauge[stat]
+                    rate[stat] = value_diff / duration
+            else:
+                if stat not in gauge:
+                    gauge[stat] = {}
+                gauge[stat][substat] = converter(value)
+                if prev_ts_orig:
+                    duration = (ts_orig / 1000) - (prev_ts_orig / 1000)
+                    value_diff = int(value) - prev_gauge[stat][substat]
+                    if stat not in rate:
+                        rate[stat] = {}
+                    rate[stat][substat] = value_diff / duration
+        return gauge, rate
+
+
+@register_parser
+class ProcintParser(StdoutParser):
+    """Parse the two-dimensional proc-interrupts output, building one
+    document per interrupt and CPU for each timestamp.
+
+    An example file format:
+    timestamp: 1394048617.043209234
+               CPU0       CPU1       CPU2       CPU3
+      0:         25          0          0          0   IO-APIC-edge      timer
+      1:         10          0          0          0   IO-APIC-edge      i8042
+    NMI:          0          0          0          0   Non-maskable interrupts
+    LOC:      48687      45068      40188      65602   Local timer interrupts
+    ERR:          0
+    """
+
+    subformat = "procint"
+
+    def __init__(self, td, converter: Callable[[str], Any], path: str):
+        super().__init__(td, converter, path)
+        self.prev_gauges = {}
+        self.prev_ids: Optional[Tuple[str, ...]] = None
+        self.prev_values: Optional[np.ndarray] = None
+
+    def records(self, sections: Iterator[Section]) -> Iterator[JSONOBJECT]:
+        idx = 0
+        for section in sections:
+            idx += 1
+            yield from self.convert(section, idx)
+
+    def rows(
+        self, lines: List[str], cpu_count: int
+    ) -> Iterator[Tuple[str, Optional[str], Any]]:
+        """Convert the interrupt lines of a section.
+
+        Args:
+            lines: the interrupt lines
+            cpu_count: the number of CPU columns
+
+        Returns:
+            a generator of the interrupt ID, description and value (for
+            "ERR" and "MIS", which have no description) or per-CPU values
+            of each line
+        """
+        converter = self.converter
+        for line in lines:
+            parts = line.split(None, 1 + cpu_count)
+            int_id = parts[0][:-1]
+            if int_id in ("ERR", "MIS"):
+                yield int_id, None, converter(parts[1])
+            else:
+                vals = [converter(parts[col]) for col in range(1, cpu_count + 1)]
+                yield int_id, parts[-1], vals
+
+    def convert(self, section: Section, idx: int) -> Iterator[JSONOBJECT]:
+        """Convert a section into documents.
+
+        Args:
+            section: the section
+            idx: the "@idx" of the section's documents
+
+        Returns:
+            a generator of the documents of the section, in the order of its
+            lines
+        """
+        toolname = self.toolname
+        ts_str = self.timestamp(section)
+        # The first line is the header naming the CPU columns.
+        if not section.lines:
+            raise Exception("Bad proc-interrupts-stdout.txt file encountered")
+        cpu_column_ids = []
+        for cpu in section.lines[0].split():
+            if not cpu.startswith("CPU"):
+                raise Exception("Bad proc-interrupts-stdout.txt file encountered")
+            cpu_column_ids.append(cpu[3:])
+        cpu_count = len(cpu_column_ids)
+
+        # Convert the lines, noting the per-CPU counts for the rates; if a
+        # line can't be converted, we convert them again as we go, so that we
+        # emit the documents of the lines before it.
+        prev_ids = self.prev_ids
+        prev_values = self.prev_values
+        self.prev_ids = None
+        self.prev_values = None
+        rates = None
+        try:
+            rows = list(self.rows(section.lines[1:], cpu_count))
+        except Exception:
+            rows = self.rows(section.lines[1:], cpu_count)
+        else:
+            ids = tuple(row[0] for row in rows if row[1] is not None)
+            if self.converter is int and len(set(ids)) == len(ids):
+                self.prev_ids = ids
+                self.prev_values = values = int64_array(
+                    [row[2] for row in rows if row[1] is not None]
+                )
+                if (
+                    ids == prev_ids
+                    and values is not None
+                    and prev_values is not None
+                    and values.shape == prev_values.shape
+                ):
+                    duration = self.ts_orig - self.prev_ts_orig
+                    if duration:
+                        # NOTE: the rate of each CPU has always been computed
+                        # from the previous count of the first CPU; we keep
+                        # that so that the documents don't change.
+                        diffs = values - prev_values[:, :1]
+                        rates = iter((diffs / duration).tolist())
+
+        # The documents of a section differ only in their tool fields.
+        base = self.record(ts_str, idx)
+        prev_gauges = self.prev_gauges
+        for int_id, desc_str, vals in rows:
+            if desc_str is None:
+                record = base.copy()
+                record[toolname] = fields = {"@idx": idx, "int_id": int_id}
+                fields["gauge"] = vals
+                if int_id in prev_gauges:
+                    duration = self.ts_orig - self.prev_ts_orig
+                    value_diff = vals - prev_gauges[int_id]
+                    fields["rate"] = value_diff / duration
+                prev_gauges[int_id] = vals
+                yield record
+                continue
+            if rates is not None:
+                cpu_rates = next(rates)
+            elif int_id in prev_gauges:
+                prev_cpu_gauges = prev_gauges[int_id]
+                duration = self.ts_orig - self.prev_ts_orig
+                cpu_rates = [(val - prev_cpu_gauges[0]) / duration for val in vals]
+            else:
+                cpu_rates = None
+            records = []
+            for col, cpu in enumerate(cpu_column_ids):
+                record = base.copy()
+                record[toolname] = fields = {
+                    "@idx": idx,
+                    "int_id": int_id,
+                    "cpu_id": cpu,
+                    "desc": desc_str,
+                    "gauge": vals[col],
+                }
+                if cpu_rates is not None:
+                    fields["rate"] = cpu_rates[col]
+                records.append(record)
+            prev_gauges[int_id] = vals
+            yield from records
@@ -0,0 +1,450 @@
+"""Resumable upload sessions.
+
+A client can upload a large tarball as a sequence of chunks rather than in a
+single PUT. The client first initiates a session, declaring the name, MD5 and
+length of the tarball; it then sends the chunks, each at an explicit byte
+offset, in any order and possibly in parallel; it can ask which byte ranges
+have been received so far, to resume after a dropped connection; and finally
+it asks the server to finalize the session, which verifies the MD5 and creates
+the dataset exactly as a single PUT would. The session is kept until the
+dataset has been created, so that the client can retry finalizing it after a
+failure without resending the tarball; a session which has received nothing
+for a day is assumed to be abandoned, and is removed.
+
+Each session is kept in a "<md5>.upload" directory under the intake TEMPORARY
+directory, holding the (preallocated) tarball file, a ".session" JSON record of
+the tarball attributes and the byte ranges received, and a ".session.lock" file
+which serializes updates to the record across server processes.
+
+The tarball MD5 is computed as chunks arrive. The server process receiving the
+first chunk of the tarball starts an MD5 hash, and feeds it each chunk which
+continues the hashed prefix of the tarball as that chunk is written, along with
+any bytes already received out of order which become contiguous with it. When
+the session is finalized we only need to hash the remainder: nothing when the
+chunks arrived in order at a single server process, and at worst the whole
+tarball if the process holding the hash didn't also receive the last chunks.
+A chunk which rewrites bytes already received changes the session's
+"generation", and any hash started under an earlier generation (in this or any
+other server process) is discarded, since it may have hashed the old bytes.
+"""
+
+from dataclasses import dataclass, field
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import time
+from typing import Any, Dict, IO, List, Tuple
+import uuid
+
+from pbench.server.cache_manager import LockManager
+from pbench.server.cache_policy import load_record, save_record
+
+
+class UploadSessionError(Exception):
+    """Base class for upload session errors"""
+
+    pass
+
+
+class SessionNotFound(UploadSessionError):
+    def __init__(self, md5: str):
+        self.md5 = md5
+
+    def __str__(self) -> str:
+        return f"No upload session for {self.md5!r}"
+
+
+class SessionMismatch(UploadSessionError):
+    def __init__(self, md5: str, problem: str):
+        self.md5 = md5
+        self.problem = problem
+
+    def __str__(self) -> str:
+        return f"Upload session {self.md5!r} {self.problem}"
+
+
+class BadRange(UploadSessionError):
+    def __init__(self, md5: str, problem: str):
+        self.md5 = md5
+        self.problem = problem
+
+    def __str__(self) -> str:
+        return f"Upload session {self.md5!r}: {self.problem}"
+
+
+class SessionIncomplete(UploadSessionError):
+    def __init__(self, md5: str, missing: List[List[int]]):
+        self.md5 = md5
+        self.missing = missing
+
+    def __str__(self) -> str:
+        return f"Upload session {self.md5!r} is missing byte ranges {self.missing}"
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add a byte range to a sorted list of disjoint byte ranges.
+
+    Args:
+        ranges: sorted list of disjoint [start, end) ranges
+        start: the first byte of the new range
+        end: the byte following the new range
+
+    Returns:
+        a new sorted list of disjoint ranges, coalescing any which overlap or
+        abut the new range
+    """
+    merged = []
+    for s, e in ranges:
+        if e < start or s > end:
+            merged.append([s, e])
+        else:
+            start, end = min(s, start), max(e, end)
+    merged.append([start, end])
+    return sorted(merged)
+
+
+@dataclass
+class SessionRecord:
+    """The persistent state of an upload session.
+
+    Fields:
+        name: the tarball file name
+        md5: the expected MD5 of the tarball
+        length: the length of the tarball
+        access: the requested dataset access
+        metadata: the requested dataset metadata expressions
+        user_id: the ID of the user who initiated the session
+        received: sorted list of disjoint [start, end) byte ranges received
+        generation: identifies the content of the received ranges, and
+            changes whenever received bytes are rewritten
+    """
+
+    name: str = ""
+    md5: str = ""
+    length: int = 0
+    access: str = ""
+    metadata: List[str] = field(default_factory=list)
+    user_id: str = ""
+    received: List[List[int]] = field(default_factory=list)
+    generation: str = ""
+
+    @property
+    def missing(self) -> List[List[int]]:
+        """The [start, end) byte ranges not yet received"""
+        missing = []
+        offset = 0
+        for start, end in self.received:
+            if start > offset:
+                missing.append([offset, start])
+            offset = end
+        if offset < self.length:
+            missing.append([offset, self.length])
+        return missing
+
+    @property
+    def contiguous(self) -> int:
+        """The length of the received prefix of the tarball"""
+        if self.received and self.received[0][0] == 0:
+            return self.received[0][1]
+        return 0
+
+
+class UploadSession:
+    """Manage the on-disk state of a resumable upload."""
+
+    SUFFIX = ".upload"
+    RECORD = ".session"
+    LOCK = ".session.lock"
+    CHUNK_SIZE = 65536
+
+    # Remove sessions which haven't been updated for a day
+    LIFETIME = 24 * 60 * 60
+
+    # In-process incremental MD5 hashes, as a tuple of the session generation
+    # they hash, the number of bytes hashed and the hash object, by session
+    # MD5.
+    HASHERS: Dict[str, Tuple[str, int, Any]] = {}
+
+    def __init__(self, temporary: Path, md5: str):
+        """Identify an upload session
+
+        Args:
+            temporary: the intake temporary directory
+            md5: the expected MD5 of the tarball
+        """
+        self.md5 = md5
+        self.path = temporary / f"{md5}{self.SUFFIX}"
+
+    def load(self) -> SessionRecord:
+        """Load the session record
+
+        Raises:
+            SessionNotFound: there's no such session
+
+        Returns:
+            the session record
+        """
+        record = load_record(SessionRecord, self.path / self.RECORD)
+        if record.md5 != self.md5:
+            raise SessionNotFound(self.md5)
+        return record
+
+    def create(
+        self,
+        name: str,
+        length: int,
+        access: str,
+        metadata: List[str],
+        user_id: str,
+    ) -> Tuple[SessionRecord, bool]:
+        """Create the session, or find the existing session to resume it.
+
+        The session directory is built under a temporary name and renamed into
+        place, so that concurrent initiation of the same session can't expose
+        an incomplete session.
+
+        Args:
+            name: the tarball file name
+            length: the length of the tarball
+            access: the requested dataset access
+            metadata: the requested dataset metadata expressions
+            user_id: the ID of the user initiating the session
+
+        Raises:
+            SessionMismatch: an existing session has a different name, length
+                or owner
+
+        Returns:
+            the session record, and whether the session was created
+        """
+        record = SessionRecord(
+            name=name,
+            md5=self.md5,
+            length=length,
+            access=access,
+            metadata=metadata,
+            user_id=user_id,
+            generation=uuid.uuid4().hex,
+        )
+        build = self.path.with_name(f".{self.path.name}.{os.getpid()}")
+        created = not self.path.is_dir()
+        try:
+            if created:
+                build.mkdir()
+                with (build / name).open("wb") as f:
+                    f.truncate(length)
+                save_record(record, build / self.RECORD)
+                build.rename(self.path)
+        except OSError:
+            if not self.path.is_dir():
+                raise
+            created = False
+        finally:
+            shutil.rmtree(build, ignore_errors=True)
+        if not created:
+            record = self.load()
+            if record.user_id != user_id:
+                raise SessionMismatch(self.md5, "belongs to another user")
+            if record.name != name or record.length != length:
+                raise SessionMismatch(
+                    self.md5,
+                    f"is for {record.name!r} with length {record.length}",
+                )
+        return record, created
+
+    def write(self, start: int, stream: IO[bytes], count: int) -> SessionRecord:
+        """Write a chunk of the tarball at an offset.
+
+        The data is streamed into the tarball file outside of the session
+        lock, so that chunks can be written in parallel; only the update of
+        the received ranges is serialized.
+
+        Args:
+            start: the offset of the chunk
+            stream: the source of the chunk data
+            count: the length of the chunk
+
+        Raises:
+            SessionNotFound: there's no such session
+            BadRange: the chunk is outside the tarball, or the stream ended
+                early
+            OSError: writing the chunk failed
+
+        Returns:
+            the updated session record
+        """
+        record = self.load()
+        end = start + count
+        if start < 0 or count <= 0 or end > record.length:
+            raise BadRange(
+                self.md5,
+                f"byte range {start}-{end - 1} is outside length {record.length}",
+            )
+
+        # Take ownership of this process's incremental hash, if any, or start
+        # one with the first chunk. If this chunk fails, the hash is dropped,
+        # and will be recomputed from the tarball when finalizing. A hash of
+        # an earlier generation, or which covers bytes this chunk rewrites,
+        # is dropped as stale.
+        generation, hashed, md5 = self.HASHERS.pop(self.md5, ("", 0, None))
+        if generation != record.generation or start < hashed:
+            hashed, md5 = 0, None
+        if md5 is None and start == 0:
+            md5 = hashlib.md5()
+        feed = md5 is not None and start == hashed
+
+        received = 0
+        try:
+            with (self.path / record.name).open("r+b") as f:
+                f.seek(start)
+                while received < count:
+                    chunk = stream.read(min(self.CHUNK_SIZE, count - received))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    if feed:
+                        md5.update(chunk)
+                    received += len(chunk)
+        except FileNotFoundError as e:
+            raise SessionNotFound(self.md5) from e
+        if received != count:
+            raise BadRange(
+                self.md5, f"expected {count} bytes but received {received} bytes"
+            )
+        if feed:
+            hashed = end
+
+        with LockManager(self.path / self.LOCK, exclusive=True):
+            current = self.load()
+            if current.generation != record.generation:
+                # Another process rewrote received bytes while we were
+                # writing this chunk, so our hash may be of the old bytes.
+                md5 = None
+            if any(s < end and start < e for s, e in current.received):
+                current.generation = uuid.uuid4().hex
+            current.received = merge_range(current.received, start, end)
+            save_record(current, self.path / self.RECORD)
+            record = current
+
+        if md5 is not None:
+            hashed = self._hash(self.path / record.name, md5, hashed, record.contiguous)
+            self.HASHERS[self.md5] = (record.generation, hashed, md5)
+        return record
+
+    def _hash(self, tarball: Path, md5: Any, start: int, end: int) -> int:
+        """Feed a byte range of the tarball file to an MD5 hash
+
+        Args:
+            tarball: the tarball file
+            md5: the hash object
+            start: the first byte to hash
+            end: the byte following the range to hash
+
+        Returns:
+            the number of bytes now hashed
+        """
+        if start >= end:
+            return start
+        with tarball.open("rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(self.CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                md5.update(chunk)
+                remaining -= len(chunk)
+        return end - remaining
+
+    def finalize(self, target: Path) -> SessionRecord:
+        """Complete the session, linking the tarball into an intake directory.
+
+        The session keeps its own link to the tarball, so that if the intake
+        fails the session can be finalized again: it must be removed once the
+        dataset has been created.
+
+        Args:
+            target: the intake directory, which must not exist
+
+        Raises:
+            SessionNotFound: there's no such session
+            SessionIncomplete: some byte ranges haven't been received
+            FileExistsError: the intake directory already exists
+
+        Returns:
+            the session record
+        """
+        with LockManager(self.path / self.LOCK, exclusive=True):
+            record = self.load()
+            if record.missing:
+                raise SessionIncomplete(self.md5, record.missing)
+            target.mkdir()
+            try:
+                (target / record.name).hardlink_to(self.path / record.name)
+            except Exception:
+                target.rmdir()
+                raise
+        return record
+
+    def digest(self, tarball: Path) -> Tuple[str, int]:
+        """Complete the MD5 of a finalized tarball
+
+        Args:
+            tarball: the finalized tarball file
+
+        Returns:
+            the MD5 of the tarball, and the number of bytes which had already
+            been hashed as chunks arrived
+        """
+        generation, hashed, md5 = self.HASHERS.pop(self.md5, ("", 0, None))
+        try:
+            current = self.load().generation
+        except SessionNotFound:
+            current = None
+        if md5 is None or generation != current:
+            hashed, md5 = 0, hashlib.md5()
+        self._hash(tarball, md5, hashed, tarball.stat().st_size)
+        return md5.hexdigest(), hashed
+
+    def remove(self):
+        """Abandon the session, discarding any data received."""
+        self.HASHERS.pop(self.md5, None)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @classmethod
+    def prune(cls, temporary: Path) -> int:
+        """Remove sessions which haven't been updated for a day
+
+        A session which is locked is being updated, and is skipped.
+
+        Args:
+            temporary: the intake temporary directory
+
+        Returns:
+            the number of sessions removed
+        """
+
+        # Drop the incremental hashes of sessions which no longer exist, or
+        # which have been replaced, including by another server process.
+        for md5, (generation, _, _) in list(cls.HASHERS.items()):
+            try:
+                current = cls(temporary, md5).load().generation
+            except SessionNotFound:
+                current = None
+            if current != generation:
+                cls.HASHERS.pop(md5, None)
+
+        removed = 0
+        expired = time.time() - cls.LIFETIME
+        for path in temporary.glob(f"*{cls.SUFFIX}"):
+            session = cls(temporary, path.name[: -len(cls.SUFFIX)])
+            try:
+                with LockManager(path / cls.LOCK, exclusive=True, wait=False):
+                    if (path / cls.RECORD).stat().st_mtime > expired:
+                        continue
+                    session.remove()
+            except OSError:
+                continue
+            removed += 1
+        return removed
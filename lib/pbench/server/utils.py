@@ -5,6 +5,7 @@ from typing import Union
 from dateutil import parser as date_parser
 
 from pbench.common.utils import md5sum
+from pbench.server.database.models.datasets import Dataset, Metadata
 
 
 def get_tarball_md5(tarball: Union[Path, str]) -> str:
@@ -26,6 +27,29 @@ def get_tarball_md5(tarball: Union[Path, str]) -> str:
     return md5sum(tarball).md5_hash
 
 
+def get_benchmark_name(dataset: Dataset) -> str:
+    """
+    Convenience method to identify the benchmark which generated a dataset.
+
+    The Pbench Server intake records the benchmark in the server.benchmark
+    metadata key. Datasets which were processed before that key existed fall
+    back to the "script" value of the Pbench Agent metadata.log, and then to
+    Metadata.SERVER_BENCHMARK_UNKNOWN.
+
+    Args:
+        dataset: Dataset object
+
+    Returns:
+        A lowercase benchmark identifier string
+    """
+    benchmark = Metadata.getvalue(dataset, Metadata.SERVER_BENCHMARK)
+    if not benchmark:
+        benchmark = Metadata.getvalue(dataset, "dataset.metalog.pbench.script")
+        if not benchmark:
+            benchmark = Metadata.SERVER_BENCHMARK_UNKNOWN
+    return benchmark
+
+
 class UtcTimeHelper:
     """
     A helper class to work with UTC "aware" datetime objects. A "naive" object
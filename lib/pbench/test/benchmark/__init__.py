@@ -0,0 +1,6 @@
+"""Micro-benchmarks for performance sensitive server code.
+
+These are not collected by pytest; run each module directly, e.g.
+
+    python -m pbench.test.benchmark.bench_unified_csv
+"""
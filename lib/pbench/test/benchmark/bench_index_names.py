@@ -0,0 +1,109 @@
+"""Measure the per-document cost of generating Elasticsearch index names.
+
+This loads the server's templates from disk (without the database), and
+times generating the index name of a stream of tool data documents, both
+with the original linear search of the templates and formatting of each
+name, and with the keyed template lookup and per-day index names, verifying
+that both produce the same names.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import logging
+from pathlib import Path
+import time
+
+from pbench.server.indexer import _known_tool_handlers
+from pbench.server.templates import PbenchTemplates
+
+
+class LocalTemplates(PbenchTemplates):
+    def resolve(self):
+        for template in self.templates.values():
+            template.load()
+
+
+def linear(templates: PbenchTemplates, template_name, source, toolname=None) -> str:
+    """The original template search and index name formatting"""
+    for t in templates.templates.values():
+        if t.key == template_name and (toolname is None or t.name == toolname):
+            template = t
+            break
+    else:
+        raise Exception(f"Invalid template name, {template_name!r}")
+    year, month, day = source["@timestamp"].split("T", 1)[0].split("-")[0:3]
+    return template.index_template.format(
+        prefix=template.prefix,
+        version=template.version,
+        idxname=template.idxname,
+        year=year,
+        month=month,
+        day=day,
+    )
+
+
+def make_sources(tools: list[str], count: int, days: int) -> list[tuple]:
+    """Generate (tool, source) pairs with timestamps spread over some days"""
+    start = datetime(2021, 3, 1)
+    step = timedelta(days=days) / count
+    return [
+        (
+            tools[i % len(tools)],
+            {"@timestamp": (start + i * step).strftime("%Y-%m-%dT%H:%M:%S.%f")},
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--lib-dir",
+        type=Path,
+        default=Path("server/lib"),
+        help="The server library directory containing the mappings",
+    )
+    parser.add_argument("--documents", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_index_names")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    templates = LocalTemplates(
+        args.lib_dir.resolve(), "bench", logger, _known_tool_handlers
+    )
+    tools = sorted(t.name for t in templates.templates.values() if t.tool)
+    sources = make_sources(tools, args.documents, args.days)
+    print(
+        f"{len(templates.templates)} templates, {len(tools)} tools,"
+        f" {args.documents} documents over {args.days} days"
+    )
+
+    methods = {
+        "linear": lambda tool, source: linear(templates, "tool-data", source, tool),
+        "keyed": lambda tool, source: templates.generate_index_name(
+            "tool-data", source, tool
+        ),
+    }
+    results = {}
+    for label, method in methods.items():
+        times = []
+        for _ in range(args.repeat):
+            beg = time.perf_counter()
+            names = [method(tool, source) for tool, source in sources]
+            times.append(time.perf_counter() - beg)
+        results[label] = names
+        best = min(times)
+        print(
+            f"{label:8s} {best:8.3f}s  {best / len(sources) * 1e9:8.0f} ns/doc"
+            f"  {len(set(names))} indices"
+        )
+    assert results["linear"] == results["keyed"], "Index names differ"
+    print("index names identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Compare dataset intake throughput per server worker.
+
+This synthesizes a dataset tarball and feeds it through a pipe (standing in
+for the request stream) to:
+
+  * the original intake loop, which reads 64KB chunks, writes them and
+    updates the MD5 on the request thread, after which the cache manager
+    extracts "metadata.log" with `tar` and reads the whole tarball again to
+    build the member index; and
+  * the StreamCopier, which reads into preallocated buffers, hashes and
+    scans the tarball members on other threads, and only reads the xz block
+    index from the written tarball.
+
+With --workers, that many intakes run concurrently in separate processes,
+as they would in separate server workers.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import os
+from pathlib import Path
+import random
+import tarfile
+import tempfile
+import threading
+import time
+
+from pbench.server.cache_manager import Tarball
+from pbench.server.intake_stream import StreamCopier
+from pbench.server.tarball_index import TarballIndex, TarballScanner
+from pbench.test.benchmark.bench_member_fetch import compress
+
+
+def make_tar(files: int, size: int) -> bytes:
+    """Generate an uncompressed tar archive of compressible text files.
+
+    The "metadata.log" is the last member, so `tar` has to read through the
+    whole archive to find it.
+    """
+    rng = random.Random(42)
+    words = [f"word{i}".encode() for i in range(1000)]
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for i in range(files):
+            data = b" ".join(rng.choice(words) for _ in range(size // 8))[:size]
+            info = tarfile.TarInfo(f"dataset/{i % 10}-iter/file{i}.txt")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        data = b"[pbench]\nname = dataset\n[run]\ncontroller = bench\n"
+        info = tarfile.TarInfo("dataset/metadata.log")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def feed(data: bytes) -> int:
+    """Write data to a pipe from another thread, returning the read end."""
+    rfd, wfd = os.pipe()
+
+    def writer():
+        with os.fdopen(wfd, "wb") as w:
+            w.write(data)
+
+    threading.Thread(target=writer, daemon=True).start()
+    return rfd
+
+
+def original(source: Path, target: Path) -> float:
+    data = source.read_bytes()
+    beg = time.perf_counter()
+    with os.fdopen(feed(data), "rb") as stream, target.open("wb") as ofp:
+        md5 = hashlib.md5()
+        while True:
+            chunk = stream.read(65536)
+            if not chunk:
+                break
+            ofp.write(chunk)
+            md5.update(chunk)
+    Tarball._get_metadata(target)
+    TarballIndex.build(target)
+    return time.perf_counter() - beg
+
+
+def streamed(source: Path, target: Path) -> float:
+    data = source.read_bytes()
+    beg = time.perf_counter()
+    scanner = TarballScanner(["dataset/metadata.log"])
+    with os.fdopen(feed(data), "rb", buffering=0) as stream, target.open("wb") as ofp:
+        StreamCopier(stream, len(data), [scanner.feed]).copy(ofp)
+    index = scanner.index(target)
+    assert index and scanner.captured, scanner.error
+    Tarball.parse_metadata(
+        scanner.captured["dataset/metadata.log"].decode().splitlines(True)
+    )
+    return time.perf_counter() - beg
+
+
+def run(args: tuple[str, str]) -> float:
+    method, source = args
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp, "dataset.tar.xz")
+        return globals()[method](Path(source), target)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--block-size", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = make_tar(args.files, args.size)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp, "dataset.tar.xz")
+        source.write_bytes(compress(raw, args.block_size))
+        mb = source.stat().st_size / (1024 * 1024)
+        print(
+            f"{args.files} files, {len(raw) / 1e6:.1f} MB uncompressed,"
+            f" {mb:.1f} MB compressed, {args.workers} worker(s)"
+        )
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for method in ("original", "streamed"):
+                best = min(
+                    max(pool.map(run, [(method, str(source))] * args.workers))
+                    for _ in range(args.repeat)
+                )
+                print(
+                    f"  {method:8s}: {best:6.2f}s per intake,"
+                    f" {mb / best:7.1f} MB/s per worker"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compare single file fetch latency from a tarball member index against a
+full cache unpack.
+
+This synthesizes a dataset tarball, compressed both as a single xz block (as
+by a single-threaded `tar cJf`) and as a sequence of independent blocks (as
+by `xz -T0`), and times fetching its first, middle and last files by:
+
+  * unpacking the whole tarball with `tar -x`, `find ... chmod` and
+    `du -s`, and reading the file; and
+  * loading the tarball member index and decompressing only the file.
+"""
+
+from argparse import ArgumentParser
+import io
+import lzma
+from pathlib import Path
+import random
+import subprocess
+import tarfile
+import tempfile
+import time
+
+from pbench.server.tarball_index import TarballIndex
+
+
+def make_tar(files: int, size: int) -> tuple[bytes, list[str]]:
+    """Generate an uncompressed tar archive of compressible text files."""
+    rng = random.Random(42)
+    words = [f"word{i}".encode() for i in range(1000)]
+    buf = io.BytesIO()
+    names = []
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for i in range(files):
+            name = f"dataset/{i % 10}-iter/sample{i % 5}/file{i}.txt"
+            data = b" ".join(rng.choice(words) for _ in range(size // 8))[:size]
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+            names.append(name)
+    return buf.getvalue(), names
+
+
+def compress(raw: bytes, block_size: int) -> bytes:
+    """Compress as one xz block, or as independent blocks of block_size."""
+    if not block_size:
+        return lzma.compress(raw)
+    return b"".join(
+        lzma.compress(raw[i : i + block_size]) for i in range(0, len(raw), block_size)
+    )
+
+
+def full_unpack(tarball: Path, name: str) -> float:
+    with tempfile.TemporaryDirectory() as cache:
+        beg = time.perf_counter()
+        subprocess.run(
+            ["tar", "-x", "--no-same-owner", "--force-local", "-f", str(tarball)],
+            cwd=cache,
+            check=True,
+        )
+        subprocess.run(
+            "find . ( -type d -exec chmod ugo+rx {} + ) -o "
+            "( -type f -exec chmod ugo+r {} + )".split(),
+            cwd=cache,
+            check=True,
+        )
+        subprocess.run(
+            ["du", "-s", "-B1", cache], check=True, capture_output=True, text=True
+        )
+        (Path(cache) / name).read_bytes()
+        return time.perf_counter() - beg
+
+
+def index_fetch(tarball: Path, index_path: Path, name: str) -> float:
+    beg = time.perf_counter()
+    index = TarballIndex.load(index_path, tarball)
+    with index.open(tarball, index.find(name)) as stream:
+        stream.read()
+    return time.perf_counter() - beg
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--block-size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    raw, names = make_tar(args.files, args.size)
+    targets = {
+        "first": names[0],
+        "middle": names[len(names) // 2],
+        "last": names[-1],
+    }
+    print(f"{args.files} files, {len(raw) / 1e6:.1f} MB uncompressed")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, block_size in (
+            ("single block", 0),
+            ("multi block", args.block_size),
+        ):
+            tarball = Path(tmp, "dataset.tar.xz")
+            tarball.write_bytes(compress(raw, block_size))
+            index_path = Path(tmp, "dataset.tar.xz.index")
+            beg = time.perf_counter()
+            index = TarballIndex.build(tarball)
+            index.save(index_path)
+            print(
+                f"{label}: {len(index.blocks)} blocks,"
+                f" {tarball.stat().st_size / 1e6:.1f} MB compressed,"
+                f" index built in {time.perf_counter() - beg:.2f}s"
+            )
+            for where, name in targets.items():
+                unpack = min(full_unpack(tarball, name) for _ in range(args.repeat))
+                fetch = min(
+                    index_fetch(tarball, index_path, name) for _ in range(args.repeat)
+                )
+                print(
+                    f"  {where:6s} file: full unpack {unpack * 1000:8.1f}ms,"
+                    f" indexed fetch {fetch * 1000:8.1f}ms"
+                    f" ({unpack / fetch:6.1f}x)"
+                )
+
+
+if __name__ == "__main__":
+    main()
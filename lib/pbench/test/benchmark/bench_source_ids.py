@@ -0,0 +1,130 @@
+"""Measure the per-document cost of constructing tool data document IDs and
+bulk payloads.
+
+This unpacks a real dataset tarball (by default, one of the functional test
+tarballs), generates the documents of each of its unified .csv tool data
+sources, and times both:
+
+  * the original scheme, which serializes each source to compute its MD5
+    ID, adds the "@generated-by" and "authorization" fields, and serializes
+    the source again as the bulk client does; and
+  * the single pass scheme, which serializes each source once, reusing the
+    JSON as the bulk payload;
+
+verifying that both produce the same IDs and equivalent payloads.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime
+import hashlib
+import json
+import logging
+from pathlib import Path
+import tarfile
+import tempfile
+import time
+
+from pbench.server.indexer import _known_tool_handlers, PbenchData
+from pbench.test.benchmark.bench_unified_csv import make_tool_data
+
+TARBALL = (
+    Path(__file__).parents[1]
+    / "functional"
+    / "server"
+    / "tarballs"
+    / "fio_rw_2018.02.01T22.40.57.tar.xz"
+)
+EXTRA = {
+    "@generated-by": "tracking-id",
+    "authorization": {"owner": "1", "access": "private"},
+}
+
+
+class FakePtb:
+    _tbctx = "benchmark"
+    start_run_ts = datetime(2000, 1, 1)
+    end_run_ts = datetime(2100, 1, 1)
+
+
+def bulk_dumps(data) -> str:
+    """Serialize a bulk source as the Elasticsearch client's JSONSerializer
+    does: strings are sent unchanged."""
+    if isinstance(data, str):
+        return data
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def gen_sources(root: Path, logger) -> list[dict]:
+    """Generate the documents of every unified .csv tool data source in the
+    unpacked tarball."""
+    sources = []
+    for csvdir in sorted(root.glob("*/*/*/tools-*/*/*/csv")):
+        tool = csvdir.parent.name
+        handler = _known_tool_handlers.get(tool)
+        if not handler or handler["@prospectus"]["method"] != "unify":
+            continue
+        csvs = {}
+        for path in sorted(csvdir.glob("*.csv")):
+            if any(rec["pattern"].match(path.name) for rec in handler["patterns"]):
+                csvs[path.name] = path.read_text()
+        if not csvs:
+            continue
+        td = make_tool_data(tool, csvs, logger)
+        td.ptb = FakePtb()
+        sources.extend(td.make_source())
+    return sources
+
+
+def original(sources: list[dict]) -> list[tuple[str, str]]:
+    results = []
+    for source in sources:
+        the_bytes = json.dumps(source, sort_keys=True).encode("utf-8")
+        source_id = hashlib.md5(the_bytes).hexdigest()
+        payload = {**source, **EXTRA}
+        results.append((source_id, bulk_dumps(payload)))
+    return results
+
+
+def single_pass(sources: list[dict]) -> list[tuple[str, str]]:
+    results = []
+    for source in sources:
+        source_id, payload = PbenchData.make_source_payload(source, EXTRA)
+        results.append((source_id, bulk_dumps(payload)))
+    return results
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("tarball", nargs="?", type=Path, default=TARBALL)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_source_ids")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with tarfile.open(args.tarball) as tar:
+            tar.extractall(tmp)
+        sources = gen_sources(Path(tmp), logger)
+    print(f"{args.tarball.name}: {len(sources)} tool data documents")
+    if not sources:
+        return
+
+    results = {}
+    for func in (original, single_pass):
+        times = []
+        for _ in range(args.repeat):
+            beg = time.perf_counter()
+            results[func.__name__] = func(sources)
+            times.append(time.perf_counter() - beg)
+        best = min(times)
+        print(f"{func.__name__:12s} {best:8.3f}s  {len(sources) / best:10.0f} docs/sec")
+    for (oid, opay), (sid, spay) in zip(*results.values()):
+        assert oid == sid, "Document IDs differ"
+        assert json.loads(opay) == json.loads(spay), "Payloads differ"
+    print("document IDs identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Compare the line by line and block stdout tool data parsers.
+
+This synthesizes proc-vmstat (keyval) and proc-interrupts (procint) stdout
+files with many samples, and times both the original line by line parsers
+(see pbench.test.benchmark.reference) and the registered parsers of
+pbench.server.tool_stdout, verifying that they produce identical documents.
+"""
+
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime
+import io
+import logging
+import time
+
+from pbench.server.indexer import _known_tool_handlers, ToolData
+from pbench.server.tool_stdout import PARSERS
+from pbench.test.benchmark.reference import stdout_keyval, stdout_procint
+
+START = 1614600000.0  # 2021-03-01T12:00:00 UTC
+REFERENCE_PARSERS = {"keyval": stdout_keyval, "procint": stdout_procint}
+
+
+class FakePtb:
+    _tbctx = "benchmark"
+    start_run_ts = datetime(2021, 3, 1, 12, 0, 0)
+    end_run_ts = datetime(2021, 3, 2, 12, 0, 0)
+
+
+def make_keyval(samples: int, keys: int) -> str:
+    """Generate a proc-vmstat stdout file."""
+    names = [f"nr_stat{k}" if k % 3 else f"stat{k}" for k in range(keys)]
+    out = io.StringIO()
+    for s in range(samples):
+        out.write(f"timestamp: {START + s * 3:.9f}\n")
+        for k, name in enumerate(names):
+            out.write(f"{name} {1000000 + s * k}\n")
+    return out.getvalue()
+
+
+def make_procint(samples: int, cpus: int, interrupts: int) -> str:
+    """Generate a proc-interrupts stdout file."""
+    out = io.StringIO()
+    header = "".join(f"       CPU{c}" for c in range(cpus))
+    for s in range(samples):
+        out.write(f"timestamp: {START + s * 3:.9f}\n{header}\n")
+        for i in range(interrupts):
+            counts = "".join(f" {s * (i + c):10d}" for c in range(cpus))
+            out.write(f" {i:3d}:{counts}   PCI-MSI {i}-edge      dev{i}\n")
+        out.write(f"ERR: {s:10d}\nMIS: {0:10d}\n")
+    return out.getvalue()
+
+
+def make_tool_data(tool: str, logger) -> ToolData:
+    td = ToolData.__new__(ToolData)
+    td.ptb = FakePtb()
+    td.logger = logger
+    td.counters = Counter()
+    td.toolname = tool
+    td.run_metadata = {"id": "run-id", "name": "run"}
+    td.iteration_metadata = {"name": "1-iter", "number": 1}
+    td.sample_metadata = {"name": "sample1", "hostname": "host"}
+    td.handler = _known_tool_handlers[tool]
+    return td
+
+
+def run(tool: str, text: str, reference: bool, logger):
+    td = make_tool_data(tool, logger)
+    subformat = td.handler["patterns"][0]["subformat"]
+    file_object = io.StringIO(text)
+    beg = time.perf_counter()
+    if reference:
+        gen = REFERENCE_PARSERS[subformat](td, file_object, int, "bench")
+    else:
+        gen = PARSERS[subformat](td, int, "bench").parse(file_object)
+    docs = list(gen)
+    return time.perf_counter() - beg, docs
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--keys", type=int, default=150)
+    parser.add_argument("--cpus", type=int, default=16)
+    parser.add_argument("--interrupts", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_stdout_parsers")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    files = {
+        "proc-vmstat": make_keyval(args.samples, args.keys),
+        "proc-interrupts": make_procint(args.samples, args.cpus, args.interrupts),
+    }
+    for tool, text in files.items():
+        print(f"{tool}: {args.samples} samples, {len(text) / 1e6:.1f} MB")
+        results = {}
+        for name, reference in (("line by line", True), ("block", False)):
+            times = []
+            for _ in range(args.repeat):
+                elapsed, docs = run(tool, text, reference, logger)
+                times.append(elapsed)
+            results[name] = docs
+            best = min(times)
+            print(
+                f"  {name:14s} {best:8.3f}s  {len(docs) / best:10.0f} docs/sec"
+                f" ({len(docs)} docs)"
+            )
+        lines, block = results.values()
+        assert lines == block, "Block parser documents differ"
+        print("  documents identical")
+
+
+if __name__ == "__main__":
+    main()
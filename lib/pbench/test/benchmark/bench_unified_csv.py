@@ -0,0 +1,121 @@
+"""Compare the columnar and lockstep unified .csv tool data generators.
+
+This synthesizes pidstat-like .csv data (one column per process in each of
+several .csv files) and times both implementations of the unified document
+generation, verifying that they produce identical documents.
+"""
+
+from argparse import ArgumentParser
+from collections import Counter
+import csv
+from datetime import datetime
+import io
+import logging
+import time
+
+from pbench.server.indexer import _known_tool_handlers, ToolData
+from pbench.test.benchmark.reference import make_source_unified_lockstep
+
+START_MS = 1614600000000  # 2021-03-01T12:00:00 UTC
+
+
+class FakePtb:
+    _tbctx = "benchmark"
+    start_run_ts = datetime(2021, 3, 1, 12, 0, 0)
+    end_run_ts = datetime(2021, 3, 2, 12, 0, 0)
+
+
+def make_csvs(tool: str, columns: int, rows: int) -> dict[str, str]:
+    """Generate the text of each .csv file handled by the tool."""
+    csvs = {}
+    for rec in _known_tool_handlers[tool]["patterns"]:
+        name = rec["pattern"].pattern.strip("^$").replace("\\", "")
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if rec["subfields"]:
+            header = [
+                f"{p}-cmd{p}-{sub}" for p in range(columns) for sub in rec["subfields"]
+            ]
+        else:
+            header = [f"{p}-cmd{p}" for p in range(columns)]
+        writer.writerow(["timestamp_ms"] + header)
+        for r in range(rows):
+            writer.writerow(
+                [START_MS + r * 1000] + [str((r * c) % 97) for c in range(len(header))]
+            )
+        csvs[name] = out.getvalue()
+    return csvs
+
+
+def make_tool_data(tool: str, csvs: dict[str, str], logger) -> ToolData:
+    td = ToolData.__new__(ToolData)
+    td.ptb = FakePtb()
+    td.logger = logger
+    td.counters = Counter()
+    td.toolname = tool
+    td.basepath = tool
+    td.run_metadata = {"id": "run-id", "name": "run"}
+    td.iteration_metadata = {"name": "1-iter", "number": 1}
+    td.sample_metadata = {"name": "sample1", "hostname": "host"}
+    td.handler = _known_tool_handlers[tool]
+    td.files = []
+    for name, text in csvs.items():
+        rec = next(r for r in td.handler["patterns"] if r["pattern"].match(name))
+        reader = csv.reader(io.StringIO(text))
+        td.files.append(
+            {
+                "basename": name,
+                "handler_rec": rec,
+                "reader": reader,
+                "header": next(reader),
+            }
+        )
+    return td
+
+
+def run(lockstep: bool, tool: str, csvs: dict[str, str], logger):
+    td = make_tool_data(tool, csvs, logger)
+    beg = time.perf_counter()
+    if lockstep:
+        docs = list(make_source_unified_lockstep(td))
+    else:
+        docs = list(td._make_source_unified())
+    return time.perf_counter() - beg, docs
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--tool", default="pidstat")
+    parser.add_argument("--columns", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench_unified_csv")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    csvs = make_csvs(args.tool, args.columns, args.rows)
+    print(
+        f"{args.tool}: {len(csvs)} .csv files, {args.columns} columns,"
+        f" {args.rows} rows"
+    )
+    results = {}
+    for name, lockstep in (("lockstep", True), ("columnar", False)):
+        times = []
+        for _ in range(args.repeat):
+            elapsed, docs = run(lockstep, args.tool, csvs, logger)
+            times.append(elapsed)
+        results[name] = docs
+        best = min(times)
+        print(
+            f"{name:10s} {best:8.3f}s  {len(docs) / best:10.0f} docs/sec"
+            f" ({len(docs)} docs)"
+        )
+    lockstep, columnar = results.values()
+    assert lockstep == columnar, "Columnar documents differ from lockstep"
+    print("documents identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Reference implementations of optimized tool data conversions.
+
+These are the original, straightforward versions of code in
+pbench.server.indexer which has since been rewritten for speed. The unit
+tests and the benchmarks run both versions to verify that the optimized code
+emits exactly the same documents.
+"""
+
+from typing import Iterator
+
+from pbench.server import JSONOBJECT
+from pbench.server.indexer import _dict_const, ToolData
+
+
+def make_source_unified_lockstep(td: ToolData) -> Iterator[JSONOBJECT]:
+    """The original ToolData._make_source_unified().
+
+    Each .csv file is read at the same time, one row from each in lock
+    step, converting the timestamp of each row individually.
+    """
+    (
+        class_list,
+        metric_mapping,
+        identifiers,
+        field_mapping,
+        metadata,
+    ) = td._unified_mappings()
+
+    # At this point, we have processed all the data about csv files
+    # and are ready to start reading the contents of all the csv
+    # files and building the unified records.
+    def rows_generator():
+        # We use this generator to highlight the process of reading from
+        # all the csv files, reading one row from each of the csv files,
+        # returning that as a dictionary of csv file to row read, which
+        # in turn is yielded by the generator.
+        idx = 0
+        while True:
+            # Read a row from each .csv file
+            rows = _dict_const()
+            for csvf in td.files:
+                try:
+                    rows[csvf["basename"]] = next(csvf["reader"])
+                except StopIteration:
+                    # This should handle the case of mismatched number of
+                    # rows across all .csv files. All readers which have
+                    # finished will emit a StopIteration.
+                    pass
+            if not rows:
+                # None of the csv file readers returned any rows to
+                # process, so we're done.
+                break
+            # Yield the one dictionary that contains each newly read row
+            # from all the csv files.
+            yield idx, rows
+            idx += 1
+
+    td.logger.info(
+        "tool-data-indexing: tool {}, gen unified begin for {}",
+        td.toolname,
+        td.basepath,
+    )
+    prev_first = None
+    prev_ts_val = None
+    for idx, rows in rows_generator():
+        # Verify timestamps are all the same for this row.
+        tstamp = None
+        first = None
+        for fname in rows.keys():
+            tstamp = rows[fname][0]
+            if first is None:
+                first = tstamp
+            elif first != tstamp:
+                td.logger.warning(
+                    "tool-data-indexing: {} csv files have"
+                    " inconsistent timestamps per row ({})",
+                    td.toolname,
+                    td.ptb._tbctx,
+                )
+                td.counters["inconsistent_timestamps_across_csv_files"] += 1
+                break
+        # The timestamp is taken from the "first" timestamp, converted
+        # to a floating point value in seconds, and then formatted as a
+        # string.
+        ts_val = td.mk_abs_timestamp_millis(first)
+        assert (
+            prev_ts_val is None or prev_ts_val <= ts_val
+        ), "prev_ts_val ({!r}, {!r}) > first ({!r}, {!r})".format(
+            prev_ts_val, prev_first, ts_val, first
+        )
+        prev_first = first
+        prev_ts_val = ts_val
+        datum, _ = td._unified_datum(
+            identifiers, metadata, class_list, ts_val, first, idx
+        )
+        # Now we can perform the mapping from multiple .csv files to JSON
+        # documents using a known field hierarchy (no identifiers in field
+        # names) with the identifiers as additional metadata. Note that we
+        # are constructing this document just from the current row of data
+        # taken from all .csv files (assumes timestamps are the same).
+        for fname, row in rows.items():
+            klass, metric, converter = metric_mapping[fname]
+            for i, val in enumerate(row):
+                if i == 0:
+                    continue
+                # Given an fname and a column offset, return the
+                # identifier from the header
+                identifier, subfield = field_mapping[fname][i]
+                if klass is not None:
+                    _d = datum[identifier][td.toolname][klass]
+                else:
+                    _d = datum[identifier][td.toolname]
+                if subfield:
+                    if metric not in _d:
+                        _d[metric] = _dict_const()
+                    _d[metric][subfield] = converter(val)
+                else:
+                    _d[metric] = converter(val)
+        # At this point we have fully mapped all data from all .csv files
+        # to their proper fields for each identifier. Now we can yield
+        # records for each of the identifiers.
+        for source in datum.values():
+            yield source
+    td.logger.info(
+        "tool-data-indexing: tool {}, end unified for {}",
+        td.toolname,
+        td.basepath,
+    )
+
+
+def stdout_keyval(td: ToolData, file_object, converter, path) -> Iterator[JSONOBJECT]:
+    """Process a line of a stdout key/value pair output file, building up the
+    record (dict) by adding each key/value pair found, associating them
+    with the previously encountered timestamp.  A record is yielded as one
+    JSON object when indexed.
+
+    This is the original ToolData._stdout_keyval(), the line by line
+    version of the "keyval" parser in pbench.server.tool_stdout.
+
+    The format for files considered by this method is as follows:
+
+     * each line of the file contains an ascii-numeric key and a
+       numeric (integer or floating point) value separated by a ':'
+     * the keyword, `timestamp`, is recognized to be the
+       timestamp value to be associated with all following
+       key/value pairs until the next `timestamp` keyword
+       is encountered
+     * all key/value pairs are treated as fields of one JSON
+       document with the associated timestamp to be indexed
+
+    An example file format:
+
+    timestamp: 12345.00
+    key0: 100.0
+    key1: 100.1
+    ...
+    keyN: 100.N
+    timestamp: 12345.01
+    key0: 100.0
+    key1: 100.1
+    ...
+    keyN: 100.N
+    timestamp: ...
+
+    """
+    record = None
+    prev_gauge = None
+    ts_orig = None
+    prev_ts_orig = None
+    try:
+        # Fetch the remaps table to see if any naming conflicts need to be
+        # resolved.
+        remaps = td._remaps[td.toolname]
+    except KeyError:
+        remaps = None
+    idx = 0
+    td.logger.info(
+        "tool-data-indexing: tool {}, stdout keyval start {}", td.toolname, path
+    )
+    for line in file_object:
+        if line.startswith("timestamp:"):
+            prev_ts_orig = ts_orig
+            if record:
+                # timestamp delimits records, yield last record.
+                if not record[td.toolname]["rate"]:
+                    # For first record, rate will be empty, so
+                    # don't emit it.
+                    del record[td.toolname]["rate"]
+                yield record
+                idx += 1
+                # Be sure to remember the record we just emitted
+                # so that it is available for rate calculations.
+                prev_gauge = record[td.toolname]["gauge"]
+            # Get the second column, the timestamp value, which is
+            # *seconds* since the epoch, and then convert to millis
+            # since the epoch.
+            ts_orig = float(line.split(":")[1])
+            assert (
+                prev_ts_orig is None or prev_ts_orig <= ts_orig
+            ), f"prev_ts_orig {prev_ts_orig!r} > ts_orig {ts_orig!r}"
+            ts_str = td.mk_abs_timestamp_millis(ts_orig * 1000)
+            record = _dict_const()
+            record["@timestamp"] = ts_str
+            record["@timestamp_original"] = str(ts_orig)
+            record["run"] = td.run_metadata
+            record["iteration"] = td.iteration_metadata
+            record["sample"] = td.sample_metadata
+            record[td.toolname] = _dict_const()
+            record[td.toolname]["@idx"] = idx
+            record[td.toolname]["gauge"] = gauge = _dict_const()
+            record[td.toolname]["rate"] = rate = _dict_const()
+        elif ts_orig is None:
+            # We have not encountered a timestamp yet, so ignore
+            # all lines until the first timestamp.
+            continue
+        else:
+            key, value = line.strip().split(" ")
+            parts = key.split("_", 1)
+            if len(parts) == 1:
+                # For keys that are not split into stat and substat, look
+                # to see if the stat needs to be rename to avoid conflict
+                # with other keys that might share the same prefix.
+                if remaps is not None:
+                    try:
+                        stat = remaps["key"][key]
+                    except KeyError:
+                        stat = key
+                else:
+                    stat = key
+                gauge[stat] = converter(value)
+                if prev_ts_orig:
+                    # Note we don't record the rate on the first value
+                    # encountered.
+                    duration = ts_orig - prev_ts_orig
+                    value_diff = int(value) - prev_gauge[stat]
+                    the_rate = value_diff / duration
+                    rate[stat] = the_rate
+            else:
+                assert len(parts) == 2, "Logic error! parts is not parts!"
+                stat = parts[0]
+                substat = parts[1]
+                if stat not in gauge:
+                    gauge[stat] = _dict_const()
+                gauge[stat][substat] = converter(value)
+                if prev_ts_orig:
+                    # Note we don't record the rate on the first value
+                    # encountered.
+                    duration = (ts_orig / 1000) - (prev_ts_orig / 1000)
+                    value_diff = int(value) - prev_gauge[stat][substat]
+                    the_rate = value_diff / duration
+                    if stat not in rate:
+                        rate[stat] = _dict_const()
+                    rate[stat][substat] = the_rate
+    if record and record[td.toolname]["gauge"]:
+        yield record
+    td.logger.info(
+        "tool-data-indexing: tool {}, stdout keyval end {}", td.toolname, path
+    )
+
+
+def stdout_procint(td: ToolData, file_object, converter, path) -> Iterator[JSONOBJECT]:
+    """Process the two-dimensional proc-interrupts output.
+
+    This is the original ToolData._stdout_procint(), the line by line
+    version of the "procint" parser in pbench.server.tool_stdout.
+
+    An example file format:
+    timestamp: 1394048617.043209234
+               CPU0       CPU1       CPU2       CPU3
+      0:         25          0          0          0   IO-APIC-edge      timer
+      1:         10          0          0          0   IO-APIC-edge      i8042
+    NMI:          0          0          0          0   Non-maskable interrupts
+    LOC:      48687      45068      40188      65602   Local timer interrupts
+    SPU:          0          0          0          0   Spurious interrupts
+    """
+    cpu_column_ids = None
+    cpu_count = None
+    ts_str = None
+    ts_orig = None
+    prev_ts_orig = None
+    prev_gauges = _dict_const()
+    idx = 0
+    td.logger.info(
+        "tool-data-indexing: tool {}, stdout procint start {}", td.toolname, path
+    )
+    for line in file_object:
+        if line.startswith("timestamp:"):
+            idx += 1
+            prev_ts_orig = ts_orig
+            # Get the second column, the timestamp value, which is
+            # *seconds* since the epoch, and then convert to millis
+            # since the epoch.
+            ts_orig = float(line.split(":")[1])
+            assert (
+                prev_ts_orig is None or prev_ts_orig <= ts_orig
+            ), f"prev_ts_orig {prev_ts_orig!r} > ts_orig {ts_orig!r}"
+            ts_str = td.mk_abs_timestamp_millis(ts_orig * 1000)
+            # The next line is assumed to be the header, so instead of
+            # looping to get to it, we just pull it out and process it
+            # here.
+            header = next(file_object)
+            columns = header.split()
+            cpu_column_ids = []
+            for cpu in columns:
+                if not cpu.startswith("CPU"):
+                    raise Exception("Bad proc-interrupts-stdout.txt file encountered")
+                cpu_column_ids.append(cpu[3:])
+            cpu_count = len(cpu_column_ids)
+            continue
+        parts = line[:-1].split(None, 1 + cpu_count)
+        int_id = parts[0][:-1]
+        if int_id in ("ERR", "MIS"):
+            record = _dict_const()
+            record["@timestamp"] = ts_str
+            record["@timestamp_original"] = str(ts_orig)
+            record["run"] = td.run_metadata
+            record["iteration"] = td.iteration_metadata
+            record["sample"] = td.sample_metadata
+            record[td.toolname] = _dict_const()
+            record[td.toolname]["@idx"] = idx
+            record[td.toolname]["int_id"] = int_id
+            record[td.toolname]["gauge"] = value = converter(parts[1])
+            if int_id in prev_gauges:
+                duration = ts_orig - prev_ts_orig
+                value_diff = value - prev_gauges[int_id]
+                the_rate = value_diff / duration
+                record[td.toolname]["rate"] = the_rate
+            prev_gauges[int_id] = value
+            yield record
+        else:
+            desc_str = parts[-1]
+            col = 1
+            records = []
+            cpu_gauges = []
+            for cpu in cpu_column_ids:
+                val = converter(parts[col])
+                col += 1
+                record = _dict_const()
+                record["@timestamp"] = ts_str
+                record["@timestamp_original"] = str(ts_orig)
+                record["run"] = td.run_metadata
+                record["iteration"] = td.iteration_metadata
+                record["sample"] = td.sample_metadata
+                record[td.toolname] = _dict_const()
+                record[td.toolname]["@idx"] = idx
+                record[td.toolname]["int_id"] = int_id
+                record[td.toolname]["cpu_id"] = cpu
+                record[td.toolname]["desc"] = desc_str
+                record[td.toolname]["gauge"] = val
+                records.append(record)
+                cpu_gauges.append(val)
+            if int_id in prev_gauges:
+                prev_cpu_gauges = prev_gauges[int_id]
+                col = 0
+                duration = ts_orig - prev_ts_orig
+                for record in records:
+                    value_diff = record[td.toolname]["gauge"] - prev_cpu_gauges[col]
+                    the_rate = value_diff / duration
+                    record[td.toolname]["rate"] = the_rate
+            prev_gauges[int_id] = cpu_gauges
+            for record in records:
+                yield record
+    td.logger.info(
+        "tool-data-indexing: tool {}, stdout procint end {}", td.toolname, path
+    )
@@ -12,6 +12,7 @@ import responses
 
 from pbench.agent import PbenchAgentConfig
 from pbench.agent.results import CopyResultToRelay, CopyResultToServer
+from pbench.common.upload import MB_BYTES
 
 
 class TestCopyResults:
@@ -125,6 +126,71 @@ class TestCopyResults:
 
         assert res.status_code == HTTPStatus.CREATED
 
+    @responses.activate
+    def test_chunked(self, agent_logger, tmp_path):
+        """A tarball larger than the chunk size is sent in chunks"""
+        tb_name = "test_tarball.tar.xz"
+        tarball = tmp_path / tb_name
+        tarball.write_bytes(b"x" * (MB_BYTES + 1))
+        uri = f"{self.config.get('results', 'server_rest_url')}/upload/{tb_name}"
+        ranges = []
+
+        def chunk_callback(request: requests.PreparedRequest):
+            ranges.append(request.headers["Content-Range"])
+            return HTTPStatus.OK, {}, "{}"
+
+        responses.add(
+            responses.POST,
+            uri,
+            status=HTTPStatus.CREATED,
+            json={"missing": [[0, MB_BYTES + 1]]},
+        )
+        responses.add_callback(responses.PUT, f"{uri}/someMD5", callback=chunk_callback)
+        responses.add(responses.GET, f"{uri}/someMD5", json={"missing": []})
+        responses.add(responses.POST, f"{uri}/someMD5", status=HTTPStatus.CREATED)
+
+        res = CopyResultToServer(
+            self.config, agent_logger, "token", None, "public", None, 1, 2
+        ).push(tarball, "someMD5")
+
+        assert res.status_code == HTTPStatus.CREATED
+        assert sorted(ranges) == [
+            f"bytes 0-{MB_BYTES - 1}/{MB_BYTES + 1}",
+            f"bytes {MB_BYTES}-{MB_BYTES}/{MB_BYTES + 1}",
+        ]
+        assert responses.calls[0].request.params == {
+            "access": "public",
+            "length": str(MB_BYTES + 1),
+        }
+
+    @responses.activate
+    @pytest.mark.parametrize(
+        "status", (HTTPStatus.NOT_FOUND, HTTPStatus.METHOD_NOT_ALLOWED)
+    )
+    def test_chunked_fallback(self, status, agent_logger, tmp_path):
+        """A server without resumable uploads gets the tarball in one PUT"""
+        tb_name = "test_tarball.tar.xz"
+        tarball = tmp_path / tb_name
+        tarball.write_bytes(b"x" * (MB_BYTES + 1))
+        uri = f"{self.config.get('results', 'server_rest_url')}/upload/{tb_name}"
+
+        def put_callback(request: requests.PreparedRequest):
+            assert request.headers["Content-MD5"] == "someMD5"
+            assert "Content-Range" not in request.headers
+            assert len(request.body.read()) == MB_BYTES + 1
+            return HTTPStatus.CREATED, {}, ""
+
+        responses.add(responses.POST, uri, status=status)
+        responses.add_callback(responses.PUT, uri, callback=put_callback)
+
+        res = CopyResultToServer(
+            self.config, agent_logger, "token", None, "public", None, 1, 2
+        ).push(tarball, "someMD5")
+
+        assert res.status_code == HTTPStatus.CREATED
+        assert len(responses.calls) == 2
+        assert responses.calls[1].request.params == {"access": "public"}
+
     @responses.activate
     @pytest.mark.parametrize("access", ("public", "private", None))
     def test_relay(self, access: str, monkeypatch, agent_logger):
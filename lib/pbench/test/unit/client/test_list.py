@@ -0,0 +1,71 @@
+import responses
+from responses import matchers
+
+from pbench.client import API
+
+
+class TestList:
+    def test_list_cursor(self, connect):
+        """
+        Confirm that get_list pages with the cursor when the server returns
+        one, and otherwise follows the "next_url".
+        """
+        url = f"{connect.url}/api/v1/datasets"
+        connect.endpoints["uri"][API.DATASETS_LIST.value] = {
+            "template": url,
+            "params": {},
+        }
+
+        def page(names: list[str], **kwargs) -> dict:
+            return {
+                "results": [{"name": n, "resource_id": n} for n in names],
+                **kwargs,
+            }
+
+        with responses.RequestsMock() as rsp:
+            rsp.add(
+                responses.GET,
+                url,
+                match=[matchers.query_param_matcher({"limit": "2"})],
+                json=page(
+                    ["a", "b"],
+                    next_url=f"{url}?limit=2&offset=2",
+                    next_cursor="c1",
+                    total=5,
+                ),
+            )
+            rsp.add(
+                responses.GET,
+                url,
+                match=[matchers.query_param_matcher({"limit": "2", "cursor": "c1"})],
+                json=page(
+                    ["c", "d"], next_url=f"{url}?cursor=c2&limit=2", next_cursor="c2"
+                ),
+            )
+            rsp.add(
+                responses.GET,
+                url,
+                match=[matchers.query_param_matcher({"limit": "2", "cursor": "c2"})],
+                json=page(["e"], next_url=""),
+            )
+            names = [d.name for d in connect.get_list(limit=2)]
+            assert names == ["a", "b", "c", "d", "e"]
+            assert len(rsp.calls) == 3
+
+        # A server that doesn't return a cursor is paged by offset
+        with responses.RequestsMock() as rsp:
+            rsp.add(
+                responses.GET,
+                url,
+                match=[matchers.query_param_matcher({"limit": "2"})],
+                json=page(["a", "b"], next_url=f"{url}?limit=2&offset=2", total=3),
+            )
+            rsp.add(
+                responses.GET,
+                url,
+                match=[matchers.query_param_matcher({"limit": "2", "offset": "2"})],
+                json=page(["c"], next_url="", total=3),
+            )
+            names = [d.name for d in connect.get_list(limit=2)]
+            assert names == ["a", "b", "c"]
+            assert len(rsp.calls) == 2
@@ -0,0 +1,108 @@
+from http import HTTPStatus
+import json
+
+import responses
+
+from pbench.client import API
+
+
+class TestUpload:
+    def test_upload_chunks(self, connect, tmp_path):
+        """
+        Confirm that a chunked upload sends each missing byte range, resends
+        a chunk which failed, and finalizes the session.
+        """
+        url = f"{connect.url}/api/v1/upload"
+        connect.endpoints["uri"][API.UPLOAD.value] = {
+            "template": f"{url}/{{filename}}",
+            "params": {"filename": {"type": "string"}},
+        }
+        tarball = tmp_path / "test.tar.xz"
+        data = b"0123456789"
+        tarball.write_bytes(data)
+        (tmp_path / "test.tar.xz.md5").write_text("md5 test.tar.xz\n")
+        session = f"{url}/test.tar.xz/md5"
+        received = bytearray(len(data))
+        ranges = []
+
+        def missing() -> list[list[int]]:
+            holes = []
+            for i, b in enumerate(received):
+                if b:
+                    continue
+                if holes and holes[-1][1] == i:
+                    holes[-1][1] = i + 1
+                else:
+                    holes.append([i, i + 1])
+            return holes
+
+        def put(request):
+            spec, total = request.headers["Content-Range"].split()[1].split("/")
+            start, end = (int(i) for i in spec.split("-"))
+            assert int(total) == len(data)
+            ranges.append((start, end))
+            if len(ranges) == 1:
+                return HTTPStatus.INTERNAL_SERVER_ERROR, {}, "{}"
+            received[start : end + 1] = request.body.read()
+            return HTTPStatus.OK, {}, "{}"
+
+        with responses.RequestsMock() as rsp:
+            rsp.add(
+                responses.POST,
+                f"{url}/test.tar.xz",
+                status=HTTPStatus.CREATED,
+                json={"missing": [[0, len(data)]]},
+            )
+            rsp.add_callback(responses.PUT, session, callback=put)
+            rsp.add_callback(
+                responses.GET,
+                session,
+                callback=lambda _r: (
+                    HTTPStatus.OK,
+                    {},
+                    json.dumps({"missing": missing()}),
+                ),
+            )
+            rsp.add(
+                responses.POST,
+                session,
+                status=HTTPStatus.CREATED,
+                json={"message": "File successfully uploaded"},
+            )
+            response = connect.upload(tarball, chunk_size=4, concurrency=1)
+            assert response.status_code == HTTPStatus.CREATED
+            assert bytes(received) == data
+            assert ranges == [(0, 3), (4, 7), (8, 9), (0, 3)]
+            assert rsp.calls[0].request.params == {"length": "10"}
+            assert rsp.calls[0].request.headers["Content-MD5"] == "md5"
+
+    def test_upload_chunks_fallback(self, connect, tmp_path):
+        """
+        Confirm that a chunked upload to a server which doesn't support
+        resumable uploads falls back to a single PUT.
+        """
+        url = f"{connect.url}/api/v1/upload"
+        connect.endpoints["uri"][API.UPLOAD.value] = {
+            "template": f"{url}/{{filename}}",
+            "params": {"filename": {"type": "string"}},
+        }
+        tarball = tmp_path / "test.tar.xz"
+        data = b"0123456789"
+        tarball.write_bytes(data)
+        (tmp_path / "test.tar.xz.md5").write_text("md5 test.tar.xz\n")
+
+        def put(request):
+            assert request.headers["Content-MD5"] == "md5"
+            assert request.body.read() == data
+            return HTTPStatus.CREATED, {}, "{}"
+
+        with responses.RequestsMock() as rsp:
+            rsp.add(
+                responses.POST,
+                f"{url}/test.tar.xz",
+                status=HTTPStatus.METHOD_NOT_ALLOWED,
+            )
+            rsp.add_callback(responses.PUT, f"{url}/test.tar.xz", callback=put)
+            response = connect.upload(tarball, chunk_size=4, concurrency=1)
+            assert response.status_code == HTTPStatus.CREATED
+            assert len(rsp.calls) == 2
@@ -823,3 +823,92 @@ class TestAuthModule:
             current_app.secret_key = jwt_secret
             user = Auth.verify_auth(pbench_invalid_api_key)
         assert user is None
+
+    def test_verify_auth_oidc_cache(
+        self, monkeypatch, mock_oidc, db_session, rsa_keys, make_logger
+    ):
+        """Verify that a verified OIDC token is cached, and that the User row
+        is written only when the token's username or roles change."""
+        audience = "server"
+        token, _ = gen_rsa_token(
+            audience, rsa_keys["private_key"], oidc_client_roles=["ROLE"]
+        )
+        config = mock_oidc("us", public_key=rsa_keys["public_key"])
+        oidc_client = OpenIDClient.construct_oidc_client(config)
+        monkeypatch.setattr(Auth, "oidc_client", oidc_client)
+
+        introspect = oidc_client.token_introspect
+        calls = {"introspect": 0, "update": 0}
+
+        def count_introspect(token: str) -> JSONOBJECT:
+            calls["introspect"] += 1
+            return introspect(token=token)
+
+        real_update = User.update
+
+        def count_update(self, **kwargs):
+            calls["update"] += 1
+            real_update(self, **kwargs)
+
+        monkeypatch.setattr(oidc_client, "token_introspect", count_introspect)
+        monkeypatch.setattr(User, "update", count_update)
+
+        app = Flask("test-verify-auth-oidc-cache")
+        app.logger = make_logger
+        app.server_config = config
+        with app.app_context():
+            user = Auth.verify_auth(token)
+            assert (user.id, user.username, user.roles) == ("12345", "dummy", ["ROLE"])
+            user = Auth.verify_auth(token)
+            assert (user.id, user.username, user.roles) == ("12345", "dummy", ["ROLE"])
+            assert user is User.query(id="12345")
+        assert calls == {"introspect": 1, "update": 0}
+        assert (Auth.TOKEN_CACHE.hits, Auth.TOKEN_CACHE.misses) == (1, 1)
+
+        # A new token for the same identity doesn't update the User
+        token2, _ = gen_rsa_token(
+            audience,
+            rsa_keys["private_key"],
+            exp="99999999998",
+            oidc_client_roles=["ROLE"],
+        )
+        with app.app_context():
+            assert Auth.verify_auth(token2).id == "12345"
+        assert calls == {"introspect": 2, "update": 0}
+
+        # ... but a change of roles does
+        token3, _ = gen_rsa_token(audience, rsa_keys["private_key"])
+        with app.app_context():
+            assert Auth.verify_auth(token3).roles == []
+        assert calls == {"introspect": 3, "update": 1}
+
+        # A cached identity never outlives its token
+        token4, _ = gen_rsa_token(audience, rsa_keys["private_key"], exp="1")
+        user = User.query(id="12345")
+        Auth.TOKEN_CACHE.put(token4, user, 1.0)
+        assert Auth.TOKEN_CACHE.get(token4) is None
+        with app.app_context():
+            assert Auth.verify_auth(token4) is None
+
+    def test_verify_auth_api_key_cache(
+        self, monkeypatch, server_config, make_logger, pbench_drb_api_key
+    ):
+        """Verify that a verified API key is cached until it's invalidated"""
+        queries = []
+        real_query = Auth.APIKey.query
+
+        def count_query(**kwargs):
+            queries.append(kwargs)
+            return real_query(**kwargs)
+
+        monkeypatch.setattr(Auth.APIKey, "query", count_query)
+        app = Flask("test_verify_auth_api_key_cache")
+        app.logger = make_logger
+        app.server_config = server_config
+        with app.app_context():
+            assert Auth.verify_auth(pbench_drb_api_key.key).id == DRB_USER_ID
+            assert Auth.verify_auth(pbench_drb_api_key.key).id == DRB_USER_ID
+            assert len(queries) == 1
+            Auth.TOKEN_CACHE.invalidate(pbench_drb_api_key.key)
+            assert Auth.verify_auth(pbench_drb_api_key.key).id == DRB_USER_ID
+            assert len(queries) == 2
@@ -23,8 +23,12 @@ from pbench.common import MetadataLog
 from pbench.common.logger import get_pbench_logger
 from pbench.server import PbenchServerConfig
 from pbench.server.api import create_app
+from pbench.server.api.resources.datasets_list import KEYSPACE_CACHE
 from pbench.server.api.resources.intake_base import IntakeBase
+from pbench.server.api.resources.query_apis import ElasticSession, RESPONSE_CACHE
+from pbench.server.api.resources.query_apis.datasets import IndexMapBase
 import pbench.server.auth.auth as Auth
+from pbench.server.cache_manager import CacheManager
 from pbench.server.database import init_db
 from pbench.server.database.database import Database
 from pbench.server.database.models.api_keys import APIKey
@@ -32,6 +36,8 @@ from pbench.server.database.models.datasets import Dataset, Metadata
 from pbench.server.database.models.index_map import IndexMap
 from pbench.server.database.models.templates import Template
 from pbench.server.database.models.users import User
+from pbench.server.quisby_cache import QuisbyCache
+from pbench.server.upload_session import UploadSession
 from pbench.test import on_disk_config
 from pbench.test.unit.server import ADMIN_USER_ID, DRB_USER_ID, TEST_USER_ID
 from pbench.test.unit.server.headertypes import HeaderTypes
@@ -41,6 +47,8 @@ install-dir = {TMP}/opt/pbench-server
 
 [pbench-server]
 pbench-top-dir = {TMP}/srv/pbench
+# The unit tests advance bulk dataset jobs explicitly
+bulk-job-poll = 0
 
 [database]
 uri = sqlite:///:memory:
@@ -129,6 +137,52 @@ def server_config(on_disk_server_config) -> PbenchServerConfig:
     return server_config
 
 
+@pytest.fixture(autouse=True)
+def shared_cache_manager(monkeypatch):
+    """Give each test case its own shared CacheManager, so that datasets and
+    mocks don't leak between test cases through the process-wide instance."""
+    monkeypatch.setattr(CacheManager, "_shared", None)
+
+
+@pytest.fixture(autouse=True)
+def shared_es_session(monkeypatch):
+    """Give each test case its own Elasticsearch session, so that connection
+    statistics don't leak between test cases."""
+    monkeypatch.setattr(ElasticSession, "_shared", None)
+
+
+@pytest.fixture(autouse=True)
+def response_cache(monkeypatch):
+    """Don't let cached Elasticsearch responses or template mappings leak
+    between test cases."""
+    RESPONSE_CACHE.clear()
+    monkeypatch.setattr(IndexMapBase, "MAPPINGS", {})
+
+
+@pytest.fixture(autouse=True)
+def token_cache():
+    """Don't let verified tokens leak between test cases."""
+    Auth.TOKEN_CACHE.clear()
+
+
+@pytest.fixture(autouse=True)
+def upload_hashers():
+    """Don't let incremental upload MD5 hashes leak between test cases."""
+    UploadSession.HASHERS.clear()
+
+
+@pytest.fixture(autouse=True)
+def keyspace_cache():
+    """Don't let cached metadata keyspace summaries leak between test cases."""
+    KEYSPACE_CACHE.entries.clear()
+
+
+@pytest.fixture(autouse=True)
+def quisby_cache(server_config):
+    """Don't let saved Quisby results leak between test cases."""
+    shutil.rmtree(server_config.CACHE / QuisbyCache.DIRECTORY, ignore_errors=True)
+
+
 @pytest.fixture(scope="session")
 def rsa_keys():
     """Fixture for generating an RSA public / private key pair.
@@ -299,6 +299,14 @@ class FakeSession:
         """
         self.added.append(instance)
 
+    def add_all(self, instances: list[Database.Base]):
+        """Add a list of DB objects to a list for testing
+
+        Args:
+            instances: DB objects
+        """
+        self.added.extend(instances)
+
     def delete(self, instance: Database.Base):
         """Delete a DB object from a list for testing
 
@@ -103,6 +103,42 @@ class TestAudit:
             committed=[FakeRow.clone(root), FakeRow.clone(other)]
         )
 
+    def test_add_all(self, fake_db):
+        """Audit records built without committing can be added together"""
+        ds = Dataset(id=1, name="test", resource_id="hash")
+        root = Audit.build(
+            name="update",
+            dataset=ds,
+            operation=OperationCode.UPDATE,
+            status=AuditStatus.BEGIN,
+        )
+        other = Audit.build(
+            dataset=Dataset(id=2, name="other", resource_id="hash2"),
+            name="update",
+            operation=OperationCode.UPDATE,
+            status=AuditStatus.BEGIN,
+        )
+        self.session.check_session()
+        Audit.add_all([root, other])
+        self.session.check_session(
+            committed=[FakeRow.clone(root), FakeRow.clone(other)]
+        )
+
+    def test_add_all_error(self, fake_db):
+        """A failure to add a set of Audit records adds none of them"""
+        self.session.raise_on_commit = DatabaseError(
+            statement="", params="", orig=FakeDBOrig("something else")
+        )
+        audits = [
+            Audit.build(operation=OperationCode.DELETE, status=AuditStatus.BEGIN)
+            for _ in range(2)
+        ]
+        with pytest.raises(
+            AuditSqlError, match=r"SQL error on.*'operation': 'add_all'"
+        ):
+            Audit.add_all(audits)
+        self.session.check_session(rolledback=1)
+
     def test_override(self, fake_db):
         attr = {"message": "the framistan is borked"}
         ds = Dataset(id=1, name="test", resource_id="md5")
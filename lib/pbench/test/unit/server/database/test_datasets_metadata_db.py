@@ -355,6 +355,64 @@ class TestMetadataNamespace:
             "contact": "Wilma"
         }
 
+    def test_getvalues(self, provide_metadata):
+        """Verify that getting metadata for many datasets at once gives the
+        same values as getting each key of each dataset separately, with a
+        constant number of queries."""
+        drb = Dataset.query(name="drb")
+        test = Dataset.query(name="test")
+        user1 = User.query(username="drb")
+        Metadata.setvalue(dataset=drb, key="user.contact", value="Wilma", user=user1)
+        Metadata.setvalue(dataset=test, key="user.contact", value="Fred", user=user1)
+        Metadata.setvalue(dataset=test, key="user.other", value="Betty")
+        Metadata.setvalue(dataset=drb, key="global.seen.by", value="Dave")
+        keys = [
+            "dataset",
+            "dataset.name",
+            "DATASET.METALOG.pbench.config",
+            "dataset.operations",
+            "global.contact",
+            "global.contact.name",
+            "global.seen.by",
+            "global.missing",
+            "server",
+            "server.deletion.what",
+            "user.contact",
+            "user.other",
+            "bad..key",
+        ]
+
+        # Reload the objects expired by the commits, so that we count only
+        # the metadata queries.
+        assert [drb.owner.username, test.owner.username, user1.id]
+
+        Database.reset_statement_count()
+        values = Metadata.getvalues([drb, test], keys, user1)
+        assert Database.statement_count() == 2
+
+        for ds in (drb, test):
+            expected = {}
+            for k in keys:
+                user = user1 if Metadata.get_native_key(k) == Metadata.USER else None
+                try:
+                    expected[k] = Metadata.getvalue(dataset=ds, key=k, user=user)
+                except (MetadataBadKey, MetadataBadStructure):
+                    expected[k] = None
+            assert values[ds.id] == expected
+        assert values[drb.id]["global.seen.by"] == "Dave"
+        assert values[test.id]["global.seen.by"] is None
+        assert values[drb.id]["global.contact.name"] is None
+        assert values[test.id]["user.contact"] == "Fred"
+        assert values[test.id]["user.other"] is None
+
+        # Without "dataset" keys, we don't need the operations
+        Database.reset_statement_count()
+        assert Metadata.getvalues([drb, test], ["global"]) == {
+            drb.id: {"global": {"contact": "me@example.com", "seen": {"by": "Dave"}}},
+            test.id: {"global": {"contact": "you@example.com"}},
+        }
+        assert Database.statement_count() == 1
+
     @pytest.mark.parametrize(
         "value",
         [
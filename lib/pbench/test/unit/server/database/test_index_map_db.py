@@ -222,3 +222,45 @@ class TestIndexMapDB:
         assert (
             str(e.value) == "Index SQL error on exists (drb)|drb:any: 'That was easy'"
         )
+
+    def test_version(self, monkeypatch, db_session, attach_dataset):
+        """Test that index map changes change the version"""
+
+        monkeypatch.setattr(IndexMap, "generations", {})
+        drb = Dataset.query(name="drb")
+        assert IndexMap.version(drb) == (0, 0, 0)
+        IndexMap.create(drb, {"run-data": ["prefix.run-data.2023-07"]})
+        first = IndexMap.version(drb)
+        assert first[0] == 1 and first[2] == 1
+
+        # Merging an index we already have commits no new rows, but still
+        # changes the version
+        IndexMap.merge(drb, {"run-data": ["prefix.run-data.2023-07"]})
+        second = IndexMap.version(drb)
+        assert second[:2] == first[:2] and second != first
+
+        # Rows added by another process change the version
+        Database.db_session.add(
+            IndexMap(dataset=drb, root="run-toc", index="prefix.run-toc.2023-07")
+        )
+        Database.db_session.commit()
+        third = IndexMap.version(drb)
+        assert third[0] == 2 and third[1] > second[1] and third[2] == second[2]
+
+        # Other datasets are unaffected
+        assert IndexMap.version(Dataset.query(name="test")) == (0, 0, 0)
+
+    def test_version_fail(self, monkeypatch, db_session, attach_dataset):
+        """Test index map version failure"""
+
+        def fake_query(*args):
+            raise SQLAlchemyError("That was easy")
+
+        drb = Dataset.query(name="drb")
+        monkeypatch.setattr(Database.db_session, "query", fake_query)
+
+        with pytest.raises(IndexMapSqlError) as e:
+            IndexMap.version(drb)
+        assert (
+            str(e.value) == "Index SQL error on version (drb)|drb:any: 'That was easy'"
+        )
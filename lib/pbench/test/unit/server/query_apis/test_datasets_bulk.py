@@ -0,0 +1,254 @@
+from http import HTTPStatus
+import json
+
+import pytest
+import responses
+
+from pbench.server.bulk_job import BulkJob
+from pbench.server.cache_manager import CacheManager
+from pbench.server.database.models.audit import Audit, AuditStatus
+from pbench.server.database.models.datasets import (
+    Dataset,
+    DatasetNotFound,
+    Metadata,
+    OperationName,
+    OperationState,
+)
+from pbench.server.sync import Sync
+
+INDICES = (
+    "unit-test.v5.result-data-sample.2020-08,"
+    "unit-test.v6.run-data.2020-08,"
+    "unit-test.v6.run-toc.2020-05"
+)
+
+
+class TestDatasetsBulk:
+    @pytest.fixture()
+    def bulk(self, client, server_config, provide_metadata, more_datasets):
+        """Provide a function to call the bulk API, returning the response"""
+
+        def bulk(method, token, payload=None, job=None):
+            uri = f"{server_config.rest_uri}/datasets/bulk"
+            if job:
+                uri += f"/{job}"
+            headers = {"authorization": f"Bearer {token}"} if token else {}
+            return getattr(client, method)(uri, headers=headers, json=payload)
+
+        return bulk
+
+    @pytest.fixture()
+    def es(self, server_config):
+        """Mock Elasticsearch, and provide its URI"""
+        with responses.RequestsMock() as rsp:
+            yield rsp, server_config.get("Indexing", "uri")
+
+    @pytest.fixture()
+    def cache_deletes(self, monkeypatch) -> list[str]:
+        """Record the datasets deleted from the cache"""
+        deleted = []
+        monkeypatch.setattr(
+            CacheManager, "delete", lambda _self, id: deleted.append(id)
+        )
+        return deleted
+
+    @staticmethod
+    def state(name: str) -> dict:
+        return Metadata.getvalue(Dataset.query(name=name), "dataset.operations")
+
+    def test_update(self, bulk, es, pbench_drb_token, server_config):
+        """An update starts a task covering the indexed datasets, and changes
+        the datasets when the task completes"""
+        rsp, uri = es
+        rsp.add(
+            responses.POST, f"{uri}/{INDICES}/_update_by_query", json={"task": "n:1"}
+        )
+        response = bulk(
+            "post",
+            pbench_drb_token,
+            {
+                "datasets": ["random_md5_string1", "random_md5_string3"],
+                "access": "public",
+            },
+        )
+        assert response.status_code == HTTPStatus.ACCEPTED
+        job = response.json["job"]
+        assert response.headers["location"].endswith(f"/datasets/bulk/{job}")
+        assert response.json["state"] == "running"
+        assert response.json["datasets"] == 2
+        assert response.json["tasks"] == {"total": 1, "completed": 0}
+
+        request = rsp.calls[0].request
+        assert "wait_for_completion=false" in request.url
+        body = json.loads(request.body)
+        assert body["query"]["dis_max"]["queries"] == [
+            {"terms": {"run.id": ["random_md5_string1"]}},
+            {"terms": {"run_data_parent": ["random_md5_string1"]}},
+        ]
+        assert body["script"]["params"] == {"authorization": {"access": "public"}}
+        for name in ("drb", "fio_1"):
+            assert self.state(name)["UPDATE"]["state"] == "WORKING"
+
+        # Nothing changes until the task is complete
+        rsp.add(responses.GET, f"{uri}/_tasks/n:1", json={"completed": False})
+        response = bulk("get", pbench_drb_token, job=job)
+        assert response.status_code == HTTPStatus.OK
+        assert response.json["state"] == "running"
+        assert Dataset.query(name="drb").access == "private"
+
+        rsp.replace(
+            responses.GET,
+            f"{uri}/_tasks/n:1",
+            json={
+                "completed": True,
+                "response": {"updated": 9, "total": 9, "failures": []},
+            },
+        )
+        response = bulk("get", pbench_drb_token, job=job)
+        assert response.json["state"] == "done"
+        assert response.json["tasks"] == {"total": 1, "completed": 1}
+        assert response.json["results"] == {
+            "deleted": 0,
+            "updated": 9,
+            "total": 9,
+            "version_conflicts": 0,
+            "failures": 0,
+        }
+        assert response.json["failed"] == []
+        for name in ("drb", "fio_1"):
+            assert Dataset.query(name=name).access == "public"
+            assert self.state(name)["UPDATE"] == {"state": "OK", "message": "OK"}
+        assert Dataset.query(name="fio_2").access == "public"
+        assert Dataset.query(name="test").access == "private"
+
+        audits = Audit.query(name="update")
+        assert len(audits) == 4
+        begins = {a.object_name: a for a in audits if a.status is AuditStatus.BEGIN}
+        ends = [a for a in audits if a.status is AuditStatus.SUCCESS]
+        assert sorted(begins) == ["drb", "fio_1"]
+        assert begins["drb"].attributes == {"job": job, "access": "public"}
+        for a in ends:
+            assert a.root_id == begins[a.object_name].id
+            assert a.user_name == "drb"
+
+        # A finished job doesn't talk to Elasticsearch again
+        calls = len(rsp.calls)
+        assert bulk("get", pbench_drb_token, job=job).json["state"] == "done"
+        assert len(rsp.calls) == calls
+
+    def test_delete(self, bulk, es, pbench_drb_token, cache_deletes):
+        """A dataset covered by a task with failures isn't deleted"""
+        rsp, uri = es
+        rsp.add(
+            responses.POST, f"{uri}/{INDICES}/_delete_by_query", json={"task": "n:2"}
+        )
+        rsp.add(
+            responses.GET,
+            f"{uri}/_tasks/n:2",
+            json={
+                "completed": True,
+                "response": {"deleted": 3, "total": 4, "failures": [{"x": 1}]},
+            },
+        )
+        response = bulk(
+            "delete",
+            pbench_drb_token,
+            {"datasets": ["random_md5_string1", "random_md5_string3"]},
+        )
+        assert response.status_code == HTTPStatus.ACCEPTED
+        response = bulk("get", pbench_drb_token, job=response.json["job"])
+        assert response.json["state"] == "done"
+        assert response.json["failed"] == ["random_md5_string1"]
+        assert response.json["results"]["failures"] == 1
+        assert cache_deletes == ["random_md5_string3"]
+        with pytest.raises(DatasetNotFound):
+            Dataset.query(name="fio_1")
+        assert self.state("drb")["DELETE"] == {
+            "state": "FAILED",
+            "message": "Unable to delete some indexed documents",
+        }
+        failures = Audit.query(name="delete", status=AuditStatus.FAILURE)
+        assert [a.object_name for a in failures] == ["drb"]
+
+    def test_unindexed(self, bulk, es, pbench_drb_token, cache_deletes):
+        """A job for datasets without indexed documents is done at once"""
+        response = bulk(
+            "delete", pbench_drb_token, {"filter": ["dataset.access:public"]}
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json["state"] == "done"
+        assert response.json["datasets"] == 1
+        assert response.json["tasks"] == {"total": 0, "completed": 0}
+        assert cache_deletes == ["random_md5_string3"]
+        assert len(es[0].calls) == 0
+
+        # The filter only selects the user's own datasets
+        Dataset.query(name="fio_2")
+
+    def test_start_failure(self, bulk, es, pbench_drb_token):
+        """A task which can't be started fails its datasets"""
+        rsp, uri = es
+        rsp.add(
+            responses.POST,
+            f"{uri}/{INDICES}/_update_by_query",
+            status=HTTPStatus.INTERNAL_SERVER_ERROR,
+        )
+        response = bulk(
+            "post",
+            pbench_drb_token,
+            {"datasets": ["random_md5_string1"], "owner": "test"},
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json["failed"] == ["random_md5_string1"]
+        assert Dataset.query(name="drb").owner.username == "drb"
+        assert self.state("drb")["UPDATE"]["state"] == "FAILED"
+
+    @pytest.mark.parametrize(
+        "method,payload,status",
+        (
+            ("post", {"datasets": ["random_md5_string1"]}, HTTPStatus.BAD_REQUEST),
+            ("delete", {}, HTTPStatus.BAD_REQUEST),
+            ("delete", {"datasets": ["nosuchdataset"]}, HTTPStatus.NOT_FOUND),
+            ("delete", {"datasets": ["random_md5_string2"]}, HTTPStatus.FORBIDDEN),
+        ),
+    )
+    def test_rejected(self, bulk, pbench_drb_token, method, payload, status):
+        """Bad requests are rejected before any work is started"""
+        response = bulk(method, pbench_drb_token, payload)
+        assert response.status_code == status
+        assert self.state("drb") == {}
+        assert not Audit.query()
+
+    def test_unauthenticated(self, bulk):
+        response = bulk("delete", None, {"datasets": ["random_md5_string1"]})
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_working(self, bulk, pbench_drb_token, make_logger):
+        """A dataset with an operation in progress can't be changed"""
+        Sync(make_logger, OperationName.INDEX).update(
+            Dataset.query(name="fio_1"), OperationState.WORKING
+        )
+        response = bulk(
+            "delete",
+            pbench_drb_token,
+            {"datasets": ["random_md5_string1", "random_md5_string3"]},
+        )
+        assert response.status_code == HTTPStatus.CONFLICT
+        assert response.json["message"] == "Datasets ['fio_1'] are working"
+
+    def test_job(self, bulk, server_config, pbench_drb_token, get_token_func):
+        """Only the submitter can see a job, and an unknown job isn't found"""
+        job = BulkJob(server_config.ARCHIVE / CacheManager.TEMPORARY)
+        response = bulk("get", pbench_drb_token, job=job.id)
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        response = bulk("get", pbench_drb_token, job="../../etc")
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        response = bulk(
+            "post",
+            get_token_func("test"),
+            {"datasets": ["random_md5_string8"], "access": "public"},
+        )
+        assert response.status_code == HTTPStatus.OK
+        response = bulk("get", pbench_drb_token, job=response.json["job"])
+        assert response.status_code == HTTPStatus.FORBIDDEN
@@ -1,12 +1,16 @@
 from http import HTTPStatus
+import re
 
 import pytest
+import responses
 
 from pbench.server.api.resources import ApiMethod
+from pbench.server.api.resources.query_apis import RESPONSE_CACHE
 from pbench.server.api.resources.query_apis.datasets.datasets_detail import (
     DatasetsDetail,
 )
 from pbench.server.database.models.datasets import Dataset, Metadata
+from pbench.server.database.models.index_map import IndexMap
 from pbench.test.unit.server.query_apis.commons import Commons
 
 
@@ -409,3 +413,83 @@ class TestDatasetsDetail(Commons):
             request_method=self.api_method,
         )
         assert response.json["message"].find("Too many hits for a unique query") != -1
+
+    def test_cache(
+        self,
+        client,
+        server_config,
+        provide_metadata,
+        find_template,
+        pbench_drb_token,
+    ):
+        """
+        Check that a repeated query reuses the cached Elasticsearch response
+        until the dataset's index map changes, and that the client can
+        revalidate its copy with the ETag.
+        """
+        response_payload = {
+            "hits": {
+                "total": {"value": 1, "relation": "eq"},
+                "hits": [
+                    {
+                        "_source": {
+                            "@metadata": {"controller_dir": "node"},
+                            "run": {"id": "random_md5_string1", "name": "drb"},
+                            "host_tools_info": [],
+                        }
+                    }
+                ],
+            }
+        }
+        headers = {"authorization": f"Bearer {pbench_drb_token}"}
+        uri = f"{server_config.rest_uri}{self.pbench_endpoint}"
+        expected = {
+            "runMetadata": {
+                "controller_dir": "node",
+                "id": "random_md5_string1",
+                "name": "drb",
+            },
+            "hostTools": [],
+        }
+
+        with responses.RequestsMock() as rsp:
+            rsp.add(responses.GET, re.compile(r".*/_search.*"), json=response_payload)
+            response = client.get(uri, headers=headers)
+            assert response.status_code == HTTPStatus.OK
+            assert response.json == expected
+            etag = response.headers["ETag"]
+            assert len(rsp.calls) == 1
+
+            # The cached response is postprocessed again, with current
+            # server metadata
+            response = client.get(
+                uri, headers=headers, query_string={"metadata": "dataset.access"}
+            )
+            assert response.json == {
+                **expected,
+                "serverMetadata": {"dataset.access": "private"},
+            }
+            response = client.get(uri, headers=headers)
+            assert response.json == expected
+            assert response.headers["ETag"] == etag
+            assert len(rsp.calls) == 1
+
+            # A client with a current copy doesn't need the data again
+            response = client.get(uri, headers={**headers, "If-None-Match": etag})
+            assert response.status_code == HTTPStatus.NOT_MODIFIED
+            assert not response.data
+            assert len(rsp.calls) == 1
+
+            # A change to the index map invalidates the cached response
+            drb = Dataset.query(name="drb")
+            IndexMap.merge(drb, {"run-data": ["unit-test.v6.run-data.2099-01"]})
+            response = client.get(uri, headers=headers)
+            assert response.json == expected
+            assert len(rsp.calls) == 2
+            assert "unit-test.v6.run-data.2099-01" in rsp.calls[1].request.url
+
+            # Updating or deleting the dataset discards its cached responses
+            RESPONSE_CACHE.invalidate(drb.resource_id)
+            response = client.get(uri, headers=headers)
+            assert len(rsp.calls) == 3
+        assert RESPONSE_CACHE.hits == 3
@@ -0,0 +1,65 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+import pytest
+import responses
+
+from pbench.server.api.resources.query_apis import ElasticSession
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """A trivial HTTP/1.1 handler which keeps connections open"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"hits": {}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    # Let requests to the local server past any active requests mocks
+    with responses.RequestsMock() as rsp:
+        rsp.add_passthru(url)
+        yield url
+    server.shutdown()
+    server.server_close()
+
+
+class TestElasticSession:
+    def test_shared(self, server_config, monkeypatch):
+        """Each worker process shares one session"""
+        session = ElasticSession.shared(server_config)
+        assert ElasticSession.shared(server_config) is session
+        assert session.session.verify == server_config.get("Indexing", "ca_bundle")
+        assert session.timeout == (10.0, None)
+        assert session.pool_size == 10
+
+        # A forked child gets its own session
+        monkeypatch.setattr(
+            "pbench.server.api.resources.query_apis.os.getpid", lambda: -1
+        )
+        assert ElasticSession.shared(server_config) is not session
+
+    def test_reuse(self, server_config, http_server):
+        """Successive requests are sent on one kept-alive connection"""
+        session = ElasticSession(server_config)
+        for _ in range(3):
+            response = session.request("GET", f"{http_server}index/_search")
+            assert response.json() == {"hits": {}}
+        assert session.report() == {"requests": 3, "connections": 1, "reused": 2}
+        session.close()
+        session.request("GET", f"{http_server}index/_search")
+        assert session.report() == {"requests": 4, "connections": 2, "reused": 2}
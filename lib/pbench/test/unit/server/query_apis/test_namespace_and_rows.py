@@ -3,6 +3,7 @@ from http import HTTPStatus
 import pytest
 
 from pbench.server.api.resources import APIAbort, ApiMethod
+from pbench.server.api.resources.query_apis import RESPONSE_CACHE
 from pbench.server.api.resources.query_apis.datasets.namespace_and_rows import (
     SampleNamespace,
     SampleValues,
@@ -585,6 +586,7 @@ class TestSampleValues(Commons):
             assert response.json == {
                 "results": [hit["_source"] for hit in response_payload["hits"]["hits"]]
             }
+            assert len(RESPONSE_CACHE.entries) == 1
 
     @pytest.mark.parametrize("filters", ({"sample.name": "sample1"}, {}, None))
     def test_scroll_id_return(
@@ -651,6 +653,9 @@ class TestSampleValues(Commons):
             res_json = response.json
             assert TestSampleValues.SCROLL_ID == res_json["scroll_id"]
 
+        # A scrolled response can't be reused
+        assert not RESPONSE_CACHE.entries
+
     def test_rows_query_with_scroll_id(
         self,
         server_config,
@@ -759,6 +764,7 @@ class TestSampleValues(Commons):
             assert response.json == {
                 "results": [hit["_source"] for hit in response_payload["hits"]["hits"]]
             }
+            assert not RESPONSE_CACHE.entries
 
     def test_get_index(self, attach_dataset, provide_metadata):
         """Test various 'get_index' cases"""
@@ -0,0 +1,40 @@
+from freezegun import freeze_time
+
+from pbench.server.api.resources.query_apis import ResponseCache
+
+
+class TestResponseCache:
+    def test_eviction(self):
+        """The least recently used responses are evicted to stay within the
+        size limit, and a response larger than the limit isn't cached"""
+        cache = ResponseCache()
+        cache.put("a", "ds1", b"1234", 60, 10)
+        cache.put("b", "ds2", b"5678", 60, 10)
+        assert cache.get("a") == b"1234"
+        cache.put("c", "ds1", b"90", 60, 10)
+        assert cache.size == 10
+        cache.put("d", "ds2", b"xy", 60, 10)
+        assert list(cache.entries) == ["a", "c", "d"]
+        assert cache.get("b") is None
+        cache.put("e", None, b"x" * 11, 60, 10)
+        assert "e" not in cache.entries
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Replacing a response replaces its size
+        cache.put("a", "ds1", b"1", 60, 10)
+        assert cache.size == 5
+
+        cache.invalidate("ds1")
+        assert list(cache.entries) == ["d"]
+        assert cache.size == 2
+
+    def test_expiration(self):
+        """A response expires after its lifetime"""
+        cache = ResponseCache()
+        with freeze_time("2023-01-01 00:00:00") as frozen:
+            cache.put("a", "ds1", b"payload", 60, 1024)
+            frozen.tick(59)
+            assert cache.get("a") == b"payload"
+            frozen.tick(2)
+            assert cache.get("a") is None
+            assert not cache.entries and cache.size == 0
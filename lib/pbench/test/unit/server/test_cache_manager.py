@@ -8,10 +8,15 @@ from pathlib import Path
 import re
 import shutil
 import subprocess
+import tarfile
+import threading
+import time
+from types import SimpleNamespace
 from typing import Optional
 
 import pytest
 
+from pbench.common.exceptions import UnsupportedTarballFormat
 from pbench.server import JSONOBJECT, OperationCode
 from pbench.server.cache_manager import (
     BadDirpath,
@@ -30,8 +35,9 @@ from pbench.server.cache_manager import (
     TarballNotFound,
     TarballUnpackError,
 )
+from pbench.server.cache_policy import AccessRecord, ReclaimState
 from pbench.server.database.models.audit import Audit, AuditStatus, AuditType
-from pbench.server.database.models.datasets import Dataset, DatasetBadName
+from pbench.server.database.models.datasets import Dataset, DatasetBadName, Metadata
 from pbench.test.unit.server.conftest import make_tarball
 
 
@@ -80,6 +86,8 @@ def fake_get_metadata(_tb_path):
     return {"pbench": {"date": "2002-05-16T00:00:00"}, "run": {"controller": "ABC"}}
 
 
+MB = 1024 * 1024
+
 MEMBER_NOT_FOUND_MSG = b"mock-tar: metadata.log: Not found in mock-archive"
 CANNOT_OPEN_MSG = (
     b"mock-tar: /mock/result.tar.xz: Cannot open: No such mock-file or mock-directory"
@@ -590,118 +598,252 @@ class TestCacheManager:
             self.last_ref = self.cache / "last_ref"
             self.unpacked = None
             self.cachemap = None
+            self.cachemap_path = self.cache / "cachemap"
+            self.cachemap_file = None
+            self.index_path = path.with_suffix(".xz.index")
+            self.index = None
             self.controller = controller
-
-    def test_unpack_tar_subprocess_exception(
-        self, make_logger, db_session, monkeypatch
-    ):
+            self.mutex = threading.Lock()
+            self.unpacked_stamp = None
+
+    @staticmethod
+    def make_unpack_tarball(path: Path, members: list[tarfile.TarInfo]) -> Path:
+        """Write an xz compressed tarball of the given members; regular file
+        members contain their own name."""
+        with tarfile.open(path, "w:xz") as tar:
+            for info in members:
+                data = None
+                if info.isreg():
+                    content = info.name.encode()
+                    info.size = len(content)
+                    data = io.BytesIO(content)
+                tar.addfile(info, data)
+        return path
+
+    @staticmethod
+    def tarinfo(name: str, type=tarfile.REGTYPE, mode=0o644, linkname=""):
+        info = tarfile.TarInfo(name)
+        info.type = type
+        info.mode = mode
+        info.linkname = linkname
+        info.mtime = 1600000000
+        return info
+
+    def test_unpack_exception(self, make_logger, db_session, monkeypatch, tmp_path):
         """Show that, when unpacking of the Tarball fails and raises
         an Exception it is handled successfully."""
-        tar = Path("/mock/A.tar.xz")
-        cache = Path("/mock/.cache")
-
-        @staticmethod
-        def mock_run(command, _dir_path, exception, dir_p):
-            verb = "tar"
-            assert command.startswith(verb)
-            raise exception(dir_p, subprocess.TimeoutExpired(verb, 43))
+        tar = tmp_path / "A.tar.xz"
+        tar.write_bytes(b"This isn't an xz file")
+        cache = tmp_path / ".cache"
+        (cache / "ABC").mkdir(parents=True)
+        audits = []
 
         with monkeypatch.context() as m:
-            m.setattr(Path, "exists", lambda self: True)
-            m.setattr(Path, "mkdir", lambda path, parents=False, exist_ok=False: None)
-            m.setattr(Path, "touch", lambda path, exist_ok=False: None)
-            m.setattr(Tarball, "subprocess_run", mock_run)
+            m.setattr(Audit, "create", lambda **kwargs: audits.append(kwargs) or kwargs)
             m.setattr(Tarball, "__init__", TestCacheManager.MockTarball.__init__)
             m.setattr(Controller, "__init__", TestCacheManager.MockController.__init__)
             tb = Tarball(
-                tar, "ABC", Controller(Path("/mock/archive"), cache, make_logger)
+                tar, "ABC", Controller(tmp_path / "archive", cache, make_logger)
             )
-            msg = f"An error occurred while unpacking {tar}: Command 'tar' timed out after 43 seconds"
+            msg = f"An error occurred while unpacking {tar}: Input format not supported"
             with pytest.raises(TarballUnpackError, match=msg):
                 tb.get_results(FakeLockRef(tb.lock))
+            assert tb.unpacked is None
+            assert not (cache / "ABC" / "A").exists()
+            assert audits[-1]["status"] == AuditStatus.FAILURE
+            assert audits[-1]["attributes"] == {
+                "error": f"An error occurred while unpacking {tar}: Input format not supported by decoder"
+            }
+            assert FakeLockRef.operations == ["upgrade", "downgrade"]
             FakeLockRef.reset()
 
-    def test_unpack_find_subprocess_exception(
-        self, make_logger, db_session, monkeypatch
+    @pytest.mark.parametrize(
+        "member,error",
+        (
+            (("/etc/passwd",), "unsafe member path '/etc/passwd'"),
+            (("A/../../escape",), "unsafe member path 'A/../../escape'"),
+            (
+                ("A/link", tarfile.SYMTYPE, 0o777, "/tmp"),
+                "member 'A/link/escape' is beneath a symlink",
+            ),
+            (
+                ("A/hard", tarfile.LNKTYPE, 0o644, "../escape"),
+                "unsafe hard link 'A/hard' to '../escape'",
+            ),
+            (
+                ("A/hard", tarfile.LNKTYPE, 0o644, "lock"),
+                "unsafe hard link 'A/hard' to 'lock'",
+            ),
+            (("escape",), "member 'escape' is outside 'A'"),
+            (("B/escape",), "member 'B/escape' is outside 'A'"),
+        ),
+    )
+    def test_unpack_unsafe(
+        self, make_logger, db_session, monkeypatch, tmp_path, member, error
     ):
-        """Show that, when permission change of the Tarball fails and raises
-        an Exception it is handled successfully."""
-        tar = Path("/mock/A.tar.xz")
-        cache = Path("/mock/.cache")
-        rmtree_called = True
+        """Show that tarball members which would be unpacked outside of the
+        cache directory are rejected, and the partial unpack is removed."""
+        members = [self.tarinfo("A", tarfile.DIRTYPE), self.tarinfo(*member)]
+        if member[1:2] == (tarfile.SYMTYPE,):
+            members.append(self.tarinfo("A/link/escape"))
+        tar = self.make_unpack_tarball(tmp_path / "A.tar.xz", members)
+        cache = tmp_path / ".cache"
+        (cache / "ABC").mkdir(parents=True)
 
-        def mock_rmtree(path: Path, ignore_errors=False):
-            nonlocal rmtree_called
-            rmtree_called = True
+        with monkeypatch.context() as m:
+            m.setattr(Audit, "create", lambda **kwargs: None)
+            m.setattr(Tarball, "__init__", TestCacheManager.MockTarball.__init__)
+            m.setattr(Controller, "__init__", TestCacheManager.MockController.__init__)
+            tb = Tarball(
+                tar, "ABC", Controller(tmp_path / "archive", cache, make_logger)
+            )
+            with pytest.raises(TarballUnpackError) as exc:
+                tb.get_results(FakeLockRef(tb.lock))
+            assert str(exc.value) == f"An error occurred while unpacking {tar}: {error}"
+
+            # A member outside the top level directory makes the tarball an
+            # unsupported format for the indexer
+            outside = "outside" in error or "unsafe member" in error
+            assert isinstance(exc.value, UnsupportedTarballFormat) == outside
+            assert list((cache / "ABC").iterdir()) == []
+            assert not (tmp_path / "escape").exists()
+            assert not (cache / "escape").exists()
+            FakeLockRef.reset()
 
-            assert ignore_errors
-            assert path == cache / "ABC"
+    def test_unpack_mode_exception(
+        self, make_logger, db_session, monkeypatch, tmp_path
+    ):
+        """Show that, when permission change of the unpacked files fails and
+        raises an Exception it is handled successfully."""
+        members = [self.tarinfo("A", tarfile.DIRTYPE), self.tarinfo("A/f1")]
+        tar = self.make_unpack_tarball(tmp_path / "A.tar.xz", members)
+        cache = tmp_path / ".cache"
+        (cache / "ABC").mkdir(parents=True)
 
-        @staticmethod
-        def mock_run(command, _dir_path, exception, dir_p):
-            verb = "find"
-            if command.startswith(verb):
-                raise exception(dir_p, subprocess.TimeoutExpired(verb, 43))
-            else:
-                assert command.startswith("tar")
+        def mock_chmod(path: Path, mode: int):
+            raise PermissionError(errno.EPERM, "Operation not permitted")
 
         with monkeypatch.context() as m:
-            m.setattr(Path, "exists", lambda self: True)
-            m.setattr(Path, "mkdir", lambda path, parents=False, exist_ok=False: None)
-            m.setattr(Path, "touch", lambda path, exist_ok=False: None)
-            m.setattr(Tarball, "subprocess_run", mock_run)
-            m.setattr(shutil, "rmtree", mock_rmtree)
+            m.setattr(Audit, "create", lambda **kwargs: None)
+            m.setattr(Path, "chmod", mock_chmod)
             m.setattr(Tarball, "__init__", TestCacheManager.MockTarball.__init__)
             m.setattr(Controller, "__init__", TestCacheManager.MockController.__init__)
             tb = Tarball(
-                tar, "ABC", Controller(Path("/mock/archive"), cache, make_logger)
+                tar, "ABC", Controller(tmp_path / "archive", cache, make_logger)
             )
-
             msg = "An error occurred while changing file permissions of "
-            msg += f"{cache / 'ABC'}: Command 'find' timed out after 43 seconds"
-            with pytest.raises(TarballModeChangeError, match=msg) as exc:
+            msg += f"{cache / 'ABC' / 'A' / 'f1'}: [Errno 1] Operation not permitted"
+            with pytest.raises(TarballModeChangeError) as exc:
                 tb.get_results(FakeLockRef(tb.lock))
             assert str(exc.value) == msg
-            assert rmtree_called
+            assert not (cache / "ABC" / "A").exists()
             FakeLockRef.reset()
 
-    def test_unpack_success(self, make_logger, db_session, monkeypatch):
-        """Test to check the unpacking functionality of the CacheManager"""
-        tar = Path("/mock/A.tar.xz")
-        cache = Path("/mock/.cache")
-        call = list()
+    def test_unpack_success(self, make_logger, db_session, monkeypatch, tmp_path):
+        """Test to check the unpacking functionality of the CacheManager
 
-        def mock_run(args, **_kwargs):
-            call.append(args[0])
+        The tarball is unpacked without running any subprocesses, with the
+        permissions fixed, the size counted, and the cache map built without
+        walking the unpacked tree.
+        """
+        members = [
+            self.tarinfo("A", tarfile.DIRTYPE, 0o700),
+            self.tarinfo("A/metadata.log", mode=0o600),
+            self.tarinfo("A/1-iter/sample1/result.txt", mode=0o200),
+            self.tarinfo("A/1-iter/sample1", tarfile.DIRTYPE, 0o300),
+            self.tarinfo("A/result", tarfile.SYMTYPE, 0o777, "1-iter/sample1"),
+            self.tarinfo("A/broken", tarfile.SYMTYPE, 0o777, "missing"),
+            self.tarinfo("A/copy.log", tarfile.LNKTYPE, 0o600, "A/metadata.log"),
+            self.tarinfo("A/fifo", tarfile.FIFOTYPE),
+            self.tarinfo("A/setuid", mode=0o4777),
+            self.tarinfo("A/tmp", tarfile.DIRTYPE, 0o1777),
+        ]
+        tar = self.make_unpack_tarball(tmp_path / "A.tar.xz", members)
+        cache = tmp_path / ".cache"
+        (cache / "ABC").mkdir(parents=True)
+        audits = []
 
-            tar_target = "--file=" + str(tar)
-            assert args[0] == "find" or args[0] == "tar" and tar_target in args
-            return subprocess.CompletedProcess(
-                args, returncode=0, stdout="Successfully Unpacked!", stderr=None
-            )
+        def mock_run(args, **_kwargs):
+            raise AssertionError(f"Unexpected subprocess {args}")
 
-        def mock_resolve(_path, **_kwargs):
-            """In this scenario, there are no symlinks,
-            so resolve() should never be called."""
-            raise AssertionError("Unexpected call to Path.resolve()")
+        def mock_glob(_path, _pattern):
+            raise AssertionError("Unexpected walk of the unpacked tree")
 
         with monkeypatch.context() as m:
-            m.setattr(Audit, "create", lambda **kwargs: None)
-            m.setattr(Path, "mkdir", lambda path, parents=False, exist_ok=False: None)
-            m.setattr(Path, "touch", lambda path, exist_ok=False: None)
-            m.setattr(Path, "resolve", mock_resolve)
-            m.setattr(Path, "glob", lambda path, p: [])
+            m.setattr(Audit, "create", lambda **kwargs: audits.append(kwargs) or kwargs)
             m.setattr("pbench.server.cache_manager.subprocess.run", mock_run)
+            m.setattr(Path, "glob", mock_glob)
             m.setattr(Tarball, "__init__", TestCacheManager.MockTarball.__init__)
             m.setattr(Controller, "__init__", TestCacheManager.MockController.__init__)
             tb = Tarball(
-                tar, "ABC", Controller(Path("/mock/archive"), cache, make_logger)
+                tar, "ABC", Controller(tmp_path / "archive", cache, make_logger)
             )
-            tb.get_results(FakeLockRef(tb.lock))
-            assert call == ["tar", "find"]
-            assert tb.unpacked == cache / "ABC" / tb.name
+            unpacked = tb.get_results(FakeLockRef(tb.lock))
             FakeLockRef.reset()
 
+        assert unpacked == cache / "ABC" / "A"
+        assert tb.unpacked == unpacked
+        assert (unpacked / "metadata.log").read_text() == "A/metadata.log"
+        assert (unpacked / "result" / "result.txt").read_text() == (
+            "A/1-iter/sample1/result.txt"
+        )
+        assert (unpacked / "copy.log").samefile(unpacked / "metadata.log")
+        assert not (unpacked / "fifo").exists()
+        assert (unpacked / "metadata.log").stat().st_mode & 0o7777 == 0o644
+        assert (unpacked / "1-iter/sample1/result.txt").stat().st_mode & 0o7777 == 0o644
+        assert (unpacked / "1-iter/sample1").stat().st_mode & 0o7777 == 0o755
+        assert (unpacked / "setuid").stat().st_mode & 0o7777 == 0o755
+        assert (unpacked / "tmp").stat().st_mode & 0o7777 == 0o755
+        assert unpacked.stat().st_mode & 0o7777 == 0o755
+        assert unpacked.stat().st_mtime == 1600000000
+        size = sum(
+            len(f)
+            for f in ("A/metadata.log", "A/1-iter/sample1/result.txt", "A/setuid")
+        )
+        assert tb.unpacked_size == size
+
+        assert audits[-1]["status"] == AuditStatus.SUCCESS
+        attributes = audits[-1]["attributes"]
+        assert attributes["bytes"] == size
+        assert attributes["files"] == 4
+        assert attributes["seconds"] >= 0.0
+        assert attributes["MB_per_second"] >= 0.0
+
+        # The modes recorded in the tarball are saved in the cache map, and in
+        # the map file
+        modes = {
+            ".": 0o700,
+            "metadata.log": 0o600,
+            "1-iter/sample1/result.txt": 0o200,
+            "1-iter/sample1": 0o300,
+            "result": 0o777,
+            "broken": 0o777,
+            "copy.log": 0o600,
+            "setuid": 0o4777,
+            "tmp": 0o1777,
+        }
+        assert tb.get_modes() == modes
+        unpack_map = tb.cachemap
+        tb.cachemap = None
+        assert tb.get_modes() == modes
+
+        # The map built while unpacking otherwise matches one built by walking
+        # the tree
+        entries = [unpack_map]
+        while entries:
+            entry = entries.pop()
+            entry["details"].mode = None
+            entries.extend(entry.get("children", {}).values())
+        tb.build_map()
+        assert unpack_map == tb.cachemap
+        assert (
+            tb.find_entry(Path("result"))["details"].resolve_type == CacheType.DIRECTORY
+        )
+        assert tb.find_entry(Path("broken"))["details"].resolve_type == CacheType.BROKEN
+        assert tb.find_entry(Path("1-iter/sample1/result.txt"))["details"].size == len(
+            "A/1-iter/sample1/result.txt"
+        )
+
     def test_cache_map_success(self, make_logger, monkeypatch, tmp_path):
         """Test to build the cache map of the root directory"""
         tar = Path("/mock/dir_name.tar.xz")
@@ -1014,6 +1156,129 @@ class TestCacheManager:
             assert c_map["details"].size == size
             assert c_map["details"].type is file_type
 
+    def test_cache_map_file(self, make_logger, monkeypatch, tmp_path):
+        """Test that the persistent cache map matches the in-memory map"""
+        tar = Path("/mock/dir_name.tar.xz")
+        cache = tmp_path / "cache"
+
+        with monkeypatch.context() as m:
+            m.setattr(Tarball, "__init__", TestCacheManager.MockTarball.__init__)
+            m.setattr(Controller, "__init__", TestCacheManager.MockController.__init__)
+            tb = Tarball(
+                tar, "ABC", Controller(Path("/mock/archive"), cache, make_logger)
+            )
+            tb.cache.mkdir(parents=True)
+            tar_dir = TestCacheManager.MockController.generate_test_result_tree(
+                tb.cache, "dir_name"
+            )
+            tb.unpacked = tar_dir
+            tb.build_map()
+            assert tb.cachemap_path.is_file()
+            entries = [Path(".")] + [
+                p.relative_to(tar_dir) for p in sorted(tar_dir.glob("**/*"))
+            ]
+            expected = {p: tb.find_entry(p) for p in entries}
+
+            # A new Tarball object, as in another process, finds the entries
+            # in the persistent map without building a map of its own.
+            tb = Tarball(
+                tar, "ABC", Controller(Path("/mock/archive"), cache, make_logger)
+            )
+            tb.unpacked = tar_dir
+            m.setattr(Tarball, "build_map", lambda _s: pytest.fail("built a map"))
+            for p, entry in expected.items():
+                found = tb.find_entry(p)
+                assert found["details"] == entry["details"]
+                if "children" in entry:
+                    assert {n: c["details"] for n, c in found["children"].items()} == {
+                        n: c["details"] for n, c in entry["children"].items()
+                    }
+                else:
+                    assert "children" not in found
+            assert tb.cachemap is None and tb.cachemap_file
+            for bad in ("ne_dir/ne_file", "subdir1/f11.txt/ne_subdir"):
+                with pytest.raises(BadDirpath):
+                    tb.find_entry(Path(bad))
+
+            # Reclaiming the unpacked tree invalidates the map
+            tb.cache_delete()
+            assert not tb.cachemap_path.exists() and tb.cachemap_file is None
+
+    def test_cache_map_file_stale(self, make_logger, monkeypatch, tmp_path):
+        """Test that a map of a previous unpack of the tree is discarded"""
+        tar = Path("/mock/dir_name.tar.xz")
+        cache = tmp_path / "cache"
+
+        with monkeypatch.context() as m:
+            m.setattr(Tarball, "__init__", TestCacheManager.MockTarball.__init__)
+            m.setattr(Controller, "__init__", TestCacheManager.MockController.__init__)
+            tb = Tarball(
+                tar, "ABC", Controller(Path("/mock/archive"), cache, make_logger)
+            )
+            tb.cache.mkdir(parents=True)
+            tar_dir = TestCacheManager.MockController.generate_test_result_tree(
+                tb.cache, "dir_name"
+            )
+            tb.unpacked = tar_dir
+            tb.build_map()
+            shutil.rmtree(tar_dir)
+            TestCacheManager.MockController.generate_test_result_tree(
+                tb.cache, "dir_name"
+            )
+            os.utime(tar_dir, ns=(0, 0))
+            assert tb.open_map() is None
+            assert not tb.cachemap_path.exists()
+
+    def test_get_inventory_index(self, make_logger, monkeypatch, tmp_path):
+        """Test that the member index avoids unpacking the tarball"""
+        archive = tmp_path / "mock" / "archive" / "ABC"
+        archive.mkdir(parents=True, exist_ok=True)
+        tar = archive / "dir_name.tar.xz"
+        cache = tmp_path / "mock" / ".cache"
+        source = tmp_path / "source"
+        TestCacheManager.MockController.generate_test_result_tree(source, "dir_name")
+        with tarfile.open(tar, "w:xz") as t:
+            t.add(source / "dir_name", arcname="dir_name")
+
+        with monkeypatch.context() as m:
+            m.setattr(Tarball, "__init__", TestCacheManager.MockTarball.__init__)
+            m.setattr(Controller, "__init__", TestCacheManager.MockController.__init__)
+            tb = Tarball(tar, "ABC", Controller(archive, cache, make_logger))
+            tb.build_index()
+            assert tb.index_path.is_file()
+            m.setattr(Tarball, "get_results", lambda _s, _l: pytest.fail("unpacked"))
+            info = tb.get_inventory("subdir1/f11.txt")
+            assert info["type"] is CacheType.FILE
+            assert info["stream"].read() == b"textual\nlines\n"
+            info["stream"].close()
+            info = tb.get_inventory("subdir1/subdir14")
+            assert info == {
+                "name": "subdir1/subdir14",
+                "type": CacheType.DIRECTORY,
+                "stream": None,
+            }
+            for bad in ("../other/f1.json", "subdir1/../../other"):
+                with pytest.raises(CacheExtractBadPath):
+                    tb.get_inventory(bad)
+
+            # A path through a symlinked directory, or one the index doesn't
+            # know, is resolved in the unpacked tree.
+            unpacked = []
+
+            def fake_results(_s, _l) -> Path:
+                unpacked.append(True)
+                return source / "dir_name"
+
+            m.setattr(Tarball, "get_results", fake_results)
+            tb.cache.mkdir(parents=True, exist_ok=True)
+            info = tb.get_inventory("subdir1/subdir14/subdir141/f1413_sym/f1411.txt")
+            assert info["type"] is CacheType.FILE
+            info["stream"].close()
+            for bad in ("subdir1/missing", "/etc/passwd"):
+                with pytest.raises(CacheExtractBadPath):
+                    tb.get_inventory(bad)
+            assert len(unpacked) == 3
+
     @pytest.mark.parametrize(
         "file_path,is_unpacked,exp_stream",
         [
@@ -1647,6 +1912,285 @@ class TestCacheManager:
         assert list(new.datasets) == [md5]
         assert list(new.tarballs) == [dataset_name]
 
+    def test_find_tarball_path(
+        self,
+        selinux_enabled,
+        server_config,
+        make_logger,
+        create_user,
+        tmp_path,
+        monkeypatch,
+    ):
+        """Test that find_dataset uses the server.tarball-path metadata to
+        locate a dataset without searching the ARCHIVE tree, and repairs
+        missing or stale metadata when it has to search."""
+        monkeypatch.setattr(Tarball, "_get_metadata", fake_get_metadata)
+        cm = CacheManager(server_config, make_logger)
+        datasets = {}
+        for name in ("first", "second"):
+            source = tmp_path / f"{name}.tar.xz"
+            _, md5 = make_tarball(source, "2002-05-16")
+            tarball = cm.create(source)
+            dataset = Dataset(owner=create_user, name=name, resource_id=md5)
+            dataset.add()
+            Metadata.setvalue(dataset, Metadata.TARBALL_PATH, str(tarball.tarball_path))
+            datasets[name] = (dataset, tarball.tarball_path)
+
+        dataset, path = datasets["first"]
+
+        def no_search(_self, dataset_id: str):
+            raise AssertionError(f"Unexpected search for {dataset_id}")
+
+        with monkeypatch.context() as m:
+            m.setattr(CacheManager, "_search_archive", no_search)
+            new = CacheManager(server_config, make_logger)
+            found = new.find_dataset(dataset.resource_id)
+            assert found.tarball_path == path
+            assert found.controller.name == "ABC"
+            assert list(new.controllers) == ["ABC"]
+            assert list(new.datasets) == [dataset.resource_id]
+            assert list(new.controllers["ABC"].datasets) == [dataset.resource_id]
+            assert new.find_dataset(dataset.resource_id) is found
+
+            # A second dataset is added to the same controller
+            other, other_path = datasets["second"]
+            second = new.find_dataset(other.resource_id)
+            assert second.tarball_path == other_path
+            assert second.controller is found.controller
+            assert list(new.datasets) == [dataset.resource_id, other.resource_id]
+
+        # Stale metadata falls back to a search, and is repaired
+        Metadata.setvalue(dataset, Metadata.TARBALL_PATH, "/no/such/ds.tar.xz")
+        new = CacheManager(server_config, make_logger)
+        assert new.find_dataset(dataset.resource_id).tarball_path == path
+        assert Metadata.getvalue(dataset, Metadata.TARBALL_PATH) == str(path)
+        with pytest.raises(TarballNotFound):
+            new.find_dataset("foobar")
+
+    def test_shared(self, server_config, make_logger, monkeypatch):
+        """Test that API calls in a process share one CacheManager"""
+        cm = CacheManager.shared(server_config, make_logger)
+        assert CacheManager.shared(server_config, make_logger) is cm
+
+        # A forked process gets its own
+        pid = os.getpid()
+        monkeypatch.setattr("pbench.server.cache_manager.os.getpid", lambda: pid + 1)
+        child = CacheManager.shared(server_config, make_logger)
+        assert child is not cm
+        assert CacheManager.shared(server_config, make_logger) is child
+
+    def test_revalidate(
+        self,
+        selinux_enabled,
+        server_config,
+        make_logger,
+        tarball,
+        monkeypatch,
+        db_session,
+    ):
+        """Test that a long-lived CacheManager notices changes made to the
+        ARCHIVE and CACHE trees by other processes."""
+        monkeypatch.setattr(Tarball, "_get_metadata", fake_get_metadata)
+        source_tarball, _, md5 = tarball
+        cm = CacheManager(server_config, make_logger)
+        cm.create(source_tarball)
+        found = cm.find_dataset(md5)
+        assert found.unpacked is None
+
+        # Another process unpacks the dataset
+        other = CacheManager(server_config, make_logger)
+        other_tb = other.find_dataset(md5)
+        other_tb.get_results(FakeLockRef(other_tb.lock))
+        FakeLockRef.reset()
+        assert cm.find_dataset(md5) is found
+        assert found.unpacked == other_tb.unpacked
+
+        # Once we have the cache map, it's reused until the cache changes
+        found.get_results(FakeLockRef(found.lock))
+        FakeLockRef.reset()
+        cachemap = found.cachemap or found.cachemap_file
+        assert cachemap
+        assert cm.find_dataset(md5) is found
+        assert (found.cachemap or found.cachemap_file) is cachemap
+
+        # Another process reclaims the cache
+        other_tb.cache_delete()
+        assert cm.find_dataset(md5) is found
+        assert found.unpacked is None
+        assert not found.cachemap and not found.cachemap_file
+
+        # Another process deletes the dataset
+        other.delete(md5)
+        with pytest.raises(TarballNotFound):
+            cm.find_dataset(md5)
+        assert md5 not in cm.datasets
+        assert found.name not in cm.tarballs
+        assert md5 not in found.controller.datasets
+
+    @staticmethod
+    def make_cache(cache_root: Path) -> dict[str, int]:
+        """Populate the cache with unpacked datasets of various sizes, ages
+        and popularity, and return their sizes.
+
+        Returns:
+            the unpacked size of each cached dataset in MB, by resource ID
+        """
+        datasets = {
+            # resource_id: (last_ref, accesses, size MB)
+            "old-huge-hot": (100.0, 50, 40),
+            "new-tiny-cold": (400.0, 1, 1),
+            "old-tiny-hot": (200.0, 20, 2),
+            "new-huge-cold": (300.0, 2, 30),
+        }
+        for rid, (last_ref, accesses, size) in datasets.items():
+            cache = cache_root / rid
+            (cache / "ds").mkdir(parents=True)
+            (cache / "lock").touch()
+            (cache / "cachemap").touch()
+            (cache / "last_ref").touch()
+            os.utime(cache / "last_ref", (last_ref, last_ref))
+            AccessRecord(
+                accesses=accesses, hits=accesses - 1, misses=1, size=size * MB
+            ).save(cache)
+        # A dataset which has been evicted before
+        (cache_root / "evicted").mkdir()
+        AccessRecord(accesses=3, hits=1, misses=2, size=MB).save(cache_root / "evicted")
+        return {rid: d[2] for rid, d in datasets.items()}
+
+    @staticmethod
+    def fake_disk_usage(cache_root: Path, sizes: dict[str, int], total_mb: int = 100):
+        """Report the cache file system usage from the cached datasets"""
+
+        def disk_usage(_path) -> shutil._ntuple_diskusage:
+            used = sum(s for r, s in sizes.items() if (cache_root / r / "ds").exists())
+            return shutil._ntuple_diskusage(
+                total_mb * MB, used * MB, (total_mb - used) * MB
+            )
+
+        return disk_usage
+
+    @pytest.mark.parametrize(
+        "policy,evicted",
+        (
+            ("lru", ["old-huge-hot"]),
+            ("lfu", ["new-tiny-cold", "new-huge-cold"]),
+            ("gdsf", ["new-huge-cold"]),
+        ),
+    )
+    def test_reclaim(self, server_config, make_logger, monkeypatch, policy, evicted):
+        """Reclaim evicts cached datasets in policy order until the goal is
+        reached, and records the eviction counters"""
+        cache_root = server_config.CACHE
+        sizes = self.make_cache(cache_root)
+        monkeypatch.setattr(
+            shutil, "disk_usage", self.fake_disk_usage(cache_root, sizes)
+        )
+        cm = CacheManager(server_config, make_logger)
+        assert cm.reclaim_policy == "lru"
+        assert cm.reclaim_cache(goal_pct=55.0, policy=policy)
+        remaining = [r for r in sizes if (cache_root / r / "ds").exists()]
+        assert sorted(set(sizes) - set(remaining)) == sorted(evicted)
+
+        # The cache maps, which are beside the unpacked trees, go with them
+        assert [r for r in sizes if (cache_root / r / "cachemap").exists()] == (
+            remaining
+        )
+
+        # The access records, and the "lock" and "last_ref" files, persist
+        for rid in sizes:
+            assert AccessRecord.load(cache_root / rid).accesses
+
+        state = ReclaimState.load(cache_root)
+        assert state.runs == 1
+        assert state.evictions == len(evicted)
+        assert state.reclaimed == sum(sizes[r] for r in evicted) * MB
+        assert (state.clock > 0.0) == (policy == "gdsf")
+
+        stats = cm.cache_statistics()
+        assert stats["datasets"] == 5
+        assert stats["cached"] == 4 - len(evicted)
+        assert stats["cached_bytes"] == sum(sizes[r] for r in remaining) * MB
+        assert stats["hits"] == 49 + 0 + 19 + 1 + 1
+        assert stats["misses"] == 4 + 2
+        assert stats["hit_ratio"] == round(70 / 76, 3)
+        assert stats["evictions"] == len(evicted)
+
+        # Nothing more is needed to reach the same goal
+        assert cm.reclaim_cache(goal_pct=55.0, policy=policy)
+        assert ReclaimState.load(cache_root).runs == 1
+
+    def test_reclaim_watermark(self, server_config, make_logger, monkeypatch):
+        """Reclaim to the low watermark only when above the high watermark, and
+        start the background reclaimer only when needed."""
+        cache_root = server_config.CACHE
+        sizes = self.make_cache(cache_root)
+        monkeypatch.setattr(
+            shutil, "disk_usage", self.fake_disk_usage(cache_root, sizes, 90)
+        )
+        started = []
+
+        class FakePopen:
+            def __init__(self, command, **kwargs):
+                started.append(command)
+                self.running = True
+
+            def poll(self):
+                return None if self.running else 0
+
+        monkeypatch.setattr(subprocess, "Popen", FakePopen)
+        cm = CacheManager(server_config, make_logger)
+
+        # 73 of 90 MB used is above the 80% high watermark
+        assert cm.start_reclaimer()
+        assert started[0][1:3] == ["--reclaim-watermark", "--config"]
+        assert started[0][0].endswith("pbench-tree-manage")
+        assert not cm.start_reclaimer()
+        assert len(started) == 1
+
+        # Reclaim to the 70% low watermark
+        assert cm.reclaim_watermark()
+        assert not (cache_root / "old-huge-hot" / "ds").exists()
+        assert (cache_root / "old-tiny-hot" / "ds").exists()
+
+        # Once the last one finishes, we don't need another
+        cm.reclaimer.running = False
+        assert not cm.start_reclaimer()
+        assert cm.reclaim_watermark()
+        assert ReclaimState.load(cache_root).runs == 1
+
+    def test_record_access_concurrent(self, server_config, make_logger):
+        """References from concurrent server processes are all recorded"""
+
+        def get_unpacked_size() -> int:
+            # Widen the window for a lost update
+            time.sleep(0.002)
+            return 0
+
+        cache = server_config.CACHE / "ABC" / "md5"
+        cache.mkdir(parents=True)
+        controller = SimpleNamespace(cache=server_config.CACHE, logger=make_logger)
+        tb = SimpleNamespace(
+            cache=cache,
+            controller=controller,
+            mutex=threading.Lock(),
+            name="ds",
+            get_unpacked_size=get_unpacked_size,
+        )
+        children = []
+        for _ in range(4):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    for i in range(25):
+                        Tarball.record_access(tb, bool(i))
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        for pid in children:
+            assert os.waitpid(pid, 0)[1] == 0
+        record = AccessRecord.load(cache)
+        assert (record.accesses, record.hits, record.misses) == (100, 96, 4)
+
     def test_lifecycle(
         self,
         db_session,
@@ -1702,8 +2246,15 @@ class TestCacheManager:
         dataset = cm.find_dataset(md5)
 
         # Now "unpack" the tarball and check that the incoming directory and
-        # results link are set up.
+        # results link are set up. Reclaiming space is left to the background
+        # reclaimer, rather than holding up the unpack.
+        monkeypatch.setattr(
+            CacheManager,
+            "reclaim_cache",
+            lambda *_a, **_k: pytest.fail("reclaim while unpacking"),
+        )
         dataset.get_results(FakeLockRef(dataset.lock))
+        assert AccessRecord.load(cache).misses == 1
         assert cache == dataset.cache
         assert cache.is_dir()
         assert unpack.is_dir()
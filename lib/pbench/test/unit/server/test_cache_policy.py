@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import pytest
+
+from pbench.server.cache_policy import (
+    AccessRecord,
+    CacheEntry,
+    EvictionPolicy,
+    get_policy,
+    MB_BYTES,
+    POLICIES,
+    ReclaimState,
+    register_policy,
+)
+
+
+def entry(name: str, last_ref: float, accesses: int, size: int, clock=0.0):
+    return CacheEntry(
+        resource_id=name,
+        cache=Path("/cache") / name / name,
+        last_ref=last_ref,
+        accesses=accesses,
+        size=size,
+        clock=clock,
+    )
+
+
+# An old, huge, popular dataset; a recent small one used once; an old small
+# one used a lot; and a recent huge one used once.
+ENTRIES = [
+    entry("old-huge-hot", 100.0, 50, 10_000 * MB_BYTES),
+    entry("new-tiny-cold", 400.0, 1, MB_BYTES),
+    entry("old-tiny-hot", 200.0, 20, 2 * MB_BYTES),
+    entry("new-huge-cold", 300.0, 1, 5_000 * MB_BYTES),
+]
+
+
+class TestCachePolicy:
+    @pytest.mark.parametrize(
+        "name,expected",
+        (
+            ("lru", ["old-huge-hot", "old-tiny-hot", "new-huge-cold", "new-tiny-cold"]),
+            ("lfu", ["new-huge-cold", "new-tiny-cold", "old-tiny-hot", "old-huge-hot"]),
+            (
+                "GDSF",
+                ["new-huge-cold", "old-huge-hot", "new-tiny-cold", "old-tiny-hot"],
+            ),
+        ),
+    )
+    def test_order(self, name, expected):
+        """Each policy orders the same datasets differently"""
+        policy = get_policy(name)
+        assert [e.resource_id for e in policy.order(ENTRIES)] == expected
+
+    def test_gdsf_clock(self):
+        """GDSF eviction advances the clock, so that datasets referenced since
+        outrank those which were popular long ago"""
+        policy = get_policy("gdsf")
+        state = ReclaimState()
+        first, second = policy.order(ENTRIES)[:2]
+        policy.evicted(first, state)
+        assert state.clock == pytest.approx(1 / 5_000)
+        policy.evicted(second, state)
+        assert state.clock == pytest.approx(50 / 10_000)
+
+        # A cold dataset referenced after the clock advanced now outranks a
+        # hot one that hasn't been referenced since
+        stale = entry("stale", 100.0, 3, MB_BYTES, clock=0.0)
+        fresh = entry("fresh", 500.0, 1, MB_BYTES, clock=5.0)
+        assert policy.order([fresh, stale]) == [stale, fresh]
+
+        # Other policies don't use the clock
+        get_policy("lru").evicted(first, state)
+        assert state.clock == pytest.approx(50 / 10_000)
+
+    def test_register(self):
+        """A policy can be plugged in by name"""
+
+        @register_policy
+        class BiggestFirst(EvictionPolicy):
+            name = "biggest"
+
+            def priority(self, entry: CacheEntry) -> int:
+                return -entry.size
+
+        try:
+            order = get_policy("biggest").order(ENTRIES)
+            assert [e.resource_id for e in order][:2] == [
+                "old-huge-hot",
+                "new-huge-cold",
+            ]
+        finally:
+            del POLICIES["biggest"]
+
+    def test_unknown(self):
+        with pytest.raises(ValueError, match="Unknown cache eviction policy 'mru'"):
+            get_policy("mru")
+
+    def test_records(self, tmp_path):
+        """The access record and reclaim state are saved and loaded, and a
+        missing or corrupt file gives an initial record"""
+        assert AccessRecord.load(tmp_path) == AccessRecord()
+        record = AccessRecord(accesses=3, hits=2, misses=1, size=42, clock=1.5)
+        record.save(tmp_path)
+        assert AccessRecord.load(tmp_path) == record
+        assert [f.name for f in tmp_path.iterdir()] == ["access"]
+        (tmp_path / "access").write_text("[1, 2")
+        assert AccessRecord.load(tmp_path) == AccessRecord()
+
+        state = ReclaimState(clock=2.0, evictions=3, reclaimed=1024, runs=1)
+        state.save(tmp_path)
+        assert ReclaimState.load(tmp_path) == state
+        (tmp_path / ".reclaim").write_text('{"clock": 1.0, "other": 2}')
+        assert ReclaimState.load(tmp_path) == ReclaimState(clock=1.0)
@@ -193,3 +193,38 @@ class TestCompareDatasets:
             assert response.json["json_data"] == "quisby_data"
         else:
             assert response.json["message"] == exp_message
+
+    def test_cached(self, query_get_as, monkeypatch):
+        """A repeated comparison, in any order, is served from the Quisby
+        cache without extracting or processing the results again, but still
+        requires authorization."""
+        calls = []
+
+        class MockQuisby:
+            def compare_csv_to_json(self, _b, _i, data) -> JSON:
+                calls.append(sorted(data))
+                return {"status": "success", "json_data": "quisby_data"}
+
+        def mock_get_inventory_bytes(_self, dataset: str, _path: str) -> str:
+            calls.append(dataset)
+            return "CSV"
+
+        monkeypatch.setattr(
+            CacheManager, "get_inventory_bytes", mock_get_inventory_bytes
+        )
+        monkeypatch.setattr(Metadata, "getvalue", mock_get_value)
+        monkeypatch.setattr(
+            "pbench.server.api.resources.datasets_compare.QuisbyProcessing", MockQuisby
+        )
+
+        first = query_get_as(["uperf_1", "uperf_2"], "test", HTTPStatus.OK)
+        assert len(calls) == 3
+        second = query_get_as(["uperf_2", "uperf_1"], "test", HTTPStatus.OK)
+        assert second.json == first.json
+        assert second.json["benchmark"] == "uperf"
+        assert len(calls) == 3
+        query_get_as(["uperf_1", "uperf_2"], "drb", HTTPStatus.FORBIDDEN)
+
+        # A different selection isn't cached
+        query_get_as(["uperf_1"], "test", HTTPStatus.OK)
+        assert len(calls) == 5
@@ -1,19 +1,26 @@
 import datetime
 from http import HTTPStatus
 import re
+import time
 from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
 
 import pytest
 import requests
 from sqlalchemy import and_, desc
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.orm import aliased, Query
+from sqlalchemy.sql.expression import ColumnElement
 
 from pbench.server import JSON, JSONARRAY, JSONOBJECT
 from pbench.server.api.resources import APIAbort, ApiParams
 from pbench.server.api.resources.datasets_list import DatasetsList, urlencode_json
 from pbench.server.database.database import Database
-from pbench.server.database.models.datasets import Dataset, Metadata
+from pbench.server.database.models.datasets import (
+    Dataset,
+    Metadata,
+    MetadataError,
+)
 from pbench.server.database.models.users import User
 from pbench.test.unit.server import DRB_USER_ID
 
@@ -141,6 +148,7 @@ class TestDatasetsList:
         results: list[JSON] = []
         offset = int(query.get("offset", "0"))
         limit = query.get("limit")
+        next_cursor = None
 
         if limit:
             next_offset = offset + int(limit)
@@ -149,6 +157,12 @@ class TestDatasetsList:
                 query["offset"] = str(len(name_list))
                 next_url = ""
             else:
+                # By default, the cursor holds the sort values of the last
+                # dataset on the page: the resource ID and the dataset ID.
+                last = Dataset.query(name=paginated_name_list[-1])
+                next_cursor = DatasetsList.encode_cursor(
+                    ["dataset.resource_id"], [last.resource_id, last.id]
+                )
                 query["offset"] = str(next_offset)
                 next_url = (
                     f"https://localhost{server_config.rest_uri}/datasets?"
@@ -174,12 +188,15 @@ class TestDatasetsList:
         q1 = {k: convert(k, v) for k, v in query.items()}
         if "metadata" not in q1:
             q1["metadata"] = ["dataset.uploaded"]
-        return {
+        expected = {
             "parameters": q1,
             "next_url": next_url,
             "results": results,
             "total": len(name_list),
         }
+        if next_cursor:
+            expected["next_cursor"] = next_cursor
+        return expected
 
     def compare_results(
         self, result: JSONOBJECT, name_list: list[str], query: JSON, server_config
@@ -547,6 +564,60 @@ class TestDatasetsList:
             "total": 1,
         }
 
+    def test_statement_count(
+        self, client, server_config, more_datasets, provide_metadata, get_token_func
+    ):
+        """The number of SQL statements needed to list datasets with metadata
+        doesn't depend on the number of datasets.
+
+        We use a single token, as the first request verifies it and the rest
+        find it in the token cache.
+        """
+        keys = "dataset.access,dataset.metalog.pbench.config,global,server,user"
+        headers = {"authorization": f"bearer {get_token_func('drb')}"}
+
+        def query(payload: JSON):
+            response = client.get(
+                f"{server_config.rest_uri}/datasets",
+                headers=headers,
+                query_string=payload,
+            )
+            assert response.status_code == HTTPStatus.OK
+            return response
+
+        query({"metadata": keys})
+
+        counts = []
+        for limit in (1, 10):
+            response = query({"metadata": keys, "limit": limit})
+            assert len(response.json["results"]) == min(limit, response.json["total"])
+            counts.append(int(response.headers["X-Pbench-SQL-Statements"]))
+        assert counts[0] == counts[1]
+
+    def test_get_metadata_error(self, monkeypatch, query_as):
+        """A failure to retrieve the metadata of a page reports each requested
+        key as None, as for a single dataset.
+
+        Args:
+            monkeypatch: Patching fixture
+            query_as: Query helper fixture
+        """
+
+        def getvalues(*args, **kwargs):
+            raise MetadataError("database unavailable")
+
+        monkeypatch.setattr(Metadata, "getvalues", staticmethod(getvalues))
+        response = query_as(
+            {"metadata": "dataset.name,server.deletion"}, "drb", HTTPStatus.OK
+        )
+        results = response.json["results"]
+        assert results
+        for result in results:
+            assert result["metadata"] == {
+                "dataset.name": None,
+                "server.deletion": None,
+            }
+
     def test_get_unknown_keys(self, query_as):
         """Test case requesting non-existent query parameter keys.
 
@@ -858,7 +929,12 @@ class TestDatasetsList:
         """
 
         def do_error(
-            self, query: Query, json: JSONOBJECT, raw_params: ApiParams, url: str
+            self,
+            query: Query,
+            json: JSONOBJECT,
+            raw_params: ApiParams,
+            url: str,
+            keyset: list[tuple[ColumnElement, bool]],
         ) -> tuple[JSONARRAY, JSONOBJECT]:
             raise exception
 
@@ -925,6 +1001,47 @@ class TestDatasetsList:
             }
         }
 
+    def test_key_summary_cache(self, monkeypatch, query_as):
+        """Test that keyspace summaries are cached for each dataset selection
+        until metadata changes, or until the cached summary expires.
+        """
+        walks = []
+        keypaths = DatasetsList.keypaths
+
+        def count_keypaths(query: Query) -> list[tuple[list[str], bool]]:
+            walks.append(query)
+            return keypaths(query)
+
+        def summary(query: JSON, computed: bool) -> JSON:
+            walks.clear()
+            response = query_as(query, "drb", HTTPStatus.OK)
+            assert bool(walks) is computed
+            return response.json["keys"]
+
+        monkeypatch.setattr(DatasetsList, "keypaths", staticmethod(count_keypaths))
+        drb = Dataset.query(name="drb")
+        Metadata.setvalue(dataset=drb, key="global.legacy", value="Truish")
+        keys = summary({"keysummary": "true"}, True)
+        assert keys["global"] == {"contact": None, "legacy": None}
+        assert summary({"keysummary": "true"}, False) == keys
+
+        # Each selection of datasets is cached separately
+        summary({"keysummary": "true", "name": "fio"}, True)
+        summary({"keysummary": "true", "name": "fio"}, False)
+
+        # A change to the metadata invalidates the cached summaries
+        fio_1 = Dataset.query(name="fio_1")
+        Metadata.setvalue(dataset=fio_1, key="global.legacy.server", value="ABC")
+        keys = summary({"keysummary": "true"}, True)
+        assert keys["global"] == {"contact": None, "legacy": {"server": None}}
+        summary({"keysummary": "true"}, False)
+
+        # An expired summary is recomputed
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 3600)
+        summary({"keysummary": "true"}, True)
+        summary({"keysummary": "true"}, False)
+
     def get_daterange_results(
         self, name_list: list[str]
     ) -> dict[str, datetime.datetime]:
@@ -1139,6 +1256,131 @@ class TestDatasetsList:
         result = query_as(query, "test", HTTPStatus.OK)
         self.compare_results(result.json, results, query, server_config)
 
+    @pytest.mark.parametrize("order", ("asc", "desc"))
+    def test_sort_missing(self, query_as, order):
+        """Test the position of datasets with no value for a metadata sort key
+
+        They sort as PostgreSQL orders NULL values by default: last when
+        ascending, and first when descending.
+
+        Args:
+            query_as: A fixture to provide a helper that executes the API call
+            order: The sort order
+        """
+        datasets = Database.db_session.query(Dataset).order_by(Dataset.name).all()
+        missing = set()
+        for i, d in enumerate(datasets):
+            if i % 3:
+                Metadata.setvalue(d, "global.test.sequence", i)
+            else:
+                missing.add(d.name)
+        query = {"sort": f"global.test.sequence:{order}:int"}
+        response = query_as(query, "test", HTTPStatus.OK)
+        nulls = [d["name"] in missing for d in response.json["results"]]
+        assert any(nulls) and not all(nulls)
+        assert nulls == sorted(nulls, reverse=order == "desc")
+
+    @pytest.mark.parametrize(
+        "sort",
+        [
+            None,
+            "dataset.name:desc",
+            "dataset.uploaded:asc:date",
+            "dataset.access,dataset.uploaded:desc",
+            "global.test.sequence:asc:int",
+            "global.test.odd:desc:bool,dataset.name",
+            "global.test.mcguffin:desc,dataset.owner",
+        ],
+    )
+    def test_cursor(self, query_as, sort):
+        """Test paging through `datasets/list` with a cursor
+
+        Paging with the cursor from each page should produce the same list of
+        datasets as a single query, even when some datasets have no value for
+        a metadata sort key, and without counting the datasets unless asked.
+
+        Args:
+            query_as: A fixture to provide a helper that executes the API call
+            sort: A JSON representation of the sort query parameter value
+        """
+
+        # Give only some datasets metadata values to sort on
+        all = Database.db_session.query(Dataset).order_by(Dataset.name).all()
+        for i, d in enumerate(all):
+            if i % 3:
+                Metadata.setvalue(d, "global.test.sequence", i // 2)
+                Metadata.setvalue(d, "global.test.odd", bool(i & 1))
+            if i % 4:
+                Metadata.setvalue(d, "global.test.mcguffin", str(i * 8 + 1))
+
+        query = {"sort": sort} if sort else {}
+        response = query_as(query, "test", HTTPStatus.OK)
+        expected = [d["name"] for d in response.json["results"]]
+        assert len(expected) == 7
+
+        # The first page uses an offset, and advertises a cursor
+        response = query_as(query | {"limit": 2}, "test", HTTPStatus.OK)
+        page = response.json
+        assert page["total"] == 7
+        assert "offset=2" in page["next_url"]
+        names = [d["name"] for d in page["results"]]
+        pages = 1
+        while "next_cursor" in page:
+            response = query_as(
+                query | {"limit": 2, "cursor": page["next_cursor"]},
+                "test",
+                HTTPStatus.OK,
+            )
+            page = response.json
+            assert "total" not in page
+            assert page["parameters"]["cursor"]
+            if "next_cursor" in page:
+                next_query = parse_qs(urlparse(page["next_url"]).query)
+                assert next_query["cursor"] == [page["next_cursor"]]
+            else:
+                assert page["next_url"] == ""
+            names.extend(d["name"] for d in page["results"])
+            pages += 1
+        assert names == expected
+        assert pages == 4
+
+        # The total can be requested with a cursor
+        response = query_as(
+            query | {"limit": 2, "cursor": "", "total": "true"}, "test", HTTPStatus.OK
+        )
+        assert response.json["total"] == 7
+        assert [d["name"] for d in response.json["results"]] == expected[:2]
+
+    @pytest.mark.parametrize(
+        "query,message",
+        [
+            ({"cursor": "xyzzy"}, "Invalid cursor 'xyzzy'"),
+            (
+                {
+                    "sort": "dataset.name",
+                    "cursor": DatasetsList.encode_cursor(
+                        ["dataset.resource_id"], ["random_md5_string1", 1]
+                    ),
+                },
+                "Invalid cursor",
+            ),
+            (
+                {"cursor": "", "offset": 2},
+                "'offset' and 'cursor' cannot be used together",
+            ),
+        ],
+    )
+    def test_cursor_errors(self, query_as, query, message):
+        """Test `datasets/list` errors with a bad cursor
+
+        Args:
+            query_as: A fixture to provide a helper that executes the API call
+            query: The query parameters
+            message: The expected error message
+        """
+        response = query_as(query, "drb", HTTPStatus.BAD_REQUEST)
+        assert response.json["message"].startswith(message)
+
     @pytest.mark.parametrize(
         "sort,message",
         [
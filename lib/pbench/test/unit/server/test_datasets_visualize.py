@@ -104,6 +104,30 @@ class TestVisualize:
         assert response.json["benchmark"] == "uperf"
         assert response.json["json_data"] == "quisby_data"
 
+    def test_cached(self, query_get_as, monkeypatch):
+        """A repeated visualization is served from the Quisby cache, and a
+        failure isn't cached"""
+        calls = []
+
+        def mock_extract_data(self, test_name, dataset_name, input_type, data) -> JSON:
+            calls.append(dataset_name)
+            if len(calls) == 1:
+                return {"status": "failed", "exception": "Unsupported Media Type"}
+            return {"status": "success", "json_data": "quisby_data"}
+
+        monkeypatch.setattr(
+            CacheManager, "get_inventory_bytes", self.mock_get_inventory_bytes
+        )
+        monkeypatch.setattr(Metadata, "getvalue", self.mock_getvalue)
+        monkeypatch.setattr(QuisbyProcessing, "extract_data", mock_extract_data)
+
+        query_get_as("uperf_1", "test", HTTPStatus.INTERNAL_SERVER_ERROR)
+        first = query_get_as("uperf_1", "test", HTTPStatus.OK)
+        second = query_get_as("uperf_1", "test", HTTPStatus.OK)
+        assert first.json == second.json
+        assert second.json["json_data"] == "quisby_data"
+        assert calls == ["uperf_1", "uperf_1"]
+
     def test_with_incorrect_data(self, query_get_as, monkeypatch):
         """Quisby processing fails"""
 
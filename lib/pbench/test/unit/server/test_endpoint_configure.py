@@ -60,6 +60,10 @@ class TestEndpointConfig:
                     "template": f"{uri}/datasets/{{dataset}}",
                     "params": {"dataset": {"type": "string"}},
                 },
+                "datasets_bulk": {
+                    "template": f"{uri}/datasets/bulk/{{job}}",
+                    "params": {"job": {"type": "string"}},
+                },
                 "datasets_compare": {"template": f"{uri}/compare", "params": {}},
                 "datasets_contents": {
                     "template": f"{uri}/datasets/{{dataset}}/contents/{{target}}",
@@ -125,6 +129,13 @@ class TestEndpointConfig:
                     "template": f"{uri}/upload/{{filename}}",
                     "params": {"filename": {"type": "string"}},
                 },
+                "upload_session": {
+                    "template": f"{uri}/upload/{{filename}}/{{resource_id}}",
+                    "params": {
+                        "filename": {"type": "string"},
+                        "resource_id": {"type": "string"},
+                    },
+                },
             },
         }
 
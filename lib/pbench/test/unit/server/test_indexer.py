@@ -1,7 +1,38 @@
+from collections import Counter
+import csv
+from datetime import datetime
+import hashlib
+import io
+import json
+from logging import Logger
+import os
+from pathlib import Path
+import tarfile
+
 import pytest
 
+from pbench.common.exceptions import BadDate
+from pbench.server import JSONOBJECT
 import pbench.server.indexer
-from pbench.server.indexer import init_indexing, ResultData
+from pbench.server.indexer import (
+    _known_tool_handlers,
+    ActionQueue,
+    check_source_ids,
+    es_index,
+    init_indexing,
+    PbenchData,
+    PbenchTarBall,
+    ResultData,
+    ToolData,
+)
+from pbench.server.tool_stdout import PARSERS, read_sections
+from pbench.test.benchmark.reference import (
+    make_source_unified_lockstep,
+    stdout_keyval,
+    stdout_procint,
+)
+
+REFERENCE_PARSERS = {"keyval": stdout_keyval, "procint": stdout_procint}
 
 
 class TestResultData_expand_uid_template:
@@ -77,3 +108,470 @@ def test_init_indexing(monkeypatch, server_config, make_logger):
     except Exception as exc:
         pytest.fail(f"Unexpected exception raised: {exc}")
     assert called[0], "Mocked update_templates() was not called"
+
+
+class TestActionQueue:
+    @staticmethod
+    def test_order():
+        """All generated actions are delivered, in order"""
+        actions = [{"_id": str(i)} for i in range(100)]
+        aq = ActionQueue(iter(actions), 3)
+        assert list(aq) == actions
+        aq.close()
+        assert aq.produced == 100 and aq.consumed == 100
+        assert aq.full_time >= 0.0 and aq.empty_time >= 0.0
+
+    @staticmethod
+    def test_error():
+        """A generator failure is re-raised after the preceding actions"""
+
+        def gen():
+            yield {"_id": "1"}
+            raise ValueError("bad tarball")
+
+        seen = []
+        aq = ActionQueue(gen(), 10)
+        with pytest.raises(ValueError, match="bad tarball"):
+            for action in aq:
+                seen.append(action)
+        aq.close()
+        assert seen == [{"_id": "1"}]
+
+    @staticmethod
+    def test_close():
+        """Closing the queue early stops a blocked producer"""
+
+        def gen():
+            for i in range(1000):
+                yield {"_id": str(i)}
+
+        aq = ActionQueue(gen(), 2)
+        it = iter(aq)
+        assert next(it) == {"_id": "0"}
+        aq.close()
+        assert not aq.thread.is_alive()
+        assert aq.produced < 1000
+
+
+@pytest.mark.parametrize(
+    "queue_depth,batch_size,method",
+    ((0, 0, "streaming_bulk"), (10, 0, "streaming_bulk"), (10, 5, "parallel_bulk")),
+)
+def test_es_index(monkeypatch, make_logger, queue_depth, batch_size, method):
+    called = {}
+
+    def fake_bulk(name):
+        def bulk(es, actions, errorsfp, logger, **kwargs):
+            called[name] = ([a["_id"] for a in actions], kwargs)
+            return (1, 2, len(called[name][0]), 0, 0, 0)
+
+        return bulk
+
+    for name in ("streaming_bulk", "parallel_bulk"):
+        monkeypatch.setattr(pbench.server.indexer.pyesbulk, name, fake_bulk(name))
+    actions = ({"_id": str(i)} for i in range(20))
+    res = es_index(
+        "es",
+        actions,
+        None,
+        make_logger,
+        queue_depth=queue_depth,
+        batch_size=batch_size,
+    )
+    assert res == (1, 2, 20, 0, 0, 0)
+    assert list(called) == [method]
+    assert called[method][0] == [str(i) for i in range(20)]
+    if batch_size:
+        assert called[method][1]["chunk_size"] == batch_size
+
+
+class TestSourceIds:
+    source = {
+        "@timestamp": "2021-03-01T12:00:00.000000",
+        "iostat": {"disk": {"sda": 1.5}, "name": "\u00e9t\u00e9"},
+        "run": {"id": "run-id"},
+    }
+    extra = {"@generated-by": "tracking-id", "authorization": {"access": "private"}}
+
+    def test_payload(self):
+        """The ID is computed as it always was, and the payload is the source
+        with the extra fields"""
+        expected = hashlib.md5(
+            json.dumps(self.source, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        source_id, payload = PbenchData.make_source_payload(self.source, self.extra)
+        assert source_id == expected
+        assert PbenchData.make_source_id(self.source) == expected
+        assert json.loads(payload) == {**self.source, **self.extra}
+        assert PbenchData.make_source_payload({}, self.extra)[1] == json.dumps(
+            self.extra, sort_keys=True
+        )
+        assert PbenchData.make_source_payload(self.source) == (
+            expected,
+            json.dumps(self.source, sort_keys=True),
+        )
+
+        # Extra fields replace those of the source, rather than duplicating
+        # the keys of the payload
+        extra = {"run": {"id": "other"}}
+        source_id, payload = PbenchData.make_source_payload(self.source, extra)
+        assert source_id == expected
+        assert payload.count('"run"') == 1
+        assert json.loads(payload) == {**self.source, **extra}
+
+    def test_check(self):
+        """Each document ID is looked up, in batches, in the index it would be
+        written to"""
+        indexed = {("idx1", "a"), ("idx2", "b")}
+        requests = []
+
+        class FakeES:
+            def mget(self, body: JSONOBJECT, _source: bool) -> JSONOBJECT:
+                assert _source is False
+                requests.append(body["docs"])
+                return {
+                    "docs": [
+                        {**d, "found": (d["_index"], d["_id"]) in indexed}
+                        for d in body["docs"]
+                    ]
+                }
+
+        actions = [
+            {"_index": "idx1", "_id": "a", "_source": "{}"},
+            {"_index": "idx2", "_id": "a", "_source": "{}"},
+            {"_index": "idx2", "_id": "b", "_source": "{}"},
+        ]
+        counts = check_source_ids(FakeES(), iter(actions), batch_size=2)
+        assert counts == Counter(documents=3, found=2, missing=1)
+        assert requests == [
+            [{"_index": "idx1", "_id": "a"}, {"_index": "idx2", "_id": "a"}],
+            [{"_index": "idx2", "_id": "b"}],
+        ]
+
+
+def test_scan_members(tmp_path: Path):
+    """The members described from an unpacked tree match those recorded by
+    tar for the same tree"""
+    top = tmp_path / "run"
+    (top / "1-iter" / "sample1").mkdir(parents=True)
+    (top / "metadata.log").write_text("[pbench]\n")
+    (top / "1-iter" / "result.json").write_text("{}")
+    (top / "1-iter" / "sample1" / "script.sh").write_text("#!/bin/sh\n")
+    (top / "1-iter" / "sample1" / "script.sh").chmod(0o755)
+    os.link(top / "metadata.log", top / "1-iter" / "metadata.log")
+    (top / "latest").symlink_to("1-iter")
+    for i, path in enumerate(sorted(top.rglob("*"), reverse=True)):
+        os.utime(path, (1000000 + i, 1000000 + i), follow_symlinks=False)
+    os.utime(top, (999999, 999999))
+
+    tar_path = tmp_path / "run.tar"
+    with tarfile.open(tar_path, "w") as tar:
+        tar.add(top, arcname="run")
+    with tarfile.open(tar_path) as tar:
+        expected = [
+            (m.name, m.type, m.mode, m.mtime, m.size, m.linkname)
+            for m in tar.getmembers()
+        ]
+
+    members = PbenchTarBall.scan_members(str(tmp_path), "run")
+    assert [tuple(m) for m in members] == expected
+    assert [m.name for m in members if m.isfile()] == [
+        "run/1-iter/metadata.log",
+        "run/1-iter/result.json",
+        "run/1-iter/sample1/script.sh",
+    ]
+    assert [m.name for m in members if m.isdir()] == [
+        "run",
+        "run/1-iter",
+        "run/1-iter/sample1",
+    ]
+    assert [(m.name, m.linkpath) for m in members if m.issym()] == [
+        ("run/latest", "1-iter")
+    ]
+
+    # The modes recorded in the tar ball, which the cache manager doesn't
+    # restore exactly, override those of the unpacked tree
+    modes = {".": 0o700, "1-iter/result.json": 0o600, "latest": 0o777}
+    members = PbenchTarBall.scan_members(str(tmp_path), "run", modes)
+    unpacked = {m.name: m.mode for m in members}
+    assert unpacked["run"] == 0o700
+    assert unpacked["run/1-iter/result.json"] == 0o600
+    assert unpacked["run/latest"] == 0o777
+    assert (
+        unpacked["run/metadata.log"] == (top / "metadata.log").stat().st_mode & 0o7777
+    )
+
+
+class FakePtb:
+    _tbctx = "fake-tarball"
+    start_run_ts = datetime(2021, 3, 1, 12, 0, 0)
+    end_run_ts = datetime(2021, 3, 1, 13, 0, 0)
+
+
+def make_tool_data(tool: str, csvs: dict[str, str], logger: Logger) -> ToolData:
+    """Construct a ToolData object for unified .csv data without a tarball"""
+    td = ToolData.__new__(ToolData)
+    td.ptb = FakePtb()
+    td.logger = logger
+    td.counters = Counter()
+    td.toolname = tool
+    td.basepath = f"1-iter/sample1/tools-default/host/{tool}"
+    td.run_metadata = {"id": "run-id", "name": "run"}
+    td.iteration_metadata = {"name": "1-iter", "number": 1}
+    td.sample_metadata = {"name": "sample1", "hostname": "host"}
+    td.handler = _known_tool_handlers[tool]
+    td.files = []
+    for name, text in csvs.items():
+        handler_rec = next(
+            r for r in td.handler["patterns"] if r["pattern"].match(name)
+        )
+        reader = csv.reader(io.StringIO(text))
+        td.files.append(
+            {
+                "basename": name,
+                "handler_rec": handler_rec,
+                "reader": reader,
+                "header": next(reader),
+            }
+        )
+    return td
+
+
+class TestUnifiedCsv:
+    # 1614600000000 is 2021-03-01T12:00:00 UTC
+    csvs = {
+        "disk_IOPS.csv": "timestamp_ms,sda-read,sda-write,sdb-read,sdb-write\n"
+        "1614600000000,1.0,2.0,3.0,4.0\n"
+        "1614600001000.5,1.5,2.5,3.5,4.5\n"
+        "1614600002000,1.75,2.75\n"
+        "1614600003000,5,6,7,8\n",
+        "disk_Queue_Size.csv": "timestamp_ms,sda,sdb\n"
+        "1614600000000,0.1,0.2\n"
+        "1614600001000.5,0.3,0.4\n"
+        "1614600002000,0.5,0.6\n"
+        "1614600003000,0.7,0.8\n"
+        "1614600004000,0.9,1.0\n",
+    }
+
+    @staticmethod
+    def generate(lockstep: bool, csvs: dict[str, str], logger: Logger):
+        td = make_tool_data("iostat", csvs, logger)
+        if lockstep:
+            gen = make_source_unified_lockstep(td)
+        else:
+            gen = td._make_source_unified()
+        docs = []
+        try:
+            for source in gen:
+                docs.append(source)
+        except BadDate as e:
+            docs.append(str(e))
+        return docs, td.counters
+
+    @pytest.mark.parametrize(
+        "csvs",
+        (
+            csvs,
+            {
+                # Relative timestamps
+                "disk_Queue_Size.csv": "timestamp_ms,sda\n0,1\n1000.25,2\n2000,3\n"
+            },
+            {
+                # Inconsistent timestamps across files
+                "disk_Queue_Size.csv": "timestamp_ms,sda\n1614600000000,1\n",
+                "disk_Utilization_percent.csv": "timestamp_ms,sda\n1614600000001,9\n",
+            },
+            {
+                # A bad timestamp after some good ones
+                "disk_Queue_Size.csv": "timestamp_ms,sda\n1614600000000,1\nxyzzy,2\n"
+            },
+            {
+                # Timestamp after the end of the run
+                "disk_Queue_Size.csv": "timestamp_ms,sda\n1614600000000,1\n"
+                "1614690000000,2\n"
+            },
+        ),
+    )
+    @pytest.mark.parametrize("block", (1, 2, ToolData.UNIFIED_BLOCK_ROWS))
+    def test_columnar_matches_lockstep(self, monkeypatch, make_logger, csvs, block):
+        """The columnar engine emits exactly what the lockstep reader does,
+        whatever the number of rows converted at a time"""
+        monkeypatch.setattr(ToolData, "UNIFIED_BLOCK_ROWS", block)
+        expected = self.generate(True, csvs, make_logger)
+        actual = self.generate(False, csvs, make_logger)
+        assert actual == expected
+        assert expected[0]
+
+    def test_timestamps(self, make_logger):
+        """Batch timestamp conversion matches the individual conversion"""
+        td = make_tool_data("iostat", {}, make_logger)
+        orig = [
+            "1614600000000",
+            "1614600000000.0005",
+            "1614600000000.0015",
+            "1614600123456.789",
+            "1614600000000.9999999",
+            "0",
+            "3599999.9995",
+            "12.5",
+            " 1614600000001 ",
+            "1614603600000",
+            "1614603600001",
+            "5000000",
+            "-1",
+            "nan",
+            "bogus",
+            None,
+        ]
+        batch = td.mk_abs_timestamps_millis(orig)
+        assert len(batch) == len(orig)
+        for ts, converted in zip(orig, batch):
+            try:
+                expected = td.mk_abs_timestamp_millis(ts)
+            except BadDate:
+                assert converted is None
+            else:
+                assert converted in (None, expected)
+        # All the valid timestamps, absolute or relative, are handled by the
+        # batch conversion itself.
+        assert [ts is not None for ts in batch] == [True] * 10 + [False] * 6
+
+
+class TestStdoutParsers:
+    tarball = (
+        Path(__file__).parents[2]
+        / "functional"
+        / "server"
+        / "tarballs"
+        / "fio_rw_2018.02.01T22.40.57.tar.xz"
+    )
+
+    @staticmethod
+    def generate(tool: str, text: str, logger: Logger, reference: bool) -> list:
+        """Collect the documents of either the reference line by line parser or
+        the registered parser, ending with the name of any exception"""
+        td = make_tool_data(tool, {}, logger)
+        td.ptb.start_run_ts = datetime(2018, 1, 1)
+        td.ptb.end_run_ts = datetime(2022, 1, 1)
+        handler_rec = td.handler["patterns"][0]
+        subformat = handler_rec["subformat"]
+        converter = handler_rec["converter"]
+        file_object = io.StringIO(text)
+        if reference:
+            gen = REFERENCE_PARSERS[subformat](td, file_object, converter, "p")
+        else:
+            gen = PARSERS[subformat](td, converter, "p").parse(file_object)
+        docs = []
+        try:
+            for doc in gen:
+                docs.append(doc)
+        except Exception as e:
+            docs.append(type(e).__name__)
+        return docs
+
+    def check(self, tool: str, text: str, logger: Logger):
+        expected = self.generate(tool, text, logger, reference=True)
+        actual = self.generate(tool, text, logger, reference=False)
+        assert actual == expected
+        assert expected
+
+    @pytest.mark.parametrize("tool", ("proc-interrupts", "proc-vmstat"))
+    def test_tarball(self, make_logger, tool):
+        """The registered parsers emit exactly what the reference parsers do
+        for the data of a real dataset"""
+        with tarfile.open(self.tarball) as tar:
+            member = next(
+                m for m in tar.getmembers() if m.name.endswith(f"/{tool}-stdout.txt")
+            )
+            text = tar.extractfile(member).read().decode()
+        self.check(tool, text, make_logger)
+        # Also with more samples than the dataset has
+        lines = text.splitlines(keepends=True)
+        starts = [i for i, line in enumerate(lines) if line.startswith("timestamp:")]
+        sample = lines[starts[1] : starts[2]]
+        more = []
+        for i in range(20):
+            ts = float(sample[0].split(":")[1]) + 3 * (i + 1)
+            more.append(f"timestamp: {ts:.9f}\n")
+            more.extend(line.replace(" 0 ", f" {i} ") for line in sample[1:])
+        self.check(tool, text + "".join(more), make_logger)
+
+    @pytest.mark.parametrize(
+        "text",
+        (
+            # Consistent keys, with remapped and substat keys, and a last
+            # record without rates
+            "ignored\n"
+            "timestamp: 1614600000.0\nallocstall 5\npgrefill_dma 3\nnr_x 1\n"
+            "timestamp: 1614600001.5\nallocstall 9\npgrefill_dma 4\nnr_x 0\n"
+            "timestamp: 1614600003.0\nallocstall 9\npgrefill_dma 8\nnr_x 7\n",
+            "timestamp: 1614600000.0\nfoo 1\n",
+            # A key appears
+            "timestamp: 1614600000.0\nfoo 1\ntimestamp: 1614600001.0\nfoo 2\nbar 1\n",
+            # A key disappears, and an empty section
+            "timestamp: 1614600000.0\nfoo 1\nbar 2\ntimestamp: 1614600001.0\n"
+            "foo 2\ntimestamp: 1614600002.0\ntimestamp: 1614600003.0\nfoo 5\n",
+            # A duplicate key
+            "timestamp: 1614600000.0\nfoo 1\nfoo 2\n"
+            "timestamp: 1614600001.0\nfoo 4\nfoo 8\n",
+            # A stat with a value and substats
+            "timestamp: 1614600000.0\nfoo 1\nfoo_bar 2\n",
+            # Values too large for numpy
+            "timestamp: 1614600000.0\nfoo 1\n"
+            f"timestamp: 1614600001.0\nfoo {2**70}\n"
+            f"timestamp: 1614600002.0\nfoo {2**70 + 3}\n",
+            # The same timestamp twice
+            "timestamp: 1614600000.0\nfoo 1\ntimestamp: 1614600000.0\nfoo 2\n",
+            # A bad line
+            "timestamp: 1614600000.0\nfoo 1\ntimestamp: 1614600001.0\nfoo\n",
+        ),
+    )
+    def test_keyval(self, make_logger, text):
+        """The keyval parser emits exactly what the reference parser does"""
+        self.check("proc-vmstat", text, make_logger)
+
+    @pytest.mark.parametrize(
+        "text",
+        (
+            # Consistent interrupts
+            "timestamp: 1614600000.5\n  CPU0  CPU1\n  0:  10  20  IO-APIC  timer\n"
+            "NMI:  1  2  Non-maskable interrupts\nERR:  0\nMIS:  3\n"
+            "timestamp: 1614600002.0\n  CPU0  CPU1\n  0:  15  40  IO-APIC  timer\n"
+            "NMI:  1  9  Non-maskable interrupts\nERR:  1\nMIS:  3\n"
+            "timestamp: 1614600004.0\n  CPU0  CPU1\n  0:  16  41  IO-APIC  timer\n"
+            "NMI:  3  9  Non-maskable interrupts\nERR:  1\nMIS:  5\n",
+            # An interrupt appears, then disappears and reappears
+            "timestamp: 1614600000.0\n  CPU0\n  0:  10  timer\n"
+            "timestamp: 1614600001.0\n  CPU0\n  0:  12  timer\n  1:  5  i8042\n"
+            "timestamp: 1614600002.0\n  CPU0\n  0:  13  timer\n"
+            "timestamp: 1614600003.0\n  CPU0\n  0:  14  timer\n  1:  7  i8042\n",
+            # A CPU comes online
+            "timestamp: 1614600000.0\n  CPU0\n  0:  10  timer\n"
+            "timestamp: 1614600001.0\n  CPU0  CPU1\n  0:  12  3  timer\n",
+            # A duplicate interrupt
+            "timestamp: 1614600000.0\n  CPU0\n  0:  10  a\n  0:  11  b\n"
+            "timestamp: 1614600001.0\n  CPU0\n  0:  12  a\n  0:  15  b\n",
+            # The same timestamp twice
+            "timestamp: 1614600000.0\n  CPU0\n  0:  10  timer\n"
+            "timestamp: 1614600000.0\n  CPU0\n  0:  12  timer\n",
+            # A bad value after some good ones
+            "timestamp: 1614600000.0\n  CPU0\n  0:  10  timer\n  1:  x  i8042\n",
+            # A bad header
+            "timestamp: 1614600000.0\n  CPU0\n  0:  10  timer\n"
+            "timestamp: 1614600001.0\n  0:  12  timer\n",
+        ),
+    )
+    def test_procint(self, make_logger, text):
+        """The procint parser emits exactly what the reference parser does"""
+        self.check("proc-interrupts", text, make_logger)
+
+    def test_read_sections(self):
+        """Sections are split across block boundaries"""
+        text = "x\ntimestamp: 1\na 1\nb 2\ntimestamp: 2\ntimestamp: 3\nc 3"
+        for block_size in (1, 2, 7, 1024):
+            sections = list(read_sections(io.StringIO(text), block_size))
+            assert sections == [
+                ("timestamp: 1", ["a 1", "b 2"]),
+                ("timestamp: 2", []),
+                ("timestamp: 3", ["c 3"]),
+            ]
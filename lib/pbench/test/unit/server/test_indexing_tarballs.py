@@ -1,10 +1,13 @@
 from argparse import Namespace
+from collections import Counter
+import io
 from logging import Logger
 import os
 from os import stat_result
 from pathlib import Path
 from signal import SIGHUP
 import time
+from types import SimpleNamespace
 from typing import Any, Dict, List, Optional
 
 import pytest
@@ -26,30 +29,40 @@ from pbench.server.database.models.datasets import (
     OperationState,
 )
 from pbench.server.database.models.index_map import IndexMapType
+from pbench.server.indexer import ToolSource
 from pbench.server.indexing_tarballs import (
     Index,
     SigIntException,
     SigTermException,
     TarballData,
 )
+from pbench.server.quisby_cache import QuisbyCache
 from pbench.server.templates import TemplateError
 
 
 class FakeDataset:
+    datasets: dict[str, "FakeDataset"] = {}
+
     def __init__(self, name: str, resource_id: str):
         self.name = name
         self.resource_id = resource_id
         self.owner_id = 1
+        __class__.datasets[resource_id] = self
 
     def __repr__(self) -> str:
         return self.name
 
+    @staticmethod
+    def query(resource_id: str) -> "FakeDataset":
+        return __class__.datasets[resource_id]
+
     @classmethod
     def reset(cls):
         cls.new_state = None
 
 
 class FakeMetadata:
+    SERVER_INDEX_CHECKPOINT = Metadata.SERVER_INDEX_CHECKPOINT
     TARBALL_PATH = Metadata.TARBALL_PATH
 
     no_tarball: list[str] = []
@@ -62,6 +75,8 @@ class FakeMetadata:
                 return None
             else:
                 return f"{dataset.name}.tar.xz"
+        elif key == Metadata.SERVER_INDEX_CHECKPOINT:
+            return __class__.set_values.get(dataset.name, {}).get(key)
         else:
             raise MetadataBadKey(key)
 
@@ -119,7 +134,7 @@ class FakePbenchTemplates:
         known_tool_handlers: JSONOBJECT = None,
         _dbg: int = 0,
     ):
-        pass
+        self.counters = Counter()
 
     def update_templates(self, es_instance):
         __class__.templates_updated = True
@@ -174,6 +189,9 @@ class FakeIdxContext:
         self.TS = "FAKE_TS"
         self.templates = FakePbenchTemplates(Path("path"), "test", logger)
         self._dbg = False
+        self.opctx = []
+        self.bulk_queue_depth = 0
+        self.bulk_batch_size = 0
 
     def getpid(self) -> int:
         return 1
@@ -197,9 +215,27 @@ class FakeIdxContext:
         return time.time()
 
 
+class FakeToolData:
+    def __init__(
+        self,
+        ptb: "FakePbenchTarBall",
+        iteration: str,
+        sample: str,
+        host: str,
+        tool: str,
+    ):
+        self.source_key = ToolSource(iteration, sample, host, tool).key
+        self.toolname = tool
+        ptb.idxctx.opctx.append(
+            {"object": f"ToolData-{self.source_key}", "counters": {"tool": tool}}
+        )
+        ptb.idxctx.templates.counters[f"template-{tool}"] += 1
+
+
 class FakePbenchTarBall:
     make_tool_called = 0
     make_all_called = 0
+    tool_sources = ["1-iter/sample1/host1/iostat", "1-iter/sample1/host1/vmstat"]
 
     def __init__(
         self,
@@ -219,10 +255,28 @@ class FakePbenchTarBall:
         __class__.make_tool_called += 1
         return [{"action": "mk_tool_data_actions", "name": self.name}]
 
+    def mk_tool_sources(self):
+        for source_key in __class__.tool_sources:
+            yield ToolSource(*source_key.split("/"))
+
+    def mk_tool_data(self):
+        for source in self.mk_tool_sources():
+            yield FakeToolData(self, *source)
+
+    def mk_tool_source_actions(self, td: FakeToolData) -> JSONARRAY:
+        __class__.make_tool_called += 1
+        self.map_document(f"tool-data-{td.toolname}", f"tool-data-{td.toolname}.1")
+        return [{"action": "mk_tool_source_actions", "source": td.source_key}]
+
     def make_all_actions(self) -> JSONARRAY:
         __class__.make_all_called += 1
         return [{"action": "make_all_actions", "name": self.name}]
 
+    def map_document(self, root_idx: str, index: str):
+        indices = self.index_map.setdefault(root_idx, [])
+        if index not in indices:
+            indices.append(index)
+
     @classmethod
     def reset(cls):
         cls.make_tool_called = 0
@@ -379,6 +433,7 @@ def mocks(monkeypatch, make_logger):
     with monkeypatch.context() as m:
         m.setattr("pbench.server.indexing_tarballs.Sync", FakeSync)
         m.setattr("pbench.server.indexing_tarballs.PbenchTarBall", FakePbenchTarBall)
+        m.setattr("pbench.server.indexing_tarballs.ToolData", FakeToolData)
         m.setattr("pbench.server.indexing_tarballs.Report", FakeReport)
         m.setattr("pbench.server.indexing_tarballs.Dataset", FakeDataset)
         m.setattr("pbench.server.indexing_tarballs.Metadata", FakeMetadata)
@@ -528,7 +583,7 @@ class TestIndexingTarballs:
         assert FakePbenchTemplates.templates_updated
 
     def test_process_tb_term(self, mocks, index):
-        def fake_es_index(es, actions, errorsfp, logger, _dbg=0):
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
             raise SigTermException("ter-min-ate; ter-min-ate")
 
         mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
@@ -536,7 +591,7 @@ class TestIndexingTarballs:
         assert stat == 0
 
     def test_process_tb_interrupt(self, mocks, index):
-        def fake_es_index(es, actions, errorsfp, logger, _dbg=0):
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
             raise SigIntException("cease. also desist. and stop. that too.")
 
         mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
@@ -558,7 +613,7 @@ class TestIndexingTarballs:
         index_actions = []
         first_index = True
 
-        def fake_es_index(es, actions, errorsfp, logger, _dbg=0):
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
             nonlocal first_index
             if first_index:
                 first_index = False
@@ -580,8 +635,30 @@ class TestIndexingTarballs:
             [{"action": "make_all_actions", "name": f"{ds3.name}.tar.xz"}],
         ]
 
+    def test_process_tb_int_removed(self, caplog, mocks, index):
+        """A dataset which is no longer enabled after a SIGHUP is skipped, and
+        reported."""
+        first_index = True
+
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
+            nonlocal first_index
+            if first_index:
+                first_index = False
+                os.kill(os.getpid(), SIGHUP)
+            return (1000, 2000, 1, 0, 0, 0)
+
+        mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
+        mocks.setattr(Index, "collect_tb", lambda self: (0, [tarball_3]))
+        stat = index.process_tb(tarballs=[tarball_2, tarball_1])
+        assert stat == 0 and FakePbenchTarBall.make_all_called == 2
+        missing = {tarball_1}
+        assert (
+            f"Tarballs previously marked for indexing are no longer present: {missing}"
+            in caplog.text
+        )
+
     def test_process_tb_merge(self, mocks, index):
-        def fake_es_index(es, actions, errorsfp, logger, _dbg=0):
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
             return (1000, 2000, 1, 0, 0, 0)
 
         FakeIndexMap.index_map = {
@@ -607,7 +684,7 @@ class TestIndexingTarballs:
     def test_process_tb(self, mocks, index):
         index_actions = []
 
-        def fake_es_index(es, actions, errorsfp, logger, _dbg=0):
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
             index_actions.append(actions)
             return (1000, 2000, 1, 0, 0, 0)
 
@@ -642,3 +719,271 @@ class TestIndexingTarballs:
             },
             {"attributes": None, "id": 4, "root": 3, "status": AuditStatus.SUCCESS},
         ]
+
+    def test_process_tb_cache_visualization(self, mocks, index):
+        """Serial indexing fills the Quisby cache as worker processes do"""
+        cached = []
+
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
+            return (1000, 2000, 1, 0, 0, 0)
+
+        mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
+        mocks.setattr(
+            index, "_cache_visualization", lambda d, _t: cached.append(d.name)
+        )
+        assert index.process_tb(tarballs=[tarball_2, tarball_1]) == 0
+        assert cached == [ds2.name, ds1.name]
+
+    def test_process_tb_workers(self, mocks, server_config, make_logger):
+        """Test indexing with a pool of worker processes.
+
+        The documents are generated and indexed by the forked workers, but the
+        IndexMap, Audit and Sync updates must all be made by the parent.
+        """
+
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
+            return (1000, 2000, 1, 0, 0, 0)
+
+        mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
+        index = Index(
+            "test",
+            Namespace(index_tool_data=False, re_index=False, workers=2),
+            FakeIdxContext(server_config, make_logger),
+        )
+        stat = index.process_tb(tarballs=[tarball_2, tarball_1, tarball_3])
+        assert stat == 0
+        assert FakeSync.state == OperationState.OK
+        assert FakeSync.errors == {}
+        assert sorted(FakeIndexMap.index_map.keys()) == ["ds1", "ds2", "ds3"]
+        begin = [a for a in FakeAudit.audits if a.status == AuditStatus.BEGIN]
+        finish = [a for a in FakeAudit.audits if a.status != AuditStatus.BEGIN]
+        assert [a.dataset for a in begin] == [ds2, ds1, ds3]
+        assert sorted(a.root for a in finish) == sorted(a.id for a in begin)
+        assert all(a.status == AuditStatus.SUCCESS for a in finish)
+        assert sum(t.datasets for t in index.throughput.values()) == 3
+        assert os.getpid() not in index.throughput
+
+    @pytest.mark.parametrize("tool_workers", (1, 2))
+    def test_process_tb_tool_checkpoint(
+        self, mocks, server_config, make_logger, tool_workers
+    ):
+        """Test resuming tool data indexing from a checkpoint.
+
+        The first run fails to index one of the tool data sources, so the
+        dataset's checkpoint records only the other. The second run indexes
+        just the failed source, and discards the checkpoint on success.
+
+        With more than one tool worker, the first run generates the sources
+        in forked worker processes, and their index maps and counters must
+        be merged into the dataset's.
+        """
+        index_actions = []
+        fail = {"1-iter/sample1/host1/iostat"}
+
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
+            actions = list(actions)
+            index_actions.extend(actions)
+            failures = 1 if actions[0]["source"] in fail else 0
+            return (1000, 2000, 1 - failures, 0, failures, 0)
+
+        mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
+        index = Index(
+            "test",
+            Namespace(index_tool_data=True, re_index=False, tool_workers=tool_workers),
+            FakeIdxContext(server_config, make_logger),
+        )
+        checkpoint = Metadata.SERVER_INDEX_CHECKPOINT
+        stat = index.process_tb(tarballs=[tarball_1])
+        assert stat == 0
+        assert sorted(a["source"] for a in index_actions) == [
+            "1-iter/sample1/host1/iostat",
+            "1-iter/sample1/host1/vmstat",
+        ]
+        assert sorted(c["counters"]["tool"] for c in index.idxctx.opctx) == [
+            "iostat",
+            "vmstat",
+        ]
+        assert index.idxctx.templates.counters == Counter(
+            {"template-iostat": 1, "template-vmstat": 1}
+        )
+        assert FakeSync.errors["ds1"] == "1:Operational error while indexing"
+        assert FakeMetadata.set_values["ds1"][checkpoint] == {
+            "operation": "TOOLINDEX",
+            "sources": ["1-iter/sample1/host1/vmstat"],
+            "index_map": {
+                "root": {"idx1": ["id1", "id2"]},
+                "tool-data-iostat": ["tool-data-iostat.1"],
+                "tool-data-vmstat": ["tool-data-vmstat.1"],
+            },
+        }
+
+        fail.clear()
+        index_actions.clear()
+        FakeSync.reset()
+        FakePbenchTarBall.reset()
+        stat = index.process_tb(tarballs=[tarball_1])
+        assert stat == 0
+        assert FakeSync.state == OperationState.OK
+        assert FakePbenchTarBall.make_tool_called == 1
+        assert index_actions == [
+            {
+                "action": "mk_tool_source_actions",
+                "source": "1-iter/sample1/host1/iostat",
+            }
+        ]
+        assert FakeMetadata.set_values["ds1"][checkpoint] is None
+        assert FakeIndexMap.index_map["ds1"]["tool-data-vmstat"] == [
+            "tool-data-vmstat.1"
+        ]
+
+    def test_process_tb_tool_batches(self, mocks, server_config, make_logger):
+        """Tool workers stream a source's actions in batches, which are
+        indexed together as the source's actions."""
+        sources = [f"1-iter/sample1/host1/tool{i}" for i in range(3)]
+        mocks.setattr(FakePbenchTarBall, "tool_sources", sources)
+        mocks.setattr("pbench.server.indexing_tarballs.TOOL_BATCH_SIZE", 2)
+
+        def fake_tool_source_actions(self, td: FakeToolData):
+            for i in range(5):
+                yield {"source": td.source_key, "id": i}
+
+        indexed = []
+
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
+            actions = list(actions)
+            indexed.append(actions)
+            return (1000, 2000, len(actions), 0, 0, 0)
+
+        mocks.setattr(
+            FakePbenchTarBall, "mk_tool_source_actions", fake_tool_source_actions
+        )
+        mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
+        index = Index(
+            "test",
+            Namespace(index_tool_data=True, re_index=False, tool_workers=2),
+            FakeIdxContext(server_config, make_logger),
+        )
+        stat = index.process_tb(tarballs=[tarball_1])
+        assert stat == 0
+        assert FakeSync.state == OperationState.OK
+        assert sorted(a[0]["source"] for a in indexed) == sources
+        for actions in indexed:
+            assert [a["id"] for a in actions] == list(range(5))
+            assert len({a["source"] for a in actions}) == 1
+
+    @pytest.mark.parametrize("interval,writes", ((0.0, 3), (3600.0, 1)))
+    def test_process_tb_checkpoint_interval(
+        self, mocks, server_config, make_logger, interval, writes
+    ):
+        """The checkpoint is rewritten at most once per checkpoint interval,
+        and the sources completed since the last write are recorded when
+        indexing stops."""
+        sources = [f"1-iter/sample1/host1/tool{i}" for i in range(4)]
+        mocks.setattr(FakePbenchTarBall, "tool_sources", sources)
+
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
+            failures = 1 if actions[0]["source"] == sources[-1] else 0
+            return (1000, 2000, 1 - failures, 0, failures, 0)
+
+        saved = []
+
+        def fake_setvalue(dataset, key, value):
+            saved.append(value["sources"] if value else value)
+            return value
+
+        mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
+        mocks.setattr(FakeMetadata, "setvalue", staticmethod(fake_setvalue))
+        index = Index(
+            "test",
+            Namespace(index_tool_data=True, re_index=False),
+            FakeIdxContext(server_config, make_logger),
+        )
+        index.CHECKPOINT_INTERVAL = interval
+        stat = index.process_tb(tarballs=[tarball_1])
+        assert stat == 0
+        assert len(saved) == writes
+        assert saved[-1] == sources[:-1]
+
+    def test_process_tb_clears_checkpoint(self, mocks, index):
+        """Re-generating the run documents invalidates a tool data checkpoint."""
+
+        def fake_es_index(es, actions, errorsfp, logger, _dbg=0, **kwargs):
+            return (1000, 2000, 1, 0, 0, 0)
+
+        mocks.setattr("pbench.server.indexing_tarballs.es_index", fake_es_index)
+        checkpoint = Metadata.SERVER_INDEX_CHECKPOINT
+        FakeMetadata.set_values["ds1"] = {
+            checkpoint: {"operation": "TOOLINDEX", "sources": ["a/b/c/d"]}
+        }
+        stat = index.process_tb(tarballs=[tarball_1])
+        assert stat == 0
+        assert FakeMetadata.set_values["ds1"][checkpoint] is None
+
+    def test_cache_visualization(self, mocks, index, tmp_path):
+        """Indexing a dataset fills the Quisby cache with its visualization"""
+        extracted = []
+
+        class MockQuisby:
+            def extract_data(self, _b, name, _i, data) -> JSONOBJECT:
+                extracted.append((name, data))
+                return {"status": "success", "json_data": "quisby_data"}
+
+        mocks.setattr("pbench.server.indexing_tarballs.QuisbyProcessing", MockQuisby)
+        mocks.setattr(
+            "pbench.server.indexing_tarballs.get_benchmark_name", lambda _d: "uperf"
+        )
+        tarobj = SimpleNamespace(unpacked=tmp_path)
+
+        # Nothing to do without a result.csv
+        index._cache_visualization(ds1, tarobj)
+        assert not extracted
+
+        (tmp_path / "result.csv").write_text("CSV")
+        index._cache_visualization(ds1, tarobj)
+        assert extracted == [("ds1", "CSV")]
+        key = QuisbyCache.key("visualize", "uperf", [ds1])
+        assert index.quisby_cache.get(key) == {
+            "status": "success",
+            "json_data": "quisby_data",
+        }
+
+        # A Quisby failure doesn't fail indexing
+        def fail(*_args):
+            raise Exception("Quisby failed")
+
+        mocks.setattr(MockQuisby, "extract_data", fail)
+        index._cache_visualization(ds2, tarobj)
+        assert (
+            index.quisby_cache.get(QuisbyCache.key("visualize", "uperf", [ds2])) is None
+        )
+
+    def test_check_ids(self, mocks, index):
+        """The document IDs of each dataset are looked up without indexing"""
+        actions = {
+            "ds1": [{"_index": "idx", "_id": "a", "_source": "{}"}],
+            "ds2": [
+                {"_index": "idx", "_id": "a", "_source": "{}"},
+                {"_index": "idx", "_id": "new", "_source": "{}"},
+            ],
+        }
+        mocks.setattr(
+            FakePbenchTarBall,
+            "mk_tool_data_actions",
+            lambda self: actions[self.name.split(".")[0]],
+        )
+
+        class FakeES:
+            def mget(self, body: JSONOBJECT, _source: bool) -> JSONOBJECT:
+                return {"docs": [{**d, "found": d["_id"] == "a"} for d in body["docs"]]}
+
+        index.idxctx.es = FakeES()
+        fp = io.StringIO()
+        assert index.check_ids(["ABC"], fp) == 0
+        assert index.check_ids(["ABC", "ACDF"], fp) == 1
+        assert fp.getvalue().splitlines() == [
+            "ds1 (ABC): 1 tool data documents, 0 IDs not indexed",
+            "ds1 (ABC): 1 tool data documents, 0 IDs not indexed",
+            "ds2 (ACDF): 2 tool data documents, 1 IDs not indexed",
+        ]
+        assert FakePbenchTarBall.make_all_called == 0
+        assert FakeSync.called == []
@@ -0,0 +1,73 @@
+import hashlib
+from io import BytesIO
+import threading
+
+import pytest
+
+from pbench.server.intake_stream import StreamCopier
+
+DATA = bytes(range(256)) * 1000
+
+
+class ReadOnly:
+    """A stream without readinto, which returns short reads"""
+
+    def __init__(self, data: bytes):
+        self.stream = BytesIO(data)
+
+    def read(self, size: int) -> bytes:
+        return self.stream.read(min(size, 1000))
+
+
+class TestStreamCopier:
+    @pytest.mark.parametrize("stream", (BytesIO, ReadOnly))
+    @pytest.mark.parametrize("buffer_size", (100, 4096, 1 << 20))
+    def test_copy(self, stream, buffer_size):
+        """The stream is copied and hashed, and each consumer sees every
+        chunk in order"""
+        chunks = []
+        threads = set()
+
+        def consumer(view: memoryview):
+            threads.add(threading.get_ident())
+            chunks.append(bytes(view))
+
+        output = BytesIO()
+        copier = StreamCopier(
+            stream(DATA), len(DATA), [consumer], buffer_size=buffer_size, buffers=3
+        )
+        result = copier.copy(output)
+        assert output.getvalue() == DATA
+        assert b"".join(chunks) == DATA
+        assert threading.get_ident() not in threads
+        assert result.received == len(DATA)
+        assert result.md5 == hashlib.md5(DATA).hexdigest()
+        assert result.rate > 0
+
+    @pytest.mark.parametrize("length", (len(DATA) - 1, len(DATA) + 1))
+    def test_length(self, length):
+        """A stream longer than expected is detected without being written,
+        and one which is shorter is reported with its length"""
+        output = BytesIO()
+        result = StreamCopier(BytesIO(DATA), length, buffer_size=4096).copy(output)
+        if length < len(DATA):
+            assert result.received == length + 1
+            assert len(output.getvalue()) == length - length % 4096
+        else:
+            assert result.received == len(DATA)
+            assert output.getvalue() == DATA
+
+    def test_consumer_error(self):
+        """A consumer failure is raised once the copy completes"""
+        calls = []
+
+        def consumer(view: memoryview):
+            calls.append(len(view))
+            raise ValueError("bad chunk")
+
+        output = BytesIO()
+        copier = StreamCopier(BytesIO(DATA), len(DATA), [consumer], buffer_size=100)
+        with pytest.raises(ValueError, match="bad chunk"):
+            copier.copy(output)
+        assert calls == [100]
+        assert output.getvalue() == DATA
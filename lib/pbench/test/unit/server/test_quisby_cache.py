@@ -0,0 +1,73 @@
+import os
+from types import SimpleNamespace
+from typing import Optional
+
+from pbench.server.quisby_cache import QuisbyCache
+
+
+def ds(resource_id: str, name: Optional[str] = None) -> SimpleNamespace:
+    """Fake the dataset attributes which identify a Quisby result"""
+    return SimpleNamespace(resource_id=resource_id, name=name or f"ds_{resource_id}")
+
+
+class TestQuisbyCache:
+    def test_key(self):
+        """The key depends on the kind, benchmark and set of datasets, but not
+        the order of the datasets or the case of the benchmark"""
+        a, b, c = (ds(i) for i in "abc")
+        key = QuisbyCache.key("compare", "uperf", [b, a])
+        assert key == QuisbyCache.key("compare", "UPERF", [a, b])
+        assert key != QuisbyCache.key("visualize", "uperf", [a, b])
+        assert key != QuisbyCache.key("compare", "fio", [a, b])
+        assert key != QuisbyCache.key("compare", "uperf", [a, b, c])
+
+        # Quisby labels results with the dataset names, so renaming a dataset
+        # changes the key
+        assert key != QuisbyCache.key("compare", "uperf", [a, ds("b", "renamed")])
+
+    def test_lookup(self, server_config, make_logger):
+        """A successful result is processed once and then found by any server
+        process, and a failure isn't cached"""
+        calls = []
+
+        def process(status: str):
+            def quisby():
+                calls.append(status)
+                return {"status": status, "json_data": [1, 2]}
+
+            return quisby
+
+        cache = QuisbyCache(server_config, make_logger)
+        result = cache.lookup("visualize", "uperf", [ds("a")], process("failed"))
+        assert result["status"] == "failed"
+        result = cache.lookup("visualize", "uperf", [ds("a")], process("success"))
+        assert result == {"status": "success", "json_data": [1, 2]}
+        other = QuisbyCache(server_config, make_logger)
+        assert (
+            other.lookup("visualize", "uperf", [ds("a")], process("success")) == result
+        )
+        assert calls == ["failed", "success"]
+
+    def test_evict(self, server_config, make_logger):
+        """The least recently used results are evicted to stay within the size
+        limit, and a result larger than the limit isn't cached"""
+        cache = QuisbyCache(server_config, make_logger)
+        cache.limit = 200
+        payload = {"status": "success", "json_data": "x" * 30}
+        for i, key in enumerate(("a", "b", "c")):
+            cache.put(key, payload)
+            os.utime(cache.root / f"{key}.json", (1000 + i, 1000 + i))
+
+        # Reading "a" makes it the most recently used, so adding "d" evicts
+        # "b" (the oldest) rather than "a"
+        assert cache.get("a") == payload
+        cache.put("d", payload)
+        assert sorted(p.stem for p in cache.root.glob("*.json")) == ["a", "c", "d"]
+        assert cache.get("b") is None
+
+        cache.put("e", {"json_data": "x" * 300})
+        assert cache.get("e") is None
+
+        # A corrupt result is ignored
+        (cache.root / "a.json").write_text("{")
+        assert cache.get("a") is None
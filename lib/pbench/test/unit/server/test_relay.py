@@ -72,7 +72,7 @@ class TestRelay:
                 self.datasets = {}
                 TestRelay.cachemanager_created = self
 
-            def create(self, path: Path) -> FakeTarball:
+            def create(self, path: Path, metadata=None, index=None) -> FakeTarball:
                 controller = "ctrl"
                 TestRelay.cachemanager_create_path = path
                 if TestRelay.cachemanager_create_fail:
@@ -236,6 +236,37 @@ class TestSync:
         list = sync.next()
         assert ["drb", "fio_1"] == sorted(d.name for d in list)
 
+    def test_update_all(self, make_logger, more_datasets):
+        """Test that update_all sets the component state of a set of datasets,
+        whether or not they already have an operation row."""
+        drb = Dataset.query(name="drb")
+        fio = Dataset.query(name="fio_1")
+        sync = Sync(make_logger, OperationName.UPDATE)
+        sync.update(drb, state=OperationState.WORKING)
+        sync.update_all([drb, fio], OperationState.FAILED, "it broke")
+        for ds in (drb, fio):
+            assert Metadata.getvalue(ds, "dataset.operations") == {
+                "UPDATE": {"state": "FAILED", "message": "it broke"}
+            }
+        sync.update_all([drb, fio], OperationState.OK)
+        for ds in (drb, fio):
+            assert Metadata.getvalue(ds, "dataset.operations") == {
+                "UPDATE": {"state": "OK", "message": "OK"}
+            }
+        assert (
+            Metadata.getvalue(Dataset.query(name="fio_2"), "dataset.operations") == {}
+        )
+
+    def test_update_all_failure(self, fake_raise_session, make_logger):
+        """Test the behavior of the sync update_all behavior when a DB failure
+        occurs.
+        """
+
+        drb = Dataset.query(name="drb")
+        sync = Sync(make_logger, OperationName.UPDATE)
+        with pytest.raises(SyncSqlError):
+            sync.update_all([drb], OperationState.OK)
+
     def test_next_failure(self, fake_raise_session, make_logger):
         """Test the behavior of the sync next behavior when a DB failure
         occurs.
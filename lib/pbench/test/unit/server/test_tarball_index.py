@@ -0,0 +1,142 @@
+import io
+import lzma
+from pathlib import Path
+import tarfile
+
+import pytest
+
+from pbench.server.tarball_index import (
+    read_xz_blocks,
+    TarballIndex,
+    TarballIndexError,
+    TarballScanner,
+)
+
+FILES = {
+    "ds/metadata.log": b"[pbench]\nname = ds\n",
+    "ds/1-iter/sample1/result.txt": b"result\n" * 3000,
+    "ds/1-iter/sample1/empty": b"",
+    "ds/result.csv": bytes(range(256)) * 400,
+}
+
+
+def make_tar() -> bytes:
+    """Build an uncompressed tar archive of FILES, with a symlink"""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        info = tarfile.TarInfo("ds")
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo("ds/link")
+        info.type = tarfile.SYMTYPE
+        info.linkname = "result.csv"
+        tar.addfile(info)
+    return buf.getvalue()
+
+
+@pytest.fixture(params=[0, 4096], ids=["single-block", "multi-block"])
+def tarball(request, tmp_path) -> Path:
+    """A tarball compressed as one xz block, or as many concatenated streams
+    of small blocks with stream padding."""
+    raw = make_tar()
+    chunk = request.param
+    if chunk:
+        data = b"".join(
+            lzma.compress(raw[i : i + chunk]) for i in range(0, len(raw), chunk)
+        )
+        data += b"\x00" * 8
+    else:
+        data = lzma.compress(raw)
+    path = tmp_path / "ds.tar.xz"
+    path.write_bytes(data)
+    return path
+
+
+class TestTarballIndex:
+    def test_blocks(self, tarball):
+        """The blocks describe the entire uncompressed archive"""
+        with tarball.open("rb") as fp:
+            blocks = read_xz_blocks(fp, tarball.stat().st_size)
+        assert blocks[0].start == 0
+        for prev, block in zip(blocks, blocks[1:]):
+            assert block.start == prev.start + prev.size
+            assert block.offset > prev.offset
+        last = blocks[-1]
+        assert last.start + last.size == len(make_tar())
+
+    def test_extract(self, tarball, tmp_path):
+        """Each member can be extracted through a saved index"""
+        index_path = tmp_path / "ds.tar.xz.index"
+        TarballIndex.build(tarball).save(index_path)
+        index = TarballIndex.load(index_path, tarball)
+        for name, data in FILES.items():
+            member = index.find(name)
+            assert member.kind == "file" and member.size == len(data)
+            with index.open(tarball, member) as stream:
+                assert stream.read() == data
+        with index.open(tarball, index.find("ds/metadata.log")) as stream:
+            assert list(stream) == [b"[pbench]\n", b"name = ds\n"]
+        assert index.find("ds").kind == "dir"
+        assert index.find("ds/1-iter").kind == "dir"
+        assert index.find("./ds/1-iter/sample1/../../result.csv").kind == "file"
+        assert index.find("ds/link").kind == "link"
+        assert index.find("ds/missing") is None
+        assert index.find("../ds/result.csv") is None
+
+    def test_load_invalid(self, tarball, tmp_path):
+        """An index of a different tarball, or a corrupt index, is ignored"""
+        index_path = tmp_path / "ds.tar.xz.index"
+        assert TarballIndex.load(index_path, tarball) is None
+        TarballIndex.build(tarball).save(index_path)
+        with tarball.open("ab") as fp:
+            fp.write(b"\x00" * 4)
+        assert TarballIndex.load(index_path, tarball) is None
+        index_path.write_text("{")
+        assert TarballIndex.load(index_path, tarball) is None
+
+    def test_build_bad(self, tmp_path):
+        """A file that isn't an xz tarball can't be indexed"""
+        bad = tmp_path / "bad.tar.xz"
+        bad.write_bytes(b"this is not an xz file\n" * 4)
+        with pytest.raises(TarballIndexError, match="bad xz stream footer"):
+            TarballIndex.build(bad)
+
+
+class TestTarballScanner:
+    @pytest.mark.parametrize("feed", (1, 1000, 1 << 20))
+    def test_scan(self, tarball, feed):
+        """Scanning the stream, in chunks of any size, captures the requested
+        members and gives the same index as reading the tarball"""
+        data = tarball.read_bytes()
+        scanner = TarballScanner(["./ds/metadata.log", "ds/missing"])
+        for i in range(0, len(data), feed):
+            scanner.feed(memoryview(data)[i : i + feed])
+        index = scanner.index(tarball)
+        assert scanner.captured == {"ds/metadata.log": FILES["ds/metadata.log"]}
+        expected = TarballIndex.build(tarball)
+        assert index.size == expected.size
+        assert index.blocks == expected.blocks
+        assert index.members == expected.members
+
+    def test_scan_bad(self, tarball):
+        """A stream that isn't a complete xz tarball can't be indexed"""
+        scanner = TarballScanner()
+        scanner.feed(b"this is not an xz file\n" * 4)
+        scanner.feed(b"nor is this")
+        assert scanner.index(tarball) is None
+        assert scanner.error
+
+        scanner = TarballScanner()
+        scanner.feed(tarball.read_bytes()[:100])
+        assert scanner.index(tarball) is None
+        assert scanner.error == "truncated xz stream"
+
+        # An xz stream that isn't a tarball
+        scanner = TarballScanner()
+        scanner.feed(lzma.compress(b"not a tarball" * 10000))
+        assert scanner.index(tarball) is None
+        assert scanner.error
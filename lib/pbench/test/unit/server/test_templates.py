@@ -4,7 +4,8 @@ from pathlib import Path
 
 import pytest
 
-from pbench.server.templates import JsonFile, JsonToolFile
+from pbench.common.exceptions import BadDate
+from pbench.server.templates import JsonFile, JsonToolFile, PbenchTemplates
 
 
 @pytest.fixture()
@@ -175,3 +176,51 @@ class TestJsonToolFile:
                 "tool": {"iostat": {"run": "far and fast"}},
             },
         }
+
+
+class TestPbenchTemplates:
+    @pytest.fixture()
+    def templates(self, monkeypatch, make_logger) -> PbenchTemplates:
+        """Load the server's templates from disk, without the database"""
+        monkeypatch.setattr(
+            PbenchTemplates,
+            "resolve",
+            lambda self: [t.load() for t in self.templates.values()],
+        )
+        return PbenchTemplates(Path("server/lib").resolve(), "unit-test", make_logger)
+
+    def test_generate_index_name(self, templates):
+        """Templates are found by key and tool name, and each index name is
+        formatted once per day"""
+        source = {"@timestamp": "2021-03-01T12:00:00.000"}
+        assert (
+            templates.generate_index_name("tool-data", source, "iostat")
+            == "unit-test.v4.tool-data-iostat.2021-03-01"
+        )
+        assert (
+            templates.generate_index_name("run", source)
+            == "unit-test.v6.run-data.2021-03"
+        )
+        iostat = templates.lookup[("tool-data", "iostat")]
+        assert iostat.index_names == {
+            "2021-03-01": "unit-test.v4.tool-data-iostat.2021-03-01"
+        }
+        iostat.index_names["2021-03-01"] = "memoized"
+        source["@timestamp"] = "2021-03-01T23:59:59"
+        assert templates.generate_index_name("tool-data", source, "iostat") == (
+            "memoized"
+        )
+
+        # Without a tool name, we get the first template with the key
+        first = next(t for t in templates.templates.values() if t.key == "tool-data")
+        assert templates.lookup[("tool-data", None)] is first
+
+    def test_generate_index_name_errors(self, templates):
+        with pytest.raises(Exception, match="Invalid template name, 'tool-data'"):
+            templates.generate_index_name(
+                "tool-data", {"@timestamp": "2021-03-01"}, "nosuchtool"
+            )
+        assert templates.counters["invalid_template_name"] == 1
+        with pytest.raises(BadDate):
+            templates.generate_index_name("run", {})
+        assert templates.counters["ts_missing_at_timestamp"] == 1
@@ -3,9 +3,12 @@ import hashlib
 from http import HTTPStatus
 from io import BytesIO
 from logging import Logger
+import os
 from pathlib import Path
 import shutil
+import time
 from typing import Optional
+from urllib.parse import quote
 
 import pytest
 
@@ -13,7 +16,7 @@ from pbench.server import OperationCode, PathLike, PbenchServerConfig
 from pbench.server.api.resources import APIInternalError, ApiMethod, ApiSchema
 from pbench.server.api.resources.intake_base import Access, IntakeBase
 from pbench.server.api.resources.upload import Upload
-from pbench.server.cache_manager import CacheManager, DuplicateTarball
+from pbench.server.cache_manager import CacheManager, DuplicateTarball, LockRef
 from pbench.server.database.models.audit import (
     Audit,
     AuditReason,
@@ -27,6 +30,7 @@ from pbench.server.database.models.datasets import (
     MetadataSqlError,
 )
 from pbench.server.sync import Sync
+from pbench.server.upload_session import UploadSession
 from pbench.test.unit.server import DRB_USER_ID
 
 
@@ -34,6 +38,7 @@ class TestUpload:
     cachemanager_created = None
     cachemanager_create_fail = None
     cachemanager_create_path = None
+    cachemanager_create_scan = None
     tarball_deleted = None
     create_metadata = True
 
@@ -94,9 +99,10 @@ class TestUpload:
                 self.datasets = {}
                 TestUpload.cachemanager_created = self
 
-            def create(self, path: Path) -> FakeTarball:
+            def create(self, path: Path, metadata=None, index=None) -> FakeTarball:
                 controller = "ctrl"
                 TestUpload.cachemanager_create_path = path
+                TestUpload.cachemanager_create_scan = (metadata, index)
                 if TestUpload.cachemanager_create_fail:
                     raise TestUpload.cachemanager_create_fail
                 self.controllers[controller] = controller
@@ -109,6 +115,7 @@ class TestUpload:
         TestUpload.cachemanager_created = None
         TestUpload.cachemanager_create_fail = None
         TestUpload.cachemanager_create_path = None
+        TestUpload.cachemanager_create_scan = None
         TestUpload.tarball_deleted = None
         monkeypatch.setattr(CacheManager, "__init__", FakeCacheManager.__init__)
         monkeypatch.setattr(CacheManager, "create", FakeCacheManager.create)
@@ -328,6 +335,7 @@ class TestUpload:
 
         monkeypatch.setattr(Upload, "_stream", access)
         monkeypatch.setattr(stream, "read", read)
+        monkeypatch.setattr(stream, "readinto", read)
 
         with BytesIO(b"12345") as data_fp:
             response = client.put(
@@ -617,6 +625,11 @@ class TestUpload:
         assert dataset.name in self.cachemanager_created
         assert self.cachemanager_create_path
 
+        # The metadata.log and member index were gathered from the stream
+        metadata, index = self.cachemanager_create_scan
+        assert metadata == {"pbench": {"date": "2002-05-16"}}
+        assert index.find(f"{name}/metadata.log").kind == "file"
+
         assert backup_created
         assert not backup_removed
 
@@ -1151,3 +1164,295 @@ class TestUpload:
             m.setattr(shutil, "rmtree", mock_rmtree)
             IntakeBase._remove_backup(backup)
             assert ops == [("rmtree", backup.parent)]
+
+    @staticmethod
+    def session_uri(server_config, filename: str, md5: str) -> str:
+        return f"{server_config.rest_uri}/upload/{filename}/{md5}"
+
+    @staticmethod
+    def send_chunk(client, uri: str, token: str, start: int, data: bytes, total: int):
+        return client.put(
+            uri,
+            data=data,
+            headers={
+                "Authorization": "Bearer " + token,
+                "Content-Range": f"bytes {start}-{start + len(data) - 1}/{total}",
+            },
+        )
+
+    @pytest.mark.freeze_time("1970-01-01")
+    def test_resumable_upload(
+        self, client, pbench_drb_token, server_config, tarball, monkeypatch
+    ):
+        """Upload a tarball in chunks sent out of order, resuming the session
+        along the way, and check that the MD5 was computed as they arrived.
+        """
+        monkeypatch.setattr(
+            IntakeBase,
+            "_backup_tarball",
+            lambda _s, p, i: server_config.BACKUP / i / p.name,
+        )
+        datafile, _, md5 = tarball
+        data = datafile.read_bytes()
+        total = len(data)
+        third = total // 3
+        chunks = [(0, data[:third]), (third, data[third : 2 * third])]
+        chunks.append((2 * third, data[2 * third :]))
+        uri = self.session_uri(server_config, datafile.name, md5)
+
+        response = client.post(
+            self.gen_uri(server_config, datafile.name),
+            headers=self.gen_headers(pbench_drb_token, md5),
+            query_string={"length": total, "access": "public"},
+        )
+        assert response.status_code == HTTPStatus.CREATED, repr(response.text)
+        assert response.json == {
+            "name": datafile.name,
+            "resource_id": md5,
+            "length": total,
+            "received": [],
+            "missing": [[0, total]],
+        }
+        assert response.headers["location"] == "https://localhost" + quote(uri)
+
+        # Send the middle chunk first, so that it can only be hashed once the
+        # first chunk arrives.
+        response = self.send_chunk(client, uri, pbench_drb_token, *chunks[1], total)
+        assert response.status_code == HTTPStatus.OK, repr(response.text)
+        assert response.json["received"] == [[third, 2 * third]]
+        assert md5 not in UploadSession.HASHERS
+        response = self.send_chunk(client, uri, pbench_drb_token, *chunks[0], total)
+        assert response.json["received"] == [[0, 2 * third]]
+        assert UploadSession.HASHERS[md5][1] == 2 * third
+
+        # Resuming the session reports what's missing
+        response = client.post(
+            self.gen_uri(server_config, datafile.name),
+            headers=self.gen_headers(pbench_drb_token, md5),
+            query_string={"length": total, "access": "public"},
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json["missing"] == [[2 * third, total]]
+
+        # A session can't be finalized until it's complete
+        response = client.post(uri, headers=self.gen_headers(pbench_drb_token, md5))
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert "is missing byte ranges" in response.json["message"]
+
+        response = self.send_chunk(client, uri, pbench_drb_token, *chunks[2], total)
+        assert UploadSession.HASHERS[md5][1] == total
+        response = client.get(uri, headers=self.gen_headers(pbench_drb_token, md5))
+        assert response.json["received"] == [[0, total]]
+        assert response.json["missing"] == []
+
+        response = client.post(uri, headers=self.gen_headers(pbench_drb_token, md5))
+        assert response.status_code == HTTPStatus.CREATED, repr(response.text)
+        assert response.json["resource_id"] == md5
+        assert md5 not in UploadSession.HASHERS
+        assert self.cachemanager_create_path.name == datafile.name
+        dataset = Dataset.query(resource_id=md5)
+        assert dataset.access == "public"
+        assert not list(
+            (server_config.ARCHIVE / CacheManager.TEMPORARY).glob(f"{md5}*")
+        )
+        audit = Audit.query()
+        assert [(a.name, a.status) for a in audit] == [
+            ("upload", AuditStatus.BEGIN),
+            ("upload", AuditStatus.SUCCESS),
+        ]
+
+        # The session is gone, and initiating it again finds the dataset
+        response = client.get(uri, headers=self.gen_headers(pbench_drb_token, md5))
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        response = client.post(
+            self.gen_uri(server_config, datafile.name),
+            headers=self.gen_headers(pbench_drb_token, md5),
+            query_string={"length": total},
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json["message"] == "Dataset already exists"
+
+    def test_resumable_upload_errors(
+        self, client, pbench_drb_token, pbench_admin_token, server_config, tarball
+    ):
+        """Check the diagnosis of bad resumable upload requests"""
+        datafile, _, md5 = tarball
+        data = datafile.read_bytes()
+        total = len(data)
+        uri = self.session_uri(server_config, datafile.name, md5)
+        initiate = self.gen_uri(server_config, datafile.name)
+        headers = self.gen_headers(pbench_drb_token, md5)
+
+        response = client.post(initiate, headers=headers)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = client.post(initiate, headers=headers, query_string={"length": 0})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = client.get(uri, headers=headers)
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        response = client.post(
+            initiate, headers=headers, query_string={"length": total}
+        )
+        assert response.status_code == HTTPStatus.CREATED
+
+        # A session can't be redefined
+        response = client.post(
+            initiate, headers=headers, query_string={"length": total + 1}
+        )
+        assert response.status_code == HTTPStatus.CONFLICT
+
+        # Only the owner can use the session
+        response = client.get(uri, headers=self.gen_headers(pbench_admin_token, md5))
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+        # The range must be in bounds and match the data
+        for start, length, content_range in (
+            (0, 10, None),
+            (0, 10, f"bytes 0-9/{total + 1}"),
+            (0, 10, f"bytes 0-10/{total}"),
+            (total - 5, 10, f"bytes {total - 5}-{total + 4}/{total}"),
+        ):
+            h = {"Authorization": "Bearer " + pbench_drb_token}
+            if content_range:
+                h["Content-Range"] = content_range
+            response = client.put(uri, data=data[start : start + length], headers=h)
+            assert response.status_code == HTTPStatus.BAD_REQUEST, content_range
+
+        # A complete session with the wrong MD5 is discarded
+        response = self.send_chunk(
+            client, uri, pbench_drb_token, 0, b"x" * total, total
+        )
+        assert response.status_code == HTTPStatus.OK
+        response = client.post(uri, headers=headers)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.json["message"].startswith("MD5 checksum")
+        response = client.get(uri, headers=headers)
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert not (server_config.ARCHIVE / CacheManager.TEMPORARY / md5).exists()
+
+        # A session can be abandoned
+        response = client.post(
+            initiate, headers=headers, query_string={"length": total}
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        response = client.delete(uri, headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        response = client.get(uri, headers=headers)
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_resumable_upload_retry(
+        self, client, pbench_drb_token, server_config, tarball, monkeypatch
+    ):
+        """A session survives a failure to create the dataset, so that the
+        client can finalize it again without resending the tarball.
+        """
+        monkeypatch.setattr(
+            IntakeBase,
+            "_backup_tarball",
+            lambda _s, p, i: server_config.BACKUP / i / p.name,
+        )
+        datafile, _, md5 = tarball
+        data = datafile.read_bytes()
+        uri = self.session_uri(server_config, datafile.name, md5)
+        headers = self.gen_headers(pbench_drb_token, md5)
+        temporary = server_config.ARCHIVE / CacheManager.TEMPORARY
+
+        response = client.post(
+            self.gen_uri(server_config, datafile.name),
+            headers=headers,
+            query_string={"length": len(data)},
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        response = self.send_chunk(client, uri, pbench_drb_token, 0, data, len(data))
+        assert response.status_code == HTTPStatus.OK
+
+        TestUpload.cachemanager_create_fail = OSError(errno.ENOSPC, "no space")
+        response = client.post(uri, headers=headers)
+        assert response.status_code == HTTPStatus.INSUFFICIENT_STORAGE
+        assert not (temporary / md5).exists()
+        with pytest.raises(DatasetNotFound):
+            Dataset.query(resource_id=md5)
+        response = client.get(uri, headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        assert response.json["missing"] == []
+
+        TestUpload.cachemanager_create_fail = None
+        response = client.post(uri, headers=headers)
+        assert response.status_code == HTTPStatus.CREATED, repr(response.text)
+        assert Dataset.query(resource_id=md5).name == Dataset.stem(datafile)
+        assert not list(temporary.glob(f"{md5}*"))
+
+    def test_upload_session_prune(self, tmp_path, monkeypatch):
+        """Sessions which haven't been updated for a day are removed, unless
+        they're locked.
+        """
+        sessions = {}
+        for md5 in ("fresh", "stale", "locked"):
+            sessions[md5] = UploadSession(tmp_path, md5)
+            sessions[md5].create(f"{md5}.tar.xz", 10, "private", [], "1")
+        expired = time.time() - UploadSession.LIFETIME - 60
+        for md5 in ("stale", "locked"):
+            record = sessions[md5].path / UploadSession.RECORD
+            os.utime(record, (expired, expired))
+
+        # POSIX locks don't conflict within a process, so fake another
+        # process holding the lock.
+        real_acquire = LockRef.acquire
+
+        def acquire(self, exclusive: bool = False, wait: bool = True) -> LockRef:
+            if Path(self.lock.name).parent.name == "locked.upload":
+                raise OSError(errno.EAGAIN, "locked")
+            return real_acquire(self, exclusive, wait)
+
+        with monkeypatch.context() as m:
+            m.setattr(LockRef, "acquire", acquire)
+            assert UploadSession.prune(tmp_path) == 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "fresh.upload",
+            "locked.upload",
+        ]
+        assert UploadSession.prune(tmp_path) == 1
+        assert [p.name for p in tmp_path.iterdir()] == ["fresh.upload"]
+
+    def test_upload_session_prune_hashers(self, tmp_path):
+        """Pruning drops the incremental hashes of sessions which are gone or
+        have been replaced, whichever process removed them.
+        """
+        for md5 in ("kept", "gone", "replaced"):
+            session = UploadSession(tmp_path, md5)
+            session.create(f"{md5}.tar.xz", 10, "private", [], "1")
+            session.write(0, BytesIO(b"x" * 5), 5)
+        assert sorted(UploadSession.HASHERS) == ["gone", "kept", "replaced"]
+
+        # Another process removes one session, and replaces another.
+        shutil.rmtree(tmp_path / f"gone{UploadSession.SUFFIX}")
+        shutil.rmtree(tmp_path / f"replaced{UploadSession.SUFFIX}")
+        UploadSession(tmp_path, "replaced").create(
+            "replaced.tar.xz", 10, "private", [], "1"
+        )
+        assert UploadSession.prune(tmp_path) == 0
+        assert list(UploadSession.HASHERS) == ["kept"]
+
+    @pytest.mark.parametrize("other_process", (False, True))
+    def test_upload_session_rewrite(self, tmp_path, other_process):
+        """Rewriting bytes which have already been hashed discards the
+        incremental hash, whichever process holds it, so that the digest is
+        that of the bytes on disk.
+        """
+        data = b"0123456789"
+        session = UploadSession(tmp_path, "md5")
+        session.create("t.tar.xz", len(data), "private", [], "1")
+        session.write(0, BytesIO(b"xxxx"), 4)
+        session.write(4, BytesIO(data[4:]), len(data) - 4)
+        assert UploadSession.HASHERS["md5"][1] == len(data)
+
+        if other_process:
+            held = UploadSession.HASHERS.pop("md5")
+        session.write(0, BytesIO(data[:4]), 4)
+        if other_process:
+            UploadSession.HASHERS["md5"] = held
+
+        session.finalize(tmp_path / "target")
+        md5, hashed = session.digest(tmp_path / "target" / "t.tar.xz")
+        assert md5 == hashlib.md5(data).hexdigest()
+        assert hashed == (0 if other_process else len(data))